@@ -937,29 +937,32 @@ class AdminService:
                 where_terms.append("g.production_ready = %s")
                 params.append(bool(production_ready))
             where_sql = (" WHERE " + " AND ".join(where_terms)) if where_terms else ""
-            with self.db.get_connection_context() as conn:
-                cur = conn.cursor()
-                cur.execute(f"SELECT COUNT(*) FROM gyms g{where_sql}", params)
-                total_row = cur.fetchone()
-                total = int(total_row[0]) if total_row else 0
+            order_sql = (
+                f"ORDER BY gs.next_due_date {od} NULLS LAST"
+                if ob == "next_due_date"
+                else f"ORDER BY g.{ob} {od}"
+            )
             with self.db.get_connection_context() as conn:
                 cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-                order_sql = (
-                    f"ORDER BY gs.next_due_date {od} NULLS LAST"
-                    if ob == "next_due_date"
-                    else f"ORDER BY g.{ob} {od}"
-                )
                 cur.execute(
                     f"""
                     SELECT g.id, g.nombre, g.subdominio, g.db_name, g.owner_phone, g.status, g.hard_suspend, g.suspended_until,
                            g.whatsapp_phone_id, g.whatsapp_business_account_id, g.whatsapp_access_token,
                            g.b2_bucket_name, g.b2_bucket_id, g.production_ready, g.production_ready_at, g.created_at,
                            gs.next_due_date, gs.status AS sub_status, gs.plan_id AS subscription_plan_id,
-                           (SELECT amount FROM gym_payments WHERE gym_id = g.id ORDER BY paid_at DESC LIMIT 1) AS last_payment_amount,
-                           (SELECT currency FROM gym_payments WHERE gym_id = g.id ORDER BY paid_at DESC LIMIT 1) AS last_payment_currency,
-                           (SELECT paid_at FROM gym_payments WHERE gym_id = g.id ORDER BY paid_at DESC LIMIT 1) AS last_payment_at
+                           lp.amount AS last_payment_amount,
+                           lp.currency AS last_payment_currency,
+                           lp.paid_at AS last_payment_at,
+                           COUNT(*) OVER() AS total_count
                     FROM gyms g
                     LEFT JOIN gym_subscriptions gs ON gs.gym_id = g.id
+                    LEFT JOIN LATERAL (
+                        SELECT gp.amount, gp.currency, gp.paid_at
+                        FROM gym_payments gp
+                        WHERE gp.gym_id = g.id
+                        ORDER BY gp.paid_at DESC
+                        LIMIT 1
+                    ) lp ON TRUE
                     {where_sql}
                     {order_sql}
                     LIMIT %s OFFSET %s
@@ -967,9 +970,19 @@ class AdminService:
                     params + [ps, (p - 1) * ps],
                 )
                 rows = cur.fetchall()
+                if rows:
+                    total = int(rows[0].get("total_count") or 0)
+                elif p > 1:
+                    # Página fuera de rango: la ventana no trae filas, el total sale aparte.
+                    cur.execute(f"SELECT COUNT(*) AS c FROM gyms g{where_sql}", params)
+                    total_row = cur.fetchone()
+                    total = int(total_row.get("c") or 0) if total_row else 0
+                else:
+                    total = 0
             items: List[Dict[str, Any]] = []
             for r in rows:
                 dct = dict(r)
+                dct.pop("total_count", None)
                 phone_id = str(dct.get("whatsapp_phone_id") or "").strip()
                 dct["wa_configured"] = bool(phone_id)
                 items.append(dct)
@@ -4805,64 +4818,74 @@ class AdminService:
     def obtener_metricas_agregadas(self) -> Dict[str, Any]:
         try:
             with self.db.get_connection_context() as conn:
-                cur = conn.cursor()
-                cur.execute("SELECT COUNT(*) FROM gyms")
-                total_gyms = int((cur.fetchone() or [0])[0])
-                cur.execute("SELECT COUNT(*) FROM gyms WHERE status = 'active'")
-                active_gyms = int((cur.fetchone() or [0])[0])
-                cur.execute("SELECT COUNT(*) FROM gyms WHERE status = 'suspended'")
-                suspended_gyms = int((cur.fetchone() or [0])[0])
-                cur.execute("SELECT COUNT(*) FROM gyms WHERE status = 'maintenance'")
-                maintenance_gyms = int((cur.fetchone() or [0])[0])
-                cur.execute(
-                    "SELECT COUNT(*) FROM gyms WHERE created_at >= (CURRENT_DATE - INTERVAL '7 days')"
-                )
-                gyms_last_7 = int((cur.fetchone() or [0])[0])
-                cur.execute(
-                    "SELECT COUNT(*) FROM gyms WHERE created_at >= (CURRENT_DATE - INTERVAL '30 days')"
-                )
-                gyms_last_30 = int((cur.fetchone() or [0])[0])
-                cur.execute(
-                    "SELECT COUNT(*) FROM gyms WHERE whatsapp_phone_id IS NOT NULL AND whatsapp_access_token IS NOT NULL"
-                )
-                whatsapp_cfg = int((cur.fetchone() or [0])[0])
-
-                storage_cfg = 0  # Simplified
-
-                cur.execute(
-                    "SELECT COUNT(*) FROM gym_subscriptions WHERE status = 'overdue'"
-                )
-                overdue_subs = int((cur.fetchone() or [0])[0])
-                cur.execute(
-                    "SELECT COUNT(*) FROM gym_subscriptions WHERE status = 'active'"
-                )
-                active_subs = int((cur.fetchone() or [0])[0])
-                cur.execute(
-                    "SELECT COALESCE(SUM(amount),0) FROM gym_payments WHERE paid_at >= (CURRENT_DATE - INTERVAL '30 days')"
-                )
-                payments_30_sum = float((cur.fetchone() or [0.0])[0] or 0)
-
+                cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
                 cur.execute(
-                    "SELECT created_at::date AS d, COUNT(*) AS c FROM gyms WHERE created_at >= (CURRENT_DATE - INTERVAL '30 days') GROUP BY d ORDER BY d ASC"
+                    """
+                    WITH g AS (
+                        SELECT
+                            COUNT(*) AS total,
+                            COUNT(*) FILTER (WHERE status = 'active') AS active,
+                            COUNT(*) FILTER (WHERE status = 'suspended') AS suspended,
+                            COUNT(*) FILTER (WHERE status = 'maintenance') AS maintenance,
+                            COUNT(*) FILTER (WHERE created_at >= (CURRENT_DATE - INTERVAL '7 days')) AS last_7,
+                            COUNT(*) FILTER (WHERE created_at >= (CURRENT_DATE - INTERVAL '30 days')) AS last_30,
+                            COUNT(*) FILTER (
+                                WHERE whatsapp_phone_id IS NOT NULL AND whatsapp_access_token IS NOT NULL
+                            ) AS whatsapp_cfg
+                        FROM gyms
+                    ),
+                    s AS (
+                        SELECT
+                            COUNT(*) FILTER (WHERE status = 'overdue') AS overdue,
+                            COUNT(*) FILTER (WHERE status = 'active') AS active
+                        FROM gym_subscriptions
+                    ),
+                    pay AS (
+                        SELECT COALESCE(SUM(amount), 0) AS last_30_sum
+                        FROM gym_payments
+                        WHERE paid_at >= (CURRENT_DATE - INTERVAL '30 days')
+                    ),
+                    series AS (
+                        SELECT COALESCE(
+                            json_agg(json_build_object('date', d::text, 'count', c) ORDER BY d),
+                            '[]'::json
+                        ) AS series_30
+                        FROM (
+                            SELECT created_at::date AS d, COUNT(*) AS c
+                            FROM gyms
+                            WHERE created_at >= (CURRENT_DATE - INTERVAL '30 days')
+                            GROUP BY d
+                        ) x
+                    )
+                    SELECT
+                        g.total, g.active, g.suspended, g.maintenance, g.last_7, g.last_30, g.whatsapp_cfg,
+                        s.overdue AS subs_overdue, s.active AS subs_active,
+                        pay.last_30_sum, series.series_30
+                    FROM g, s, pay, series
+                    """
                 )
-                series_rows = cur.fetchall()
-                series_30 = [
-                    {"date": str(r[0]), "count": int(r[1])} for r in series_rows
-                ]
+                row = dict(cur.fetchone() or {})
+            series_30 = [
+                {"date": str(r.get("date")), "count": int(r.get("count") or 0)}
+                for r in (row.get("series_30") or [])
+            ]
             return {
                 "gyms": {
-                    "total": total_gyms,
-                    "active": active_gyms,
-                    "suspended": suspended_gyms,
-                    "maintenance": maintenance_gyms,
-                    "last_7": gyms_last_7,
-                    "last_30": gyms_last_30,
+                    "total": int(row.get("total") or 0),
+                    "active": int(row.get("active") or 0),
+                    "suspended": int(row.get("suspended") or 0),
+                    "maintenance": int(row.get("maintenance") or 0),
+                    "last_7": int(row.get("last_7") or 0),
+                    "last_30": int(row.get("last_30") or 0),
                     "series_30": series_30,
                 },
-                "whatsapp": {"configured": whatsapp_cfg},
-                "storage": {"configured": storage_cfg},
-                "subscriptions": {"active": active_subs, "overdue": overdue_subs},
-                "payments": {"last_30_sum": payments_30_sum},
+                "whatsapp": {"configured": int(row.get("whatsapp_cfg") or 0)},
+                "storage": {"configured": 0},  # Simplified
+                "subscriptions": {
+                    "active": int(row.get("subs_active") or 0),
+                    "overdue": int(row.get("subs_overdue") or 0),
+                },
+                "payments": {"last_30_sum": float(row.get("last_30_sum") or 0)},
             }
         except Exception:
             return {
@@ -4884,27 +4907,29 @@ class AdminService:
     def obtener_warnings_admin(self) -> List[str]:
         ws: List[str] = []
         try:
-            m = self.obtener_metricas_agregadas()
-            if int((m.get("subscriptions") or {}).get("overdue") or 0) > 0:
-                ws.append("Hay suscripciones vencidas")
             with self.db.get_connection_context() as conn:
-                cur = conn.cursor()
+                cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
                 cur.execute(
-                    "SELECT COUNT(*) FROM gyms WHERE owner_phone IS NULL OR TRIM(owner_phone) = ''"
+                    """
+                    SELECT
+                        (SELECT COUNT(*) FROM gym_subscriptions WHERE status = 'overdue') AS overdue,
+                        COUNT(*) FILTER (WHERE owner_phone IS NULL OR TRIM(owner_phone) = '') AS no_phone,
+                        COUNT(*) FILTER (
+                            WHERE whatsapp_phone_id IS NULL OR whatsapp_access_token IS NULL
+                        ) AS no_wa,
+                        COUNT(*) FILTER (WHERE status = 'suspended') AS suspended
+                    FROM gyms
+                    """
                 )
-                no_phone = int((cur.fetchone() or [0])[0])
-                if no_phone > 0:
-                    ws.append("Gimnasios sin teléfono del dueño")
-                cur.execute(
-                    "SELECT COUNT(*) FROM gyms WHERE whatsapp_phone_id IS NULL OR whatsapp_access_token IS NULL"
-                )
-                no_wa = int((cur.fetchone() or [0])[0])
-                if no_wa > 0:
-                    ws.append("Gimnasios sin WhatsApp configurado")
-                cur.execute("SELECT COUNT(*) FROM gyms WHERE status = 'suspended'")
-                sus = int((cur.fetchone() or [0])[0])
-                if sus > 0:
-                    ws.append("Gimnasios suspendidos")
+                row = dict(cur.fetchone() or {})
+            if int(row.get("overdue") or 0) > 0:
+                ws.append("Hay suscripciones vencidas")
+            if int(row.get("no_phone") or 0) > 0:
+                ws.append("Gimnasios sin teléfono del dueño")
+            if int(row.get("no_wa") or 0) > 0:
+                ws.append("Gimnasios sin WhatsApp configurado")
+            if int(row.get("suspended") or 0) > 0:
+                ws.append("Gimnasios suspendidos")
         except Exception:
             pass
         return ws
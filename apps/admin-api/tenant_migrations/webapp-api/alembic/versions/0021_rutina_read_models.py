@@ -0,0 +1,29 @@
+"""
+Denormalized routine documents for member views and PDF export
+(see src/services/routine_read_model.py). Rows are filled lazily on first
+read and rebuilt whenever a routine or its exercises change.
+"""
+
+from alembic import op
+
+revision = "0021_rutina_read_models"
+down_revision = "0020_tpl_tipo"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS rutina_read_models (
+            rutina_id INTEGER PRIMARY KEY REFERENCES rutinas(id) ON DELETE CASCADE,
+            version INTEGER NOT NULL DEFAULT 1,
+            documento JSONB NOT NULL,
+            actualizado_en TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW()
+        );
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS rutina_read_models;")
@@ -0,0 +1,61 @@
+"""
+Tables that used to be created on first use by request handlers
+(whatsapp_triggers, clase_profesor_asignaciones). They ship as a migration
+now; request paths consult src/database/schema_capabilities.py instead of
+running DDL.
+"""
+
+from alembic import op
+
+revision = "0022_runtime_ddl_tables"
+down_revision = "0021_rutina_read_models"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS whatsapp_triggers (
+            trigger_key TEXT PRIMARY KEY,
+            enabled BOOLEAN NOT NULL DEFAULT FALSE,
+            template_name TEXT NULL,
+            cooldown_minutes INTEGER NOT NULL DEFAULT 1440,
+            last_run_at TIMESTAMP NULL
+        );
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO whatsapp_triggers(trigger_key, enabled, template_name, cooldown_minutes)
+        VALUES
+            ('overdue_daily', FALSE, NULL, 1440),
+            ('due_today_daily', FALSE, NULL, 1440),
+            ('due_soon_daily', FALSE, NULL, 1440)
+        ON CONFLICT (trigger_key) DO NOTHING;
+        """
+    )
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS clase_profesor_asignaciones (
+            id SERIAL PRIMARY KEY,
+            clase_id INTEGER NOT NULL REFERENCES clases(id) ON DELETE CASCADE,
+            profesor_id INTEGER NOT NULL REFERENCES profesores(id) ON DELETE CASCADE,
+            activa BOOLEAN NOT NULL DEFAULT TRUE,
+            created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
+            updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
+            UNIQUE (clase_id, profesor_id)
+        );
+        """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_clase_profesor_asignaciones_profesor ON clase_profesor_asignaciones(profesor_id);"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_clase_profesor_asignaciones_clase ON clase_profesor_asignaciones(clase_id);"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS clase_profesor_asignaciones;")
+    op.execute("DROP TABLE IF EXISTS whatsapp_triggers;")
@@ -0,0 +1,50 @@
+"""
+Composite indexes for the owner dashboard keyset pagination
+(see src/services/owner_dashboard_service.py). Each matches a panel's
+ORDER BY with the id tie-breaker, so cursor pages and the capped window
+counts read an index range instead of sorting the filtered table. The
+single-column / two-column indexes they supersede are dropped.
+"""
+
+from alembic import op
+
+revision = "0024_owner_dashboard_keyset"
+down_revision = "0023_inscriptos_count"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_pagos_sucursal_fecha_id ON pagos (sucursal_id, fecha_pago DESC, id DESC);"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_pagos_fecha_id ON pagos (fecha_pago DESC, id DESC);"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_asistencias_sucursal_fecha_id ON asistencias (sucursal_id, fecha DESC, id DESC);"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_asistencias_fecha_id ON asistencias (fecha DESC, id DESC);"
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS idx_usuarios_nombre_id ON usuarios (nombre, id);")
+    op.execute("DROP INDEX IF EXISTS idx_usuarios_nombre;")
+    op.execute("DROP INDEX IF EXISTS idx_pagos_fecha;")
+    op.execute("DROP INDEX IF EXISTS idx_pagos_fecha_pago;")
+    op.execute("DROP INDEX IF EXISTS idx_asistencias_fecha;")
+    op.execute("DROP INDEX IF EXISTS idx_pagos_sucursal_id;")
+    op.execute("DROP INDEX IF EXISTS idx_asistencias_sucursal_fecha;")
+
+
+def downgrade() -> None:
+    op.execute("CREATE INDEX IF NOT EXISTS idx_asistencias_sucursal_fecha ON asistencias (sucursal_id, fecha);")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_pagos_sucursal_id ON pagos (sucursal_id);")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_usuarios_nombre ON usuarios (nombre);")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_asistencias_fecha ON asistencias (fecha);")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_pagos_fecha_pago ON pagos (fecha_pago);")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_pagos_fecha ON pagos (fecha_pago);")
+    op.execute("DROP INDEX IF EXISTS idx_usuarios_nombre_id;")
+    op.execute("DROP INDEX IF EXISTS idx_asistencias_fecha_id;")
+    op.execute("DROP INDEX IF EXISTS idx_asistencias_sucursal_fecha_id;")
+    op.execute("DROP INDEX IF EXISTS idx_pagos_fecha_id;")
+    op.execute("DROP INDEX IF EXISTS idx_pagos_sucursal_fecha_id;")
@@ -0,0 +1,158 @@
+"""
+Support objects for monthly range partitioning of the append-only tables
+(asistencias, access_events, whatsapp_messages, audit_logs).
+
+The conversion itself rewrites each table under an exclusive lock, so it is
+not run here (tenant engines auto-migrate on the request path); it is run
+per tenant with src/cli/tenant_partitions.py, which reads the policies seeded
+below. This migration only adds:
+
+- partition_policies: per-table retention / pre-creation settings;
+- partition_guard_keys + trigger functions: global uniqueness for keys that
+  a partitioned table cannot enforce with an index because they do not
+  include the partition column (whatsapp_messages.message_id, the
+  access_events nonce). Duplicate inserts are skipped like ON CONFLICT DO
+  NOTHING; an update that would duplicate a key raises unique_violation.
+"""
+
+from alembic import op
+
+revision = "0025_partition_maintenance"
+down_revision = "0024_owner_dashboard_keyset"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS partition_policies (
+            table_name TEXT PRIMARY KEY,
+            premake_months INTEGER NOT NULL DEFAULT 3,
+            retention_months INTEGER NULL,
+            retention_action TEXT NOT NULL DEFAULT 'detach',
+            converted_at TIMESTAMP WITHOUT TIME ZONE NULL,
+            updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            CONSTRAINT ck_partition_policies_action CHECK (retention_action IN ('detach', 'drop'))
+        );
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO partition_policies (table_name, premake_months, retention_months, retention_action)
+        VALUES
+            ('asistencias', 3, NULL, 'detach'),
+            ('access_events', 3, 13, 'detach'),
+            ('whatsapp_messages', 3, 13, 'detach'),
+            ('audit_logs', 3, 25, 'detach')
+        ON CONFLICT (table_name) DO NOTHING;
+        """
+    )
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS partition_guard_keys (
+            table_name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            bound TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            PRIMARY KEY (table_name, key)
+        );
+        """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_partition_guard_keys_bound ON partition_guard_keys (table_name, bound);"
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION partition_guard_key(rec JSONB, cols TEXT[]) RETURNS TEXT AS $$
+        DECLARE
+            k TEXT := '';
+            c TEXT;
+        BEGIN
+            FOREACH c IN ARRAY cols LOOP
+                -- NULLs never conflict, as with a unique index
+                IF rec ->> c IS NULL THEN
+                    RETURN NULL;
+                END IF;
+                k := k || (rec ->> c) || chr(31);
+            END LOOP;
+            RETURN k;
+        END;
+        $$ LANGUAGE plpgsql IMMUTABLE;
+        """
+    )
+    # TG_ARGV: table, partition column, key columns...
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION partition_guard_unique() RETURNS trigger AS $$
+        DECLARE
+            rec JSONB := to_jsonb(NEW);
+            k TEXT := partition_guard_key(rec, TG_ARGV[2:TG_NARGS - 1]);
+        BEGIN
+            IF k IS NULL THEN
+                RETURN NEW;
+            END IF;
+            INSERT INTO partition_guard_keys (table_name, key, bound)
+            VALUES (TG_ARGV[0], k, COALESCE((rec ->> TG_ARGV[1])::timestamp, CURRENT_TIMESTAMP))
+            ON CONFLICT DO NOTHING;
+            IF NOT FOUND THEN
+                RETURN NULL;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION partition_guard_release() RETURNS trigger AS $$
+        DECLARE
+            k TEXT := partition_guard_key(to_jsonb(OLD), TG_ARGV[2:TG_NARGS - 1]);
+        BEGIN
+            IF k IS NOT NULL THEN
+                DELETE FROM partition_guard_keys WHERE table_name = TG_ARGV[0] AND key = k;
+            END IF;
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    # AFTER UPDATE OF the key / partition columns: swaps the key when it
+    # changes, otherwise keeps its bound in step with the partition column
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION partition_guard_update() RETURNS trigger AS $$
+        DECLARE
+            cols TEXT[] := TG_ARGV[2:TG_NARGS - 1];
+            rec JSONB := to_jsonb(NEW);
+            old_k TEXT := partition_guard_key(to_jsonb(OLD), cols);
+            new_k TEXT := partition_guard_key(rec, cols);
+            b TIMESTAMP := COALESCE((rec ->> TG_ARGV[1])::timestamp, CURRENT_TIMESTAMP);
+        BEGIN
+            IF old_k IS NOT DISTINCT FROM new_k THEN
+                IF new_k IS NOT NULL THEN
+                    UPDATE partition_guard_keys SET bound = b
+                    WHERE table_name = TG_ARGV[0] AND key = new_k;
+                END IF;
+                RETURN NULL;
+            END IF;
+            IF old_k IS NOT NULL THEN
+                DELETE FROM partition_guard_keys WHERE table_name = TG_ARGV[0] AND key = old_k;
+            END IF;
+            IF new_k IS NOT NULL THEN
+                INSERT INTO partition_guard_keys (table_name, key, bound)
+                VALUES (TG_ARGV[0], new_k, b);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP FUNCTION IF EXISTS partition_guard_update();")
+    op.execute("DROP FUNCTION IF EXISTS partition_guard_release();")
+    op.execute("DROP FUNCTION IF EXISTS partition_guard_unique();")
+    op.execute("DROP FUNCTION IF EXISTS partition_guard_key(JSONB, TEXT[]);")
+    op.execute("DROP TABLE IF EXISTS partition_guard_keys;")
+    op.execute("DROP TABLE IF EXISTS partition_policies;")
@@ -0,0 +1,42 @@
+"""
+Manifest of cold-archived data (src/services/cold_archive.py).
+
+Closed periods of pagos, asistencias and whatsapp_messages are exported to
+Parquet objects and deleted from the table; each object is one row here so
+exports can union the archived periods back without listing the bucket.
+Children archived with their parent (pago_detalles, comprobantes_pago) get
+their own rows with the same period and part.
+"""
+
+from alembic import op
+
+revision = "0026_archive_segments"
+down_revision = "0025_partition_maintenance"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS archive_segments (
+            id SERIAL PRIMARY KEY,
+            table_name TEXT NOT NULL,
+            period DATE NOT NULL,
+            part INTEGER NOT NULL DEFAULT 1,
+            object_key TEXT NOT NULL,
+            backend TEXT NOT NULL,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            byte_size BIGINT NOT NULL DEFAULT 0,
+            sha256 TEXT NOT NULL,
+            min_id BIGINT NULL,
+            max_id BIGINT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            CONSTRAINT uq_archive_segments_table_period_part UNIQUE (table_name, period, part)
+        );
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS archive_segments;")
@@ -0,0 +1,63 @@
+"""
+Denormalized enrollment counter per schedule for the class booking engine
+(see src/services/class_booking_service.py). Bookings take a spot with a
+conditional UPDATE on inscriptos_count; every DELETE on clase_usuarios
+(cancellations, schedule or user removal, cascades) gives it back through
+the trigger below.
+"""
+
+from alembic import op
+
+revision = "0023_inscriptos_count"
+down_revision = "0022_runtime_ddl_tables"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "ALTER TABLE clases_horarios ADD COLUMN IF NOT EXISTS inscriptos_count INTEGER NOT NULL DEFAULT 0;"
+    )
+    op.execute(
+        """
+        UPDATE clases_horarios ch
+        SET inscriptos_count = COALESCE(sub.n, 0)
+        FROM (
+            SELECT h.id, COUNT(cu.id) AS n
+            FROM clases_horarios h
+            LEFT JOIN clase_usuarios cu ON cu.clase_horario_id = h.id
+            GROUP BY h.id
+        ) sub
+        WHERE ch.id = sub.id;
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION clase_usuarios_release_spot() RETURNS trigger AS $$
+        BEGIN
+            UPDATE clases_horarios
+            SET inscriptos_count = GREATEST(inscriptos_count - 1, 0)
+            WHERE id = OLD.clase_horario_id;
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute("DROP TRIGGER IF EXISTS trg_clase_usuarios_release_spot ON clase_usuarios;")
+    op.execute(
+        """
+        CREATE TRIGGER trg_clase_usuarios_release_spot
+        AFTER DELETE ON clase_usuarios
+        FOR EACH ROW EXECUTE FUNCTION clase_usuarios_release_spot();
+        """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_clase_lista_espera_horario_posicion ON clase_lista_espera(clase_horario_id, posicion) WHERE activo = TRUE;"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS idx_clase_lista_espera_horario_posicion;")
+    op.execute("DROP TRIGGER IF EXISTS trg_clase_usuarios_release_spot ON clase_usuarios;")
+    op.execute("DROP FUNCTION IF EXISTS clase_usuarios_release_spot();")
+    op.execute("ALTER TABLE clases_horarios DROP COLUMN IF EXISTS inscriptos_count;")
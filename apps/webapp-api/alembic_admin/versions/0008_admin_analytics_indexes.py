@@ -0,0 +1,40 @@
+from alembic import op
+
+revision = "0008_admin_analytics_indexes"
+down_revision = "0007_support_tenant_settings"
+branch_labels = None
+depends_on = None
+
+
+_INDEXES = [
+    ("gyms", "CREATE INDEX IF NOT EXISTS idx_gyms_status ON public.gyms(status)"),
+    ("gyms", "CREATE INDEX IF NOT EXISTS idx_gyms_created_at ON public.gyms(created_at DESC)"),
+    (
+        "gym_payments",
+        "CREATE INDEX IF NOT EXISTS idx_gym_payments_gym_paid_at_desc ON public.gym_payments(gym_id, paid_at DESC)",
+    ),
+    ("gym_payments", "CREATE INDEX IF NOT EXISTS idx_gym_payments_paid_at ON public.gym_payments(paid_at)"),
+    (
+        "gym_subscriptions",
+        "CREATE INDEX IF NOT EXISTS idx_gym_subscriptions_gym_status ON public.gym_subscriptions(gym_id, status)",
+    ),
+    ("gym_subscriptions", "CREATE INDEX IF NOT EXISTS idx_gym_subscriptions_status ON public.gym_subscriptions(status)"),
+]
+
+
+def upgrade() -> None:
+    for table, ddl in _INDEXES:
+        op.execute(
+            f"""
+            DO $$
+            BEGIN
+                IF to_regclass('public.{table}') IS NOT NULL THEN
+                    EXECUTE '{ddl}';
+                END IF;
+            END $$;
+            """
+        )
+
+
+def downgrade() -> None:
+    return
@@ -0,0 +1,35 @@
+from alembic import op
+
+revision = "0009_whatsapp_inbound_queue"
+down_revision = "0008_admin_analytics_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS public.whatsapp_inbound_queue (
+            id BIGSERIAL PRIMARY KEY,
+            received_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW(),
+            tenant TEXT NULL,
+            phone_number_id TEXT NULL,
+            payload JSONB NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            locked_until TIMESTAMP WITHOUT TIME ZONE NULL,
+            processed_at TIMESTAMP WITHOUT TIME ZONE NULL,
+            last_error TEXT NULL
+        );
+        """
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_whatsapp_inbound_queue_pending ON public.whatsapp_inbound_queue(id) WHERE status = 'pending';"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_whatsapp_inbound_queue_processed_at ON public.whatsapp_inbound_queue(processed_at) WHERE status <> 'pending';"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS public.whatsapp_inbound_queue;")
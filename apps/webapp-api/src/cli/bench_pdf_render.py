@@ -0,0 +1,107 @@
+import argparse
+import multiprocessing
+import os
+import time
+from typing import Any, Dict, List, Tuple
+
+from src.services.pdf_engine import PDFEngine
+
+
+def _bench_template(weeks: int) -> Dict[str, Any]:
+    return {
+        "metadata": {"name": "Bench", "version": "1.0.0", "description": "Benchmark", "category": "general"},
+        "layout": {"page_size": "A4", "orientation": "landscape", "margins": {"top": 15, "bottom": 15, "left": 10, "right": 10}},
+        "pages": [
+            {
+                "name": "Rutina",
+                "sections": [
+                    {"type": "excel_header", "content": {"weeks": weeks}},
+                    {"type": "exercise_table", "content": {"format": "excel_weekly", "weeks": weeks}},
+                    {"type": "text", "content": {"text": "Rutina de {{usuario_nombre}} - {{gym_name}}"}},
+                    {"type": "qr_code", "content": {"size": 80}},
+                ],
+            }
+        ],
+        "variables": {
+            "gym_name": {"type": "string", "default": "Gimnasio"},
+            "usuario_nombre": {"type": "string", "default": "Usuario"},
+        },
+        "qr_code": {"enabled": True, "position": "footer", "data_source": "routine_uuid"},
+    }
+
+
+def _bench_data(weeks: int, days: int, exercises: int) -> Dict[str, Any]:
+    reps = ",".join(str(12 - (w % 6)) for w in range(weeks))
+    return {
+        "gym_name": "Gym Bench",
+        "nombre_rutina": "Hipertrofia",
+        "usuario_nombre": "Usuario Bench",
+        "uuid_rutina": "bench-uuid-0001",
+        "total_weeks": weeks,
+        "dias": [
+            {
+                "numero": d,
+                "nombre": f"Día {d}",
+                "ejercicios": [
+                    {
+                        "nombre": f"Ejercicio {d}.{i}",
+                        "series": 4,
+                        "repeticiones": reps,
+                        "peso_kg": "20,22.5,25",
+                        "rir": 2,
+                        "descanso": "90s",
+                    }
+                    for i in range(1, exercises + 1)
+                ],
+            }
+            for d in range(1, days + 1)
+        ],
+    }
+
+
+def _run_worker(args: Tuple[float, int, int, int, bool]) -> Tuple[int, float]:
+    seconds, weeks, days, exercises, cold = args
+    cfg = _bench_template(weeks)
+    data = _bench_data(weeks, days, exercises)
+    PDFEngine().generate_pdf(cfg, data)  # warm-up: imports, fonts, plan
+    count = 0
+    t0 = time.perf_counter()
+    deadline = t0 + seconds
+    while time.perf_counter() < deadline:
+        if cold:
+            PDFEngine.clear_render_plans()
+        PDFEngine().generate_pdf(cfg, data)
+        count += 1
+    return count, time.perf_counter() - t0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="webapp-api-bench-pdf-render")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--weeks", type=int, default=12)
+    parser.add_argument("--days", type=int, default=5)
+    parser.add_argument("--exercises", type=int, default=8)
+    parser.add_argument("--cold", action="store_true", help="Recompilar el render plan en cada export")
+    args = parser.parse_args()
+
+    procs = max(1, min(int(args.processes), os.cpu_count() or 1))
+    job = (float(args.seconds), int(args.weeks), int(args.days), int(args.exercises), bool(args.cold))
+    if procs == 1:
+        results: List[Tuple[int, float]] = [_run_worker(job)]
+    else:
+        with multiprocessing.get_context("spawn").Pool(procs) as pool:
+            results = pool.map(_run_worker, [job] * procs)
+
+    total = sum(c for c, _ in results)
+    per_core = [c / e for c, e in results if e > 0]
+    mode = "cold" if args.cold else "cached-plan"
+    print(f"mode={mode} processes={procs} weeks={args.weeks} days={args.days} exercises/day={args.exercises}")
+    print(f"pdfs={total} throughput={sum(per_core):.2f} pdf/s")
+    print(f"per_core={sum(per_core) / len(per_core):.2f} pdf/s/core")
+    if procs == 1:
+        print(f"plan_cache={PDFEngine.render_plan_stats()}")
+
+
+if __name__ == "__main__":
+    main()
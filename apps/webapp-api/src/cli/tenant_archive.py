@@ -0,0 +1,158 @@
+import argparse
+import json
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import create_engine, text
+
+from src.database.connection import AdminSessionLocal
+from src.database.partitioning import detached_partitions
+from src.database.tenant_connection import _build_tenant_db_url
+from src.services.cold_archive import (
+    ARCHIVE_TABLES,
+    COLD_ARCHIVE_MIN_AGE_MONTHS,
+    ColdArchiver,
+    get_store,
+)
+
+
+@dataclass(frozen=True)
+class TenantInfo:
+    subdominio: str
+    db_name: str
+
+
+def _load_tenant_from_admin(subdominio: str) -> Optional[TenantInfo]:
+    ses = AdminSessionLocal()
+    try:
+        row = (
+            ses.execute(
+                text(
+                    """
+                    SELECT subdominio, db_name
+                    FROM gyms
+                    WHERE LOWER(TRIM(subdominio)) = LOWER(TRIM(:s))
+                    LIMIT 1
+                    """
+                ),
+                {"s": str(subdominio or "")},
+            )
+            .mappings()
+            .first()
+        )
+        if not row:
+            return None
+        sub = str(row.get("subdominio") or "").strip().lower()
+        dbn = str(row.get("db_name") or "").strip()
+        if not sub or not dbn:
+            return None
+        return TenantInfo(subdominio=sub, db_name=dbn)
+    finally:
+        ses.close()
+
+
+def _segments(engine, tables: List[str]) -> List[Dict[str, Any]]:
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                """
+                SELECT table_name, period, part, backend, row_count, byte_size, object_key, created_at
+                FROM archive_segments
+                WHERE table_name = ANY(:t)
+                ORDER BY table_name, period, part
+                """
+            ),
+            {"t": tables},
+        ).mappings().all()
+    return [dict(r) for r in rows]
+
+
+def run(
+    url: str,
+    tenant: str,
+    action: str,
+    tables: List[str],
+    older_than_months: int,
+    max_periods: int,
+    backend: Optional[str],
+    local_dir: Optional[str],
+) -> List[Dict[str, Any]]:
+    engine = create_engine(url, pool_pre_ping=True)
+    out: List[Dict[str, Any]] = []
+    try:
+        if action == "segments":
+            children = [c for t in tables for c, _fk in ARCHIVE_TABLES[t].children]
+            return _segments(engine, tables + children)
+        archiver = ColdArchiver(engine, tenant, get_store(backend, local_dir))
+        for table in tables:
+            spec = ARCHIVE_TABLES[table]
+            periods = archiver.closed_periods(spec, older_than_months)
+            if max_periods > 0:
+                periods = periods[:max_periods]
+            if action == "plan":
+                with engine.connect() as conn:
+                    detached = detached_partitions(conn, table)
+                out.append(
+                    {
+                        "table": table,
+                        "cutoff": archiver.cutoff(older_than_months).isoformat(),
+                        "periods": [{"period": p.isoformat(), "rows": n} for p, n in periods],
+                        "detached_partitions": detached,
+                    }
+                )
+                continue
+            out.extend(archiver.archive_detached(spec))
+            for period, _rows in periods:
+                done = archiver.archive_period(spec, period)
+                if done:
+                    out.append(done)
+    finally:
+        engine.dispose()
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="webapp-api-tenant-archive")
+    parser.add_argument("action", choices=["plan", "archive", "segments"])
+    parser.add_argument("--tenant", type=str, default=None)
+    parser.add_argument("--db-url", type=str, default=None)
+    parser.add_argument("--table", action="append", choices=sorted(ARCHIVE_TABLES), default=None)
+    parser.add_argument("--older-than-months", type=int, default=COLD_ARCHIVE_MIN_AGE_MONTHS)
+    parser.add_argument("--max-periods", type=int, default=0, help="0 = todos los meses cerrados")
+    parser.add_argument("--backend", choices=["b2", "local"], default=None)
+    parser.add_argument("--local-dir", type=str, default=None)
+    args = parser.parse_args()
+
+    url = str(args.db_url or "").strip()
+    tenant = str(args.tenant or "").strip().lower()
+    if not tenant:
+        raise SystemExit("Falta --tenant (nombra los objetos archivados).")
+    if not url:
+        ti = _load_tenant_from_admin(tenant)
+        if ti:
+            url = _build_tenant_db_url(ti.db_name)
+
+    if not url:
+        env_url = os.getenv("DATABASE_URL") or ""
+        if env_url:
+            url = env_url
+    if not url:
+        raise SystemExit("Falta --db-url o --tenant (o DATABASE_URL).")
+
+    tables = list(dict.fromkeys(args.table or list(ARCHIVE_TABLES)))
+    result = run(
+        url,
+        tenant,
+        args.action,
+        tables,
+        max(int(args.older_than_months), 1),
+        max(int(args.max_periods), 0),
+        args.backend,
+        args.local_dir,
+    )
+    print(json.dumps(result, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import create_engine, text
+
+from src.database.connection import AdminSessionLocal
+from src.database.partitioning import (
+    MANAGED_TABLES,
+    apply_retention,
+    convert_table,
+    default_partition_name,
+    detached_partitions,
+    ensure_future_partitions,
+    is_partitioned,
+    list_partitions,
+    load_policies,
+    plan_conversion,
+)
+from src.database.tenant_connection import _build_tenant_db_url
+
+# BEFORE ROW triggers on partitioned tables (unique-key guard)
+_MIN_SERVER_VERSION = 130000
+
+
+@dataclass(frozen=True)
+class TenantInfo:
+    subdominio: str
+    db_name: str
+
+
+def _load_tenant_from_admin(subdominio: str) -> Optional[TenantInfo]:
+    ses = AdminSessionLocal()
+    try:
+        row = (
+            ses.execute(
+                text(
+                    """
+                    SELECT subdominio, db_name
+                    FROM gyms
+                    WHERE LOWER(TRIM(subdominio)) = LOWER(TRIM(:s))
+                    LIMIT 1
+                    """
+                ),
+                {"s": str(subdominio or "")},
+            )
+            .mappings()
+            .first()
+        )
+        if not row:
+            return None
+        sub = str(row.get("subdominio") or "").strip().lower()
+        dbn = str(row.get("db_name") or "").strip()
+        if not sub or not dbn:
+            return None
+        return TenantInfo(subdominio=sub, db_name=dbn)
+    finally:
+        ses.close()
+
+
+def _status(conn, table: str) -> Dict[str, Any]:
+    if not is_partitioned(conn, table):
+        rows = conn.execute(text(f'SELECT COUNT(*) FROM "{table}"')).scalar()
+        return {"table": table, "partitioned": False, "rows": int(rows or 0)}
+    parts = list_partitions(conn, table)
+    months = [p for p in parts if not p.is_default]
+    default_rows = conn.execute(text(f'SELECT COUNT(*) FROM "{default_partition_name(table)}"')).scalar()
+    return {
+        "table": table,
+        "partitioned": True,
+        "partitions": len(months),
+        "first_month": months[0].start.isoformat() if months and months[0].start else None,
+        "last_month": months[-1].start.isoformat() if months and months[-1].start else None,
+        "default_rows": int(default_rows or 0),
+        "detached": detached_partitions(conn, table),
+    }
+
+
+def run(url: str, action: str, tables: List[str], dry_run: bool, lock_timeout_ms: int) -> List[Dict[str, Any]]:
+    engine = create_engine(url, pool_pre_ping=True)
+    today = date.today()
+    out: List[Dict[str, Any]] = []
+    try:
+        with engine.connect() as conn:
+            policies = load_policies(conn)
+            if action == "convert" and not dry_run:
+                version = int(conn.execute(text("SHOW server_version_num")).scalar() or 0)
+                if version < _MIN_SERVER_VERSION:
+                    raise SystemExit(f"Se requiere PostgreSQL 13+ para particionar (server_version_num={version}).")
+        for table in tables:
+            spec = MANAGED_TABLES[table]
+            policy = policies[table]
+            # One transaction per table: a failure leaves the others done
+            with engine.begin() as conn:
+                if action == "status":
+                    out.append(_status(conn, table))
+                    continue
+                partitioned = is_partitioned(conn, table)
+                if action == "convert":
+                    if partitioned:
+                        out.append({"table": table, "skipped": "ya particionada"})
+                        continue
+                    if dry_run:
+                        plan = plan_conversion(conn, spec, policy.premake_months, today)
+                    else:
+                        plan = convert_table(conn, spec, policy.premake_months, today, lock_timeout_ms)
+                    out.append(
+                        {
+                            "table": table,
+                            "rows": plan.rows,
+                            "months": len(plan.months),
+                            "first_month": plan.months[0].isoformat() if plan.months else None,
+                            "unique_replaced": plan.dropped_indexes,
+                            "dry_run": dry_run,
+                        }
+                    )
+                    continue
+                if not partitioned:
+                    out.append({"table": table, "skipped": "sin particionar"})
+                    continue
+                item: Dict[str, Any] = {"table": table}
+                if action in ("premake", "run"):
+                    conn.execute(text(f"SET LOCAL lock_timeout = {max(int(lock_timeout_ms), 0)}"))
+                    item["created"] = [] if dry_run else ensure_future_partitions(
+                        conn, spec, policy.premake_months, today
+                    )
+                if action in ("retention", "run"):
+                    conn.execute(text(f"SET LOCAL lock_timeout = {max(int(lock_timeout_ms), 0)}"))
+                    item["retention_action"] = policy.retention_action
+                    item["expired"] = apply_retention(conn, spec, policy, today, dry_run)
+                item["dry_run"] = dry_run
+                out.append(item)
+    finally:
+        engine.dispose()
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="webapp-api-tenant-partitions")
+    parser.add_argument(
+        "action",
+        choices=["status", "convert", "premake", "retention", "run"],
+        help="run = premake + retention (para cron)",
+    )
+    parser.add_argument("--tenant", type=str, default=None)
+    parser.add_argument("--db-url", type=str, default=None)
+    parser.add_argument("--table", action="append", choices=sorted(MANAGED_TABLES), default=None)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--lock-timeout-ms", type=int, default=5000)
+    args = parser.parse_args()
+
+    url = str(args.db_url or "").strip()
+    tenant = str(args.tenant or "").strip()
+    if not url and tenant:
+        ti = _load_tenant_from_admin(tenant)
+        if not ti:
+            raise SystemExit(f"Tenant no encontrado: {tenant}")
+        url = _build_tenant_db_url(ti.db_name)
+
+    if not url:
+        env_url = os.getenv("DATABASE_URL") or ""
+        if env_url:
+            url = env_url
+    if not url:
+        raise SystemExit("Falta --db-url o --tenant (o DATABASE_URL).")
+
+    tables = list(dict.fromkeys(args.table or list(MANAGED_TABLES)))
+    result = run(url, args.action, tables, bool(args.dry_run), int(args.lock_timeout_ms))
+    print(json.dumps(result, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import argparse
+import json
+import signal
+
+from src.services import whatsapp_inbound_service as inbound
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="webapp-api-whatsapp-inbound")
+    parser.add_argument("--once", action="store_true", help="Drenar la cola y salir")
+    parser.add_argument("--batch", type=int, default=inbound.WHATSAPP_INBOUND_BATCH)
+    parser.add_argument("--max-batches", type=int, default=0)
+    parser.add_argument("--stats", action="store_true", help="Mostrar el estado de la cola")
+    args = parser.parse_args()
+
+    if args.stats:
+        print(json.dumps(inbound.queue_stats(), indent=2))
+        return
+
+    if args.once:
+        stats = inbound.drain(batch=max(int(args.batch), 1), max_batches=max(int(args.max_batches), 0))
+        print(json.dumps(stats))
+        return
+
+    worker = inbound.InboundWorker()
+    stopping = []
+
+    def _stop(*_):
+        stopping.append(True)
+        worker.stop()
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+    worker.start()
+    while not stopping:
+        signal.pause()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,622 @@
+"""
+Monthly range partitioning for the append-only tenant tables
+
+asistencias, access_events, whatsapp_messages and audit_logs only grow, while
+their hot queries (station check-ins, anti-passback, message log, attendance
+audit) read the last days or weeks. Partitioning them by month lets those
+queries prune to one or two small partitions and lets old months leave the
+table with a DETACH instead of a bulk DELETE.
+
+Layout per table: `<table>_pYYYYMM` partitions plus `<table>_default`, which
+catches rows outside the pre-created range (a late cron run, backdated
+imports). `create_month_partition` moves such rows into the new month when it
+creates it. Primary keys become (id, <partition column>); unique keys without
+the partition column become plain indexes for lookups, and their uniqueness
+is enforced through partition_guard_keys (alembic
+0025_partition_maintenance): inserts register keys, deletes release them and
+in-place updates of a key column swap them. A row that moves partitions is
+a delete plus an insert, so it goes through the first two.
+
+These helpers run on a Connection inside the caller's transaction and use
+the connection's search_path. src/cli/tenant_partitions.py drives them per
+tenant; src/tools/partition_benchmark.py measures the effect.
+"""
+
+import logging
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class TableSpec:
+    table: str
+    column: str
+    # Unique keys that cannot be a unique index once partitioned
+    guard_keys: Tuple[str, ...] = ()
+
+
+@dataclass
+class Policy:
+    table: str
+    premake_months: int = 3
+    retention_months: Optional[int] = None
+    retention_action: str = "detach"
+    converted_at: Optional[datetime] = None
+
+
+@dataclass
+class PartitionInfo:
+    name: str
+    start: Optional[date]
+    end: Optional[date]
+    is_default: bool = False
+    rows: int = 0
+
+
+@dataclass
+class ConversionPlan:
+    table: str
+    rows: int
+    months: List[date] = field(default_factory=list)
+    dropped_indexes: List[str] = field(default_factory=list)
+
+
+MANAGED_TABLES: Dict[str, TableSpec] = {
+    "asistencias": TableSpec("asistencias", "fecha"),
+    "access_events": TableSpec("access_events", "created_at", ("device_id", "event_nonce_hash")),
+    "whatsapp_messages": TableSpec("whatsapp_messages", "sent_at", ("message_id",)),
+    "audit_logs": TableSpec("audit_logs", "timestamp"),
+}
+
+# Unique indexes replaced by the guard once their table is partitioned
+_GUARDED_UNIQUE = {
+    "access_events": ("uq_access_events_nonce",),
+    "whatsapp_messages": ("whatsapp_messages_message_id_key",),
+}
+
+
+# ========== Months ==========
+
+
+def month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def add_months(d: date, n: int) -> date:
+    idx = d.year * 12 + (d.month - 1) + int(n)
+    return date(idx // 12, idx % 12 + 1, 1)
+
+
+def months_between(first: date, last: date) -> List[date]:
+    """Month starts from first's month to last's month, inclusive"""
+    out: List[date] = []
+    cur = month_start(first)
+    end = month_start(last)
+    while cur <= end:
+        out.append(cur)
+        cur = add_months(cur, 1)
+    return out
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month.year:04d}{month.month:02d}"
+
+
+def default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+def _q(ident: str) -> str:
+    return '"' + str(ident).replace('"', '""') + '"'
+
+
+def _as_date(value: Any) -> Optional[date]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except Exception:
+        return None
+
+
+# ========== Catalog ==========
+
+
+def _relkind(conn: Connection, table: str) -> Optional[str]:
+    row = conn.execute(
+        text(
+            """
+            SELECT c.relkind
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = current_schema() AND c.relname = :t
+            """
+        ),
+        {"t": table},
+    ).fetchone()
+    return str(row[0]) if row else None
+
+
+def is_partitioned(conn: Connection, table: str) -> bool:
+    return _relkind(conn, table) == "p"
+
+
+def list_partitions(conn: Connection, table: str, with_rows: bool = False) -> List[PartitionInfo]:
+    rows = conn.execute(
+        text(
+            """
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            JOIN pg_namespace n ON n.oid = p.relnamespace
+            WHERE n.nspname = current_schema() AND p.relname = :t
+            ORDER BY c.relname
+            """
+        ),
+        {"t": table},
+    ).fetchall()
+    out: List[PartitionInfo] = []
+    for name, bound, estimate in rows:
+        bound = str(bound or "")
+        if bound.strip().upper() == "DEFAULT":
+            info = PartitionInfo(name=str(name), start=None, end=None, is_default=True)
+        else:
+            # FOR VALUES FROM ('2026-01-01 00:00:00') TO ('2026-02-01 00:00:00')
+            parts = bound.split("'")
+            start = _as_date(parts[1]) if len(parts) > 1 else None
+            end = _as_date(parts[3]) if len(parts) > 3 else None
+            info = PartitionInfo(name=str(name), start=start, end=end)
+        info.rows = max(int(estimate or 0), 0)
+        out.append(info)
+    if with_rows:
+        for info in out:
+            info.rows = int(conn.execute(text(f"SELECT COUNT(*) FROM {_q(info.name)}")).scalar() or 0)
+    out.sort(key=lambda p: (p.is_default, p.start or date.min))
+    return out
+
+
+def detached_partitions(conn: Connection, table: str) -> List[str]:
+    """Former monthly partitions of `table` that are now standalone tables"""
+    rows = conn.execute(
+        text(
+            """
+            SELECT c.relname
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = current_schema()
+              AND c.relkind = 'r'
+              AND c.relname ~ ('^' || :t || '_p[0-9]{6}$')
+              AND NOT c.relispartition
+            ORDER BY c.relname
+            """
+        ),
+        {"t": table},
+    ).fetchall()
+    return [str(r[0]) for r in rows]
+
+
+def load_policies(conn: Connection) -> Dict[str, Policy]:
+    """Policies per managed table; defaults when partition_policies is missing"""
+    out = {t: Policy(table=t) for t in MANAGED_TABLES}
+    if _relkind(conn, "partition_policies") is None:
+        return out
+    for r in conn.execute(
+        text(
+            """
+            SELECT table_name, premake_months, retention_months, retention_action, converted_at
+            FROM partition_policies
+            """
+        )
+    ).mappings():
+        t = str(r["table_name"])
+        if t not in MANAGED_TABLES:
+            continue
+        out[t] = Policy(
+            table=t,
+            premake_months=max(int(r["premake_months"] or 0), 0),
+            retention_months=int(r["retention_months"]) if r["retention_months"] is not None else None,
+            retention_action=str(r["retention_action"] or "detach"),
+            converted_at=r["converted_at"],
+        )
+    return out
+
+
+# ========== Partitions ==========
+
+
+def _has_guard(conn: Connection, spec: TableSpec) -> bool:
+    return bool(spec.guard_keys) and _relkind(conn, "partition_guard_keys") is not None
+
+
+def _seed_guard_keys(conn: Connection, spec: TableSpec, source: str) -> None:
+    cols = ", ".join(f"'{c}'" for c in spec.guard_keys)
+    conn.execute(
+        text(
+            f"""
+            INSERT INTO partition_guard_keys (table_name, key, bound)
+            SELECT :t, k, b
+            FROM (
+                SELECT partition_guard_key(to_jsonb(s), ARRAY[{cols}]::text[]) AS k,
+                       COALESCE(s.{_q(spec.column)}::timestamp, CURRENT_TIMESTAMP) AS b
+                FROM {_q(source)} s
+            ) x
+            WHERE k IS NOT NULL
+            ON CONFLICT DO NOTHING
+            """
+        ),
+        {"t": spec.table},
+    )
+
+
+def create_month_partition(conn: Connection, spec: TableSpec, month: date) -> bool:
+    """Create the month's partition; rows already in the default move into it"""
+    month = month_start(month)
+    name = partition_name(spec.table, month)
+    if _relkind(conn, name) is not None:
+        return False
+    lo, hi = month.isoformat(), add_months(month, 1).isoformat()
+    bounds = f"FROM ('{lo}') TO ('{hi}')"
+    default = default_partition_name(spec.table)
+    col = _q(spec.column)
+    pending = 0
+    if _relkind(conn, default) is not None:
+        pending = int(
+            conn.execute(
+                text(f"SELECT COUNT(*) FROM {_q(default)} WHERE {col} >= :lo AND {col} < :hi"),
+                {"lo": lo, "hi": hi},
+            ).scalar()
+            or 0
+        )
+    if not pending:
+        conn.execute(text(f"CREATE TABLE {_q(name)} PARTITION OF {_q(spec.table)} FOR VALUES {bounds}"))
+        return True
+    # Attaching over rows still in the default fails, so move them first
+    conn.execute(
+        text(f"CREATE TABLE {_q(name)} (LIKE {_q(spec.table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    )
+    conn.execute(
+        text(
+            f"""
+            WITH moved AS (
+                DELETE FROM {_q(default)} WHERE {col} >= :lo AND {col} < :hi RETURNING *
+            )
+            INSERT INTO {_q(name)} SELECT * FROM moved
+            """
+        ),
+        {"lo": lo, "hi": hi},
+    )
+    conn.execute(text(f"ALTER TABLE {_q(spec.table)} ATTACH PARTITION {_q(name)} FOR VALUES {bounds}"))
+    if _has_guard(conn, spec):
+        # The delete above released their keys through the guard trigger
+        _seed_guard_keys(conn, spec, name)
+    logger.info(f"Moved {pending} row(s) of {spec.table} from the default partition into {name}")
+    return True
+
+
+def ensure_future_partitions(
+    conn: Connection, spec: TableSpec, months_ahead: int, today: Optional[date] = None
+) -> List[str]:
+    """Partitions for the current month and the next `months_ahead`"""
+    today = today or date.today()
+    created: List[str] = []
+    for month in months_between(today, add_months(today, max(int(months_ahead), 0))):
+        if create_month_partition(conn, spec, month):
+            created.append(partition_name(spec.table, month))
+    return created
+
+
+def retention_cutoff(retention_months: int, today: Optional[date] = None) -> date:
+    """Partitions ending on or before this month start are past retention"""
+    return add_months(month_start(today or date.today()), -max(int(retention_months), 1))
+
+
+def apply_retention(
+    conn: Connection,
+    spec: TableSpec,
+    policy: Policy,
+    today: Optional[date] = None,
+    dry_run: bool = False,
+) -> List[str]:
+    """Detach (or drop) monthly partitions older than the policy's retention"""
+    if policy.retention_months is None:
+        return []
+    cutoff = retention_cutoff(policy.retention_months, today)
+    expired = [
+        p
+        for p in list_partitions(conn, spec.table)
+        if not p.is_default and p.end is not None and p.end <= cutoff
+    ]
+    if dry_run:
+        return [p.name for p in expired]
+    guarded = _has_guard(conn, spec)
+    for p in expired:
+        conn.execute(text(f"ALTER TABLE {_q(spec.table)} DETACH PARTITION {_q(p.name)}"))
+        if policy.retention_action == "drop":
+            conn.execute(text(f"DROP TABLE {_q(p.name)}"))
+        if guarded:
+            conn.execute(
+                text("DELETE FROM partition_guard_keys WHERE table_name = :t AND bound < :end"),
+                {"t": spec.table, "end": p.end},
+            )
+        logger.info(f"Retention: {policy.retention_action} {p.name}")
+    return [p.name for p in expired]
+
+
+# ========== Conversion ==========
+
+
+def _columns(conn: Connection, table: str) -> List[Dict[str, Any]]:
+    return [
+        dict(r)
+        for r in conn.execute(
+            text(
+                """
+                SELECT column_name, is_nullable
+                FROM information_schema.columns
+                WHERE table_schema = current_schema() AND table_name = :t
+                ORDER BY ordinal_position
+                """
+            ),
+            {"t": table},
+        ).mappings()
+    ]
+
+
+def _index_defs(conn: Connection, table: str) -> List[Tuple[str, str, bool, List[str]]]:
+    """(name, definition, is_unique, columns) of the table's non-constraint-owned indexes"""
+    rows = conn.execute(
+        text(
+            """
+            SELECT ic.relname,
+                   pg_get_indexdef(ix.indexrelid),
+                   ix.indisunique,
+                   ARRAY(
+                       SELECT a.attname FROM pg_attribute a
+                       WHERE a.attrelid = ix.indrelid AND a.attnum = ANY(ix.indkey)
+                   ) AS cols
+            FROM pg_index ix
+            JOIN pg_class ic ON ic.oid = ix.indexrelid
+            WHERE ix.indrelid = CAST(:t AS regclass)
+              AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = ix.indexrelid)
+            ORDER BY ic.relname
+            """
+        ),
+        {"t": table},
+    ).fetchall()
+    return [(str(n), str(d), bool(u), [str(c) for c in (cols or [])]) for n, d, u, cols in rows]
+
+
+def _constraints(conn: Connection, table: str) -> List[Tuple[str, str, str, List[str]]]:
+    """(name, type, definition, columns) of the table's PK / UNIQUE / FK constraints"""
+    rows = conn.execute(
+        text(
+            """
+            SELECT k.conname,
+                   k.contype,
+                   pg_get_constraintdef(k.oid),
+                   ARRAY(
+                       SELECT a.attname
+                       FROM unnest(k.conkey) WITH ORDINALITY AS ck(attnum, ord)
+                       JOIN pg_attribute a ON a.attrelid = k.conrelid AND a.attnum = ck.attnum
+                       ORDER BY ck.ord
+                   ) AS cols
+            FROM pg_constraint k
+            WHERE k.conrelid = CAST(:t AS regclass) AND k.contype IN ('p', 'u', 'f')
+            ORDER BY k.conname
+            """
+        ),
+        {"t": table},
+    ).fetchall()
+    return [(str(n), str(t), str(d), [str(c) for c in (cols or [])]) for n, t, d, cols in rows]
+
+
+def _lookup_index_sql(table: str, definition: str, cols: List[str]) -> str:
+    """Plain index standing in for a unique key the partitioned table cannot keep"""
+    name = _q(f"idx_{table}_{'_'.join(cols)}")
+    m = re.match(r"CREATE UNIQUE INDEX \S+ ON (.*)$", definition, re.S)
+    if m:
+        # Keeps the method and partial predicate of the original index
+        return f"CREATE INDEX IF NOT EXISTS {name} ON {m.group(1)}"
+    return f"CREATE INDEX IF NOT EXISTS {name} ON {_q(table)} ({', '.join(_q(c) for c in cols)})"
+
+
+def plan_conversion(conn: Connection, spec: TableSpec, premake_months: int, today: Optional[date] = None) -> ConversionPlan:
+    today = today or date.today()
+    col = _q(spec.column)
+    rows, lo, hi = conn.execute(
+        text(f"SELECT COUNT(*), MIN({col}), MAX({col}) FROM {_q(spec.table)}")
+    ).fetchone()
+    first = _as_date(lo) or today
+    last = max(_as_date(hi) or today, add_months(today, max(int(premake_months), 0)))
+    plan = ConversionPlan(table=spec.table, rows=int(rows or 0), months=months_between(first, last))
+    guarded = set(_GUARDED_UNIQUE.get(spec.table, ()))
+    for name, _definition, unique, cols in _index_defs(conn, spec.table):
+        if unique and spec.column not in cols:
+            plan.dropped_indexes.append(name if name in guarded else f"{name} (sin reemplazo)")
+    for name, kind, _definition, cols in _constraints(conn, spec.table):
+        if kind == "u" and spec.column not in cols:
+            plan.dropped_indexes.append(name if name in guarded else f"{name} (sin reemplazo)")
+    return plan
+
+
+def convert_table(
+    conn: Connection,
+    spec: TableSpec,
+    premake_months: int = 3,
+    today: Optional[date] = None,
+    lock_timeout_ms: int = 5000,
+) -> ConversionPlan:
+    """Rewrite a plain table as a monthly range-partitioned one, in place.
+
+    Runs in the caller's transaction and holds an ACCESS EXCLUSIVE lock on the
+    table while copying, so it belongs in a maintenance window. The table
+    keeps its name, columns, defaults, sequences, indexes and foreign keys;
+    the primary key gains the partition column.
+    """
+    if _relkind(conn, spec.table) != "r":
+        raise ValueError(f"{spec.table} no es una tabla sin particionar")
+    conn.execute(text(f"SET LOCAL lock_timeout = {max(int(lock_timeout_ms), 0)}"))
+    conn.execute(text(f"LOCK TABLE {_q(spec.table)} IN ACCESS EXCLUSIVE MODE"))
+
+    plan = plan_conversion(conn, spec, premake_months, today)
+    columns = _columns(conn, spec.table)
+    indexes = _index_defs(conn, spec.table)
+    constraints = _constraints(conn, spec.table)
+    pk_cols = ["id"]
+    for _name, kind, _definition, cols in constraints:
+        if kind == "p" and cols:
+            pk_cols = list(cols)
+    if spec.column not in pk_cols:
+        pk_cols.append(spec.column)
+
+    tmp = f"{spec.table}__partitioned"
+    col = _q(spec.column)
+    conn.execute(
+        text(
+            f"""
+            CREATE TABLE {_q(tmp)} (LIKE {_q(spec.table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+            PARTITION BY RANGE ({col})
+            """
+        )
+    )
+    # The primary key makes the partition column NOT NULL; stray NULLs land on NOW()
+    nullable = any(c["column_name"] == spec.column and c["is_nullable"] == "YES" for c in columns)
+    conn.execute(
+        text(
+            f"ALTER TABLE {_q(tmp)} ADD CONSTRAINT {_q(spec.table + '_pkey_part')} "
+            f"PRIMARY KEY ({', '.join(_q(c) for c in pk_cols)})"
+        )
+    )
+    for month in plan.months:
+        lo, hi = month.isoformat(), add_months(month, 1).isoformat()
+        conn.execute(
+            text(
+                f"CREATE TABLE {_q(partition_name(spec.table, month))} PARTITION OF {_q(tmp)} "
+                f"FOR VALUES FROM ('{lo}') TO ('{hi}')"
+            )
+        )
+    conn.execute(text(f"CREATE TABLE {_q(default_partition_name(spec.table))} PARTITION OF {_q(tmp)} DEFAULT"))
+
+    names = ", ".join(_q(c["column_name"]) for c in columns)
+    select = ", ".join(
+        f"COALESCE({col}, NOW())" if c["column_name"] == spec.column and nullable else _q(c["column_name"])
+        for c in columns
+    )
+    conn.execute(text(f"INSERT INTO {_q(tmp)} ({names}) SELECT {select} FROM {_q(spec.table)}"))
+
+    # Sequences owned by the old table would be dropped with it
+    for c in columns:
+        seq = conn.execute(
+            text("SELECT pg_get_serial_sequence(:t, :c)"),
+            {"t": spec.table, "c": c["column_name"]},
+        ).scalar()
+        if seq:
+            conn.execute(text(f"ALTER SEQUENCE {seq} OWNED BY {_q(tmp)}.{_q(c['column_name'])}"))
+
+    conn.execute(text(f"DROP TABLE {_q(spec.table)}"))
+    conn.execute(text(f"ALTER TABLE {_q(tmp)} RENAME TO {_q(spec.table)}"))
+    conn.execute(
+        text(
+            f"ALTER TABLE {_q(spec.table)} RENAME CONSTRAINT {_q(spec.table + '_pkey_part')} "
+            f"TO {_q(spec.table + '_pkey')}"
+        )
+    )
+
+    for name, definition, unique, cols in indexes:
+        if unique and spec.column not in cols:
+            conn.execute(text(_lookup_index_sql(spec.table, definition, cols)))
+            continue
+        conn.execute(text(definition))
+    for name, kind, definition, cols in constraints:
+        if kind == "f" or (kind == "u" and spec.column in cols):
+            conn.execute(text(f"ALTER TABLE {_q(spec.table)} ADD CONSTRAINT {_q(name)} {definition}"))
+        elif kind == "u":
+            conn.execute(text(_lookup_index_sql(spec.table, "", cols)))
+
+    if _has_guard(conn, spec):
+        args = ", ".join(f"'{a}'" for a in (spec.table, spec.column) + spec.guard_keys)
+        conn.execute(
+            text(
+                f"""
+                CREATE TRIGGER {_q('trg_' + spec.table + '_guard_unique')}
+                BEFORE INSERT ON {_q(spec.table)}
+                FOR EACH ROW EXECUTE FUNCTION partition_guard_unique({args})
+                """
+            )
+        )
+        # BEFORE DELETE so a row moving partitions releases its key before
+        # the destination's BEFORE INSERT registers it again
+        conn.execute(
+            text(
+                f"""
+                CREATE TRIGGER {_q('trg_' + spec.table + '_guard_release')}
+                BEFORE DELETE ON {_q(spec.table)}
+                FOR EACH ROW EXECUTE FUNCTION partition_guard_release({args})
+                """
+            )
+        )
+        # AFTER UPDATE triggers do not fire for rows that move partitions,
+        # so this only sees in-place updates (e.g. the dispatcher filling in
+        # message_id on a reserved row)
+        watched = ", ".join(_q(c) for c in (spec.column,) + spec.guard_keys)
+        conn.execute(
+            text(
+                f"""
+                CREATE TRIGGER {_q('trg_' + spec.table + '_guard_update')}
+                AFTER UPDATE OF {watched} ON {_q(spec.table)}
+                FOR EACH ROW EXECUTE FUNCTION partition_guard_update({args})
+                """
+            )
+        )
+        conn.execute(text("DELETE FROM partition_guard_keys WHERE table_name = :t"), {"t": spec.table})
+        _seed_guard_keys(conn, spec, spec.table)
+
+    if _relkind(conn, "partition_policies") is not None:
+        conn.execute(
+            text(
+                """
+                UPDATE partition_policies
+                SET converted_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE table_name = :t
+                """
+            ),
+            {"t": spec.table},
+        )
+    logger.info(f"Partitioned {spec.table}: {plan.rows} row(s) in {len(plan.months)} month(s)")
+    return plan
+
+
+__all__ = [
+    "ConversionPlan",
+    "MANAGED_TABLES",
+    "PartitionInfo",
+    "Policy",
+    "TableSpec",
+    "add_months",
+    "apply_retention",
+    "convert_table",
+    "create_month_partition",
+    "default_partition_name",
+    "detached_partitions",
+    "ensure_future_partitions",
+    "is_partitioned",
+    "list_partitions",
+    "load_policies",
+    "month_start",
+    "months_between",
+    "partition_name",
+    "plan_conversion",
+    "retention_cutoff",
+]
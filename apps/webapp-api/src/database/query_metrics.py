@@ -0,0 +1,390 @@
+"""
+Per-tenant query metrics
+
+SQLAlchemy cursor events on every tenant engine time each statement. While a
+request is active (begin_request/end_request from the tenant middleware) the
+numbers accumulate on a request-local object without locking and are folded
+into the process aggregates once, at the end of the request:
+
+- queries, DB time and DB-touching requests per (tenant, route template)
+- N+1 detection: the same statement shape (literals stripped) executed more
+  than QUERY_N_PLUS_ONE_THRESHOLD times in one request
+- a per-tenant query duration histogram
+- a ring buffer of statements slower than SLOW_QUERY_MS (no parameters are
+  kept, only the statement text)
+
+Statements that run outside a request (workers, startup) are recorded under
+route "-". `render_prometheus()` returns the aggregates in the Prometheus text
+exposition format for /internal/metrics.
+"""
+
+import bisect
+import contextvars
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+QUERY_METRICS_ENABLED = str(os.getenv("QUERY_METRICS_ENABLED", "true")).strip().lower() in (
+    "1",
+    "true",
+    "yes",
+    "on",
+)
+SLOW_QUERY_MS = _env_int("SLOW_QUERY_MS", 250)
+SLOW_QUERY_RING_SIZE = max(_env_int("SLOW_QUERY_RING_SIZE", 200), 1)
+QUERY_N_PLUS_ONE_THRESHOLD = max(_env_int("QUERY_N_PLUS_ONE_THRESHOLD", 10), 1)
+QUERY_METRICS_MAX_SERIES = max(_env_int("QUERY_METRICS_MAX_SERIES", 2000), 1)
+
+# Seconds; upper bounds of the query duration histogram
+DURATION_BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+BACKGROUND_ROUTE = "-"
+_OVERFLOW = "__other__"
+
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WS_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def statement_shape(statement: str) -> Tuple[str, str]:
+    """(fingerprint, normalized text) with literals and IN-lists collapsed"""
+    s = _STRING_RE.sub("?", str(statement or ""))
+    s = _NUMBER_RE.sub("?", s)
+    s = _IN_LIST_RE.sub("(?)", s)
+    s = _WS_RE.sub(" ", s).strip()
+    return hashlib.sha1(s.encode("utf-8", errors="replace")).hexdigest()[:12], s[:500]
+
+
+class _RequestStats:
+    """Request-local counters; slow statements wait here until the route is known"""
+
+    __slots__ = ("tenant", "route", "queries", "db_time", "slow", "shapes", "buckets")
+
+    def __init__(self) -> None:
+        self.tenant: Optional[str] = None
+        self.route: Optional[str] = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.slow: List[Tuple[float, str]] = []
+        self.shapes: Dict[str, int] = {}
+        self.buckets: List[int] = [0] * (len(DURATION_BUCKETS) + 1)
+
+
+_REQUEST_STATS: contextvars.ContextVar[Optional[_RequestStats]] = contextvars.ContextVar(
+    "query_metrics_request", default=None
+)
+
+
+class _Series:
+    __slots__ = ("queries", "db_time", "requests", "n_plus_one", "slow")
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.db_time = 0.0
+        self.requests = 0
+        self.n_plus_one = 0
+        self.slow = 0
+
+
+class QueryMetrics:
+    """Process-wide aggregates; all mutation happens under one lock"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._histograms: Dict[str, List[int]] = {}
+        self._histogram_sums: Dict[str, float] = {}
+        self._slow: Deque[Dict[str, Any]] = deque(maxlen=SLOW_QUERY_RING_SIZE)
+        self._n_plus_one: Deque[Dict[str, Any]] = deque(maxlen=SLOW_QUERY_RING_SIZE)
+
+    def _series_for(self, tenant: str, route: str) -> _Series:
+        key = (tenant, route)
+        s = self._series.get(key)
+        if s is None:
+            if len(self._series) >= QUERY_METRICS_MAX_SERIES:
+                key = (_OVERFLOW, _OVERFLOW)
+                s = self._series.get(key)
+                if s is not None:
+                    return s
+            s = _Series()
+            self._series[key] = s
+        return s
+
+    def _histogram_for(self, tenant: str) -> List[int]:
+        h = self._histograms.get(tenant)
+        if h is None:
+            h = [0] * (len(DURATION_BUCKETS) + 1)
+            self._histograms[tenant] = h
+            self._histogram_sums[tenant] = 0.0
+        return h
+
+    def record_background(self, tenant: str, elapsed: float, slow: bool) -> None:
+        idx = bisect.bisect_left(DURATION_BUCKETS, elapsed)
+        with self._lock:
+            s = self._series_for(tenant, BACKGROUND_ROUTE)
+            s.queries += 1
+            s.db_time += elapsed
+            if slow:
+                s.slow += 1
+            self._histogram_for(tenant)[idx] += 1
+            self._histogram_sums[tenant] += elapsed
+
+    def record_request(self, rs: _RequestStats) -> None:
+        tenant = rs.tenant or ""
+        route = rs.route or "unmatched"
+        repeated = [
+            (shape, n) for shape, n in rs.shapes.items() if n > QUERY_N_PLUS_ONE_THRESHOLD
+        ]
+        with self._lock:
+            s = self._series_for(tenant, route)
+            s.requests += 1
+            s.queries += rs.queries
+            s.db_time += rs.db_time
+            s.slow += len(rs.slow)
+            s.n_plus_one += len(repeated)
+            h = self._histogram_for(tenant)
+            for i, n in enumerate(rs.buckets):
+                h[i] += n
+            self._histogram_sums[tenant] += rs.db_time
+            for elapsed, statement in rs.slow:
+                self._slow.append(_slow_entry(tenant, route, elapsed, statement))
+            for shape, n in repeated:
+                self._n_plus_one.append(
+                    {
+                        "ts": time.time(),
+                        "tenant": tenant,
+                        "route": route,
+                        "count": n,
+                        "statement": _shape_text(shape),
+                    }
+                )
+        for shape, n in repeated:
+            logger.warning(
+                f"N+1 suspect on {tenant or '-'} {route}: statement repeated {n}x: {_shape_text(shape)[:200]}"
+            )
+
+    def record_slow(self, tenant: str, route: str, elapsed: float, statement: str) -> None:
+        entry = _slow_entry(tenant, route, elapsed, statement)
+        with self._lock:
+            self._slow.append(entry)
+
+    def slow_queries(self, tenant: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = list(self._slow)
+        if tenant:
+            items = [i for i in items if i.get("tenant") == tenant]
+        return list(reversed(items))[: max(int(limit), 0)]
+
+    def n_plus_one_events(self, tenant: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = list(self._n_plus_one)
+        if tenant:
+            items = [i for i in items if i.get("tenant") == tenant]
+        return list(reversed(items))[: max(int(limit), 0)]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+            self._histograms.clear()
+            self._histogram_sums.clear()
+            self._slow.clear()
+            self._n_plus_one.clear()
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            series = [
+                (t, r, s.queries, s.db_time, s.requests, s.n_plus_one, s.slow)
+                for (t, r), s in self._series.items()
+            ]
+            histograms = {t: list(h) for t, h in self._histograms.items()}
+            sums = dict(self._histogram_sums)
+        lines: List[str] = []
+
+        def _family(name: str, kind: str, help_text: str, idx: int) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for row in series:
+                lines.append(f'{name}{{tenant="{_esc(row[0])}",route="{_esc(row[1])}"}} {_num(row[idx])}')
+
+        _family("ironhub_db_queries_total", "counter", "SQL statements executed", 2)
+        _family("ironhub_db_time_seconds_total", "counter", "Time spent in SQL statements", 3)
+        _family("ironhub_db_requests_total", "counter", "Requests that executed SQL", 4)
+        _family(
+            "ironhub_db_n_plus_one_total",
+            "counter",
+            f"Statement shapes repeated more than {QUERY_N_PLUS_ONE_THRESHOLD} times within one request",
+            5,
+        )
+        _family("ironhub_db_slow_queries_total", "counter", f"Statements slower than {SLOW_QUERY_MS} ms", 6)
+
+        name = "ironhub_db_query_duration_seconds"
+        lines.append(f"# HELP {name} SQL statement duration per tenant")
+        lines.append(f"# TYPE {name} histogram")
+        for tenant, h in histograms.items():
+            t = _esc(tenant)
+            cumulative = 0
+            for bound, n in zip(DURATION_BUCKETS, h):
+                cumulative += n
+                lines.append(f'{name}_bucket{{tenant="{t}",le="{bound}"}} {cumulative}')
+            cumulative += h[-1]
+            lines.append(f'{name}_bucket{{tenant="{t}",le="+Inf"}} {cumulative}')
+            lines.append(f'{name}_sum{{tenant="{t}"}} {_num(sums.get(tenant, 0.0))}')
+            lines.append(f'{name}_count{{tenant="{t}"}} {cumulative}')
+        return "\n".join(lines) + "\n"
+
+
+def _slow_entry(tenant: str, route: str, elapsed: float, statement: str) -> Dict[str, Any]:
+    return {
+        "ts": time.time(),
+        "tenant": tenant,
+        "route": route,
+        "ms": round(elapsed * 1000.0, 2),
+        "statement": str(statement or "")[:2000],
+    }
+
+
+# fingerprint -> normalized text, only for shapes that crossed the N+1 threshold
+_shape_texts: Dict[str, str] = {}
+_SHAPE_TEXTS_MAX = 4096
+
+
+def _shape_text(fingerprint: str) -> str:
+    return _shape_texts.get(fingerprint, fingerprint)
+
+
+def _esc(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _num(value: Any) -> str:
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+_metrics = QueryMetrics()
+
+
+def get_query_metrics() -> QueryMetrics:
+    return _metrics
+
+
+# === Request scope ===
+
+
+def begin_request() -> Optional[contextvars.Token]:
+    """Start collecting for the current request (no-op when disabled)"""
+    if not QUERY_METRICS_ENABLED:
+        return None
+    return _REQUEST_STATS.set(_RequestStats())
+
+
+def current_request_stats() -> Optional[_RequestStats]:
+    return _REQUEST_STATS.get()
+
+
+def end_request(token: Optional[contextvars.Token], route: Optional[str] = None) -> None:
+    """Fold the request's numbers into the aggregates and reset the scope"""
+    if token is None:
+        return
+    rs = _REQUEST_STATS.get()
+    try:
+        _REQUEST_STATS.reset(token)
+    except Exception:
+        _REQUEST_STATS.set(None)
+    if rs is None or rs.queries == 0:
+        return
+    if route:
+        rs.route = route
+    try:
+        _metrics.record_request(rs)
+    except Exception as e:
+        logger.warning(f"Query metrics flush failed: {e}")
+
+
+# === Engine instrumentation ===
+
+
+def _current_tenant(default: str) -> str:
+    try:
+        from src.database.tenant_connection import CURRENT_TENANT
+
+        return str(CURRENT_TENANT.get() or default)
+    except Exception:
+        return default
+
+
+def instrument_engine(engine: Engine, tenant: Optional[str] = None) -> None:
+    """Attach timing listeners to an engine (idempotent)"""
+    if not QUERY_METRICS_ENABLED or getattr(engine, "_ironhub_query_metrics", False):
+        return
+    engine_tenant = str(tenant or "")
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._qm_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_qm_start", None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        try:
+            slow = elapsed * 1000.0 >= SLOW_QUERY_MS
+            rs = _REQUEST_STATS.get()
+            if rs is None:
+                t = _current_tenant(engine_tenant)
+                _metrics.record_background(t, elapsed, slow)
+                if slow:
+                    _metrics.record_slow(t, BACKGROUND_ROUTE, elapsed, statement)
+                return
+            if rs.tenant is None:
+                rs.tenant = _current_tenant(engine_tenant)
+            rs.queries += 1
+            rs.db_time += elapsed
+            rs.buckets[bisect.bisect_left(DURATION_BUCKETS, elapsed)] += 1
+            fp, text_ = statement_shape(statement)
+            n = rs.shapes.get(fp, 0) + 1
+            rs.shapes[fp] = n
+            if n == QUERY_N_PLUS_ONE_THRESHOLD + 1 and len(_shape_texts) < _SHAPE_TEXTS_MAX:
+                _shape_texts.setdefault(fp, text_)
+            if slow:
+                rs.slow.append((elapsed, str(statement or "")))
+        except Exception:
+            pass
+
+    engine._ironhub_query_metrics = True
+
+
+__all__ = [
+    "QueryMetrics",
+    "begin_request",
+    "current_request_stats",
+    "end_request",
+    "get_query_metrics",
+    "instrument_engine",
+    "statement_shape",
+]
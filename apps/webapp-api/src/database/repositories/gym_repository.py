@@ -97,6 +97,12 @@ class GymRepository(BaseRepository):
 
             self.db.commit()
             self._invalidate_cache("config")
+            try:
+                from src.services import bootstrap_cache
+
+                bootstrap_cache.invalidate()
+            except Exception:
+                pass
             return True
         except Exception:
             try:
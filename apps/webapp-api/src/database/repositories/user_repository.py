@@ -1,6 +1,8 @@
+from functools import lru_cache
 from typing import List, Optional, Dict, Any
 from datetime import date, datetime, timedelta
 from sqlalchemy import select, update, delete, func, text, or_
+from .. import statement_registry
 from .base import BaseRepository
 from ..orm_models import (
     Usuario,
@@ -21,6 +23,100 @@ from ..orm_models import (
 )
 
 
+# Branch visibility for the staff listings: the latest per-user grant wins,
+# else the membership type's branches
+_SUCURSAL_ACCESS_SQL = """
+    COALESCE((
+        SELECT uas.allow
+        FROM usuario_accesos_sucursales uas
+        WHERE uas.usuario_id = u.id
+          AND uas.sucursal_id = :sucursal_id
+          AND (uas.starts_at IS NULL OR uas.starts_at <= NOW())
+          AND (uas.ends_at IS NULL OR uas.ends_at >= NOW())
+        ORDER BY uas.id DESC
+        LIMIT 1
+    ), (
+        COALESCE(tc.all_sucursales, FALSE)
+        OR EXISTS (
+            SELECT 1
+            FROM tipo_cuota_sucursales tcs
+            WHERE tcs.tipo_cuota_id = tc.id
+              AND tcs.sucursal_id = :sucursal_id
+        )
+    )) = TRUE
+"""
+
+# The directory also lists users assigned to the branch
+_DIRECTORIO_ACCESS_SQL = f"""
+    (
+        {_SUCURSAL_ACCESS_SQL.strip()}
+        OR EXISTS (
+            SELECT 1
+            FROM usuario_sucursales us
+            WHERE us.usuario_id = u.id
+              AND us.sucursal_id = :sucursal_id
+        )
+    )
+"""
+
+_USER_LIST_COLUMNS = """
+    u.id,
+    u.nombre,
+    u.dni,
+    u.telefono,
+    u.rol,
+    u.tipo_cuota,
+    u.activo,
+    u.fecha_registro,
+    u.fecha_proximo_vencimiento,
+    u.cuotas_vencidas,
+    u.ultimo_pago,
+    u.notas
+"""
+
+
+@lru_cache(maxsize=None)
+def _sucursal_user_statement(
+    kind: str, directorio: bool, has_q: bool, has_activo: bool
+) -> statement_registry.Statement:
+    """Registered SQL for one filter combination (4 variants per family)"""
+    where_parts: List[str] = []
+    if has_q:
+        where_parts.append("(u.nombre ILIKE :q OR u.dni ILIKE :q OR u.telefono ILIKE :q)")
+    if has_activo:
+        where_parts.append("u.activo = :activo")
+    where_parts.append(_DIRECTORIO_ACCESS_SQL if directorio else _SUCURSAL_ACCESS_SQL)
+    where_sql = " AND ".join(p.strip() for p in where_parts)
+    family = f"users.{'directorio' if directorio else 'sucursal'}_{kind}"
+    if kind == "count":
+        return statement_registry.variant(
+            family,
+            f"SELECT COUNT(*) AS total FROM usuarios u LEFT JOIN tipos_cuota tc ON LOWER(tc.nombre) = LOWER(u.tipo_cuota) WHERE {where_sql}",
+        )
+    return statement_registry.variant(
+        family,
+        f"""
+        SELECT {_USER_LIST_COLUMNS.strip()}
+        FROM usuarios u
+        LEFT JOIN tipos_cuota tc ON LOWER(tc.nombre) = LOWER(u.tipo_cuota)
+        WHERE {where_sql}
+        ORDER BY u.nombre ASC
+        LIMIT :limit OFFSET :offset
+        """,
+    )
+
+
+def _sucursal_user_params(
+    sucursal_id: int, q: Optional[str], activo: Optional[bool]
+) -> Dict[str, Any]:
+    params: Dict[str, Any] = {"sucursal_id": int(sucursal_id)}
+    if q:
+        params["q"] = f"%{q}%"
+    if activo is not None:
+        params["activo"] = bool(activo)
+    return params
+
+
 class UserRepository(BaseRepository):
     def _today_local_date(self) -> date:
         try:
@@ -71,15 +167,16 @@ class UserRepository(BaseRepository):
 
         if not pin_str:
             return pin_str
-        if pin_str.startswith("$2"):
+        if pin_str.startswith("$2") or pin_str.startswith("pbkdf2$"):
             return pin_str
 
         try:
-            import bcrypt
+            from src.security.credential_hashing import get_credential_hasher
 
-            return bcrypt.hashpw(pin_str.encode("utf-8"), bcrypt.gensalt()).decode(
-                "utf-8"
-            )
+            hashed = get_credential_hasher().hash(pin_str)
+            if hashed:
+                return hashed
+            return pin_str
         except Exception as e:
             try:
                 self.logger.warning(f"Could not bcrypt-hash PIN, storing as-is: {e}")
@@ -102,6 +199,53 @@ class UserRepository(BaseRepository):
             stmt = stmt.where(Usuario.activo == bool(activo))
         return stmt
 
+    def _contar_sucursal(
+        self, sucursal_id: int, q: Optional[str], activo: Optional[bool], *, directorio: bool
+    ) -> int:
+        stmt = _sucursal_user_statement("count", directorio, bool(q), activo is not None)
+        try:
+            row = statement_registry.execute(
+                self.db, stmt, _sucursal_user_params(sucursal_id, q, activo)
+            ).mappings().first()
+            return int((row or {}).get("total") or 0)
+        except Exception:
+            return 0
+
+    def _listar_sucursal(
+        self,
+        sucursal_id: int,
+        q: Optional[str],
+        limit: int,
+        offset: int,
+        activo: Optional[bool],
+        *,
+        directorio: bool,
+    ) -> List[Dict]:
+        stmt = _sucursal_user_statement("page", directorio, bool(q), activo is not None)
+        params = _sucursal_user_params(sucursal_id, q, activo)
+        params["limit"] = int(limit)
+        params["offset"] = int(offset)
+        rows = statement_registry.execute(self.db, stmt, params).mappings().all()
+        return [
+            {
+                "id": int(r.get("id")),
+                "nombre": str(r.get("nombre") or "").strip(),
+                "dni": r.get("dni"),
+                "telefono": r.get("telefono"),
+                "email": None,
+                "rol": str(r.get("rol") or "").strip().lower(),
+                "tipo_cuota": r.get("tipo_cuota"),
+                "activo": bool(r.get("activo")) if r.get("activo") is not None else False,
+                "fecha_registro": r.get("fecha_registro"),
+                "fecha_proximo_vencimiento": r.get("fecha_proximo_vencimiento"),
+                "cuotas_vencidas": r.get("cuotas_vencidas"),
+                "ultimo_pago": r.get("ultimo_pago"),
+                "notas": r.get("notas"),
+            }
+            for r in (rows or [])
+            if r and r.get("id") is not None
+        ]
+
     def contar_usuarios(
         self,
         q: Optional[str] = None,
@@ -116,48 +260,7 @@ class UserRepository(BaseRepository):
                 return int(self.db.scalar(stmt) or 0)
             except Exception:
                 return 0
-
-        where_parts: List[str] = []
-        params: Dict[str, Any] = {"sucursal_id": int(sucursal_id)}
-        if q:
-            where_parts.append(
-                "(u.nombre ILIKE :q OR u.dni ILIKE :q OR u.telefono ILIKE :q)"
-            )
-            params["q"] = f"%{q}%"
-        if activo is not None:
-            where_parts.append("u.activo = :activo")
-            params["activo"] = bool(activo)
-
-        where_parts.append(
-            """
-            COALESCE((
-                SELECT uas.allow
-                FROM usuario_accesos_sucursales uas
-                WHERE uas.usuario_id = u.id
-                  AND uas.sucursal_id = :sucursal_id
-                  AND (uas.starts_at IS NULL OR uas.starts_at <= NOW())
-                  AND (uas.ends_at IS NULL OR uas.ends_at >= NOW())
-                ORDER BY uas.id DESC
-                LIMIT 1
-            ), (
-                COALESCE(tc.all_sucursales, FALSE)
-                OR EXISTS (
-                    SELECT 1
-                    FROM tipo_cuota_sucursales tcs
-                    WHERE tcs.tipo_cuota_id = tc.id
-                      AND tcs.sucursal_id = :sucursal_id
-                )
-            )) = TRUE
-            """
-        )
-
-        where_sql = " AND ".join([p.strip() for p in where_parts if p and p.strip()])
-        query = f"SELECT COUNT(*) AS total FROM usuarios u LEFT JOIN tipos_cuota tc ON LOWER(tc.nombre) = LOWER(u.tipo_cuota) WHERE {where_sql}"
-        try:
-            row = self.db.execute(text(query), params).mappings().first()
-            return int((row or {}).get("total") or 0)
-        except Exception:
-            return 0
+        return self._contar_sucursal(int(sucursal_id), q, activo, directorio=False)
 
     def listar_usuarios_paginados(
         self,
@@ -194,87 +297,10 @@ class UserRepository(BaseRepository):
                 }
                 for u in users
             ]
-
-        where_parts: List[str] = []
-        params: Dict[str, Any] = {
-            "sucursal_id": int(sucursal_id),
-            "limit": int(limit),
-            "offset": int(offset),
-        }
-        if q:
-            where_parts.append(
-                "(u.nombre ILIKE :q OR u.dni ILIKE :q OR u.telefono ILIKE :q)"
-            )
-            params["q"] = f"%{q}%"
-        if activo is not None:
-            where_parts.append("u.activo = :activo")
-            params["activo"] = bool(activo)
-
-        where_parts.append(
-            """
-            COALESCE((
-                SELECT uas.allow
-                FROM usuario_accesos_sucursales uas
-                WHERE uas.usuario_id = u.id
-                  AND uas.sucursal_id = :sucursal_id
-                  AND (uas.starts_at IS NULL OR uas.starts_at <= NOW())
-                  AND (uas.ends_at IS NULL OR uas.ends_at >= NOW())
-                ORDER BY uas.id DESC
-                LIMIT 1
-            ), (
-                COALESCE(tc.all_sucursales, FALSE)
-                OR EXISTS (
-                    SELECT 1
-                    FROM tipo_cuota_sucursales tcs
-                    WHERE tcs.tipo_cuota_id = tc.id
-                      AND tcs.sucursal_id = :sucursal_id
-                )
-            )) = TRUE
-            """
+        return self._listar_sucursal(
+            int(sucursal_id), q, limit, offset, activo, directorio=False
         )
 
-        where_sql = " AND ".join([p.strip() for p in where_parts if p and p.strip()])
-        query = f"""
-            SELECT
-              u.id,
-              u.nombre,
-              u.dni,
-              u.telefono,
-              u.rol,
-              u.tipo_cuota,
-              u.activo,
-              u.fecha_registro,
-              u.fecha_proximo_vencimiento,
-              u.cuotas_vencidas,
-              u.ultimo_pago,
-              u.notas
-            FROM usuarios u
-            LEFT JOIN tipos_cuota tc ON LOWER(tc.nombre) = LOWER(u.tipo_cuota)
-            WHERE {where_sql}
-            ORDER BY u.nombre ASC
-            LIMIT :limit OFFSET :offset
-        """
-        rows = self.db.execute(text(query), params).mappings().all()
-        return [
-            {
-                "id": int(r.get("id")),
-                "nombre": str(r.get("nombre") or "").strip(),
-                "dni": r.get("dni"),
-                "telefono": r.get("telefono"),
-                "email": None,
-                "rol": str(r.get("rol") or "").strip().lower(),
-                "tipo_cuota": r.get("tipo_cuota"),
-                "activo": bool(r.get("activo")) if r.get("activo") is not None else False,
-                "fecha_registro": r.get("fecha_registro"),
-                "fecha_proximo_vencimiento": r.get("fecha_proximo_vencimiento"),
-                "cuotas_vencidas": r.get("cuotas_vencidas"),
-                "ultimo_pago": r.get("ultimo_pago"),
-                "notas": r.get("notas"),
-            }
-            for r in (rows or [])
-            if r and r.get("id") is not None
-        ]
-
     def contar_usuarios_directorio(
         self,
         q: Optional[str] = None,
@@ -284,56 +310,7 @@ class UserRepository(BaseRepository):
     ) -> int:
         if sucursal_id is None:
             return self.contar_usuarios(q, activo=activo, sucursal_id=None)
-
-        where_parts: List[str] = []
-        params: Dict[str, Any] = {"sucursal_id": int(sucursal_id)}
-        if q:
-            where_parts.append(
-                "(u.nombre ILIKE :q OR u.dni ILIKE :q OR u.telefono ILIKE :q)"
-            )
-            params["q"] = f"%{q}%"
-        if activo is not None:
-            where_parts.append("u.activo = :activo")
-            params["activo"] = bool(activo)
-
-        where_parts.append(
-            """
-            (
-                COALESCE((
-                    SELECT uas.allow
-                    FROM usuario_accesos_sucursales uas
-                    WHERE uas.usuario_id = u.id
-                      AND uas.sucursal_id = :sucursal_id
-                      AND (uas.starts_at IS NULL OR uas.starts_at <= NOW())
-                      AND (uas.ends_at IS NULL OR uas.ends_at >= NOW())
-                    ORDER BY uas.id DESC
-                    LIMIT 1
-                ), (
-                    COALESCE(tc.all_sucursales, FALSE)
-                    OR EXISTS (
-                        SELECT 1
-                        FROM tipo_cuota_sucursales tcs
-                        WHERE tcs.tipo_cuota_id = tc.id
-                          AND tcs.sucursal_id = :sucursal_id
-                    )
-                )) = TRUE
-                OR EXISTS (
-                    SELECT 1
-                    FROM usuario_sucursales us
-                    WHERE us.usuario_id = u.id
-                      AND us.sucursal_id = :sucursal_id
-                )
-            )
-            """
-        )
-
-        where_sql = " AND ".join([p.strip() for p in where_parts if p and p.strip()])
-        query = f"SELECT COUNT(*) AS total FROM usuarios u LEFT JOIN tipos_cuota tc ON LOWER(tc.nombre) = LOWER(u.tipo_cuota) WHERE {where_sql}"
-        try:
-            row = self.db.execute(text(query), params).mappings().first()
-            return int((row or {}).get("total") or 0)
-        except Exception:
-            return 0
+        return self._contar_sucursal(int(sucursal_id), q, activo, directorio=True)
 
     def listar_usuarios_directorio_paginados(
         self,
@@ -348,95 +325,10 @@ class UserRepository(BaseRepository):
             return self.listar_usuarios_paginados(
                 q, limit, offset, activo=activo, sucursal_id=None
             )
-
-        where_parts: List[str] = []
-        params: Dict[str, Any] = {
-            "sucursal_id": int(sucursal_id),
-            "limit": int(limit),
-            "offset": int(offset),
-        }
-        if q:
-            where_parts.append(
-                "(u.nombre ILIKE :q OR u.dni ILIKE :q OR u.telefono ILIKE :q)"
-            )
-            params["q"] = f"%{q}%"
-        if activo is not None:
-            where_parts.append("u.activo = :activo")
-            params["activo"] = bool(activo)
-
-        where_parts.append(
-            """
-            (
-                COALESCE((
-                    SELECT uas.allow
-                    FROM usuario_accesos_sucursales uas
-                    WHERE uas.usuario_id = u.id
-                      AND uas.sucursal_id = :sucursal_id
-                      AND (uas.starts_at IS NULL OR uas.starts_at <= NOW())
-                      AND (uas.ends_at IS NULL OR uas.ends_at >= NOW())
-                    ORDER BY uas.id DESC
-                    LIMIT 1
-                ), (
-                    COALESCE(tc.all_sucursales, FALSE)
-                    OR EXISTS (
-                        SELECT 1
-                        FROM tipo_cuota_sucursales tcs
-                        WHERE tcs.tipo_cuota_id = tc.id
-                          AND tcs.sucursal_id = :sucursal_id
-                    )
-                )) = TRUE
-                OR EXISTS (
-                    SELECT 1
-                    FROM usuario_sucursales us
-                    WHERE us.usuario_id = u.id
-                      AND us.sucursal_id = :sucursal_id
-                )
-            )
-            """
+        return self._listar_sucursal(
+            int(sucursal_id), q, limit, offset, activo, directorio=True
         )
 
-        where_sql = " AND ".join([p.strip() for p in where_parts if p and p.strip()])
-        query = f"""
-            SELECT
-              u.id,
-              u.nombre,
-              u.dni,
-              u.telefono,
-              u.rol,
-              u.tipo_cuota,
-              u.activo,
-              u.fecha_registro,
-              u.fecha_proximo_vencimiento,
-              u.cuotas_vencidas,
-              u.ultimo_pago,
-              u.notas
-            FROM usuarios u
-            LEFT JOIN tipos_cuota tc ON LOWER(tc.nombre) = LOWER(u.tipo_cuota)
-            WHERE {where_sql}
-            ORDER BY u.nombre ASC
-            LIMIT :limit OFFSET :offset
-        """
-        rows = self.db.execute(text(query), params).mappings().all()
-        return [
-            {
-                "id": int(r.get("id")),
-                "nombre": str(r.get("nombre") or "").strip(),
-                "dni": r.get("dni"),
-                "telefono": r.get("telefono"),
-                "email": None,
-                "rol": str(r.get("rol") or "").strip().lower(),
-                "tipo_cuota": r.get("tipo_cuota"),
-                "activo": bool(r.get("activo")) if r.get("activo") is not None else False,
-                "fecha_registro": r.get("fecha_registro"),
-                "fecha_proximo_vencimiento": r.get("fecha_proximo_vencimiento"),
-                "cuotas_vencidas": r.get("cuotas_vencidas"),
-                "ultimo_pago": r.get("ultimo_pago"),
-                "notas": r.get("notas"),
-            }
-            for r in (rows or [])
-            if r and r.get("id") is not None
-        ]
-
     def cambiar_usuario_id(self, current_id: int, new_id: int):
         # This is a dangerous operation, but requested by the user/legacy code.
         # We need to disable foreign key checks or cascade updates if the DB supports it,
@@ -0,0 +1,284 @@
+"""
+Tenant Schema Capabilities
+
+Per-engine registry of what a tenant schema supports, computed once from the
+alembic revision and a single catalog snapshot (tables + columns of the
+current schema). Hot paths ask `has(db, "checkin_idempotency")` instead of
+catching "relation does not exist" and running CREATE TABLE / to_regclass on
+the request, which took DDL locks and added round-trips on every miss.
+
+The same snapshot doubles as a catalog cache: `has_table(db, "x")` and
+`has_column(db, "x", "y")` answer from memory instead of a to_regclass /
+information_schema probe per call. tenant_connection loads it when it creates
+an engine and reloads it right after auto-migrating one.
+
+Schema changes belong to alembic. The snapshot is dropped when
+tenant_connection auto-migrates an engine, when an engine is evicted, and
+after SCHEMA_CAPABILITIES_TTL seconds so migrations applied by admin-api are
+picked up without a restart. Code that still hits a missing relation at
+runtime calls `mark_missing` so later requests skip it without a round-trip.
+"""
+
+import logging
+import os
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+try:
+    SCHEMA_CAPABILITIES_TTL = int(os.getenv("SCHEMA_CAPABILITIES_TTL", "600"))
+except Exception:
+    SCHEMA_CAPABILITIES_TTL = 600
+# A failed snapshot is retried sooner than a good one is refreshed
+_UNKNOWN_RETRY_SECONDS = 30
+
+# capability -> (required tables, required (table, column) pairs)
+CAPABILITIES: Dict[str, Tuple[Tuple[str, ...], Tuple[Tuple[str, str], ...]]] = {
+    "checkin_idempotency": (("checkin_idempotency",), ()),
+    "pagos_idempotency": (("pagos_idempotency",), ()),
+    "rutina_read_models": (("rutina_read_models",), ()),
+    "whatsapp_triggers": (("whatsapp_triggers",), ()),
+    "clase_profesor_asignaciones": (("clase_profesor_asignaciones",), ()),
+    "entitlements": (
+        (
+            "tipo_cuota_sucursales",
+            "tipo_cuota_clases_permisos",
+            "usuario_accesos_sucursales",
+            "usuario_permisos_clases",
+        ),
+        (("tipos_cuota", "all_sucursales"),),
+    ),
+    "multisucursal": (
+        ("sucursales", "usuario_sucursales"),
+        (("asistencias", "sucursal_id"),),
+    ),
+    "staff": (("staff_profiles", "staff_permissions"), ()),
+    "memberships": (("memberships",), ()),
+    "feature_flags": (("feature_flags",), ()),
+    "asistencias_tipo": ((), (("asistencias", "tipo"),)),
+    "rutinas_semanas": ((), (("rutinas", "semanas"),)),
+    "whatsapp_messages_sucursal": ((), (("whatsapp_messages", "sucursal_id"),)),
+    "inscriptos_count": ((), (("clases_horarios", "inscriptos_count"),)),
+    "archive_segments": (("archive_segments",), ()),
+}
+
+_SNAPSHOT_SQL = """
+    SELECT c.relname, a.attname
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_attribute a
+           ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    WHERE n.nspname = current_schema()
+      AND c.relkind IN ('r', 'p', 'v', 'm')
+"""
+
+
+@dataclass
+class SchemaCapabilities:
+    """Snapshot of one tenant schema. `known=False` means the snapshot failed."""
+
+    revision: Optional[str] = None
+    columns: Dict[str, FrozenSet[str]] = field(default_factory=dict)
+    missing: set = field(default_factory=set)
+    known: bool = False
+    computed_at: float = field(default_factory=time.monotonic)
+
+    def has_table(self, table: str) -> bool:
+        if not self.known:
+            return True
+        return str(table) in self.columns
+
+    def has_column(self, table: str, column: str) -> bool:
+        if not self.known:
+            return True
+        return str(column) in self.columns.get(str(table), frozenset())
+
+    def has(self, capability: str) -> bool:
+        """True when every table/column the capability needs exists.
+
+        Unknown snapshots answer True so callers behave as before the
+        registry existed (and their own error handling still applies).
+        """
+        if capability in self.missing:
+            return False
+        if not self.known:
+            return True
+        spec = CAPABILITIES.get(capability)
+        if spec is None:
+            # Undeclared capabilities are plain table names
+            return self.has_table(capability)
+        tables, cols = spec
+        return all(self.has_table(t) for t in tables) and all(
+            self.has_column(t, c) for t, c in cols
+        )
+
+    def expired(self, now: Optional[float] = None) -> bool:
+        age = (now if now is not None else time.monotonic()) - self.computed_at
+        if not self.known:
+            return age >= _UNKNOWN_RETRY_SECONDS
+        return SCHEMA_CAPABILITIES_TTL > 0 and age >= SCHEMA_CAPABILITIES_TTL
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "revision": self.revision,
+            "known": self.known,
+            "tables": len(self.columns),
+            "capabilities": {name: self.has(name) for name in sorted(CAPABILITIES)},
+            "missing": sorted(self.missing),
+        }
+
+
+_registry: "weakref.WeakKeyDictionary[Engine, SchemaCapabilities]" = weakref.WeakKeyDictionary()
+_registry_lock = threading.Lock()
+_compute_locks: "weakref.WeakKeyDictionary[Engine, threading.Lock]" = weakref.WeakKeyDictionary()
+
+
+def _engine_of(bind: Any) -> Optional[Engine]:
+    try:
+        if isinstance(bind, Session):
+            bind = bind.get_bind()
+        return getattr(bind, "engine", bind) if bind is not None else None
+    except Exception:
+        return None
+
+
+def compute_capabilities(engine: Engine) -> SchemaCapabilities:
+    """Read the alembic revision and the catalog on a dedicated connection."""
+    caps = SchemaCapabilities()
+    try:
+        with engine.connect() as conn:
+            try:
+                caps.revision = conn.execute(
+                    text("SELECT version_num FROM alembic_version LIMIT 1")
+                ).scalar()
+            except Exception:
+                conn.rollback()
+                caps.revision = None
+            cols: Dict[str, set] = {}
+            for relname, attname in conn.execute(text(_SNAPSHOT_SQL)).fetchall():
+                bucket = cols.setdefault(str(relname), set())
+                if attname:
+                    bucket.add(str(attname))
+        caps.columns = {t: frozenset(c) for t, c in cols.items()}
+        caps.known = True
+    except Exception as e:
+        logger.warning(f"Schema capability snapshot failed: {e}")
+    caps.computed_at = time.monotonic()
+    return caps
+
+
+def get_capabilities(bind: Any) -> SchemaCapabilities:
+    """Cached capabilities for the engine behind a Session/Connection/Engine."""
+    engine = _engine_of(bind)
+    if engine is None:
+        return SchemaCapabilities()
+    with _registry_lock:
+        caps = _registry.get(engine)
+        if caps is not None and not caps.expired():
+            return caps
+        lock = _compute_locks.get(engine)
+        if lock is None:
+            lock = threading.Lock()
+            _compute_locks[engine] = lock
+    with lock:
+        with _registry_lock:
+            caps = _registry.get(engine)
+            if caps is not None and not caps.expired():
+                return caps
+        fresh = compute_capabilities(engine)
+        with _registry_lock:
+            _registry[engine] = fresh
+        if fresh.known:
+            logger.info(
+                f"Schema capabilities for {engine.url.database}: revision={fresh.revision}, "
+                f"tables={len(fresh.columns)}"
+            )
+        return fresh
+
+
+def has(bind: Any, capability: str) -> bool:
+    try:
+        return get_capabilities(bind).has(capability)
+    except Exception:
+        return True
+
+
+def has_table(bind: Any, table: str) -> bool:
+    try:
+        caps = get_capabilities(bind)
+        if str(table) in caps.missing:
+            return False
+        return caps.has_table(str(table))
+    except Exception:
+        return True
+
+
+def has_column(bind: Any, table: str, column: str) -> bool:
+    try:
+        return get_capabilities(bind).has_column(str(table), str(column))
+    except Exception:
+        return True
+
+
+def refresh_capabilities(bind: Any) -> SchemaCapabilities:
+    """Reload one engine's snapshot now (engine creation, after a migration)."""
+    invalidate_capabilities(bind)
+    return get_capabilities(bind)
+
+
+def mark_missing(bind: Any, *capabilities: str) -> None:
+    """Record capabilities found missing at runtime until the next snapshot."""
+    engine = _engine_of(bind)
+    if engine is None:
+        return
+    with _registry_lock:
+        caps = _registry.get(engine)
+        if caps is None:
+            caps = SchemaCapabilities()
+            _registry[engine] = caps
+        new = set(capabilities) - caps.missing
+        caps.missing.update(capabilities)
+    if new:
+        logger.warning(
+            f"Schema capability missing on {engine.url.database}: {', '.join(sorted(new))}"
+        )
+
+
+def invalidate_capabilities(bind: Any = None) -> None:
+    """Forget one engine's snapshot (or all of them), e.g. after a migration."""
+    with _registry_lock:
+        if bind is None:
+            _registry.clear()
+            return
+        engine = _engine_of(bind)
+        if engine is not None:
+            _registry.pop(engine, None)
+
+
+def registry_stats() -> Dict[str, Any]:
+    with _registry_lock:
+        items: Iterable[Tuple[Engine, SchemaCapabilities]] = list(_registry.items())
+    return {str(e.url.database): c.as_dict() for e, c in items}
+
+
+__all__ = [
+    "CAPABILITIES",
+    "SchemaCapabilities",
+    "compute_capabilities",
+    "get_capabilities",
+    "has",
+    "has_column",
+    "has_table",
+    "invalidate_capabilities",
+    "mark_missing",
+    "refresh_capabilities",
+    "registry_stats",
+]
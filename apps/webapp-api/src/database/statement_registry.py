@@ -0,0 +1,395 @@
+"""
+Named SQL statements, compiled once and prepared per connection
+
+Hot paths used to wrap f-strings in `text()` on every call, so SQLAlchemy
+re-parsed the SQL and PostgreSQL re-planned it each time. Their SQL is now
+registered here once per process under a name and executed through the
+registry:
+
+    _DEVICE = statement_registry.register("access.device", "SELECT ... WHERE device_public_id = :pid")
+    row = statement_registry.execute(db, _DEVICE, {"pid": pid}).mappings().first()
+
+On engines enabled with `enable_prepared_statements` (PostgreSQL through
+psycopg2) the first execution on a pooled connection issues
+`PREPARE ih_<name>_<hash> AS ...` with the named binds rewritten to $n, and
+every execution runs `EXECUTE` with the values, so the server skips parsing
+and, after its custom-plan warm-up, reuses the generic plan. psycopg2 has no
+`prepare_threshold` (that is psycopg 3), hence the explicit PREPARE. The names
+prepared on each DBAPI connection are kept in the pool record's `info`, which
+SQLAlchemy clears whenever the connection is replaced.
+
+Everything else (SQLite, a transaction pooler in front of Postgres, or
+SQL_PREPARED_STATEMENTS=off) executes the statement's cached `text()` clause.
+The first PREPARE of a statement on an engine runs inside a savepoint; if the
+server can't type its parameters the statement stays on the text path for that
+engine.
+
+Dynamic WHERE builders register through `variant()`: each distinct SQL of a
+family gets its own prepared name, up to SQL_STATEMENT_MAX_VARIANTS per family.
+Beyond that the SQL runs unprepared (and is counted), so a builder that leaks
+literals into the text can't grow the registry or the server's statement cache.
+
+Per-family counters (hits = EXECUTE of an already prepared statement,
+misses = PREPARE issued, text executions, prepare failures, overflow) are
+rendered for /internal/metrics.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, List, Mapping, Optional, Set, Tuple, Union
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine, Result
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+# auto = on for PostgreSQL/psycopg2 unless the host looks like a transaction pooler
+SQL_PREPARED_STATEMENTS = str(os.getenv("SQL_PREPARED_STATEMENTS", "auto")).strip().lower()
+SQL_STATEMENT_MAX_VARIANTS = max(_env_int("SQL_STATEMENT_MAX_VARIANTS", 32), 1)
+
+# Same rule text() uses to find :name binds (`::type` casts are skipped)
+_BIND_RE = re.compile(r"(?<![:\w\\]):(\w+)(?!:)", re.UNICODE)
+_NAME_RE = re.compile(r"[^a-z0-9_]+")
+
+_INFO_KEY = "ironhub_prepared"
+_STALE_KEY = "ironhub_prepared_stale"
+
+# invalid_sql_statement_name: the server no longer has the statement
+_PG_STATEMENT_MISSING = "26000"
+# feature_not_supported: "cached plan must not change result type" after DDL
+_PG_PLAN_INVALID = "0A000"
+
+
+class Statement:
+    """One registered SQL text: its cached clause plus the PREPARE/EXECUTE forms"""
+
+    __slots__ = ("name", "family", "sql", "clause", "pg_name", "params", "prepare_sql", "execute_sql", "preparable")
+
+    def __init__(self, name: str, family: str, sql: str, *, preparable: bool = True) -> None:
+        self.name = name
+        self.family = family
+        self.sql = sql
+        self.clause = text(sql)
+        digest = hashlib.sha1(sql.encode("utf-8")).hexdigest()[:8]
+        self.pg_name = f"ih_{_NAME_RE.sub('_', name.lower())[:40]}_{digest}"
+        order: List[str] = []
+
+        def _positional(m: "re.Match[str]") -> str:
+            p = m.group(1)
+            if p not in order:
+                order.append(p)
+            return f"${order.index(p) + 1}"
+
+        body = _BIND_RE.sub(_positional, sql)
+        self.params: Tuple[str, ...] = tuple(order)
+        self.prepare_sql = f"PREPARE {self.pg_name} AS {body}"
+        args = ", ".join(f"%({p})s" for p in order)
+        self.execute_sql = f"EXECUTE {self.pg_name}({args})" if order else f"EXECUTE {self.pg_name}"
+        self.preparable = preparable
+
+    def __repr__(self) -> str:
+        return f"Statement({self.name!r})"
+
+
+class _Counters:
+    __slots__ = ("hits", "misses", "text", "failures", "overflow")
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.text = 0
+        self.failures = 0
+        self.overflow = 0
+
+
+class _EngineState:
+    """Per-engine switch plus what the server said about each statement"""
+
+    __slots__ = ("enabled", "verified", "rejected")
+
+    def __init__(self) -> None:
+        self.enabled = True
+        self.verified: Set[str] = set()
+        self.rejected: Set[str] = set()
+
+
+class StatementRegistry:
+    """Process-wide statements; registration and counters happen under one lock"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._statements: Dict[str, Statement] = {}
+        self._variants: Dict[Tuple[str, str], Statement] = {}
+        self._family_sizes: Dict[str, int] = {}
+        self._counters: Dict[str, _Counters] = {}
+
+    def _counters_for(self, family: str) -> _Counters:
+        c = self._counters.get(family)
+        if c is None:
+            c = _Counters()
+            self._counters[family] = c
+        return c
+
+    def _count(self, stmt: Statement, field: str) -> None:
+        with self._lock:
+            c = self._counters_for(stmt.family)
+            setattr(c, field, getattr(c, field) + 1)
+
+    def register(self, name: str, sql: str) -> Statement:
+        """Fixed statement; registering the same name with other SQL is a bug"""
+        sql = str(sql).strip()
+        with self._lock:
+            stmt = self._statements.get(name)
+            if stmt is None:
+                stmt = Statement(name, name, sql)
+                self._statements[name] = stmt
+                self._counters_for(name)
+            elif stmt.sql != sql:
+                raise ValueError(f"Statement {name!r} already registered with different SQL")
+        return stmt
+
+    def variant(self, family: str, sql: str) -> Statement:
+        """Statement for one output of a dynamic builder, bounded per family"""
+        sql = str(sql).strip()
+        key = (family, sql)
+        stmt = self._variants.get(key)
+        if stmt is not None:
+            return stmt
+        with self._lock:
+            stmt = self._variants.get(key)
+            if stmt is not None:
+                return stmt
+            n = self._family_sizes.get(family, 0)
+            c = self._counters_for(family)
+            if n >= SQL_STATEMENT_MAX_VARIANTS:
+                c.overflow += 1
+                if c.overflow == 1:
+                    logger.warning(
+                        f"Statement family {family} exceeded {SQL_STATEMENT_MAX_VARIANTS} variants; extra SQL runs unprepared"
+                    )
+                return Statement(f"{family}#overflow", family, sql, preparable=False)
+            stmt = Statement(f"{family}#{n}", family, sql)
+            self._family_sizes[family] = n + 1
+            self._variants[key] = stmt
+        return stmt
+
+    def execute(
+        self,
+        db: Union[Session, Connection],
+        stmt: Statement,
+        params: Optional[Mapping[str, Any]] = None,
+    ) -> Result:
+        values = dict(params or {})
+        conn = db.connection() if isinstance(db, Session) else db
+        state = _engine_state(conn)
+        if state is None or not state.enabled or not stmt.preparable or stmt.pg_name in state.rejected:
+            self._count(stmt, "text")
+            return db.execute(stmt.clause, values)
+
+        fairy = conn.connection
+        prepared = _prepared_names(fairy)
+        if prepared is None:
+            self._count(stmt, "text")
+            return db.execute(stmt.clause, values)
+        if stmt.pg_name in prepared:
+            self._count(stmt, "hits")
+        else:
+            if not self._prepare(fairy, stmt, state):
+                self._count(stmt, "text")
+                return db.execute(stmt.clause, values)
+            prepared.add(stmt.pg_name)
+            self._count(stmt, "misses")
+        try:
+            return conn.exec_driver_sql(stmt.execute_sql, values)
+        except DBAPIError as e:
+            code = getattr(e.orig, "pgcode", None)
+            if code == _PG_STATEMENT_MISSING:
+                # Something between us and the server drops session state
+                state.enabled = False
+                prepared.clear()
+                logger.warning(f"Prepared statement {stmt.pg_name} vanished; disabling PREPARE on this engine")
+            elif code == _PG_PLAN_INVALID:
+                fairy.info[_STALE_KEY] = True
+            raise
+
+    def _prepare(self, fairy: Any, stmt: Statement, state: _EngineState) -> bool:
+        dbapi_conn = fairy.dbapi_connection
+        # Until the server has accepted this statement once, failures must not abort the caller's transaction
+        guard = stmt.pg_name not in state.verified and not getattr(dbapi_conn, "autocommit", False)
+        cur = dbapi_conn.cursor()
+        try:
+            if guard:
+                cur.execute("SAVEPOINT ih_prepare")
+            try:
+                cur.execute(stmt.prepare_sql)
+            except Exception as e:
+                if not guard:
+                    raise
+                cur.execute("ROLLBACK TO SAVEPOINT ih_prepare")
+                cur.execute("RELEASE SAVEPOINT ih_prepare")
+                state.rejected.add(stmt.pg_name)
+                self._count(stmt, "failures")
+                logger.warning(f"Could not prepare {stmt.name}, using plain text: {e}")
+                return False
+            if guard:
+                cur.execute("RELEASE SAVEPOINT ih_prepare")
+        finally:
+            cur.close()
+        state.verified.add(stmt.pg_name)
+        return True
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = [
+                (family, c.hits, c.misses, c.text, c.failures, c.overflow, self._family_sizes.get(family, 1))
+                for family, c in self._counters.items()
+            ]
+        out: List[Dict[str, Any]] = []
+        for family, hits, misses, text_, failures, overflow, variants in sorted(rows):
+            prepared = hits + misses
+            out.append(
+                {
+                    "statement": family,
+                    "variants": variants,
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_ratio": round(hits / prepared, 4) if prepared else None,
+                    "text": text_,
+                    "prepare_failures": failures,
+                    "overflow": overflow,
+                }
+            )
+        return out
+
+    def reset(self) -> None:
+        with self._lock:
+            for c in self._counters.values():
+                c.hits = c.misses = c.text = c.failures = c.overflow = 0
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            rows = [
+                (family, c.hits, c.misses, c.text, c.failures, c.overflow)
+                for family, c in self._counters.items()
+            ]
+        lines: List[str] = []
+
+        def _family(name: str, help_text: str, idx: int) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for row in rows:
+                lines.append(f'{name}{{statement="{_esc(row[0])}"}} {row[idx]}')
+
+        _family("ironhub_sql_prepared_hits_total", "EXECUTEs of a statement already prepared on the connection", 1)
+        _family("ironhub_sql_prepared_misses_total", "PREPAREs issued (first use of a statement on a connection)", 2)
+        _family("ironhub_sql_text_executions_total", "Registered statements executed as plain text", 3)
+        _family("ironhub_sql_prepare_failures_total", "Statements the server refused to prepare", 4)
+        _family(
+            "ironhub_sql_variant_overflow_total",
+            f"Builder outputs beyond {SQL_STATEMENT_MAX_VARIANTS} variants per family",
+            5,
+        )
+        return "\n".join(lines) + "\n"
+
+
+def _esc(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _engine_state(conn: Connection) -> Optional[_EngineState]:
+    try:
+        return getattr(conn.engine, "_ironhub_statements", None)
+    except Exception:
+        return None
+
+
+def _prepared_names(fairy: Any) -> Optional[Set[str]]:
+    """Names prepared on this DBAPI connection; None if it can't be used right now"""
+    info = fairy.info
+    names = info.get(_INFO_KEY)
+    if names is None:
+        names = set()
+        info[_INFO_KEY] = names
+    elif info.get(_STALE_KEY):
+        cur = fairy.dbapi_connection.cursor()
+        try:
+            cur.execute("DEALLOCATE ALL")
+        except Exception:
+            # Still inside the failed transaction; retry on the next use
+            return None
+        finally:
+            cur.close()
+        names.clear()
+        info.pop(_STALE_KEY, None)
+    return names
+
+
+def _behind_pooler(engine: Engine) -> bool:
+    url = engine.url
+    host = str(url.host or "").lower()
+    return "pooler" in host or "pgbouncer" in host or str(url.port or "") == "6432"
+
+
+def enable_prepared_statements(engine: Engine) -> bool:
+    """Run registered statements on this engine as server-side prepared statements (idempotent)"""
+    if getattr(engine, "_ironhub_statements", None) is not None:
+        return True
+    mode = SQL_PREPARED_STATEMENTS
+    if mode in ("0", "false", "no", "off"):
+        return False
+    if engine.dialect.name != "postgresql" or engine.dialect.driver != "psycopg2":
+        return False
+    if mode not in ("1", "true", "yes", "on") and _behind_pooler(engine):
+        logger.info(f"Prepared statements off for {engine.url.host}: transaction pooler suspected")
+        return False
+    engine._ironhub_statements = _EngineState()
+    return True
+
+
+_registry = StatementRegistry()
+
+
+def get_statement_registry() -> StatementRegistry:
+    return _registry
+
+
+def register(name: str, sql: str) -> Statement:
+    return _registry.register(name, sql)
+
+
+def variant(family: str, sql: str) -> Statement:
+    return _registry.variant(family, sql)
+
+
+def execute(
+    db: Union[Session, Connection],
+    stmt: Statement,
+    params: Optional[Mapping[str, Any]] = None,
+) -> Result:
+    return _registry.execute(db, stmt, params)
+
+
+__all__ = [
+    "SQL_PREPARED_STATEMENTS",
+    "SQL_STATEMENT_MAX_VARIANTS",
+    "Statement",
+    "StatementRegistry",
+    "enable_prepared_statements",
+    "execute",
+    "get_statement_registry",
+    "register",
+    "variant",
+]
@@ -31,6 +31,9 @@ logger = logging.getLogger(__name__)
 from pathlib import Path
 
 from src.database.migration_runner import upgrade_head_with_connection
+from src.database.query_metrics import instrument_engine
+from src.database.schema_capabilities import invalidate_capabilities, refresh_capabilities
+from src.database.statement_registry import enable_prepared_statements
 
 # ============================================================================
 # CONFIGURATION
@@ -467,8 +470,13 @@ def get_tenant_engine(tenant: str, verify_status: bool = True) -> Optional[Engin
                     with engine.connect() as conn:
                         conn.execute(text("SELECT 1"))
 
+                    instrument_engine(engine, tenant)
+                    enable_prepared_statements(engine)
                     _tenant_engines[tenant] = engine
                     logger.info(f"Created engine for tenant: {tenant} -> {db_name}")
+                    if not should_auto_migrate:
+                        # Catalog snapshot up front; auto-migrate reloads it below
+                        refresh_capabilities(engine)
                     break
 
                 except (OperationalError, SQLAlchemyError) as e:
@@ -511,6 +519,7 @@ def get_tenant_engine(tenant: str, verify_status: bool = True) -> Optional[Engin
             )
         with _tenant_lock:
             _tenant_migration_checked[tenant] = now_ts
+        refresh_capabilities(engine)
         return engine
     except Exception as e:
         logger.error(f"Auto-migrate tenant failed for '{tenant}': {e}")
@@ -620,6 +629,7 @@ def clear_tenant_cache(tenant: str = None):
             if tenant in _tenant_session_factories:
                 del _tenant_session_factories[tenant]
             if tenant in _tenant_engines:
+                invalidate_capabilities(_tenant_engines[tenant])
                 try:
                     _tenant_engines[tenant].dispose()
                 except Exception:
@@ -639,6 +649,7 @@ def clear_tenant_cache(tenant: str = None):
                 except Exception:
                     pass
             _tenant_engines.clear()
+            invalidate_capabilities()
             _tenant_db_info.clear()
             _tenant_last_access.clear()
 
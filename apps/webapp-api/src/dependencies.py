@@ -4,7 +4,6 @@ Self-contained FastAPI dependency injection for webapp-api
 """
 
 import logging
-import json
 import os
 import re
 from typing import Optional, Generator, List
@@ -14,807 +13,9 @@ from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
-logger = logging.getLogger(__name__)
-
-
-_schema_guard_lock = None
-_schema_guard_done = set()
-try:
-    import threading
-
-    _schema_guard_lock = threading.RLock()
-except Exception:
-    _schema_guard_lock = None
-
-
-def _ensure_ejercicios_columns(session: Session, tenant: Optional[str]) -> None:
-    try:
-        auto_guard = str(os.getenv("AUTO_SCHEMA_GUARD", "")).strip().lower() in (
-            "1",
-            "true",
-            "yes",
-            "on",
-        )
-        dev_mode = str(os.getenv("DEVELOPMENT_MODE", "")).strip().lower() in (
-            "1",
-            "true",
-            "yes",
-            "on",
-        )
-        if not auto_guard and not dev_mode:
-            return
-    except Exception:
-        return
-    try:
-        key = str(tenant or "__default__")
-        if _schema_guard_lock is not None:
-            with _schema_guard_lock:
-                if key in _schema_guard_done:
-                    return
-        else:
-            if key in _schema_guard_done:
-                return
-        session.execute(
-            text("""
-                ALTER TABLE ejercicios
-                    ADD COLUMN IF NOT EXISTS objetivo VARCHAR(100) DEFAULT 'general',
-                    ADD COLUMN IF NOT EXISTS equipamiento VARCHAR(100),
-                    ADD COLUMN IF NOT EXISTS variantes TEXT;
-            """)
-        )
-
-        try:
-            session.commit()
-        except Exception:
-            session.rollback()
-    except Exception:
-        try:
-            session.rollback()
-        except Exception:
-            pass
-    finally:
-        try:
-            if _schema_guard_lock is not None:
-                with _schema_guard_lock:
-                    _schema_guard_done.add(str(tenant or "__default__"))
-            else:
-                _schema_guard_done.add(str(tenant or "__default__"))
-        except Exception:
-            pass
+from src import request_timing
 
-
-def _ensure_multisucursal_schema(session: Session, tenant: Optional[str]) -> None:
-    try:
-        auto_guard = str(os.getenv("AUTO_SCHEMA_GUARD", "")).strip().lower() in (
-            "1",
-            "true",
-            "yes",
-            "on",
-        )
-        dev_mode = str(os.getenv("DEVELOPMENT_MODE", "")).strip().lower() in (
-            "1",
-            "true",
-            "yes",
-            "on",
-        )
-        if not auto_guard and not dev_mode:
-            return
-    except Exception:
-        return
-
-    key = f"multisucursal:{str(tenant or '__default__')}"
-    try:
-        if _schema_guard_lock is not None:
-            with _schema_guard_lock:
-                if key in _schema_guard_done:
-                    return
-        else:
-            if key in _schema_guard_done:
-                return
-
-        session.execute(
-            text(
-                """
-                CREATE TABLE IF NOT EXISTS sucursales (
-                    id SERIAL PRIMARY KEY,
-                    nombre TEXT NOT NULL,
-                    codigo TEXT NOT NULL UNIQUE,
-                    direccion TEXT NULL,
-                    timezone TEXT NULL,
-                    station_key VARCHAR(64) NULL,
-                    activa BOOLEAN NOT NULL DEFAULT TRUE,
-                    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
-                );
-                CREATE INDEX IF NOT EXISTS idx_sucursales_activa ON sucursales(activa);
-                """
-            )
-        )
-        try:
-            session.execute(
-                text(
-                    "ALTER TABLE sucursales ADD COLUMN IF NOT EXISTS station_key VARCHAR(64) NULL"
-                )
-            )
-        except Exception:
-            pass
-        try:
-            session.execute(
-                text(
-                    "CREATE UNIQUE INDEX IF NOT EXISTS uq_sucursales_station_key ON sucursales(station_key) WHERE station_key IS NOT NULL AND TRIM(station_key) <> ''"
-                )
-            )
-        except Exception:
-            pass
-
-        session.execute(
-            text(
-                """
-                CREATE TABLE IF NOT EXISTS usuario_sucursales (
-                    usuario_id INTEGER NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
-                    sucursal_id INTEGER NOT NULL REFERENCES sucursales(id) ON DELETE CASCADE,
-                    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
-                    PRIMARY KEY (usuario_id, sucursal_id)
-                );
-                CREATE INDEX IF NOT EXISTS idx_usuario_sucursales_sucursal_id ON usuario_sucursales(sucursal_id);
-                """
-            )
-        )
-
-        session.execute(
-            text(
-                "ALTER TABLE asistencias ADD COLUMN IF NOT EXISTS sucursal_id INTEGER NULL"
-            )
-        )
-        try:
-            session.execute(
-                text(
-                    "DO $$ BEGIN "
-                    "IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'fk_asistencias_sucursal_id') THEN "
-                    "ALTER TABLE asistencias ADD CONSTRAINT fk_asistencias_sucursal_id FOREIGN KEY (sucursal_id) REFERENCES sucursales(id) ON DELETE SET NULL; "
-                    "END IF; "
-                    "END $$;"
-                )
-            )
-        except Exception:
-            pass
-        session.execute(
-            text(
-                "CREATE INDEX IF NOT EXISTS idx_asistencias_sucursal_fecha ON asistencias(sucursal_id, fecha)"
-            )
-        )
-
-        session.execute(
-            text(
-                "ALTER TABLE checkin_pending ADD COLUMN IF NOT EXISTS sucursal_id INTEGER NULL"
-            )
-        )
-        try:
-            session.execute(
-                text(
-                    "DO $$ BEGIN "
-                    "IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'fk_checkin_pending_sucursal_id') THEN "
-                    "ALTER TABLE checkin_pending ADD CONSTRAINT fk_checkin_pending_sucursal_id FOREIGN KEY (sucursal_id) REFERENCES sucursales(id) ON DELETE SET NULL; "
-                    "END IF; "
-                    "END $$;"
-                )
-            )
-        except Exception:
-            pass
-        session.execute(
-            text(
-                "CREATE INDEX IF NOT EXISTS idx_checkin_pending_sucursal_expires ON checkin_pending(sucursal_id, expires_at)"
-            )
-        )
-
-        session.execute(
-            text(
-                """
-                INSERT INTO sucursales (nombre, codigo)
-                SELECT 'Sucursal Principal', 'principal'
-                WHERE NOT EXISTS (SELECT 1 FROM sucursales);
-                """
-            )
-        )
-        session.execute(
-            text(
-                """
-                UPDATE asistencias
-                SET sucursal_id = (SELECT id FROM sucursales ORDER BY id ASC LIMIT 1)
-                WHERE sucursal_id IS NULL;
-                """
-            )
-        )
-        session.execute(
-            text(
-                """
-                UPDATE checkin_pending
-                SET sucursal_id = (SELECT id FROM sucursales ORDER BY id ASC LIMIT 1)
-                WHERE sucursal_id IS NULL;
-                """
-            )
-        )
-        try:
-            session.commit()
-        except Exception:
-            session.rollback()
-    except Exception:
-        try:
-            session.rollback()
-        except Exception:
-            pass
-    finally:
-        try:
-            if _schema_guard_lock is not None:
-                with _schema_guard_lock:
-                    _schema_guard_done.add(key)
-            else:
-                _schema_guard_done.add(key)
-        except Exception:
-            pass
-
-
-def _ensure_staff_schema(session: Session, tenant: Optional[str]) -> None:
-    try:
-        auto_guard = str(os.getenv("AUTO_SCHEMA_GUARD", "")).strip().lower() in (
-            "1",
-            "true",
-            "yes",
-            "on",
-        )
-        dev_mode = str(os.getenv("DEVELOPMENT_MODE", "")).strip().lower() in (
-            "1",
-            "true",
-            "yes",
-            "on",
-        )
-        if not auto_guard and not dev_mode:
-            return
-    except Exception:
-        return
-
-    key = f"staff_schema:{str(tenant or '__default__')}"
-    try:
-        if _schema_guard_lock is not None:
-            with _schema_guard_lock:
-                if key in _schema_guard_done:
-                    return
-        else:
-            if key in _schema_guard_done:
-                return
-
-        session.execute(
-            text(
-                """
-                CREATE TABLE IF NOT EXISTS staff_profiles (
-                    id SERIAL PRIMARY KEY,
-                    usuario_id INTEGER NOT NULL UNIQUE REFERENCES usuarios(id) ON DELETE CASCADE,
-                    tipo VARCHAR(50) NOT NULL DEFAULT 'empleado',
-                    estado VARCHAR(20) NOT NULL DEFAULT 'activo',
-                    fecha_creacion TIMESTAMP DEFAULT NOW(),
-                    fecha_actualizacion TIMESTAMP DEFAULT NOW()
-                )
-                """
-            )
-        )
-        try:
-            session.execute(
-                text(
-                    "DO $$ BEGIN "
-                    "IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'staff_profiles_estado_check') THEN "
-                    "ALTER TABLE staff_profiles ADD CONSTRAINT staff_profiles_estado_check CHECK (estado IN ('activo','inactivo','vacaciones')); "
-                    "END IF; "
-                    "END $$;"
-                )
-            )
-        except Exception:
-            pass
-
-        session.execute(
-            text(
-                """
-                CREATE TABLE IF NOT EXISTS staff_sessions (
-                    id SERIAL PRIMARY KEY,
-                    staff_id INTEGER NOT NULL REFERENCES staff_profiles(id) ON DELETE CASCADE,
-                    sucursal_id INTEGER NULL REFERENCES sucursales(id) ON DELETE SET NULL,
-                    fecha DATE NOT NULL,
-                    hora_inicio TIMESTAMP NOT NULL,
-                    hora_fin TIMESTAMP NULL,
-                    minutos_totales INTEGER NULL,
-                    notas TEXT NULL,
-                    fecha_creacion TIMESTAMP DEFAULT NOW()
-                )
-                """
-            )
-        )
-        try:
-            session.execute(
-                text(
-                    "CREATE UNIQUE INDEX IF NOT EXISTS uniq_sesion_activa_por_staff "
-                    "ON staff_sessions(staff_id) WHERE hora_fin IS NULL"
-                )
-            )
-            session.execute(
-                text(
-                    "CREATE INDEX IF NOT EXISTS idx_staff_sessions_staff_id ON staff_sessions(staff_id)"
-                )
-            )
-            session.execute(
-                text(
-                    "CREATE INDEX IF NOT EXISTS idx_staff_sessions_fecha ON staff_sessions(fecha)"
-                )
-            )
-            session.execute(
-                text(
-                    "CREATE INDEX IF NOT EXISTS idx_staff_sessions_sucursal_id ON staff_sessions(sucursal_id)"
-                )
-            )
-        except Exception:
-            pass
-
-        try:
-            session.execute(
-                text(
-                    "ALTER TABLE profesor_horas_trabajadas ADD COLUMN IF NOT EXISTS sucursal_id INTEGER NULL"
-                )
-            )
-        except Exception:
-            pass
-        try:
-            session.execute(
-                text(
-                    "DO $$ BEGIN "
-                    "IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'fk_profesor_horas_trabajadas_sucursal_id') THEN "
-                    "ALTER TABLE profesor_horas_trabajadas "
-                    "ADD CONSTRAINT fk_profesor_horas_trabajadas_sucursal_id "
-                    "FOREIGN KEY (sucursal_id) REFERENCES sucursales(id) ON DELETE SET NULL; "
-                    "END IF; "
-                    "END $$;"
-                )
-            )
-        except Exception:
-            pass
-        try:
-            session.execute(
-                text(
-                    "CREATE INDEX IF NOT EXISTS idx_profesor_horas_trabajadas_sucursal_id ON profesor_horas_trabajadas(sucursal_id)"
-                )
-            )
-        except Exception:
-            pass
-
-        session.execute(
-            text(
-                """
-                CREATE TABLE IF NOT EXISTS work_session_pauses (
-                    id SERIAL PRIMARY KEY,
-                    session_kind VARCHAR(20) NOT NULL,
-                    session_id INTEGER NOT NULL,
-                    started_at TIMESTAMP NOT NULL,
-                    ended_at TIMESTAMP NULL,
-                    created_at TIMESTAMP DEFAULT NOW()
-                )
-                """
-            )
-        )
-        try:
-            session.execute(
-                text(
-                    "DO $$ BEGIN "
-                    "IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'work_session_pauses_kind_check') THEN "
-                    "ALTER TABLE work_session_pauses "
-                    "ADD CONSTRAINT work_session_pauses_kind_check CHECK (session_kind IN ('profesor','staff')); "
-                    "END IF; "
-                    "END $$;"
-                )
-            )
-        except Exception:
-            pass
-        try:
-            session.execute(
-                text(
-                    "CREATE INDEX IF NOT EXISTS idx_work_session_pauses_session ON work_session_pauses(session_kind, session_id)"
-                )
-            )
-            session.execute(
-                text(
-                    "CREATE UNIQUE INDEX IF NOT EXISTS uniq_work_session_pause_active "
-                    "ON work_session_pauses(session_kind, session_id) WHERE ended_at IS NULL"
-                )
-            )
-            session.execute(
-                text(
-                    "CREATE INDEX IF NOT EXISTS idx_work_session_pauses_started_at ON work_session_pauses(started_at)"
-                )
-            )
-        except Exception:
-            pass
-
-        session.execute(
-            text(
-                """
-                CREATE TABLE IF NOT EXISTS staff_permissions (
-                    usuario_id INTEGER PRIMARY KEY REFERENCES usuarios(id) ON DELETE CASCADE,
-                    scopes JSONB NOT NULL DEFAULT '[]'::jsonb,
-                    updated_at TIMESTAMP DEFAULT NOW()
-                )
-                """
-            )
-        )
-
-        try:
-            session.commit()
-        except Exception:
-            session.rollback()
-    except Exception:
-        try:
-            session.rollback()
-        except Exception:
-            pass
-    finally:
-        try:
-            if _schema_guard_lock is not None:
-                with _schema_guard_lock:
-                    _schema_guard_done.add(key)
-            else:
-                _schema_guard_done.add(key)
-        except Exception:
-            pass
-
-
-def _ensure_whatsapp_multisucursal_schema(session: Session, tenant: Optional[str]) -> None:
-    try:
-        auto_guard = str(os.getenv("AUTO_SCHEMA_GUARD", "")).strip().lower() in (
-            "1",
-            "true",
-            "yes",
-            "on",
-        )
-        dev_mode = str(os.getenv("DEVELOPMENT_MODE", "")).strip().lower() in (
-            "1",
-            "true",
-            "yes",
-            "on",
-        )
-        if not auto_guard and not dev_mode:
-            return
-    except Exception:
-        return
-
-    key = f"wa_multisucursal:{str(tenant or '__default__')}"
-    try:
-        if _schema_guard_lock is not None:
-            with _schema_guard_lock:
-                if key in _schema_guard_done:
-                    return
-        else:
-            if key in _schema_guard_done:
-                return
-
-        session.execute(text("ALTER TABLE whatsapp_config ADD COLUMN IF NOT EXISTS sucursal_id INTEGER NULL"))
-        try:
-            session.execute(
-                text(
-                    "DO $$ BEGIN "
-                    "IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'fk_whatsapp_config_sucursal_id') THEN "
-                    "ALTER TABLE whatsapp_config ADD CONSTRAINT fk_whatsapp_config_sucursal_id FOREIGN KEY (sucursal_id) REFERENCES sucursales(id) ON DELETE SET NULL; "
-                    "END IF; "
-                    "END $$;"
-                )
-            )
-        except Exception:
-            pass
-        try:
-            session.execute(text("CREATE INDEX IF NOT EXISTS idx_whatsapp_config_sucursal_id ON whatsapp_config(sucursal_id)"))
-            session.execute(
-                text(
-                    "CREATE UNIQUE INDEX IF NOT EXISTS uniq_whatsapp_config_active_global "
-                    "ON whatsapp_config ((1)) WHERE active = TRUE AND sucursal_id IS NULL"
-                )
-            )
-            session.execute(
-                text(
-                    "CREATE UNIQUE INDEX IF NOT EXISTS uniq_whatsapp_config_active_by_branch "
-                    "ON whatsapp_config (sucursal_id) WHERE active = TRUE AND sucursal_id IS NOT NULL"
-                )
-            )
-        except Exception:
-            pass
-
-        session.execute(text("ALTER TABLE whatsapp_messages ADD COLUMN IF NOT EXISTS sucursal_id INTEGER NULL"))
-        session.execute(text("ALTER TABLE whatsapp_messages ADD COLUMN IF NOT EXISTS event_key VARCHAR(150) NULL"))
-        try:
-            session.execute(
-                text(
-                    "DO $$ BEGIN "
-                    "IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'fk_whatsapp_messages_sucursal_id') THEN "
-                    "ALTER TABLE whatsapp_messages ADD CONSTRAINT fk_whatsapp_messages_sucursal_id FOREIGN KEY (sucursal_id) REFERENCES sucursales(id) ON DELETE SET NULL; "
-                    "END IF; "
-                    "END $$;"
-                )
-            )
-        except Exception:
-            pass
-        try:
-            session.execute(text("CREATE INDEX IF NOT EXISTS idx_whatsapp_messages_sucursal_id ON whatsapp_messages(sucursal_id)"))
-            session.execute(text("CREATE INDEX IF NOT EXISTS idx_whatsapp_messages_event_key ON whatsapp_messages(event_key)"))
-            session.execute(
-                text(
-                    "CREATE UNIQUE INDEX IF NOT EXISTS uniq_whatsapp_messages_event_key "
-                    "ON whatsapp_messages(event_key) "
-                    "WHERE event_key IS NOT NULL AND TRIM(event_key) <> ''"
-                )
-            )
-        except Exception:
-            pass
-
-        try:
-            session.commit()
-        except Exception:
-            session.rollback()
-    except Exception:
-        try:
-            session.rollback()
-        except Exception:
-            pass
-    finally:
-        try:
-            if _schema_guard_lock is not None:
-                with _schema_guard_lock:
-                    _schema_guard_done.add(key)
-            else:
-                _schema_guard_done.add(key)
-        except Exception:
-            pass
-
-
-def _ensure_branch_scoped_resources_schema(session: Session, tenant: Optional[str]) -> None:
-    try:
-        auto_guard = str(os.getenv("AUTO_SCHEMA_GUARD", "")).strip().lower() in ("1", "true", "yes", "on")
-        dev_mode = str(os.getenv("DEVELOPMENT_MODE", "")).strip().lower() in ("1", "true", "yes", "on")
-        if not auto_guard and not dev_mode:
-            return
-    except Exception:
-        return
-
-    key = f"branch_resources:{str(tenant or '__default__')}"
-    try:
-        if _schema_guard_lock is not None:
-            with _schema_guard_lock:
-                if key in _schema_guard_done:
-                    return
-        else:
-            if key in _schema_guard_done:
-                return
-
-        session.execute(text("ALTER TABLE ejercicios ADD COLUMN IF NOT EXISTS sucursal_id INTEGER NULL"))
-        try:
-            session.execute(
-                text(
-                    "DO $$ BEGIN "
-                    "IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'fk_ejercicios_sucursal_id') THEN "
-                    "ALTER TABLE ejercicios ADD CONSTRAINT fk_ejercicios_sucursal_id FOREIGN KEY (sucursal_id) REFERENCES sucursales(id) ON DELETE SET NULL; "
-                    "END IF; "
-                    "END $$;"
-                )
-            )
-        except Exception:
-            pass
-        try:
-            session.execute(text("CREATE INDEX IF NOT EXISTS idx_ejercicios_sucursal_id ON ejercicios(sucursal_id)"))
-        except Exception:
-            pass
-
-        session.execute(text("ALTER TABLE rutinas ADD COLUMN IF NOT EXISTS sucursal_id INTEGER NULL"))
-        try:
-            session.execute(
-                text(
-                    "DO $$ BEGIN "
-                    "IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'fk_rutinas_sucursal_id') THEN "
-                    "ALTER TABLE rutinas ADD CONSTRAINT fk_rutinas_sucursal_id FOREIGN KEY (sucursal_id) REFERENCES sucursales(id) ON DELETE SET NULL; "
-                    "END IF; "
-                    "END $$;"
-                )
-            )
-        except Exception:
-            pass
-        try:
-            session.execute(text("CREATE INDEX IF NOT EXISTS idx_rutinas_sucursal_id ON rutinas(sucursal_id)"))
-        except Exception:
-            pass
-
-        session.execute(text("ALTER TABLE clases ADD COLUMN IF NOT EXISTS sucursal_id INTEGER NULL"))
-        try:
-            session.execute(
-                text(
-                    "DO $$ BEGIN "
-                    "IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'fk_clases_sucursal_id') THEN "
-                    "ALTER TABLE clases ADD CONSTRAINT fk_clases_sucursal_id FOREIGN KEY (sucursal_id) REFERENCES sucursales(id) ON DELETE SET NULL; "
-                    "END IF; "
-                    "END $$;"
-                )
-            )
-        except Exception:
-            pass
-        try:
-            session.execute(text("CREATE INDEX IF NOT EXISTS idx_clases_sucursal_id ON clases(sucursal_id)"))
-        except Exception:
-            pass
-
-        try:
-            session.commit()
-        except Exception:
-            session.rollback()
-    except Exception:
-        try:
-            session.rollback()
-        except Exception:
-            pass
-    finally:
-        try:
-            if _schema_guard_lock is not None:
-                with _schema_guard_lock:
-                    _schema_guard_done.add(key)
-            else:
-                _schema_guard_done.add(key)
-        except Exception:
-            pass
-
-
-def _ensure_membership_schema(session: Session, tenant: Optional[str]) -> None:
-    try:
-        auto_guard = str(os.getenv("AUTO_SCHEMA_GUARD", "")).strip().lower() in (
-            "1",
-            "true",
-            "yes",
-            "on",
-        )
-        dev_mode = str(os.getenv("DEVELOPMENT_MODE", "")).strip().lower() in (
-            "1",
-            "true",
-            "yes",
-            "on",
-        )
-        if not auto_guard and not dev_mode:
-            return
-    except Exception:
-        return
-
-    key = f"membership:{str(tenant or '__default__')}"
-    try:
-        if _schema_guard_lock is not None:
-            with _schema_guard_lock:
-                if key in _schema_guard_done:
-                    return
-        else:
-            if key in _schema_guard_done:
-                return
-
-        session.execute(
-            text(
-                """
-                CREATE TABLE IF NOT EXISTS memberships (
-                    id SERIAL PRIMARY KEY,
-                    usuario_id INTEGER NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
-                    plan_name TEXT NULL,
-                    status TEXT NOT NULL DEFAULT 'active',
-                    start_date DATE NOT NULL DEFAULT CURRENT_DATE,
-                    end_date DATE NULL,
-                    all_sucursales BOOLEAN NOT NULL DEFAULT FALSE,
-                    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
-                    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
-                );
-                CREATE INDEX IF NOT EXISTS idx_memberships_usuario_status ON memberships(usuario_id, status);
-                CREATE INDEX IF NOT EXISTS idx_memberships_status_end_date ON memberships(status, end_date);
-                """
-            )
-        )
-        session.execute(
-            text(
-                """
-                CREATE TABLE IF NOT EXISTS membership_sucursales (
-                    membership_id INTEGER NOT NULL REFERENCES memberships(id) ON DELETE CASCADE,
-                    sucursal_id INTEGER NOT NULL REFERENCES sucursales(id) ON DELETE CASCADE,
-                    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW(),
-                    PRIMARY KEY (membership_id, sucursal_id)
-                );
-                CREATE INDEX IF NOT EXISTS idx_membership_sucursales_sucursal_id ON membership_sucursales(sucursal_id);
-                """
-            )
-        )
-        try:
-            session.commit()
-        except Exception:
-            session.rollback()
-    except Exception:
-        try:
-            session.rollback()
-        except Exception:
-            pass
-    finally:
-        try:
-            if _schema_guard_lock is not None:
-                with _schema_guard_lock:
-                    _schema_guard_done.add(key)
-            else:
-                _schema_guard_done.add(key)
-        except Exception:
-            pass
-
-
-# Import tenant context functions from tenant_connection to avoid circular imports
-def _ensure_feature_flags_schema(session: Session, tenant: Optional[str]) -> None:
-    key = f"feature_flags:{str(tenant or '__default__')}"
-    try:
-        if _schema_guard_lock is not None:
-            with _schema_guard_lock:
-                if key in _schema_guard_done:
-                    return
-        else:
-            if key in _schema_guard_done:
-                return
-
-        default_flags = {
-            "modules": {
-                "usuarios": True,
-                "pagos": True,
-                "profesores": True,
-                "empleados": True,
-                "rutinas": True,
-                "ejercicios": True,
-                "clases": True,
-                "asistencias": True,
-                "whatsapp": True,
-                "configuracion": True,
-                "reportes": True,
-                "entitlements_v2": False,
-            }
-        }
-        session.execute(
-            text(
-                """
-                CREATE TABLE IF NOT EXISTS feature_flags (
-                    id SMALLINT PRIMARY KEY,
-                    flags JSONB NOT NULL DEFAULT '{}'::jsonb,
-                    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
-                );
-                """
-            )
-        )
-        session.execute(
-            text(
-                """
-                CREATE TABLE IF NOT EXISTS feature_flags_overrides (
-                    sucursal_id INTEGER PRIMARY KEY REFERENCES sucursales(id) ON DELETE CASCADE,
-                    flags JSONB NOT NULL DEFAULT '{}'::jsonb,
-                    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
-                );
-                """
-            )
-        )
-        session.execute(
-            text(
-                "INSERT INTO feature_flags (id, flags) VALUES (1, :flags::jsonb) ON CONFLICT (id) DO NOTHING"
-            ),
-            {"flags": json.dumps(default_flags, ensure_ascii=False)},
-        )
-        try:
-            session.commit()
-        except Exception:
-            session.rollback()
-    except Exception:
-        try:
-            session.rollback()
-        except Exception:
-            pass
-    finally:
-        try:
-            if _schema_guard_lock is not None:
-                with _schema_guard_lock:
-                    _schema_guard_done.add(key)
-            else:
-                _schema_guard_done.add(key)
-        except Exception:
-            pass
+logger = logging.getLogger(__name__)
 
 
 # tenant_connection has the canonical CURRENT_TENANT contextvar
@@ -849,6 +50,7 @@ from src.services.whatsapp_service import WhatsAppService
 from src.services.whatsapp_dispatch_service import WhatsAppDispatchService
 from src.services.whatsapp_settings_service import WhatsAppSettingsService
 from src.services.reports_service import ReportsService
+from src.services.owner_dashboard_service import OwnerDashboardService
 from src.services.admin_service import AdminService
 from src.services.audit_service import AuditService
 
@@ -1012,7 +214,8 @@ def get_db_session(request: Request) -> Generator[Session, None, None]:
     if tenant:
         # Use tenant-specific session
         try:
-            factory = get_tenant_session_factory(tenant)
+            with request_timing.phase("db_session"):
+                factory = get_tenant_session_factory(tenant)
             if not factory:
                 logger.error(f"Tenant session factory returned None for '{tenant}'")
                 raise HTTPException(
@@ -1156,6 +359,12 @@ def get_reports_service(
     return svc
 
 
+def get_owner_dashboard_service(
+    session: Session = Depends(get_db_session),
+) -> OwnerDashboardService:
+    return OwnerDashboardService(session)
+
+
 def get_admin_service(session: Session = Depends(get_db_session)) -> AdminService:
     """Get AdminService instance with current session."""
     return AdminService(session)
@@ -1188,6 +397,7 @@ def get_admin_db() -> Generator[Session, None, None]:
 
 
 def require_feature(feature_key: str):
+    @request_timing.timed_dependency("feature")
     async def _dep(request: Request, session: Session = Depends(get_db_session)):
         try:
             claims = get_claims(request)
@@ -1372,6 +582,7 @@ async def require_user_auth(request: Request):
     return user_id
 
 
+@request_timing.timed_dependency("sucursal")
 async def require_sucursal_selected(
     request: Request, db: Session = Depends(get_db_session)
 ):
@@ -1414,6 +625,7 @@ async def require_sucursal_selected(
     return RedirectResponse(url="/gestion/seleccionar-sucursal", status_code=303)
 
 
+@request_timing.timed_dependency("sucursal")
 async def require_sucursal_selected_optional(
     request: Request, db: Session = Depends(get_db_session)
 ) -> Optional[int]:
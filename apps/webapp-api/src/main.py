@@ -23,6 +23,10 @@ from starlette.middleware.sessions import SessionMiddleware
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 
+from src import request_timing
+from src.database import query_metrics
+from src.sampling_profiler import get_sampling_profiler
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -219,6 +223,46 @@ app.add_middleware(
 )
 
 
+@app.on_event("shutdown")
+async def _shutdown_pdf_render_service() -> None:
+    try:
+        from src.services.pdf_render_service import shutdown_pdf_render_service
+
+        shutdown_pdf_render_service()
+    except Exception:
+        pass
+
+
+@app.on_event("shutdown")
+async def _shutdown_credential_hasher() -> None:
+    try:
+        from src.security.credential_hashing import shutdown_credential_hasher
+
+        shutdown_credential_hasher()
+    except Exception:
+        pass
+
+
+@app.on_event("shutdown")
+async def _shutdown_audit_writer() -> None:
+    try:
+        from src.services.audit_writer import shutdown_audit_writer
+
+        shutdown_audit_writer()
+    except Exception:
+        pass
+
+
+@app.on_event("shutdown")
+async def _shutdown_whatsapp_inbound_worker() -> None:
+    try:
+        from src.services.whatsapp_inbound_service import stop_inbound_worker
+
+        stop_inbound_worker()
+    except Exception:
+        pass
+
+
 @app.on_event("startup")
 async def _startup_auto_migrate() -> None:
     should = str(os.getenv("AUTO_MIGRATE_ADMIN_DB", "true")).strip().lower() in (
@@ -260,6 +304,28 @@ async def _startup_auto_migrate() -> None:
             raise
 
 
+@app.on_event("startup")
+async def _startup_whatsapp_inbound_worker() -> None:
+    try:
+        from src.services.whatsapp_inbound_service import start_inbound_worker
+
+        start_inbound_worker()
+    except Exception as e:
+        logger.warning(f"WhatsApp inbound worker not started: {e}")
+
+
+def _route_template(request: Request) -> str:
+    """Matched route path (e.g. /api/usuarios/{usuario_id}) to keep metric labels bounded"""
+    try:
+        route = request.scope.get("route")
+        path = getattr(route, "path", None)
+        if path:
+            return str(path)
+    except Exception:
+        pass
+    return "unmatched"
+
+
 # =====================================================
 # TENANT CONTEXT MIDDLEWARE
 # =====================================================
@@ -272,7 +338,19 @@ async def tenant_context_middleware(request: Request, call_next):
     """
     Global middleware to extract and set tenant context for every request.
     This is CRITICAL for multi-tenant database routing.
+
+    Each stage is timed (src/request_timing.py) and reported as Server-Timing.
     """
+    timing_token = request_timing.begin()
+    response = None
+    try:
+        response = await _tenant_context_dispatch(request, call_next)
+        return response
+    finally:
+        request_timing.finish(timing_token, response, _route_template(request))
+
+
+async def _tenant_context_dispatch(request: Request, call_next):
     tenant = None
 
     # === GLOBAL RATE LIMITING ===
@@ -327,6 +405,7 @@ async def tenant_context_middleware(request: Request, call_next):
             register_api_request(request)
         except Exception as e:
             logger.warning(f"Rate limiting check failed: {e}")
+        request_timing.lap("ratelimit")
 
     if request.url.path.startswith("/api/") and request.method in ("POST", "PUT", "DELETE", "PATCH"):
         pth = str(request.url.path)
@@ -347,6 +426,7 @@ async def tenant_context_middleware(request: Request, call_next):
                     )
                     _apply_cors_headers(request, resp)
                     return resp
+        request_timing.lap("csrf")
     host = request.headers.get("host", "")
     base = os.getenv("TENANT_BASE_DOMAIN", "ironhub.motiona.xyz")
     debug_tenant = os.getenv("DEBUG_TENANT", "false").lower() in ("1", "true", "yes")
@@ -448,6 +528,9 @@ async def tenant_context_middleware(request: Request, call_next):
     if not tenant and request.url.path.startswith("/api/") and debug_tenant:
         logger.warning(f"NO TENANT CONTEXT for API route: {request.url.path}")
 
+    request_timing.lap("tenant")
+    qm_token = query_metrics.begin_request()
+    profile_token = get_sampling_profiler().enter(tenant)
     try:
         try:
             if request.method != "GET" and str(request.url.path).startswith("/api/"):
@@ -494,7 +577,10 @@ async def tenant_context_middleware(request: Request, call_next):
         except Exception:
             pass
 
+        request_timing.lap("cache")
         response = await call_next(request)
+        request_timing.lap("app")
+        request_timing.note_db()
 
         try:
             content_type = (response.headers.get("content-type") or "").lower()
@@ -611,6 +697,7 @@ async def tenant_context_middleware(request: Request, call_next):
                             pass
         except Exception:
             pass
+        request_timing.lap("envelope")
 
         try:
             if request.url.path.startswith("/api/") and request.method == "GET":
@@ -636,6 +723,8 @@ async def tenant_context_middleware(request: Request, call_next):
         response.headers.setdefault("Permissions-Policy", "geolocation=(), microphone=(), camera=()")
         return response
     finally:
+        get_sampling_profiler().exit(profile_token)
+        query_metrics.end_request(qm_token, _route_template(request))
         try:
             set_current_tenant(None)
         except Exception:
@@ -1120,6 +1209,7 @@ from src.routers import bulk_actions
 from src.routers import support
 from src.routers import changelogs
 from src.routers import access_control
+from src.routers import metrics
 from src.routes import template_admin
 from src.routes import gym_templates
 
@@ -1143,6 +1233,7 @@ app.include_router(bulk_actions.router, tags=["Bulk Actions"])
 app.include_router(support.router, tags=["Support"])
 app.include_router(changelogs.router, tags=["Changelogs"])
 app.include_router(access_control.router, tags=["Access Control"])
+app.include_router(metrics.router, tags=["Metrics"])
 app.include_router(admin.router, tags=["Admin"])
 app.include_router(meta_review.router, tags=["Meta Review"])
 app.include_router(staff.router, tags=["Staff"])
@@ -147,7 +147,7 @@ class Usuario(Base):
     )
 
     __table_args__ = (
-        Index("idx_usuarios_nombre", "nombre"),
+        Index("idx_usuarios_nombre_id", "nombre", "id"),
         Index("idx_usuarios_dni", "dni"),
         Index("idx_usuarios_activo", "activo"),
         Index("idx_usuarios_rol", "rol"),
@@ -196,9 +196,9 @@ class Pago(Base):
     __table_args__ = (
         UniqueConstraint("usuario_id", "mes", "año", name="idx_pagos_usuario_mes_año"),
         Index("idx_pagos_usuario_id", "usuario_id"),
-        Index("idx_pagos_sucursal_id", "sucursal_id"),
+        Index("idx_pagos_sucursal_fecha_id", "sucursal_id", text("fecha_pago DESC"), text("id DESC")),
+        Index("idx_pagos_fecha_id", text("fecha_pago DESC"), text("id DESC")),
         Index("idx_pagos_tipo_cuota_id", "tipo_cuota_id"),
-        Index("idx_pagos_fecha", "fecha_pago"),
         Index(
             "idx_pagos_month_year",
             text("(EXTRACT(MONTH FROM fecha_pago))"),
@@ -606,10 +606,10 @@ class Asistencia(Base):
 
     __table_args__ = (
         Index("idx_asistencias_usuario_id", "usuario_id"),
-        Index("idx_asistencias_fecha", "fecha"),
         Index("idx_asistencias_usuario_fecha", "usuario_id", "fecha"),
         Index("idx_asistencias_usuario_fecha_desc", "usuario_id", text("fecha DESC")),
-        Index("idx_asistencias_sucursal_fecha", "sucursal_id", "fecha"),
+        Index("idx_asistencias_sucursal_fecha_id", "sucursal_id", text("fecha DESC"), text("id DESC")),
+        Index("idx_asistencias_fecha_id", text("fecha DESC"), text("id DESC")),
     )
 
 
@@ -673,6 +673,9 @@ class ClaseHorario(Base):
     hora_fin: Mapped[time] = mapped_column(Time, nullable=False)
     cupo_maximo: Mapped[Optional[int]] = mapped_column(Integer, server_default="20")
     activo: Mapped[bool] = mapped_column(Boolean, server_default="true")
+    inscriptos_count: Mapped[int] = mapped_column(
+        Integer, nullable=False, server_default="0"
+    )
 
     clase: Mapped["Clase"] = relationship("Clase", back_populates="horarios")
     lista_espera: Mapped[List["ClaseListaEspera"]] = relationship(
@@ -897,6 +900,19 @@ class RutinaEjercicio(Base):
     )
 
 
+class RutinaReadModel(Base):
+    __tablename__ = "rutina_read_models"
+
+    rutina_id: Mapped[int] = mapped_column(
+        ForeignKey("rutinas.id", ondelete="CASCADE"), primary_key=True
+    )
+    version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
+    documento: Mapped[Any] = mapped_column(JSONB, nullable=False)
+    actualizado_en: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, server_default=func.now()
+    )
+
+
 class ClaseEjercicio(Base):
     __tablename__ = "clase_ejercicios"
 
@@ -1,7 +1,6 @@
 import os
 import tempfile
 from datetime import datetime
-import time
 from .models import Pago, Usuario, PagoDetalle
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import inch
@@ -179,38 +178,23 @@ class PDFGenerator:
 
         header_data = [["", Paragraph(str(header_text), title_style), right_info_para]]
         if mostrar_logo is not False:
-            from reportlab.platypus import Image
-
-            tmp_logo_path = None
             try:
+                logo_path = None
                 if self.logo_url:
-                    try:
-                        import requests
-
-                        r = requests.get(str(self.logo_url), timeout=8)
-                        if r.status_code == 200 and r.content:
-                            ext = ".png"
-                            try:
-                                low = str(self.logo_url).lower()
-                                if low.endswith(".jpg") or low.endswith(".jpeg"):
-                                    ext = ".jpg"
-                                elif low.endswith(".png"):
-                                    ext = ".png"
-                            except Exception:
-                                ext = ".png"
-                            tmp_logo_path = os.path.join(
-                                tempfile.gettempdir(),
-                                f"ironhub_logo_{int(time.time())}{ext}",
-                            )
-                            with open(tmp_logo_path, "wb") as f:
-                                f.write(r.content)
-                    except Exception:
-                        tmp_logo_path = None
-                if tmp_logo_path and os.path.exists(tmp_logo_path):
-                    logo = Image(tmp_logo_path, width=1 * inch, height=1 * inch)
-                    header_data[0][0] = logo
-                elif self.logo_path and os.path.exists(self.logo_path):
-                    logo = Image(self.logo_path, width=1 * inch, height=1 * inch)
+                    from src.services.branding_assets import logo_local_path
+
+                    logo_path = logo_local_path(str(self.logo_url))
+                if not logo_path and self.logo_path and os.path.exists(self.logo_path):
+                    logo_path = self.logo_path
+                if logo_path:
+                    from src.services.branding_assets import (
+                        image_reader_from_path,
+                        reader_flowable,
+                    )
+
+                    logo = reader_flowable(
+                        image_reader_from_path(logo_path), 1 * inch, 1 * inch
+                    )
                     header_data[0][0] = logo
             except Exception:
                 pass
@@ -0,0 +1,236 @@
+"""
+Request phase timing
+
+tenant_context_middleware opens a timer per request and marks laps between
+its stages (rate limiting, CSRF, tenant resolution, GET cache, the app itself,
+the JSON envelope rewrite). Dependencies time themselves with `phase()` /
+`timed_dependency()`, and the DB time comes from query_metrics. Phases are
+returned in a `Server-Timing` header (visible in browser devtools) and folded
+into per-route, per-phase histograms rendered next to the query metrics on
+/internal/metrics.
+
+Nested phases (db_session, feature, sucursal, db) overlap "app"; the header
+reports them side by side rather than subtracting.
+"""
+
+import bisect
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SERVER_TIMING_HEADER = str(os.getenv("SERVER_TIMING_HEADER", "true")).strip().lower() in (
+    "1",
+    "true",
+    "yes",
+    "on",
+)
+try:
+    REQUEST_TIMING_MAX_SERIES = max(int(os.getenv("REQUEST_TIMING_MAX_SERIES", "3000")), 1)
+except Exception:
+    REQUEST_TIMING_MAX_SERIES = 3000
+
+# Seconds; upper bounds shared by every phase histogram
+PHASE_BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.025, 0.1, 0.25, 1.0, 2.5, 10.0)
+
+_OVERFLOW = "__other__"
+
+
+class RequestTimer:
+    """Accumulated seconds per phase for one request"""
+
+    __slots__ = ("start", "last", "phases", "db_queries")
+
+    def __init__(self) -> None:
+        now = time.perf_counter()
+        self.start = now
+        self.last = now
+        self.phases: Dict[str, float] = {}
+        self.db_queries = 0
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + max(seconds, 0.0)
+
+    def lap(self, name: str) -> None:
+        now = time.perf_counter()
+        self.add(name, now - self.last)
+        self.last = now
+
+    def total(self) -> float:
+        return time.perf_counter() - self.start
+
+    def header(self, total: float) -> str:
+        parts = []
+        for name, seconds in self.phases.items():
+            entry = f"{name};dur={seconds * 1000.0:.2f}"
+            if name == "db":
+                entry += f';desc="{self.db_queries} queries"'
+            parts.append(entry)
+        parts.append(f"total;dur={total * 1000.0:.2f}")
+        return ", ".join(parts)
+
+
+_TIMER: contextvars.ContextVar[Optional[RequestTimer]] = contextvars.ContextVar(
+    "request_timer", default=None
+)
+
+
+class PhaseHistograms:
+    """Per (route, phase) duration histograms"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str], List[Any]] = {}
+
+    def record(self, route: str, phases: Dict[str, float]) -> None:
+        with self._lock:
+            for phase_name, seconds in phases.items():
+                key = (route, phase_name)
+                row = self._series.get(key)
+                if row is None:
+                    if len(self._series) >= REQUEST_TIMING_MAX_SERIES:
+                        key = (_OVERFLOW, phase_name)
+                        row = self._series.get(key)
+                    if row is None:
+                        # bucket counts..., +Inf count, sum
+                        row = [0] * (len(PHASE_BUCKETS) + 1) + [0.0]
+                        self._series[key] = row
+                row[bisect.bisect_left(PHASE_BUCKETS, seconds)] += 1
+                row[-1] += seconds
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        name = "ironhub_request_phase_seconds"
+        lines = [
+            f"# HELP {name} Request time per route and phase (see Server-Timing)",
+            f"# TYPE {name} histogram",
+        ]
+        for (route, phase_name), row in sorted(items):
+            labels = f'route="{_esc(route)}",phase="{_esc(phase_name)}"'
+            cumulative = 0
+            for bound, n in zip(PHASE_BUCKETS, row):
+                cumulative += n
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            cumulative += row[len(PHASE_BUCKETS)]
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {round(row[-1], 6)!r}")
+            lines.append(f"{name}_count{{{labels}}} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _esc(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_histograms = PhaseHistograms()
+
+
+def get_phase_histograms() -> PhaseHistograms:
+    return _histograms
+
+
+# === Request scope ===
+
+
+def begin() -> contextvars.Token:
+    return _TIMER.set(RequestTimer())
+
+
+def current_timer() -> Optional[RequestTimer]:
+    return _TIMER.get()
+
+
+def lap(name: str) -> None:
+    """Charge the time since the previous lap to a middleware stage"""
+    timer = _TIMER.get()
+    if timer is not None:
+        timer.lap(name)
+
+
+@contextmanager
+def phase(name: str):
+    """Time a nested block (dependency, service call) within the request"""
+    timer = _TIMER.get()
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - start)
+
+
+def timed_dependency(name: str):
+    """Decorator for async FastAPI dependencies; keeps the signature for Depends()"""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with phase(name):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def note_db() -> None:
+    """Copy the request's DB totals from query_metrics into the timer"""
+    timer = _TIMER.get()
+    if timer is None:
+        return
+    try:
+        from src.database.query_metrics import current_request_stats
+
+        rs = current_request_stats()
+        if rs is not None and rs.queries:
+            timer.phases["db"] = rs.db_time
+            timer.db_queries = rs.queries
+    except Exception:
+        pass
+
+
+def finish(token: contextvars.Token, response: Any, route: str) -> None:
+    """Emit Server-Timing, record histograms and close the scope"""
+    timer = _TIMER.get()
+    try:
+        _TIMER.reset(token)
+    except Exception:
+        _TIMER.set(None)
+    if timer is None:
+        return
+    try:
+        total = timer.total()
+        if SERVER_TIMING_HEADER and response is not None:
+            response.headers["Server-Timing"] = timer.header(total)
+        phases = dict(timer.phases)
+        phases["total"] = total
+        _histograms.record(route or "unmatched", phases)
+    except Exception as e:
+        logger.warning(f"Request timing failed: {e}")
+
+
+__all__ = [
+    "PhaseHistograms",
+    "RequestTimer",
+    "begin",
+    "current_timer",
+    "finish",
+    "get_phase_histograms",
+    "lap",
+    "note_db",
+    "phase",
+    "timed_dependency",
+]
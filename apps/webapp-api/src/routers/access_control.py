@@ -12,6 +12,7 @@ from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from src.checkin_ws_hub import checkin_ws_hub
+from src.database import statement_registry
 from src.dependencies import (
     get_claims,
     get_db_session,
@@ -27,6 +28,105 @@ from src.rate_limit_store import incr_and_check
 
 router = APIRouter()
 
+# Statements on the device event path (every scan), prepared once per connection
+_DEVICE_BY_PUBLIC_ID = statement_registry.register(
+    "access.device_by_public_id",
+    """
+    SELECT id, sucursal_id, enabled, token_hash, config
+    FROM access_devices
+    WHERE device_public_id = :pid
+    LIMIT 1
+    """,
+)
+_DEVICE_TOUCH = statement_registry.register(
+    "access.device_touch",
+    "UPDATE access_devices SET last_seen_at = NOW(), updated_at = NOW() WHERE id = :id",
+)
+_EVENT_BY_NONCE = statement_registry.register(
+    "access.event_by_nonce",
+    """
+    SELECT decision, reason, unlock, unlock_ms
+    FROM access_events
+    WHERE device_id = :did AND event_nonce_hash = :nh
+    ORDER BY id DESC
+    LIMIT 1
+    """,
+)
+_EVENTS_SINCE_COUNT = statement_registry.register(
+    "access.device_events_window",
+    """
+    SELECT COUNT(*)
+    FROM access_events
+    WHERE device_id = :did AND created_at >= NOW() - make_interval(secs => :win)
+    """,
+)
+# Anti-passback: one statement per branch filter instead of `:sid IS NULL OR ...`
+_LAST_UNLOCK_SQL = """
+    SELECT created_at
+    FROM access_events
+    WHERE subject_usuario_id = :uid
+      AND decision = 'allow'
+      AND unlock = TRUE
+      {sucursal}
+      AND created_at >= :since
+    ORDER BY created_at DESC
+    LIMIT 1
+"""
+_LAST_UNLOCK = statement_registry.register(
+    "access.last_unlock", _LAST_UNLOCK_SQL.format(sucursal="")
+)
+_LAST_UNLOCK_SUCURSAL = statement_registry.register(
+    "access.last_unlock_sucursal",
+    _LAST_UNLOCK_SQL.format(sucursal="AND sucursal_id = :sid"),
+)
+_INSERT_EVENT = statement_registry.register(
+    "access.insert_event",
+    """
+    INSERT INTO access_events(
+        sucursal_id, device_id, event_type, subject_usuario_id, credential_type, credential_hint,
+        input_kind, input_value_masked, decision, reason, unlock, unlock_ms, meta, event_nonce_hash, created_at
+    )
+    VALUES (
+        :sid, :did, :etype, :uid, :ct, :chint,
+        :ik, :ivm, :dec, :reason, :unlock, :ums, CAST(:meta AS JSONB), :nh, NOW()
+    )
+    """,
+)
+_USUARIO_DISPLAY = statement_registry.register(
+    "access.usuario_display",
+    """
+    SELECT
+      u.id,
+      u.nombre,
+      u.dni,
+      u.rol,
+      u.activo,
+      COALESCE(u.exento, FALSE) AS exento,
+      COALESCE(u.cuotas_vencidas, 0) AS cuotas_vencidas,
+      u.fecha_proximo_vencimiento,
+      u.ultimo_pago,
+      u.tipo_cuota_id,
+      tc.nombre AS tipo_cuota_nombre,
+      tc.duracion_dias AS tipo_cuota_duracion_dias
+    FROM usuarios u
+    LEFT JOIN tipo_cuotas tc ON tc.id = u.tipo_cuota_id
+    WHERE u.id = :uid
+    LIMIT 1
+    """,
+)
+_USUARIO_BY_DNI = statement_registry.register(
+    "access.usuario_by_dni", "SELECT id FROM usuarios WHERE dni = :dni LIMIT 1"
+)
+_CREDENTIAL_OWNER = statement_registry.register(
+    "access.credential_owner",
+    """
+    SELECT usuario_id
+    FROM access_credentials
+    WHERE credential_hash = :ch AND active = TRUE
+    LIMIT 1
+    """,
+)
+
 
 def _utcnow() -> datetime:
     return datetime.utcnow().replace(microsecond=0)
@@ -114,30 +214,7 @@ def _get_usuario_display(db: Session, usuario_id: int) -> Optional[Dict[str, Any
     if uid <= 0:
         return None
     try:
-        row = db.execute(
-            text(
-                """
-                SELECT
-                  u.id,
-                  u.nombre,
-                  u.dni,
-                  u.rol,
-                  u.activo,
-                  COALESCE(u.exento, FALSE) AS exento,
-                  COALESCE(u.cuotas_vencidas, 0) AS cuotas_vencidas,
-                  u.fecha_proximo_vencimiento,
-                  u.ultimo_pago,
-                  u.tipo_cuota_id,
-                  tc.nombre AS tipo_cuota_nombre,
-                  tc.duracion_dias AS tipo_cuota_duracion_dias
-                FROM usuarios u
-                LEFT JOIN tipo_cuotas tc ON tc.id = u.tipo_cuota_id
-                WHERE u.id = :uid
-                LIMIT 1
-                """
-            ),
-            {"uid": int(uid)},
-        ).mappings().first()
+        row = statement_registry.execute(db, _USUARIO_DISPLAY, {"uid": int(uid)}).mappings().first()
         if not row:
             return None
         fpv = row.get("fecha_proximo_vencimiento")
@@ -230,19 +307,9 @@ def _insert_access_event(
     meta: Dict[str, Any],
     event_nonce_hash: Optional[str],
 ) -> None:
-    db.execute(
-        text(
-            """
-            INSERT INTO access_events(
-                sucursal_id, device_id, event_type, subject_usuario_id, credential_type, credential_hint,
-                input_kind, input_value_masked, decision, reason, unlock, unlock_ms, meta, event_nonce_hash, created_at
-            )
-            VALUES (
-                :sid, :did, :etype, :uid, :ct, :chint,
-                :ik, :ivm, :dec, :reason, :unlock, :ums, CAST(:meta AS JSONB), :nh, NOW()
-            )
-            """
-        ),
+    statement_registry.execute(
+        db,
+        _INSERT_EVENT,
         {
             "sid": sucursal_id,
             "did": int(device_id),
@@ -426,15 +493,8 @@ def _deny_if_rate_limited(db: Session, device_id: int, cfg: Dict[str, Any]) -> O
         window_seconds = 60
     window_seconds = max(5, min(window_seconds, 300))
     try:
-        c = db.execute(
-            text(
-                """
-                SELECT COUNT(*)
-                FROM access_events
-                WHERE device_id = :did AND created_at >= (NOW() - (:win || ' seconds')::interval)
-                """
-            ),
-            {"did": int(device_id), "win": int(window_seconds)},
+        c = statement_registry.execute(
+            db, _EVENTS_SINCE_COUNT, {"did": int(device_id), "win": int(window_seconds)}
         ).scalar()
         if c is not None and int(c) >= int(max_per_min):
             return "Rate limit"
@@ -452,20 +512,15 @@ def _deny_if_anti_passback(db: Session, usuario_id: int, sid: Optional[int], cfg
         return None
     apb = max(5, min(apb, 24 * 3600))
     try:
-        row = db.execute(
-            text(
-                """
-                SELECT created_at
-                FROM access_events
-                WHERE subject_usuario_id = :uid
-                  AND decision = 'allow'
-                  AND unlock = TRUE
-                  AND (:sid IS NULL OR sucursal_id = :sid)
-                ORDER BY created_at DESC
-                LIMIT 1
-                """
-            ),
-            {"uid": int(usuario_id), "sid": int(sid) if sid is not None else None},
+        row = statement_registry.execute(
+            db,
+            _LAST_UNLOCK if sid is None else _LAST_UNLOCK_SUCURSAL,
+            {
+                "uid": int(usuario_id),
+                "sid": int(sid) if sid is not None else None,
+                # Only the window matters; the bound also prunes monthly partitions
+                "since": datetime.utcnow() - timedelta(seconds=apb),
+            },
         ).fetchone()
         if not row or not row[0]:
             return None
@@ -493,26 +548,15 @@ def _require_device(request: Request, db: Session) -> Dict[str, Any]:
         raise HTTPException(status_code=401, detail="Device no autenticado")
     if len(device_public_id) > 200 or len(token) > 512:
         raise HTTPException(status_code=401, detail="Device inválido")
-    row = db.execute(
-        text(
-            """
-            SELECT id, sucursal_id, enabled, token_hash, config
-            FROM access_devices
-            WHERE device_public_id = :pid
-            LIMIT 1
-            """
-        ),
-        {"pid": device_public_id},
+    row = statement_registry.execute(
+        db, _DEVICE_BY_PUBLIC_ID, {"pid": device_public_id}
     ).mappings().first()
     if not row or not row.get("enabled"):
         raise HTTPException(status_code=401, detail="Device inválido")
     if not secrets.compare_digest(str(row.get("token_hash") or ""), _sha256(token)):
         raise HTTPException(status_code=401, detail="Device inválido")
     try:
-        db.execute(
-            text("UPDATE access_devices SET last_seen_at = NOW(), updated_at = NOW() WHERE id = :id"),
-            {"id": int(row["id"])},
-        )
+        statement_registry.execute(db, _DEVICE_TOUCH, {"id": int(row["id"])})
         db.commit()
     except Exception:
         try:
@@ -1376,17 +1420,8 @@ async def api_access_event(request: Request, db: Session = Depends(get_db_sessio
         raise HTTPException(status_code=400, detail="X-Event-Nonce requerido")
     event_nonce_hash = _sha256(event_nonce) if event_nonce else None
     if event_nonce_hash:
-        prev = db.execute(
-            text(
-                """
-                SELECT decision, reason, unlock, unlock_ms
-                FROM access_events
-                WHERE device_id = :did AND event_nonce_hash = :nh
-                ORDER BY id DESC
-                LIMIT 1
-                """
-            ),
-            {"did": int(device["id"]), "nh": str(event_nonce_hash)},
+        prev = statement_registry.execute(
+            db, _EVENT_BY_NONCE, {"did": int(device["id"]), "nh": str(event_nonce_hash)}
         ).mappings().first()
         if prev:
             return {
@@ -1646,7 +1681,7 @@ async def api_access_event(request: Request, db: Session = Depends(get_db_sessio
                 reason = "DNI inválido"
             else:
                 try:
-                    row = db.execute(text("SELECT id FROM usuarios WHERE dni = :dni LIMIT 1"), {"dni": dni}).fetchone()
+                    row = statement_registry.execute(db, _USUARIO_BY_DNI, {"dni": dni}).fetchone()
                     uid = int(row[0]) if row and row[0] is not None else None
                     if not uid:
                         decision = "deny"
@@ -1697,7 +1732,7 @@ async def api_access_event(request: Request, db: Session = Depends(get_db_sessio
             reason = "PIN inválido"
         else:
             try:
-                row = db.execute(text("SELECT id FROM usuarios WHERE dni = :dni LIMIT 1"), {"dni": dni}).fetchone()
+                row = statement_registry.execute(db, _USUARIO_BY_DNI, {"dni": dni}).fetchone()
                 uid = int(row[0]) if row and row[0] is not None else None
                 if not uid:
                     decision = "deny"
@@ -1709,7 +1744,7 @@ async def api_access_event(request: Request, db: Session = Depends(get_db_sessio
                         decision = "deny"
                         reason = apb_reason
                     else:
-                        ok, msg, asistencia_id, created = attendance_service.registrar_asistencia_por_dni_y_pin(
+                        ok, msg, asistencia_id, created = await attendance_service.aregistrar_asistencia_por_dni_y_pin(
                             dni, pin, sid, commit=False, tipo="access_agent"
                         )
                         decision = "allow" if ok else "deny"
@@ -1824,17 +1859,7 @@ async def api_access_event(request: Request, db: Session = Depends(get_db_sessio
             reason = "Credencial inválida"
         else:
             ch = _sha256(f"{credential_type}:{norm}")
-            row = db.execute(
-                text(
-                    """
-                    SELECT usuario_id
-                    FROM access_credentials
-                    WHERE credential_hash = :ch AND active = TRUE
-                    LIMIT 1
-                    """
-                ),
-                {"ch": ch},
-            ).mappings().first()
+            row = statement_registry.execute(db, _CREDENTIAL_OWNER, {"ch": ch}).mappings().first()
             if not row:
                 decision = "deny"
                 reason = "Credencial no registrada"
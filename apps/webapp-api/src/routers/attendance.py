@@ -295,7 +295,7 @@ async def api_checkin_by_dni(
 
         # Check-in with or without PIN verification
         if require_pin:
-            ok, msg, asistencia_id, created = svc.registrar_asistencia_por_dni_y_pin(
+            ok, msg, asistencia_id, created = await svc.aregistrar_asistencia_por_dni_y_pin(
                 dni, pin, request.session.get("sucursal_id"), tipo="dni_pin"
             )
         else:
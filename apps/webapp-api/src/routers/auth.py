@@ -166,7 +166,7 @@ async def public_login_post(
     if not password:
         return error_response("Contraseña requerida")
 
-    if svc.verificar_owner_password(password):
+    if await svc.averificar_owner_password(password):
         request.session.clear()
         set_session_claims(
             request.session,
@@ -265,7 +265,7 @@ async def usuario_login_post(
         return error_response("Usuario inactivo")
 
     if pin:
-        pin_result = svc.verificar_pin(user.id, pin)
+        pin_result = await svc.averificar_pin(user.id, pin)
         if not pin_result["valid"]:
             return error_response("PIN inválido")
     elif require_pin:
@@ -436,7 +436,7 @@ async def gestion_auth(
     if isinstance(usuario_id_raw, str) and usuario_id_raw == "__OWNER__":
         if not owner_password:
             return error_response("Ingrese la contraseña")
-        if svc.verificar_owner_password(owner_password):
+        if await svc.averificar_owner_password(owner_password):
             request.session.clear()
             set_session_claims(
                 request.session,
@@ -498,7 +498,7 @@ async def gestion_auth(
         return error_response("Parámetros inválidos")
 
     # Verify PIN using AuthService
-    pin_result = svc.verificar_pin(usuario_id, pin)
+    pin_result = await svc.averificar_pin(usuario_id, pin)
     if not pin_result["valid"]:
         return error_response("PIN inválido")
 
@@ -704,7 +704,7 @@ async def api_auth_login(
 
     # If no DNI, try owner login with just password
     if not dni and password:
-        if svc.verificar_owner_password(password):
+        if await svc.averificar_owner_password(password):
             request.session.clear()
             set_session_claims(
                 request.session,
@@ -751,7 +751,7 @@ async def api_auth_login(
         )
 
     # Verify PIN using AuthService
-    pin_result = svc.verificar_pin(user.id, password)
+    pin_result = await svc.averificar_pin(user.id, password)
     if not pin_result["valid"]:
         return JSONResponse(
             {"ok": False, "error": "Credenciales inválidas"}, status_code=401
@@ -982,7 +982,7 @@ async def api_usuario_change_pin(
         )
 
     # Verify old PIN using AuthService
-    pin_result = svc.verificar_pin(user.id, old_pin)
+    pin_result = await svc.averificar_pin(user.id, old_pin)
     if not pin_result["valid"]:
         return JSONResponse(
             {"ok": False, "error": "PIN antiguo inválido"}, status_code=400
@@ -1094,7 +1094,7 @@ async def api_usuario_login(
 
     # Verify PIN
     if pin:
-        pin_result = svc.verificar_pin(user.id, pin)
+        pin_result = await svc.averificar_pin(user.id, pin)
         if not pin_result["valid"]:
             return JSONResponse(
                 {
@@ -1261,7 +1261,7 @@ async def api_checkin_auth(
         result = {"valid": False, "error": "Usuario inactivo", "activo": False}
     else:
         if require_pin:
-            pin_result = svc.verificar_pin(user.id, pin)
+            pin_result = await svc.averificar_pin(user.id, pin)
             if not pin_result.get("valid"):
                 result = {"valid": False, "error": "PIN incorrecto", "activo": True}
             else:
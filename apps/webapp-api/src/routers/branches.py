@@ -11,6 +11,7 @@ from sqlalchemy.orm import Session
 from src.dependencies import get_db_session, require_owner
 from src.security.session_claims import get_claims
 from src.database.connection import AdminSessionLocal
+from src.services import bootstrap_cache
 from src.services.branch_access_service import BranchAccessService
 
 logger = logging.getLogger(__name__)
@@ -186,6 +187,7 @@ async def api_create_sucursal(
             .first()
         )
         db.commit()
+        bootstrap_cache.invalidate()
         new_id = int(row["id"]) if row and row.get("id") is not None else None
         if not new_id:
             return JSONResponse({"ok": False, "error": "create_failed"}, status_code=500)
@@ -275,6 +277,7 @@ async def api_update_sucursal(
                 pass
 
         db.commit()
+        bootstrap_cache.invalidate()
         try:
             claims = get_claims(request)
             tenant = str(claims.get("tenant") or "").strip().lower()
@@ -472,6 +475,7 @@ async def api_delete_sucursal(
         except Exception:
             pass
         db.commit()
+        bootstrap_cache.invalidate()
         try:
             if int(request.session.get("sucursal_id") or 0) == int(sucursal_id):
                 request.session.pop("sucursal_id", None)
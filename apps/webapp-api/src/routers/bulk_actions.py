@@ -3,19 +3,20 @@ from __future__ import annotations
 import csv
 import io
 import json
+import os
 import threading
-from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, BinaryIO, Dict, List, Optional, Set, Tuple
 
 from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Request, UploadFile
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from openpyxl import Workbook, load_workbook
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from src.database import get_tenant_session_factory
 from src.dependencies import get_db_session, get_claims, require_feature, require_owner
-from src.services.user_service import UserService
+from src.services.bulk_import_service import BulkUserImportService
 
 router = APIRouter(
     dependencies=[
@@ -52,9 +53,15 @@ def _digits(v: Any) -> str:
     return "".join(ch for ch in s if ch.isdigit())
 
 
-def _iter_csv_rows(content: bytes):
-    text_content = content.decode("utf-8-sig", errors="replace")
-    reader = csv.reader(io.StringIO(text_content))
+BULK_IMPORT_MAX_BYTES = int(os.environ.get("BULK_IMPORT_MAX_BYTES", str(50 * 1024 * 1024)))
+BULK_IMPORT_MAX_ROWS = int(os.environ.get("BULK_IMPORT_MAX_ROWS", "200000"))
+BULK_IMPORT_COPY_CHUNK = int(os.environ.get("BULK_IMPORT_COPY_CHUNK", "2000"))
+
+
+def _iter_csv_rows(source: BinaryIO):
+    """Stream CSV rows from a binary file object without loading it whole."""
+    stream = io.TextIOWrapper(source, encoding="utf-8-sig", errors="replace", newline="")
+    reader = csv.reader(stream)
     it = iter(reader)
     try:
         header_row = next(it)
@@ -64,8 +71,8 @@ def _iter_csv_rows(content: bytes):
     return (headers, it)
 
 
-def _iter_xlsx_rows(content: bytes):
-    wb = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+def _iter_xlsx_rows(source: BinaryIO):
+    wb = load_workbook(source, read_only=True, data_only=True)
     ws = wb.active
     rows_iter = ws.iter_rows(values_only=True)
     try:
@@ -141,6 +148,64 @@ def _validate_usuario_row(
     return (out, errors, warnings)
 
 
+def _validate_usuario_rows(
+    raws: List[Dict[str, Any]],
+    *,
+    tipo_cuota_map: Dict[str, int],
+    seen_dnis: Optional[Set[str]] = None,
+) -> List[Tuple[Dict[str, Any], List[str], List[str]]]:
+    """Validate a chunk of rows, flagging DNIs already seen in the file.
+
+    Pass the same `seen_dnis` set for every chunk of one import so repeats
+    across chunks are caught too.
+    """
+    results = [_validate_usuario_row(raw, tipo_cuota_map=tipo_cuota_map) for raw in raws]
+    seen = seen_dnis if seen_dnis is not None else set()
+    for out, _errs, warns in results:
+        dni = out.get("dni")
+        if not dni:
+            continue
+        if dni in seen:
+            warns.append("dni repetido en el archivo")
+        seen.add(dni)
+    return results
+
+
+def _copy_rows(db: Session, params: List[Dict[str, Any]]) -> None:
+    """Load bulk_job_rows with COPY; falls back to a multi-row INSERT."""
+    if not params:
+        return
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for p in params:
+        writer.writerow(
+            [p["job_id"], p["row_index"], p["data"], p["errors"], p["warnings"], "t" if p["is_valid"] else "f"]
+        )
+    buf.seek(0)
+    try:
+        raw_conn = db.connection().connection
+        cur = raw_conn.cursor()
+        try:
+            cur.copy_expert(
+                "COPY bulk_job_rows(job_id, row_index, data, errors, warnings, is_valid) FROM STDIN WITH (FORMAT csv)",
+                buf,
+            )
+        finally:
+            cur.close()
+        return
+    except AttributeError:
+        pass
+    db.execute(
+        text(
+            """
+            INSERT INTO bulk_job_rows(job_id, row_index, data, errors, warnings, is_valid)
+            VALUES (:job_id, :row_index, CAST(:data AS JSONB), CAST(:errors AS JSONB), CAST(:warnings AS JSONB), :is_valid)
+            """
+        ),
+        params,
+    )
+
+
 def _insert_job(
     db: Session,
     *,
@@ -194,15 +259,7 @@ def _save_rows(
                 "is_valid": bool(len(errs) == 0),
             }
         )
-    db.execute(
-        text(
-            """
-            INSERT INTO bulk_job_rows(job_id, row_index, data, errors, warnings, is_valid)
-            VALUES (:job_id, :row_index, CAST(:data AS JSONB), CAST(:errors AS JSONB), CAST(:warnings AS JSONB), :is_valid)
-            """
-        ),
-        params,
-    )
+    _copy_rows(db, params)
     valid = sum(1 for e, _w in validations if len(e) == 0)
     invalid = len(rows) - valid
     db.execute(
@@ -259,99 +316,20 @@ def _run_job_background(*, tenant: str, job_id: int) -> None:
         db.execute(text("UPDATE bulk_jobs SET status = 'running', updated_at = NOW() WHERE id = :id"), {"id": int(job_id)})
         db.commit()
 
-        svc = UserService(db)
-        rows = db.execute(
-            text(
-                """
-                SELECT row_index, data
-                FROM bulk_job_rows
-                WHERE job_id = :id AND is_valid = true
-                ORDER BY row_index ASC
-                """
-            ),
-            {"id": int(job_id)},
-        ).fetchall()
-
-        applied = 0
-        failed = 0
-        for row_index, data in rows:
-            try:
-                if (applied + failed) % 50 == 0:
-                    st = db.execute(
-                        text("SELECT status FROM bulk_jobs WHERE id = :id"),
-                        {"id": int(job_id)},
-                    ).scalar()
-                    if str(st or "") == "cancelled":
-                        db.execute(
-                            text(
-                                "UPDATE bulk_jobs SET status = 'cancelled', updated_at = NOW() WHERE id = :id"
-                            ),
-                            {"id": int(job_id)},
-                        )
-                        db.commit()
-                        return
-            except Exception:
-                pass
-            try:
-                dni = str((data or {}).get("dni") or "").strip()
-                tel = str((data or {}).get("telefono") or "").strip()
-
-                existing = None
-                if dni:
-                    existing = svc.get_user_by_dni(dni)
-                if (existing is None) and tel:
-                    try:
-                        existing = svc.user_repo.obtener_usuario_por_telefono(tel)
-                    except Exception:
-                        existing = None
-
-                if existing is None:
-                    payload = dict(data or {})
-                    payload["rol"] = "socio"
-                    payload["fecha_registro"] = datetime.now(timezone.utc).replace(tzinfo=None)
-                    svc.create_user(payload, is_owner=True)
-                else:
-                    uid = int(getattr(existing, "id"))
-                    payload = dict(data or {})
-                    payload.pop("dni", None)
-                    svc.update_user(uid, payload, modifier_id=None, is_owner=True)
-
-                applied += 1
-                db.execute(
-                    text(
-                        """
-                        UPDATE bulk_job_rows
-                        SET applied = true, applied_at = NOW(), result = CAST(:res AS JSONB)
-                        WHERE job_id = :jid AND row_index = :idx
-                        """
-                    ),
-                    {"jid": int(job_id), "idx": int(row_index), "res": json.dumps({"ok": True}, ensure_ascii=False)},
-                )
-            except Exception as e:
-                failed += 1
-                db.execute(
-                    text(
-                        """
-                        UPDATE bulk_job_rows
-                        SET applied = false, result = CAST(:res AS JSONB)
-                        WHERE job_id = :jid AND row_index = :idx
-                        """
-                    ),
-                    {"jid": int(job_id), "idx": int(row_index), "res": json.dumps({"ok": False, "error": str(e)}, ensure_ascii=False)},
-                )
-
-            if (applied + failed) % 50 == 0:
-                db.execute(
-                    text(
-                        "UPDATE bulk_jobs SET applied_count = :a, error_count = :e, updated_at = NOW() WHERE id = :id"
-                    ),
-                    {"id": int(job_id), "a": int(applied), "e": int(failed)},
-                )
-                db.commit()
+        outcome = BulkUserImportService(db).apply_job(int(job_id))
+        if outcome.get("cancelled"):
+            db.execute(
+                text(
+                    "UPDATE bulk_jobs SET status = 'cancelled', applied_count = :a, error_count = :e, updated_at = NOW() WHERE id = :id"
+                ),
+                {"id": int(job_id), "a": int(outcome["applied"]), "e": int(outcome["failed"])},
+            )
+            db.commit()
+            return
 
         db.execute(
             text("UPDATE bulk_jobs SET applied_count = :a, error_count = :e, status = 'completed', updated_at = NOW() WHERE id = :id"),
-            {"id": int(job_id), "a": int(applied), "e": int(failed)},
+            {"id": int(job_id), "a": int(outcome["applied"]), "e": int(outcome["failed"])},
         )
         db.commit()
     except Exception as e:
@@ -433,130 +411,124 @@ async def api_bulk_preview(
     if k not in SUPPORTED_KINDS:
         raise HTTPException(status_code=404, detail="Tipo no soportado")
 
-    content = await file.read()
-    if not content:
+    source = file.file
+    try:
+        source.seek(0, os.SEEK_END)
+        size_bytes = int(source.tell())
+        source.seek(0)
+    except Exception:
+        size_bytes = None
+    if not size_bytes:
         raise HTTPException(status_code=400, detail="Archivo vacío")
-    if len(content) > 10 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="Archivo demasiado grande (max 10MB)")
-
-    name = str(file.filename or "").lower()
-    if name.endswith(".xlsx"):
-        headers, rows_iter = _iter_xlsx_rows(content)
-    else:
-        headers, rows_iter = _iter_csv_rows(content)
-
-    if not headers:
-        raise HTTPException(status_code=400, detail="No se detectaron columnas")
-
-    alias = {
-        "documento": "dni",
-        "doc": "dni",
-        "tel": "telefono",
-        "celular": "telefono",
-        "plan": "tipo_cuota",
-        "tipo_cuota_nombre": "tipo_cuota",
-    }
-    cols = [_normalize_header(h) for h in headers]
-    cols = [alias.get(c, c) for c in cols]
+    if size_bytes > BULK_IMPORT_MAX_BYTES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Archivo demasiado grande (max {BULK_IMPORT_MAX_BYTES // (1024 * 1024)}MB)",
+        )
 
     tipo_cuota_map = _resolve_tipo_cuota_map(db)
+    name = str(file.filename or "").lower()
 
-    job_id = _insert_job(
-        db,
-        kind=k,
-        request=request,
-        filename=file.filename,
-        mime=file.content_type,
-        size_bytes=len(content),
-    )
-
-    max_rows = 20000
-    batch_size = 250
-
-    total = 0
-    valid = 0
-    invalid = 0
-    preview_rows: List[Dict[str, Any]] = []
-
-    batch_params: List[Dict[str, Any]] = []
-    row_index = 0
-    for r in rows_iter:
-        if r is None:
-            continue
-        try:
-            row_vals = list(r)
-        except Exception:
-            row_vals = []
-        raw = {cols[i]: (row_vals[i] if i < len(row_vals) else None) for i in range(len(cols))}
-        if all((raw.get(c) in (None, "", 0) for c in cols)):
-            continue
-
-        if k == KIND_USUARIOS_IMPORT:
-            out, errs, warns = _validate_usuario_row(raw, tipo_cuota_map=tipo_cuota_map)
-        else:
-            out, errs, warns = ({}, ["tipo no soportado"], [])
-
-        is_valid = bool(len(errs) == 0)
-        total += 1
-        if is_valid:
-            valid += 1
+    def _ingest() -> Tuple[int, List[Dict[str, Any]]]:
+        if name.endswith(".xlsx"):
+            headers, rows_iter = _iter_xlsx_rows(source)
         else:
-            invalid += 1
-
-        if len(preview_rows) < 200:
-            preview_rows.append({"row_index": int(row_index), "data": out, "errors": errs, "warnings": warns})
-
-        batch_params.append(
-            {
-                "job_id": int(job_id),
-                "row_index": int(row_index),
-                "data": json.dumps(out or {}, ensure_ascii=False),
-                "errors": json.dumps(errs or [], ensure_ascii=False),
-                "warnings": json.dumps(warns or [], ensure_ascii=False),
-                "is_valid": bool(is_valid),
-            }
+            headers, rows_iter = _iter_csv_rows(source)
+
+        if not headers:
+            raise HTTPException(status_code=400, detail="No se detectaron columnas")
+
+        alias = {
+            "documento": "dni",
+            "doc": "dni",
+            "tel": "telefono",
+            "celular": "telefono",
+            "plan": "tipo_cuota",
+            "tipo_cuota_nombre": "tipo_cuota",
+        }
+        cols = [_normalize_header(h) for h in headers]
+        cols = [alias.get(c, c) for c in cols]
+        ncols = len(cols)
+
+        job_id = _insert_job(
+            db,
+            kind=k,
+            request=request,
+            filename=file.filename,
+            mime=file.content_type,
+            size_bytes=size_bytes,
         )
 
-        row_index += 1
-        if len(batch_params) >= batch_size:
-            db.execute(
-                text(
-                    """
-                    INSERT INTO bulk_job_rows(job_id, row_index, data, errors, warnings, is_valid)
-                    VALUES (:job_id, :row_index, CAST(:data AS JSONB), CAST(:errors AS JSONB), CAST(:warnings AS JSONB), :is_valid)
-                    """
-                ),
-                batch_params,
-            )
+        total = 0
+        valid = 0
+        preview_rows: List[Dict[str, Any]] = []
+        chunk: List[Dict[str, Any]] = []
+        seen_dnis: Set[str] = set()
+
+        def _flush(raws: List[Dict[str, Any]], first_index: int) -> int:
+            if k == KIND_USUARIOS_IMPORT:
+                results = _validate_usuario_rows(
+                    raws, tipo_cuota_map=tipo_cuota_map, seen_dnis=seen_dnis
+                )
+            else:
+                results = [({}, ["tipo no soportado"], []) for _ in raws]
+            params: List[Dict[str, Any]] = []
+            ok = 0
+            for offset, (out, errs, warns) in enumerate(results):
+                idx = first_index + offset
+                is_valid = not errs
+                ok += 1 if is_valid else 0
+                if len(preview_rows) < 200:
+                    preview_rows.append({"row_index": int(idx), "data": out, "errors": errs, "warnings": warns})
+                params.append(
+                    {
+                        "job_id": int(job_id),
+                        "row_index": int(idx),
+                        "data": json.dumps(out or {}, ensure_ascii=False),
+                        "errors": json.dumps(errs or [], ensure_ascii=False),
+                        "warnings": json.dumps(warns or [], ensure_ascii=False),
+                        "is_valid": bool(is_valid),
+                    }
+                )
+            _copy_rows(db, params)
             db.commit()
-            batch_params = []
+            return ok
 
-        if total >= max_rows:
-            break
+        for r in rows_iter:
+            if r is None:
+                continue
+            try:
+                row_vals = list(r)
+            except Exception:
+                row_vals = []
+            nvals = len(row_vals)
+            raw = {cols[i]: (row_vals[i] if i < nvals else None) for i in range(ncols)}
+            if all((v in (None, "", 0) for v in raw.values())):
+                continue
+            chunk.append(raw)
+            total += 1
+            if len(chunk) >= BULK_IMPORT_COPY_CHUNK:
+                valid += _flush(chunk, total - len(chunk))
+                chunk = []
+            if total >= BULK_IMPORT_MAX_ROWS:
+                break
+        if chunk:
+            valid += _flush(chunk, total - len(chunk))
 
-    if batch_params:
         db.execute(
             text(
                 """
-                INSERT INTO bulk_job_rows(job_id, row_index, data, errors, warnings, is_valid)
-                VALUES (:job_id, :row_index, CAST(:data AS JSONB), CAST(:errors AS JSONB), CAST(:warnings AS JSONB), :is_valid)
+                UPDATE bulk_jobs
+                SET rows_total = :total, rows_valid = :valid, rows_invalid = :invalid, updated_at = NOW()
+                WHERE id = :id
                 """
             ),
-            batch_params,
+            {"id": int(job_id), "total": int(total), "valid": int(valid), "invalid": int(total - valid)},
         )
         db.commit()
+        return job_id, preview_rows
 
-    db.execute(
-        text(
-            """
-            UPDATE bulk_jobs
-            SET rows_total = :total, rows_valid = :valid, rows_invalid = :invalid, updated_at = NOW()
-            WHERE id = :id
-            """
-        ),
-        {"id": int(job_id), "total": int(total), "valid": int(valid), "invalid": int(invalid)},
-    )
-    db.commit()
+    job_id, preview_rows = await run_in_threadpool(_ingest)
 
     return {
         "ok": True,
@@ -7,13 +7,17 @@ from fastapi.responses import JSONResponse
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
-from src.database.entitlements_schema import ensure_entitlements_schema
+from src.database.entitlements_schema import has_entitlements_schema
 from src.dependencies import get_db_session, require_owner
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+def _schema_missing() -> JSONResponse:
+    return JSONResponse({"ok": False, "error": "entitlements_schema_missing"}, status_code=503)
+
+
 def _parse_dt(v: Any) -> Optional[datetime]:
     if v is None:
         return None
@@ -30,7 +34,8 @@ async def api_tipo_cuota_entitlements_get(
     db: Session = Depends(get_db_session),
 ):
     try:
-        ensure_entitlements_schema(db)
+        if not has_entitlements_schema(db):
+            return _schema_missing()
         tc = (
             db.execute(
                 text(
@@ -110,7 +115,8 @@ async def api_tipo_cuota_entitlements_put(
     db: Session = Depends(get_db_session),
 ):
     try:
-        ensure_entitlements_schema(db)
+        if not has_entitlements_schema(db):
+            return _schema_missing()
         try:
             payload = await request.json()
         except Exception:
@@ -214,7 +220,8 @@ async def api_usuario_entitlements_get(
     db: Session = Depends(get_db_session),
 ):
     try:
-        ensure_entitlements_schema(db)
+        if not has_entitlements_schema(db):
+            return _schema_missing()
         rows = (
             db.execute(
                 text(
@@ -295,7 +302,8 @@ async def api_usuario_entitlements_put(
     db: Session = Depends(get_db_session),
 ):
     try:
-        ensure_entitlements_schema(db)
+        if not has_entitlements_schema(db):
+            return _schema_missing()
         try:
             payload = await request.json()
         except Exception:
@@ -404,7 +412,8 @@ async def api_entitlements_backfill(
     db: Session = Depends(get_db_session),
 ):
     try:
-        ensure_entitlements_schema(db)
+        if not has_entitlements_schema(db):
+            return _schema_missing()
         try:
             payload = await request.json()
         except Exception:
@@ -15,7 +15,7 @@ from src.dependencies import (
     require_scope_gestion,
 )
 from src.services.training_service import TrainingService
-from src.services.b2_storage import simple_upload as b2_upload, get_file_url
+from src.services.b2_storage import fileobj_size, get_file_url, simple_upload_stream
 from src.utils import _get_tenant_from_request
 
 router = APIRouter(
@@ -56,8 +56,8 @@ async def api_upload_exercise_video(
                 status_code=400,
             )
 
-        data = await file.read()
-        if not data:
+        size = fileobj_size(file.file)
+        if not size:
             msg = "Archivo vacío"
             return JSONResponse(
                 {
@@ -73,7 +73,7 @@ async def api_upload_exercise_video(
         max_bytes = int(
             os.environ.get("MAX_EXERCISE_VIDEO_BYTES", str(50 * 1024 * 1024))
         )
-        if len(data) > max_bytes:
+        if size > max_bytes:
             msg = "El video es demasiado grande"
             return JSONResponse(
                 {
@@ -107,7 +107,9 @@ async def api_upload_exercise_video(
             else:
                 filename = f"ejercicio_{int(time.time())}{ext}"
 
-        public_url = b2_upload(data, filename, ctype, subfolder=f"exercises/{tenant}")
+        public_url = await simple_upload_stream(
+            file.file, filename, ctype, subfolder=f"exercises/{tenant}", max_bytes=max_bytes
+        )
         if not public_url:
             msg = "Error subiendo el video"
             return JSONResponse(
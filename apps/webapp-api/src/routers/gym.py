@@ -9,7 +9,8 @@ import unicodedata
 import zlib
 import uuid
 import threading
-import urllib.request
+import io
+import zipfile
 from pathlib import Path
 from typing import Optional, List, Dict, Any
 from datetime import datetime
@@ -23,7 +24,7 @@ from fastapi import (
     File,
     Response,
 )
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import FileResponse, JSONResponse, HTMLResponse
 from pydantic import BaseModel
 from sqlalchemy import text
 from sqlalchemy.orm import Session
@@ -66,9 +67,17 @@ from src.utils import (
 from src.services.gym_config_service import GymConfigService
 from src.services.clase_service import ClaseService
 from src.services.training_service import TrainingService
-from src.services.b2_storage import simple_upload as b2_upload
+from src.services.b2_storage import fileobj_size, simple_upload_stream
+from src.services.branding_assets import logo_data_uri
+from src.services.qr_code_manager import QR_RENDER_MODE
 from src.services.feature_flags_service import FeatureFlagsService
-from src.services.pdf_engine import PDFEngine
+from src.services.pdf_render_service import RenderQueueFull, get_pdf_render_service
+from src.services.pdf_artifact_cache import (
+    compute_digest,
+    etag_for,
+    etag_matches,
+    get_artifact_cache,
+)
 from src.services.template_validator import TemplateValidator
 from src.rate_limit import (
     is_export_rate_limited,
@@ -114,52 +123,6 @@ _MAX_PREVIEW_DECOMPRESSED_BYTES = int(
 _PREVIEW_SECRET_CACHE: Optional[str] = None
 
 
-def _logo_to_data_uri(logo_url: str) -> str:
-    if not logo_url:
-        return ""
-    if logo_url.startswith("data:image/"):
-        return logo_url
-    max_bytes = int(os.environ.get("PDF_MAX_IMAGE_BYTES", "600000"))
-    if logo_url.startswith("/assets/") or not logo_url.startswith("http"):
-        rel = logo_url[len("/assets/") :] if logo_url.startswith("/assets/") else logo_url
-        rel = rel.lstrip("/")
-        assets_root = (Path(__file__).resolve().parents[1] / "assets").resolve()
-        candidate = (assets_root / rel).resolve()
-        if assets_root not in candidate.parents and candidate != assets_root:
-            return ""
-        if not candidate.exists() or not candidate.is_file():
-            return ""
-        if candidate.suffix.lower() == ".svg":
-            return ""
-        raw = candidate.read_bytes()
-        if len(raw) > max_bytes:
-            return ""
-        ext = candidate.suffix.lower()
-        if ext == ".png":
-            ctype = "image/png"
-        elif ext in (".jpg", ".jpeg"):
-            ctype = "image/jpeg"
-        elif ext == ".gif":
-            ctype = "image/gif"
-        else:
-            return ""
-        return f"data:{ctype};base64,{base64.b64encode(raw).decode()}"
-    try:
-        req = urllib.request.Request(logo_url, headers={"User-Agent": "IronHub"})
-        with urllib.request.urlopen(req, timeout=3) as resp:
-            ctype = (resp.headers.get("content-type") or "").split(";")[0].strip().lower()
-            if ctype not in ("image/png", "image/jpeg", "image/jpg", "image/gif"):
-                return ""
-            raw = resp.read(max_bytes + 1)
-            if len(raw) > max_bytes:
-                return ""
-            if ctype == "image/jpg":
-                ctype = "image/jpeg"
-            return f"data:{ctype};base64,{base64.b64encode(raw).decode()}"
-    except Exception:
-        return ""
-
-
 def _cleanup_file(path: str) -> None:
     try:
         if path and os.path.exists(path):
@@ -235,7 +198,7 @@ def _build_rutina_pdf_data(
     out["fecha"] = datetime.now().strftime("%d/%m/%Y")
     out["current_year"] = datetime.now().strftime("%Y")
     try:
-        out["gym_logo_base64"] = _logo_to_data_uri(_resolve_logo_url())
+        out["gym_logo_base64"] = logo_data_uri(_resolve_logo_url())
     except Exception:
         out["gym_logo_base64"] = ""
     return out
@@ -785,8 +748,8 @@ async def api_gym_logo(
                 status_code=400,
             )
 
-        data = await file.read()
-        if not data:
+        size = fileobj_size(file.file)
+        if not size:
             return JSONResponse(
                 {"ok": False, "error": "Archivo vacío"}, status_code=400
             )
@@ -806,7 +769,9 @@ async def api_gym_logo(
                 ext = ".jpg"
 
             filename = f"gym_logo_{int(time.time())}{ext}"
-            uploaded_url = b2_upload(data, filename, ctype, subfolder=f"logos/{tenant}")
+            uploaded_url = await simple_upload_stream(
+                file.file, filename, ctype, subfolder=f"logos/{tenant}"
+            )
             if uploaded_url:
                 public_url = uploaded_url
         except Exception as e:
@@ -1541,13 +1506,13 @@ async def api_gym_logo_legacy(
                 status_code=400,
             )
 
-        content = await file.read()
-        if not content:
+        size = fileobj_size(file.file)
+        if not size:
             return JSONResponse(
                 {"ok": False, "error": "Archivo vacío"}, status_code=400
             )
         max_bytes = int(os.environ.get("MAX_LOGO_BYTES", "5000000"))
-        if len(content) > max_bytes:
+        if size > max_bytes:
             return JSONResponse(
                 {"ok": False, "error": "Logo demasiado grande"}, status_code=400
             )
@@ -1564,7 +1529,9 @@ async def api_gym_logo_legacy(
         if not tenant:
             tenant = "common"
 
-        uploaded_url = b2_upload(content, filename, ctype, subfolder=f"logos/{tenant}")
+        uploaded_url = await simple_upload_stream(
+            file.file, filename, ctype, subfolder=f"logos/{tenant}", max_bytes=max_bytes
+        )
         if not uploaded_url:
             return JSONResponse(
                 {"ok": False, "error": "Error subiendo logo"}, status_code=500
@@ -2481,22 +2448,6 @@ async def api_rutina_export_pdf(
     t0 = time.time()
     template_used_id: Optional[int] = None
     try:
-        try:
-            uid = request.session.get("user_id")
-            uid = int(uid) if uid is not None else None
-        except Exception:
-            uid = None
-        if is_export_rate_limited(request, user_id=uid):
-            status = get_export_rate_limit_status(request, user_id=uid)
-            raise HTTPException(
-                status_code=429,
-                detail="Demasiadas exportaciones",
-                headers={
-                    "Retry-After": str(status.get("export_window", 300)),
-                    "X-RateLimit-Limit": str(status.get("export_limit", 10)),
-                    "X-RateLimit-Remaining": "0",
-                },
-            )
         rutina_data = svc.obtener_rutina_completa(rutina_id)
         if not rutina_data:
             raise HTTPException(status_code=404, detail="Rutina no encontrada")
@@ -2531,8 +2482,58 @@ async def api_rutina_export_pdf(
                 effective_template_id = None
         template_config, template_used_id = _select_template_config_for_rutina(db, template_id=effective_template_id, qr_mode=qr_mode)
 
-        engine = PDFEngine()
-        pdf_bytes = engine.generate_pdf(template_config=template_config, data=data, output_path=None)
+        tenant_name = get_current_tenant()
+        artifacts = get_artifact_cache()
+        digest = compute_digest(
+            "rutina",
+            template_id=template_used_id,
+            template=template_config,
+            data=data,
+            qr_render=QR_RENDER_MODE,
+        )
+        etag = etag_for(digest)
+        headers = {
+            "Content-Disposition": f'attachment; filename="{pdf_filename}"',
+            "ETag": etag,
+            "Cache-Control": "private, no-cache",
+        }
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={k: v for k, v in headers.items() if k != "Content-Disposition"})
+        if artifacts is not None:
+            cached_path = await artifacts.aget(tenant_name, "rutina", rutina_id, digest)
+            if cached_path:
+                return FileResponse(cached_path, media_type="application/pdf", headers=headers)
+
+        try:
+            uid = request.session.get("user_id")
+            uid = int(uid) if uid is not None else None
+        except Exception:
+            uid = None
+        if is_export_rate_limited(request, user_id=uid):
+            status = get_export_rate_limit_status(request, user_id=uid)
+            raise HTTPException(
+                status_code=429,
+                detail="Demasiadas exportaciones",
+                headers={
+                    "Retry-After": str(status.get("export_window", 300)),
+                    "X-RateLimit-Limit": str(status.get("export_limit", 10)),
+                    "X-RateLimit-Remaining": "0",
+                },
+            )
+
+        try:
+            pdf_bytes = await get_pdf_render_service().render_routine(
+                tenant_name,
+                template_config,
+                data,
+                options={"template_id": template_used_id},
+            )
+        except RenderQueueFull as e:
+            raise HTTPException(
+                status_code=429,
+                detail="Demasiadas exportaciones en curso",
+                headers={"Retry-After": str(e.retry_after)},
+            )
         if not isinstance(pdf_bytes, (bytes, bytearray)):
             raise HTTPException(status_code=500, detail="Error generando PDF")
 
@@ -2548,7 +2549,8 @@ async def api_rutina_export_pdf(
             except Exception:
                 pass
 
-        headers = {"Content-Disposition": f'attachment; filename="{pdf_filename}"'}
+        if artifacts is not None:
+            await artifacts.aput(tenant_name, "rutina", rutina_id, digest, bytes(pdf_bytes))
         return Response(content=bytes(pdf_bytes), media_type="application/pdf", headers=headers)
     except HTTPException:
         raise
@@ -2592,6 +2594,139 @@ async def api_rutina_export_pdf(
                 pass
 
 
+@router.post(
+    "/api/rutinas/export/pdf/batch",
+    dependencies=[
+        Depends(require_feature("rutinas")),
+        Depends(require_scope_gestion("rutinas:read")),
+    ],
+)
+async def api_rutinas_export_pdf_batch(
+    request: Request,
+    _=Depends(require_gestion_access),
+    svc: TrainingService = Depends(get_training_service),
+    db: Session = Depends(get_db),
+):
+    """Export several routines in one submission; returns a ZIP with one PDF per routine."""
+    try:
+        payload = await request.json()
+    except Exception:
+        payload = {}
+    raw_ids = payload.get("rutina_ids") or payload.get("ids") or []
+    try:
+        rutina_ids = list(dict.fromkeys(int(x) for x in raw_ids))
+    except Exception:
+        raise HTTPException(status_code=400, detail="rutina_ids inválidos")
+    render_svc = get_pdf_render_service()
+    if not rutina_ids:
+        raise HTTPException(status_code=400, detail="rutina_ids requerido")
+    if len(rutina_ids) > render_svc.max_per_tenant:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Máximo {render_svc.max_per_tenant} rutinas por lote",
+        )
+    try:
+        uid = request.session.get("user_id")
+        uid = int(uid) if uid is not None else None
+    except Exception:
+        uid = None
+    if is_export_rate_limited(request, user_id=uid):
+        status = get_export_rate_limit_status(request, user_id=uid)
+        raise HTTPException(
+            status_code=429,
+            detail="Demasiadas exportaciones",
+            headers={"Retry-After": str(status.get("export_window", 300))},
+        )
+
+    qr_mode = str(payload.get("qr_mode") or "auto")
+    template_id = payload.get("template_id")
+    try:
+        weeks = int(payload.get("weeks") or 1)
+    except Exception:
+        weeks = 1
+
+    tenant_name = get_current_tenant()
+    artifacts = get_artifact_cache()
+    names: List[str] = []
+    jobs: List[Any] = []
+    pending: List[Any] = []
+    cached_files: List[Any] = []
+    errors: Dict[str, str] = {}
+    template_cache: Dict[Any, Any] = {}
+    for rid in rutina_ids:
+        rutina_data = svc.obtener_rutina_completa(rid)
+        if not rutina_data:
+            errors[str(rid)] = "Rutina no encontrada"
+            continue
+        try:
+            semanas_total = max(1, min(int(rutina_data.get("semanas") or 4), 12))
+        except Exception:
+            semanas_total = 4
+        current_week = max(1, min(weeks, semanas_total))
+        effective_template_id = template_id
+        if effective_template_id is None:
+            effective_template_id = rutina_data.get("plantilla_id")
+        try:
+            effective_template_id = int(effective_template_id) if effective_template_id is not None else None
+        except Exception:
+            effective_template_id = None
+        try:
+            if effective_template_id not in template_cache:
+                template_cache[effective_template_id] = _select_template_config_for_rutina(
+                    db, template_id=effective_template_id, qr_mode=qr_mode
+                )
+            template_config, template_used_id = template_cache[effective_template_id]
+        except HTTPException as he:
+            errors[str(rid)] = str(he.detail)
+            continue
+        data = _build_rutina_pdf_data(rutina_data, current_week=current_week)
+        name = _sanitize_download_filename(None, f"rutina_{rid}", ".pdf")
+        digest = compute_digest(
+            "rutina",
+            template_id=template_used_id,
+            template=template_config,
+            data=data,
+            qr_render=QR_RENDER_MODE,
+        )
+        if artifacts is not None:
+            cached_path = await artifacts.aget(tenant_name, "rutina", rid, digest)
+            if cached_path:
+                cached_files.append((name, cached_path))
+                continue
+        names.append(name)
+        pending.append((rid, digest))
+        jobs.append((template_config, data, {"template_id": template_used_id}))
+
+    if not jobs and not cached_files:
+        raise HTTPException(status_code=404, detail="No hay rutinas para exportar")
+
+    try:
+        results = await render_svc.render_routine_batch(tenant_name, jobs) if jobs else []
+    except RenderQueueFull as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Demasiadas exportaciones en curso",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, path in cached_files:
+            zf.write(path, arcname=name)
+        for name, (rid, digest), res in zip(names, pending, results):
+            if isinstance(res, BaseException):
+                logger.error(f"Error exporting {name} in batch: {res}")
+                errors[name] = "Error generando PDF"
+                continue
+            zf.writestr(name, bytes(res))
+            if artifacts is not None:
+                await artifacts.aput(tenant_name, "rutina", rid, digest, bytes(res))
+        if errors:
+            zf.writestr("errores.json", json.dumps(errors, ensure_ascii=False, indent=2))
+    headers = {"Content-Disposition": 'attachment; filename="rutinas.zip"'}
+    return Response(content=buf.getvalue(), media_type="application/zip", headers=headers)
+
+
 @router.get(
     "/api/rutinas/{rutina_id}",
     dependencies=[
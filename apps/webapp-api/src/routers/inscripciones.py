@@ -6,8 +6,8 @@ Uses InscripcionesService for all database operations.
 import logging
 from fastapi import status
 
-from fastapi import APIRouter, Request, Depends, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, BackgroundTasks, Request, Depends, HTTPException
+from fastapi.responses import JSONResponse, Response
 
 from src.dependencies import (
     require_gestion_access,
@@ -17,6 +17,7 @@ from src.dependencies import (
     get_whatsapp_dispatch_service,
 )
 from src.services.inscripciones_service import InscripcionesService
+from src.services.pdf_artifact_cache import etag_matches
 from src.services.whatsapp_dispatch_service import WhatsAppDispatchService
 
 router = APIRouter()
@@ -38,6 +39,22 @@ def _assert_profesor_horario_access(
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
 
 
+def _notify_promoted(
+    wa: WhatsAppDispatchService, info: dict, promoted: list
+) -> None:
+    """Tell members promoted from the waitlist (runs after the response)."""
+    for p in promoted or []:
+        try:
+            wa.send_waitlist_confirmed(
+                int(p.get("usuario_id")),
+                str(info.get("clase_nombre") or ""),
+                str(info.get("dia") or ""),
+                str(info.get("hora_inicio") or ""),
+            )
+        except Exception as e:
+            logger.warning(f"Waitlist promotion notification failed: {e}")
+
+
 # === Clase Tipos ===
 
 
@@ -113,7 +130,10 @@ async def api_clases_agenda(
     __=Depends(require_sucursal_selected),
     svc: InscripcionesService = Depends(get_inscripciones_service),
 ):
-    """List schedule entries across classes (calendar view)."""
+    """List schedule entries across classes (calendar view).
+
+    Served from class_agenda_cache; an unchanged agenda answers 304.
+    """
     role = str(request.session.get("role") or "").lower()
     profesor_id = None
     if role == "profesor":
@@ -126,7 +146,13 @@ async def api_clases_agenda(
         sucursal_id = int(sucursal_id) if sucursal_id is not None else None
     except Exception:
         sucursal_id = None
-    return {"agenda": svc.obtener_agenda(profesor_id=profesor_id, sucursal_id=sucursal_id)}
+    agenda, etag = svc.obtener_agenda_con_etag(profesor_id=profesor_id, sucursal_id=sucursal_id)
+    if not etag:
+        return {"agenda": agenda}
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse({"agenda": agenda}, headers=headers)
 
 
 @router.get("/api/clases/{clase_id}/horarios")
@@ -207,11 +233,13 @@ async def api_clase_horario_update(
     clase_id: int,
     horario_id: int,
     request: Request,
+    background_tasks: BackgroundTasks,
     _=Depends(require_gestion_access),
     __=Depends(require_sucursal_selected),
     svc: InscripcionesService = Depends(get_inscripciones_service),
+    wa: WhatsAppDispatchService = Depends(get_whatsapp_dispatch_service),
 ):
-    """Update a class schedule."""
+    """Update a class schedule; a higher cupo fills spots from the waitlist."""
     try:
         _assert_profesor_horario_access(request, svc, horario_id)
         payload = await request.json()
@@ -223,6 +251,11 @@ async def api_clase_horario_update(
         result = svc.actualizar_horario(horario_id, clase_id, payload, sucursal_id=sucursal_id)
         if result is None:
             raise HTTPException(status_code=404, detail="Horario no encontrado")
+        promoted = result.pop("promoted", None) or []
+        if promoted:
+            info = svc.obtener_horario_info(horario_id) or {}
+            background_tasks.add_task(_notify_promoted, wa, info, promoted)
+            result["promoted"] = [int(p.get("usuario_id")) for p in promoted]
         return result
     except HTTPException:
         raise
@@ -314,14 +347,23 @@ async def api_inscripcion_delete(
     horario_id: int,
     usuario_id: int,
     request: Request,
+    background_tasks: BackgroundTasks,
     _=Depends(require_gestion_access),
     svc: InscripcionesService = Depends(get_inscripciones_service),
+    wa: WhatsAppDispatchService = Depends(get_whatsapp_dispatch_service),
 ):
-    """Remove user from class schedule."""
+    """Remove user from class schedule; frees the spot for the waitlist."""
     try:
         _assert_profesor_horario_access(request, svc, horario_id)
-        svc.eliminar_inscripcion(horario_id, usuario_id)
-        return {"ok": True}
+        result = svc.cancelar_inscripcion(horario_id, usuario_id)
+        promoted = result.get("promoted") or []
+        if promoted:
+            info = svc.obtener_horario_info(horario_id) or {}
+            background_tasks.add_task(_notify_promoted, wa, info, promoted)
+        return {
+            "ok": True,
+            "promoted": [int(p.get("usuario_id")) for p in promoted],
+        }
     except Exception as e:
         logger.error(f"Error deleting enrollment: {e}")
         return JSONResponse({"error": str(e)}, status_code=500)
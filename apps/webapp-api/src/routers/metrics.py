@@ -0,0 +1,134 @@
+"""Internal metrics router - Prometheus scrape target, query and statement diagnostics, profiler control."""
+
+import hmac
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from src.database.query_metrics import get_query_metrics
+from src.database.statement_registry import get_statement_registry
+from src.database.tenant_connection import validate_tenant_name
+from src.request_timing import get_phase_histograms
+from src.sampling_profiler import PROFILER_MAX_WINDOW_SECONDS, get_sampling_profiler
+
+router = APIRouter()
+
+
+def _authorized(request: Request) -> Optional[JSONResponse]:
+    """None when the request carries the metrics token, else the error response"""
+    secret = (os.getenv("METRICS_TOKEN") or os.getenv("INTERNAL_CRON_SECRET") or "").strip()
+    if not secret:
+        return JSONResponse(
+            {"ok": False, "error": "METRICS_TOKEN not configured"}, status_code=503
+        )
+    auth = str(request.headers.get("authorization") or "").strip()
+    incoming = auth[7:].strip() if auth.lower().startswith("bearer ") else ""
+    incoming = incoming or str(request.headers.get("X-Metrics-Token") or "").strip()
+    if not incoming or not hmac.compare_digest(incoming.encode("utf-8"), secret.encode("utf-8")):
+        return JSONResponse({"ok": False, "error": "Unauthorized"}, status_code=401)
+    return None
+
+
+def _limit(request: Request) -> int:
+    try:
+        return max(1, min(int(request.query_params.get("limit") or 100), 1000))
+    except Exception:
+        return 100
+
+
+@router.get("/internal/metrics")
+async def internal_metrics(request: Request):
+    denied = _authorized(request)
+    if denied is not None:
+        return denied
+    return PlainTextResponse(
+        get_query_metrics().render_prometheus()
+        + get_statement_registry().render_prometheus()
+        + get_phase_histograms().render_prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@router.get("/internal/metrics/slow-queries")
+async def internal_slow_queries(request: Request):
+    denied = _authorized(request)
+    if denied is not None:
+        return denied
+    tenant = str(request.query_params.get("tenant") or "").strip().lower() or None
+    m = get_query_metrics()
+    return {
+        "ok": True,
+        "slow_queries": m.slow_queries(tenant, _limit(request)),
+        "n_plus_one": m.n_plus_one_events(tenant, _limit(request)),
+    }
+
+
+@router.get("/internal/metrics/statements")
+async def internal_statements(request: Request):
+    """Registered statements with their prepared-statement hit ratio"""
+    denied = _authorized(request)
+    if denied is not None:
+        return denied
+    return {"ok": True, "statements": get_statement_registry().stats()}
+
+
+def _tenant_param(tenant: str) -> Optional[str]:
+    t = str(tenant or "").strip().lower()
+    try:
+        ok, _err = validate_tenant_name(t)
+    except Exception:
+        ok = False
+    return t if ok else None
+
+
+@router.post("/internal/profiler/{tenant}")
+async def internal_profiler_start(tenant: str, request: Request):
+    """Arm the sampling profiler for one tenant (?seconds=60&strict=1)"""
+    denied = _authorized(request)
+    if denied is not None:
+        return denied
+    t = _tenant_param(tenant)
+    if not t:
+        return JSONResponse({"ok": False, "error": "Invalid tenant"}, status_code=400)
+    try:
+        seconds = int(request.query_params.get("seconds") or 60)
+    except Exception:
+        seconds = 60
+    strict = str(request.query_params.get("strict") or "1").strip().lower() not in (
+        "0",
+        "false",
+        "no",
+        "off",
+    )
+    window = get_sampling_profiler().start(t, seconds, strict=strict)
+    return {
+        "ok": True,
+        "tenant": t,
+        "ends": window.ends,
+        "max_seconds": PROFILER_MAX_WINDOW_SECONDS,
+    }
+
+
+@router.get("/internal/profiler/{tenant}")
+async def internal_profiler_report(tenant: str, request: Request):
+    """Profile of the tenant's last window; ?format=folded for flamegraph input"""
+    denied = _authorized(request)
+    if denied is not None:
+        return denied
+    window = get_sampling_profiler().get(_tenant_param(tenant) or "")
+    if window is None:
+        return JSONResponse({"ok": False, "error": "No profile"}, status_code=404)
+    if str(request.query_params.get("format") or "").strip().lower() == "folded":
+        return PlainTextResponse(window.folded())
+    return {"ok": True, **window.report(_limit(request))}
+
+
+@router.delete("/internal/profiler/{tenant}")
+async def internal_profiler_stop(tenant: str, request: Request):
+    denied = _authorized(request)
+    if denied is not None:
+        return denied
+    window = get_sampling_profiler().stop(_tenant_param(tenant) or "")
+    return {"ok": window is not None}
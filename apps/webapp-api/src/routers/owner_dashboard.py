@@ -4,16 +4,16 @@ import csv
 import io
 import logging
 from datetime import date, timedelta
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from fastapi import APIRouter, Depends, Query, Request
 from fastapi.responses import JSONResponse, StreamingResponse
-from sqlalchemy import func, select, text
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 
-from src.database.clase_profesor_schema import ensure_clase_profesor_schema
 from src.dependencies import (
     get_db_session,
+    get_owner_dashboard_service,
     get_staff_service,
     get_reports_service,
     get_whatsapp_service,
@@ -21,12 +21,13 @@ from src.dependencies import (
     require_feature,
     require_owner,
 )
-from src.models.orm_models import (
-    Asistencia,
-    Pago,
-    Sucursal,
-    Usuario,
+from src.services.owner_dashboard_service import (
+    EXPORT_COLUMNS,
+    OWNER_DASHBOARD_EXPORT_CHUNK,
+    OwnerDashboardService,
+    profesor_sucursales_sql,
 )
+from src.services.csv_stream import stream_csv
 from src.services.reports_service import ReportsService
 from src.services.staff_service import StaffService
 from src.services.whatsapp_service import WhatsAppService
@@ -61,6 +62,26 @@ def _to_csv_response(data: list, filename: str):
     )
 
 
+def _page_params(page: int, limit: int, cursor: Optional[str]) -> Tuple[int, int]:
+    """(limit, offset); a cursor takes precedence over the legacy page number."""
+    limit_i = max(1, min(int(limit or 20), 200))
+    if cursor:
+        return limit_i, 0
+    return limit_i, (max(1, int(page or 1)) - 1) * limit_i
+
+
+def _parse_range(desde: Optional[str], hasta: Optional[str]) -> Tuple[Optional[date], Optional[date]]:
+    try:
+        d = date.fromisoformat(str(desde)) if desde else None
+    except Exception:
+        d = None
+    try:
+        h = date.fromisoformat(str(hasta)) if hasta else None
+    except Exception:
+        h = None
+    return d, h
+
+
 def _get_optional_sucursal_id(request: Request, db: Session) -> Optional[int]:
     try:
         sid_raw = request.session.get("sucursal_id")
@@ -128,6 +149,7 @@ async def api_owner_dashboard_overview(
     reports: ReportsService = Depends(get_reports_service),
     wa_settings: WhatsAppSettingsService = Depends(get_whatsapp_settings_service),
     wa_svc: WhatsAppService = Depends(get_whatsapp_service),
+    dashboard: OwnerDashboardService = Depends(get_owner_dashboard_service),
 ):
     sid = _get_optional_sucursal_id(request, db)
     scope = {
@@ -136,6 +158,7 @@ async def api_owner_dashboard_overview(
         "sucursal_nombre": _get_sucursal_nombre(db, sid),
     }
 
+    resumen = _safe(lambda: dashboard.resumen(sucursal_id=sid), {})
     kpis = _safe(lambda: reports.obtener_kpis(sucursal_id=sid), {})
     kpis_adv = _safe(lambda: reports.obtener_kpis_avanzados(sucursal_id=sid), {})
     activos_inactivos = _safe(lambda: reports.obtener_activos_inactivos(sucursal_id=sid), {})
@@ -157,6 +180,7 @@ async def api_owner_dashboard_overview(
     return {
         "ok": True,
         "scope": scope,
+        "resumen": resumen,
         "kpis": kpis,
         "kpis_avanzados": kpis_adv,
         "activos_inactivos": activos_inactivos,
@@ -174,6 +198,17 @@ async def api_owner_dashboard_overview(
     }
 
 
+@router.get("/api/owner_dashboard/resumen")
+async def api_owner_dashboard_resumen(
+    request: Request,
+    db: Session = Depends(get_db_session),
+    svc: OwnerDashboardService = Depends(get_owner_dashboard_service),
+):
+    """Headline numbers of every panel (usuarios, pagos, asistencias, profesores, staff)."""
+    sid = _get_optional_sucursal_id(request, db)
+    return {"ok": True, "sucursal_id": sid, "resumen": svc.resumen(sucursal_id=sid)}
+
+
 @router.get("/api/owner_dashboard/attendance_audit")
 async def api_owner_dashboard_attendance_audit(
     request: Request,
@@ -210,135 +245,24 @@ async def api_owner_dashboard_attendance_audit(
 async def api_owner_dashboard_usuarios(
     request: Request,
     db: Session = Depends(get_db_session),
+    svc: OwnerDashboardService = Depends(get_owner_dashboard_service),
     search: str = "",
     activo: Optional[bool] = None,
     page: int = 1,
     limit: int = 20,
+    cursor: Optional[str] = None,
 ):
     sid = _get_optional_sucursal_id(request, db)
-    page_i = max(1, int(page or 1))
-    limit_i = max(1, min(int(limit or 20), 200))
-    offset_i = (page_i - 1) * limit_i
-
-    term = str(search or "").strip()
-    where_parts: List[str] = []
-    params: Dict[str, Any] = {"limit": int(limit_i), "offset": int(offset_i)}
-
-    if term:
-        where_parts.append("(u.nombre ILIKE :q OR u.dni ILIKE :q OR u.telefono ILIKE :q)")
-        params["q"] = f"%{term}%"
-    if activo is not None:
-        where_parts.append("u.activo = :activo")
-        params["activo"] = bool(activo)
-    if sid is not None:
-        params["sid"] = int(sid)
-        where_parts.append(
-            """
-            COALESCE((
-                SELECT uas.allow
-                FROM usuario_accesos_sucursales uas
-                WHERE uas.usuario_id = u.id
-                  AND uas.sucursal_id = :sid
-                  AND (uas.starts_at IS NULL OR uas.starts_at <= NOW())
-                  AND (uas.ends_at IS NULL OR uas.ends_at >= NOW())
-                ORDER BY uas.id DESC
-                LIMIT 1
-            ), (
-                COALESCE(tc.all_sucursales, FALSE)
-                OR EXISTS (
-                    SELECT 1
-                    FROM tipo_cuota_sucursales tcs
-                    WHERE tcs.tipo_cuota_id = tc.id
-                      AND tcs.sucursal_id = :sid
-                )
-            )) = TRUE
-            """
-        )
-
-    where_sql = " AND ".join([p.strip() for p in where_parts if p and p.strip()])
-    where_sql = where_sql.strip()
-    if where_sql:
-        where_sql = "WHERE " + where_sql
-
-    total = (
-        db.execute(
-            text(
-                f"""
-                SELECT COUNT(*) AS total
-                FROM usuarios u
-                LEFT JOIN tipos_cuota tc ON LOWER(tc.nombre) = LOWER(u.tipo_cuota)
-                {where_sql}
-                """
-            ),
-            params,
-        )
-        .scalar()
-        or 0
-    )
-
-    rows = (
-        db.execute(
-            text(
-                f"""
-                SELECT
-                  u.id,
-                  u.nombre,
-                  u.dni,
-                  u.telefono,
-                  u.activo,
-                  u.rol,
-                  u.tipo_cuota,
-                  u.fecha_registro,
-                  u.fecha_proximo_vencimiento,
-                  u.cuotas_vencidas,
-                  u.ultimo_pago,
-                  u.notas,
-                  u.sucursal_registro_id,
-                  s.nombre AS sucursal_registro_nombre
-                FROM usuarios u
-                LEFT JOIN tipos_cuota tc ON LOWER(tc.nombre) = LOWER(u.tipo_cuota)
-                LEFT JOIN sucursales s ON s.id = u.sucursal_registro_id
-                {where_sql}
-                ORDER BY u.nombre ASC
-                LIMIT :limit OFFSET :offset
-                """
-            ),
-            params,
-        )
-        .mappings()
-        .all()
+    limit_i, offset_i = _page_params(page, limit, cursor)
+    data = svc.listar_usuarios(
+        sucursal_id=sid,
+        search=search,
+        activo=activo,
+        limit=limit_i,
+        offset=offset_i,
+        cursor=cursor,
     )
-
-    usuarios = [
-        {
-            "id": int(r.get("id") or 0),
-            "nombre": str(r.get("nombre") or ""),
-            "dni": r.get("dni"),
-            "telefono": r.get("telefono"),
-            "email": "",
-            "activo": bool(r.get("activo")) if r.get("activo") is not None else False,
-            "rol": str(r.get("rol") or "").strip().lower(),
-            "tipo_cuota_id": None,
-            "tipo_cuota_nombre": r.get("tipo_cuota"),
-            "fecha_registro": r.get("fecha_registro"),
-            "fecha_proximo_vencimiento": r.get("fecha_proximo_vencimiento"),
-            "cuotas_vencidas": r.get("cuotas_vencidas"),
-            "ultimo_pago": r.get("ultimo_pago"),
-            "notas": r.get("notas"),
-            "sucursal_registro_id": r.get("sucursal_registro_id"),
-            "sucursal_registro_nombre": r.get("sucursal_registro_nombre"),
-        }
-        for r in (rows or [])
-        if r and r.get("id") is not None
-    ]
-
-    return {
-        "ok": True,
-        "usuarios": usuarios,
-        "total": int(total or 0),
-        "limit": int(limit_i),
-        "offset": int(offset_i),
-    }
+    return {"ok": True, **data, "limit": limit_i, "offset": offset_i}
 
 
 @router.get("/api/owner_dashboard/staff")
@@ -395,14 +319,14 @@ async def api_owner_dashboard_profesores(
     db: Session = Depends(get_db_session),
     search: str = "",
 ):
-    ensure_clase_profesor_schema(db)
     sid = _get_optional_sucursal_id(request, db)
     term = str(search or "").strip()
     q = f"%{term}%" if term else None
+    profesor_sucursales = profesor_sucursales_sql(db)
     rows = (
         db.execute(
             text(
-                """
+                f"""
                 SELECT
                   p.id AS profesor_id,
                   p.usuario_id,
@@ -414,22 +338,7 @@ async def api_owner_dashboard_profesores(
                   ARRAY_REMOVE(ARRAY_AGG(DISTINCT suc.sid), NULL) AS sucursal_ids
                 FROM profesores p
                 JOIN usuarios u ON u.id = p.usuario_id
-                LEFT JOIN (
-                    SELECT p.id AS profesor_id, us.sucursal_id AS sid
-                    FROM profesores p
-                    LEFT JOIN usuario_sucursales us ON us.usuario_id = p.usuario_id
-                    UNION
-                    SELECT a.profesor_id AS profesor_id, c.sucursal_id AS sid
-                    FROM profesor_clase_asignaciones a
-                    JOIN clases_horarios ch ON ch.id = a.clase_horario_id
-                    JOIN clases c ON c.id = ch.clase_id
-                    WHERE a.activa = TRUE
-                    UNION
-                    SELECT a.profesor_id AS profesor_id, c.sucursal_id AS sid
-                    FROM clase_profesor_asignaciones a
-                    JOIN clases c ON c.id = a.clase_id
-                    WHERE a.activa = TRUE
-                ) suc ON suc.profesor_id = p.id
+                LEFT JOIN ({profesor_sucursales}) suc ON suc.profesor_id = p.id
                 WHERE (:sid IS NULL OR suc.sid = :sid)
                   AND (
                     :q IS NULL OR u.nombre ILIKE :q OR u.dni ILIKE :q OR u.telefono ILIKE :q
@@ -498,153 +407,55 @@ async def api_owner_dashboard_profesores(
 async def api_owner_dashboard_pagos(
     request: Request,
     db: Session = Depends(get_db_session),
+    svc: OwnerDashboardService = Depends(get_owner_dashboard_service),
     desde: Optional[str] = None,
     hasta: Optional[str] = None,
     metodo_id: Optional[int] = None,
     page: int = 1,
     limit: int = 20,
+    cursor: Optional[str] = None,
 ):
     sid = _get_optional_sucursal_id(request, db)
-    page_i = max(1, int(page or 1))
-    limit_i = max(1, min(int(limit or 20), 200))
-    offset_i = (page_i - 1) * limit_i
-
-    d = None
-    h = None
-    try:
-        d = date.fromisoformat(str(desde)) if desde else None
-    except Exception:
-        d = None
-    try:
-        h = date.fromisoformat(str(hasta)) if hasta else None
-    except Exception:
-        h = None
-
-    stmt = (
-        select(
-            Pago,
-            Usuario.nombre.label("usuario_nombre"),
-            Sucursal.nombre.label("sucursal_nombre"),
-        )
-        .join(Usuario, Pago.usuario_id == Usuario.id)
-        .outerjoin(Sucursal, Pago.sucursal_id == Sucursal.id)
-    )
-
-    if d is not None:
-        stmt = stmt.where(func.date(Pago.fecha_pago) >= d)
-    if h is not None:
-        stmt = stmt.where(func.date(Pago.fecha_pago) <= h)
-    if metodo_id is not None:
-        try:
-            mid = int(metodo_id)
-        except Exception:
-            mid = None
-        if mid is not None:
-            stmt = stmt.where(Pago.metodo_pago_id == mid)
-    if sid is not None:
-        stmt = stmt.where(Pago.sucursal_id == int(sid))
-
-    rows = (
-        db.execute(stmt.order_by(Pago.fecha_pago.desc()).limit(limit_i).offset(offset_i))
-        .mappings()
-        .all()
+    limit_i, offset_i = _page_params(page, limit, cursor)
+    d, h = _parse_range(desde, hasta)
+    data = svc.listar_pagos(
+        sucursal_id=sid,
+        desde=d,
+        hasta=h,
+        metodo_id=metodo_id,
+        limit=limit_i,
+        offset=offset_i,
+        cursor=cursor,
     )
-
-    pagos: List[Dict[str, Any]] = []
-    for r in rows or []:
-        p = r.get("Pago")
-        if not p:
-            continue
-        pagos.append(
-            {
-                "id": int(getattr(p, "id", 0) or 0),
-                "usuario_id": int(getattr(p, "usuario_id", 0) or 0),
-                "usuario_nombre": r.get("usuario_nombre"),
-                "monto": float(getattr(p, "monto", 0) or 0),
-                "fecha_pago": getattr(p, "fecha_pago", None),
-                "mes": getattr(p, "mes", None),
-                "anio": getattr(p, "año", None),
-                "metodo_pago_id": getattr(p, "metodo_pago_id", None),
-                "metodo_pago": getattr(p, "metodo_pago", None),
-                "estado": getattr(p, "estado", None),
-                "sucursal_id": getattr(p, "sucursal_id", None),
-                "sucursal_nombre": r.get("sucursal_nombre"),
-            }
-        )
-
-    return {"ok": True, "pagos": pagos, "limit": limit_i, "offset": offset_i}
+    return {"ok": True, **data, "limit": limit_i, "offset": offset_i}
 
 
 @router.get("/api/owner_dashboard/asistencias")
 async def api_owner_dashboard_asistencias(
     request: Request,
     db: Session = Depends(get_db_session),
+    svc: OwnerDashboardService = Depends(get_owner_dashboard_service),
     desde: Optional[str] = None,
     hasta: Optional[str] = None,
     page: int = 1,
     limit: int = 20,
+    cursor: Optional[str] = None,
 ):
     sid = _get_optional_sucursal_id(request, db)
-    page_i = max(1, int(page or 1))
-    limit_i = max(1, min(int(limit or 20), 200))
-    offset_i = (page_i - 1) * limit_i
-
-    d = None
-    h = None
-    try:
-        d = date.fromisoformat(str(desde)) if desde else None
-    except Exception:
-        d = None
-    try:
-        h = date.fromisoformat(str(hasta)) if hasta else None
-    except Exception:
-        h = None
-
+    limit_i, offset_i = _page_params(page, limit, cursor)
+    d, h = _parse_range(desde, hasta)
     if d is None and h is None:
         h = date.today()
         d = h - timedelta(days=7)
-
-    stmt = (
-        select(
-            Asistencia,
-            Usuario.nombre.label("usuario_nombre"),
-            Sucursal.nombre.label("sucursal_nombre"),
-        )
-        .join(Usuario, Asistencia.usuario_id == Usuario.id)
-        .outerjoin(Sucursal, Asistencia.sucursal_id == Sucursal.id)
-    )
-    if d is not None:
-        stmt = stmt.where(Asistencia.fecha >= d)
-    if h is not None:
-        stmt = stmt.where(Asistencia.fecha <= h)
-    if sid is not None:
-        stmt = stmt.where(Asistencia.sucursal_id == int(sid))
-
-    rows = (
-        db.execute(stmt.order_by(Asistencia.fecha.desc()).limit(limit_i).offset(offset_i))
-        .mappings()
-        .all()
+    data = svc.listar_asistencias(
+        sucursal_id=sid,
+        desde=d,
+        hasta=h,
+        limit=limit_i,
+        offset=offset_i,
+        cursor=cursor,
     )
-
-    items: List[Dict[str, Any]] = []
-    for r in rows or []:
-        a = r.get("Asistencia")
-        if not a:
-            continue
-        items.append(
-            {
-                "id": int(getattr(a, "id", 0) or 0),
-                "usuario_id": int(getattr(a, "usuario_id", 0) or 0),
-                "usuario_nombre": r.get("usuario_nombre"),
-                "fecha": getattr(a, "fecha", None),
-                "hora": getattr(a, "hora", None),
-                "tipo": getattr(a, "tipo", None),
-                "sucursal_id": getattr(a, "sucursal_id", None),
-                "sucursal_nombre": r.get("sucursal_nombre"),
-            }
-        )
-
-    return {"ok": True, "asistencias": items, "limit": limit_i, "offset": offset_i}
+    return {"ok": True, **data, "limit": limit_i, "offset": offset_i}
 
 
 @router.get("/api/owner_dashboard/export/{type}/csv")
@@ -653,6 +464,7 @@ async def api_owner_dashboard_export_csv(
     type: str,
     db: Session = Depends(get_db_session),
     reports: ReportsService = Depends(get_reports_service),
+    svc: OwnerDashboardService = Depends(get_owner_dashboard_service),
     desde: Optional[str] = Query(None),
     hasta: Optional[str] = Query(None),
 ):
@@ -664,183 +476,14 @@ async def api_owner_dashboard_export_csv(
             await require_feature("pagos:export")(request, db)
     except Exception:
         raise
-    if t == "usuarios":
-        def _load():
-            rows = db.execute(
-                text(
-                    """
-                    SELECT
-                      u.id,
-                      u.nombre,
-                      u.dni,
-                      u.telefono,
-                      u.activo,
-                      u.rol,
-                      u.tipo_cuota,
-                      u.fecha_registro AS created_at,
-                      u.sucursal_registro_id,
-                      s.nombre AS sucursal_registro_nombre
-                    FROM usuarios u
-                    LEFT JOIN tipos_cuota tc ON LOWER(tc.nombre) = LOWER(u.tipo_cuota)
-                    LEFT JOIN sucursales s ON s.id = u.sucursal_registro_id
-                    WHERE (
-                      :sid IS NULL OR
-                      COALESCE((
-                          SELECT uas.allow
-                          FROM usuario_accesos_sucursales uas
-                          WHERE uas.usuario_id = u.id
-                            AND uas.sucursal_id = :sid
-                            AND (uas.starts_at IS NULL OR uas.starts_at <= NOW())
-                            AND (uas.ends_at IS NULL OR uas.ends_at >= NOW())
-                          ORDER BY uas.id DESC
-                          LIMIT 1
-                      ), (
-                          COALESCE(tc.all_sucursales, FALSE)
-                          OR EXISTS (
-                              SELECT 1
-                              FROM tipo_cuota_sucursales tcs
-                              WHERE tcs.tipo_cuota_id = tc.id
-                                AND tcs.sucursal_id = :sid
-                          )
-                      )) = TRUE
-                    )
-                    ORDER BY u.nombre ASC
-                    """
-                ),
-                {"sid": int(sid) if sid is not None else None},
-            ).mappings().all()
-            return [
-                {
-                    "id": r.get("id"),
-                    "nombre": r.get("nombre"),
-                    "dni": r.get("dni"),
-                    "telefono": r.get("telefono"),
-                    "activo": r.get("activo"),
-                    "rol": r.get("rol"),
-                    "tipo_cuota": r.get("tipo_cuota"),
-                    "created_at": r.get("created_at"),
-                    "sucursal_registro_id": r.get("sucursal_registro_id"),
-                    "sucursal_registro_nombre": r.get("sucursal_registro_nombre"),
-                }
-                for r in (rows or [])
-            ]
-
-        data = _safe(_load, [])
-        return _to_csv_response(data, f"usuarios_{date.today().isoformat()}.csv")
-    if t == "pagos":
-        def _load():
-            d = None
-            h = None
-            try:
-                d = date.fromisoformat(desde) if desde else None
-            except Exception:
-                d = None
-            try:
-                h = date.fromisoformat(hasta) if hasta else None
-            except Exception:
-                h = None
-            rows = db.execute(
-                text(
-                    """
-                    SELECT
-                      p.id,
-                      p.usuario_id,
-                      u.nombre AS usuario_nombre,
-                      p.monto,
-                      p.fecha_pago,
-                      p.metodo_pago,
-                      p.metodo_pago_id,
-                      p.estado,
-                      p.sucursal_id,
-                      s.nombre AS sucursal_nombre
-                    FROM pagos p
-                    JOIN usuarios u ON u.id = p.usuario_id
-                    LEFT JOIN sucursales s ON s.id = p.sucursal_id
-                    WHERE (:sid IS NULL OR p.sucursal_id = :sid)
-                      AND (:desde IS NULL OR DATE(p.fecha_pago) >= :desde)
-                      AND (:hasta IS NULL OR DATE(p.fecha_pago) <= :hasta)
-                    ORDER BY p.fecha_pago DESC
-                    """
-                ),
-                {
-                    "sid": int(sid) if sid is not None else None,
-                    "desde": d,
-                    "hasta": h,
-                },
-            ).mappings().all()
-            return [
-                {
-                    "id": r.get("id"),
-                    "usuario_id": r.get("usuario_id"),
-                    "usuario_nombre": r.get("usuario_nombre"),
-                    "monto": r.get("monto"),
-                    "fecha_pago": r.get("fecha_pago"),
-                    "metodo_pago": r.get("metodo_pago"),
-                    "metodo_pago_id": r.get("metodo_pago_id"),
-                    "estado": r.get("estado"),
-                    "sucursal_id": r.get("sucursal_id"),
-                    "sucursal_nombre": r.get("sucursal_nombre"),
-                }
-                for r in (rows or [])
-            ]
-
-        data = _safe(_load, [])
-        return _to_csv_response(data, f"pagos_{date.today().isoformat()}.csv")
-    if t == "asistencias":
-        def _load():
-            d = None
-            h = None
-            try:
-                d = date.fromisoformat(desde) if desde else None
-            except Exception:
-                d = None
-            try:
-                h = date.fromisoformat(hasta) if hasta else None
-            except Exception:
-                h = None
-            rows = db.execute(
-                text(
-                    """
-                    SELECT
-                      a.id,
-                      a.usuario_id,
-                      u.nombre AS usuario_nombre,
-                      a.fecha,
-                      a.hora,
-                      a.tipo,
-                      a.sucursal_id,
-                      s.nombre AS sucursal_nombre
-                    FROM asistencias a
-                    JOIN usuarios u ON u.id = a.usuario_id
-                    LEFT JOIN sucursales s ON s.id = a.sucursal_id
-                    WHERE (:sid IS NULL OR a.sucursal_id = :sid)
-                      AND (:desde IS NULL OR a.fecha >= :desde)
-                      AND (:hasta IS NULL OR a.fecha <= :hasta)
-                    ORDER BY a.fecha DESC
-                    """
-                ),
-                {
-                    "sid": int(sid) if sid is not None else None,
-                    "desde": d,
-                    "hasta": h,
-                },
-            ).mappings().all()
-            return [
-                {
-                    "id": r.get("id"),
-                    "usuario_id": r.get("usuario_id"),
-                    "usuario_nombre": r.get("usuario_nombre"),
-                    "fecha": r.get("fecha"),
-                    "hora": r.get("hora"),
-                    "tipo": r.get("tipo"),
-                    "sucursal_id": r.get("sucursal_id"),
-                    "sucursal_nombre": r.get("sucursal_nombre"),
-                }
-                for r in (rows or [])
-            ]
-
-        data = _safe(_load, [])
-        return _to_csv_response(data, f"asistencias_{date.today().isoformat()}.csv")
+    if t in EXPORT_COLUMNS:
+        d, h = _parse_range(desde, hasta)
+        return stream_csv(
+            svc.iter_export(t, sucursal_id=sid, desde=d, hasta=h),
+            EXPORT_COLUMNS[t],
+            f"{t}_{date.today().isoformat()}.csv",
+            OWNER_DASHBOARD_EXPORT_CHUNK,
+        )
     if t == "asistencias_audit":
         try:
             d = date.fromisoformat(desde) if desde else None
@@ -1,6 +1,8 @@
 import logging
 import os
+import io
 import json
+import zipfile
 from datetime import datetime, timezone, timedelta
 from typing import Optional, List, Dict, Any
 
@@ -10,7 +12,7 @@ except Exception:
     ZoneInfo = None
 
 from fastapi import APIRouter, Request, Depends, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, Response
 from sqlalchemy import select, or_, text
 
 from src.dependencies import (
@@ -29,7 +31,22 @@ from src.services.payment_service import PaymentService
 from src.services.whatsapp_dispatch_service import WhatsAppDispatchService
 from src.services.audit_service import AuditService
 from src.services.membership_service import MembershipService
+from src.services.pdf_artifact_cache import (
+    compute_digest,
+    etag_for,
+    etag_matches,
+    get_artifact_cache,
+)
+from src.services.pdf_render_service import (
+    RenderQueueFull,
+    get_pdf_render_service,
+    prepare_receipt_branding,
+    snapshot_detalles,
+    snapshot_pago,
+    snapshot_usuario,
+)
 from src.database.orm_models import Usuario
+from src.database.tenant_connection import get_current_tenant
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -55,6 +72,105 @@ def _get_public_base_url(request: Request) -> str:
         )
 
 
+def _render_queue_full_response(e: RenderQueueFull) -> JSONResponse:
+    return JSONResponse(
+        {
+            "ok": False,
+            "error": "Demasiados comprobantes en generación",
+            "retry_after": e.retry_after,
+        },
+        status_code=429,
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+def _resolve_receipt_branding(svc: PaymentService, pago: Any) -> Dict[str, Any]:
+    """Gym branding plus the sucursal-aware default name/address for a receipt."""
+    logo_url = None
+    gym_name_cfg = None
+    gym_addr_cfg = None
+    try:
+        from src.services.gym_config_service import GymConfigService
+
+        cfg = GymConfigService(svc.db).obtener_configuracion_gimnasio() or {}
+        logo_url = cfg.get("logo_url") or cfg.get("gym_logo_url")
+        gym_name_cfg = cfg.get("gym_name") or cfg.get("nombre")
+        gym_addr_cfg = cfg.get("gym_address") or cfg.get("direccion")
+    except Exception:
+        logo_url = None
+        gym_name_cfg = None
+        gym_addr_cfg = None
+
+    sucursal_nombre = None
+    sucursal_codigo = None
+    sucursal_direccion = None
+    try:
+        if getattr(pago, "sucursal_id", None) is not None:
+            row = svc.db.execute(
+                text(
+                    "SELECT nombre, codigo, direccion FROM sucursales WHERE id = :id LIMIT 1"
+                ),
+                {"id": int(pago.sucursal_id)},
+            ).fetchone()
+            if row:
+                sucursal_nombre = str(row[0] or "") if row[0] is not None else None
+                sucursal_codigo = str(row[1] or "") if row[1] is not None else None
+                sucursal_direccion = str(row[2] or "") if row[2] is not None else None
+    except Exception:
+        sucursal_nombre = None
+        sucursal_codigo = None
+        sucursal_direccion = None
+    if not logo_url:
+        try:
+            from src.utils import _resolve_logo_url
+
+            logo_url = _resolve_logo_url()
+        except Exception:
+            logo_url = None
+
+    try:
+        if (
+            logo_url
+            and not str(logo_url).startswith("http")
+            and not str(logo_url).startswith("/")
+        ):
+            from src.services.b2_storage import get_file_url
+
+            logo_url = get_file_url(str(logo_url))
+    except Exception:
+        pass
+
+    gym_name_default = None
+    try:
+        if sucursal_nombre and gym_name_cfg:
+            gym_name_default = f"{gym_name_cfg} - {sucursal_nombre}"
+        elif sucursal_nombre:
+            gym_name_default = str(sucursal_nombre)
+    except Exception:
+        pass
+    gym_address_default = None
+    try:
+        base_addr = sucursal_direccion or gym_addr_cfg
+        if base_addr and sucursal_codigo:
+            gym_address_default = f"{base_addr} ({sucursal_codigo})"
+        else:
+            gym_address_default = base_addr
+    except Exception:
+        pass
+
+    return {
+        "branding": prepare_receipt_branding(
+            {
+                "gym_name": gym_name_cfg,
+                "gym_address": gym_addr_cfg,
+                "logo_url": logo_url,
+            }
+        ),
+        "gym_name": gym_name_default,
+        "gym_address": gym_address_default,
+    }
+
+
 def _now_local_naive() -> datetime:
     tz_name = (
         os.getenv("APP_TIMEZONE")
@@ -1103,14 +1219,9 @@ async def api_pago_preview(
         totales = body.get("totales", {})
         branding = body.get("branding", {})
 
-        try:
-            from apps.core.pdf_generator import PDFGenerator
-        except ImportError:
-            from src.pdf_generator import PDFGenerator
-
-        pdfg = PDFGenerator(branding_config=branding)
-
-        filepath = pdfg.generar_recibo(
+        filepath = await get_pdf_render_service().render_receipt(
+            get_current_tenant(),
+            prepare_receipt_branding(branding),
             pago=pago,
             usuario=usuario,
             numero_comprobante="PREVIEW",
@@ -1131,6 +1242,8 @@ async def api_pago_preview(
             filepath, media_type="application/pdf", filename="preview.pdf"
         )
 
+    except RenderQueueFull as e:
+        return _render_queue_full_response(e)
     except Exception as e:
         logger.error(f"Error previewing receipt: {e}")
         import traceback
@@ -1671,94 +1784,18 @@ async def api_pago_recibo_pdf(
             except Exception:
                 numero_comprobante = None
 
-        try:
-            from apps.core.pdf_generator import PDFGenerator
-        except ImportError:
-            # If apps.core is not in path directly, assume it is available via sys.path from dependencies
-            from src.pdf_generator import PDFGenerator
-
-        logo_url = None
-        gym_name_cfg = None
-        gym_addr_cfg = None
-        try:
-            from src.services.gym_config_service import GymConfigService
-
-            cfg = GymConfigService(svc.db).obtener_configuracion_gimnasio() or {}
-            logo_url = cfg.get("logo_url") or cfg.get("gym_logo_url")
-            gym_name_cfg = cfg.get("gym_name") or cfg.get("nombre")
-            gym_addr_cfg = cfg.get("gym_address") or cfg.get("direccion")
-        except Exception:
-            logo_url = None
-            gym_name_cfg = None
-            gym_addr_cfg = None
-
-        sucursal_nombre = None
-        sucursal_codigo = None
-        sucursal_direccion = None
-        try:
-            if getattr(pago, "sucursal_id", None) is not None:
-                row = svc.db.execute(
-                    text(
-                        "SELECT nombre, codigo, direccion FROM sucursales WHERE id = :id LIMIT 1"
-                    ),
-                    {"id": int(pago.sucursal_id)},
-                ).fetchone()
-                if row:
-                    sucursal_nombre = str(row[0] or "") if row[0] is not None else None
-                    sucursal_codigo = str(row[1] or "") if row[1] is not None else None
-                    sucursal_direccion = str(row[2] or "") if row[2] is not None else None
-        except Exception:
-            sucursal_nombre = None
-            sucursal_codigo = None
-            sucursal_direccion = None
-        if not logo_url:
-            try:
-                from src.utils import _resolve_logo_url
-
-                logo_url = _resolve_logo_url()
-            except Exception:
-                logo_url = None
-
-        try:
-            if (
-                logo_url
-                and not str(logo_url).startswith("http")
-                and not str(logo_url).startswith("/")
-            ):
-                from src.services.b2_storage import get_file_url
-
-                logo_url = get_file_url(str(logo_url))
-        except Exception:
-            pass
-
-        branding_cfg = {
-            "gym_name": gym_name_cfg,
-            "gym_address": gym_addr_cfg,
-            "logo_url": logo_url,
-        }
+        receipt_branding = _resolve_receipt_branding(svc, pago)
         if not gym_name_override:
-            try:
-                if sucursal_nombre and gym_name_cfg:
-                    gym_name_override = f"{gym_name_cfg} - {sucursal_nombre}"
-                elif sucursal_nombre:
-                    gym_name_override = str(sucursal_nombre)
-            except Exception:
-                pass
+            gym_name_override = receipt_branding.get("gym_name")
         if not gym_address_override:
-            try:
-                base_addr = sucursal_direccion or gym_addr_cfg
-                if base_addr and sucursal_codigo:
-                    gym_address_override = f"{base_addr} ({sucursal_codigo})"
-                else:
-                    gym_address_override = base_addr
-            except Exception:
-                pass
-        pdfg = PDFGenerator(branding_config=branding_cfg)
-        filepath = pdfg.generar_recibo(
-            pago,
-            usuario,
+            gym_address_override = receipt_branding.get("gym_address")
+        render_args = (
+            snapshot_pago(pago),
+            snapshot_usuario(usuario),
             numero_comprobante,
-            detalles=detalles,
+        )
+        render_kwargs = dict(
+            detalles=snapshot_detalles(detalles),
             totales=totales,
             observaciones=obs_text,
             emitido_por=emitido_por,
@@ -1776,6 +1813,43 @@ async def api_pago_recibo_pdf(
             tipo_cuota=tipo_cuota_override,
             periodo=periodo_override,
         )
+        tenant_name = get_current_tenant()
+        artifacts = get_artifact_cache()
+        digest = compute_digest(
+            "recibo",
+            branding=receipt_branding["branding"],
+            args=render_args,
+            kwargs=render_kwargs,
+        )
+        etag = etag_for(digest)
+        download_name = f"recibo_{numero_comprobante or int(pago_id)}.pdf"
+        headers = {
+            "Content-Disposition": f'inline; filename="{download_name}"',
+            "ETag": etag,
+            "Cache-Control": "private, no-cache",
+        }
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(
+                status_code=304,
+                headers={"ETag": etag, "Cache-Control": "private, no-cache"},
+            )
+        if artifacts is not None:
+            cached_path = await artifacts.aget(tenant_name, "recibo", int(pago_id), digest)
+            if cached_path:
+                return FileResponse(
+                    cached_path, media_type="application/pdf", headers=headers
+                )
+
+        filepath = await get_pdf_render_service().render_receipt(
+            tenant_name,
+            receipt_branding["branding"],
+            *render_args,
+            **render_kwargs,
+        )
+        if artifacts is not None and filepath:
+            await artifacts.aput_file(
+                tenant_name, "recibo", int(pago_id), digest, str(filepath)
+            )
 
         try:
             if comprobante_id is not None and filepath:
@@ -1783,15 +1857,11 @@ async def api_pago_recibo_pdf(
         except Exception:
             pass
 
-        filename = os.path.basename(filepath)
-        resp = FileResponse(filepath, media_type="application/pdf")
-        try:
-            resp.headers["Content-Disposition"] = f'inline; filename="{filename}"'
-        except Exception:
-            pass
-        return resp
+        return FileResponse(filepath, media_type="application/pdf", headers=headers)
     except HTTPException:
         raise
+    except RenderQueueFull as e:
+        return _render_queue_full_response(e)
     except Exception as e:
         import traceback
 
@@ -1799,6 +1869,127 @@ async def api_pago_recibo_pdf(
         return JSONResponse({"error": str(e)}, status_code=500)
 
 
+@router.post("/api/pagos/recibos/pdf/batch", dependencies=[Depends(require_feature("pagos"))])
+async def api_pagos_recibos_pdf_batch(
+    request: Request,
+    _scope=Depends(require_scope_gestion("pagos:read")),
+    _=Depends(require_gestion_access),
+    svc: PaymentService = Depends(get_payment_service),
+):
+    """Render the receipts of many payments in one submission and return a ZIP.
+
+    Only already-issued comprobante numbers are used; no new numbers are
+    allocated from here.
+    """
+    try:
+        payload = await request.json()
+    except Exception:
+        payload = {}
+    raw_ids = payload.get("pago_ids") if isinstance(payload, dict) else None
+    if not isinstance(raw_ids, list) or not raw_ids:
+        raise HTTPException(status_code=400, detail="pago_ids requerido")
+    render_svc = get_pdf_render_service()
+    pago_ids: List[int] = []
+    for v in raw_ids:
+        try:
+            pid = int(v)
+        except Exception:
+            continue
+        if pid > 0 and pid not in pago_ids:
+            pago_ids.append(pid)
+    if not pago_ids:
+        raise HTTPException(status_code=400, detail="pago_ids inválido")
+    if len(pago_ids) > render_svc.max_per_tenant:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Máximo {render_svc.max_per_tenant} recibos por lote",
+        )
+
+    errores: Dict[str, str] = {}
+    items = []
+    item_ids: List[int] = []
+    for pid in pago_ids:
+        try:
+            pago = svc.obtener_pago(pid)
+            if not pago:
+                errores[str(pid)] = "Pago no encontrado"
+                continue
+            usuario = svc.obtener_usuario_por_id(int(pago.usuario_id))
+            if not usuario:
+                errores[str(pid)] = "Usuario del pago no encontrado"
+                continue
+            try:
+                detalles = svc.obtener_detalles_pago(pid)
+            except Exception:
+                detalles = []
+            try:
+                subtotal = (
+                    sum(float(d.subtotal or 0.0) for d in detalles)
+                    if detalles
+                    else float(pago.monto or 0.0)
+                )
+            except Exception:
+                subtotal = float(pago.monto or 0.0)
+            try:
+                totales = svc.calcular_total_con_comision(subtotal, pago.metodo_pago_id)
+            except Exception:
+                totales = {"subtotal": subtotal, "comision": 0.0, "total": subtotal}
+            metodo_nombre = None
+            try:
+                if pago.metodo_pago_id:
+                    m = svc.obtener_metodo_pago(int(pago.metodo_pago_id))
+                    metodo_nombre = getattr(m, "nombre", None) if m else None
+            except Exception:
+                metodo_nombre = None
+            numero_comprobante = None
+            try:
+                comp = svc.obtener_comprobante_por_pago(pid)
+                if comp:
+                    numero_comprobante = comp.get("numero_comprobante")
+            except Exception:
+                numero_comprobante = None
+            rb = _resolve_receipt_branding(svc, pago)
+            items.append(
+                (
+                    rb["branding"],
+                    (snapshot_pago(pago), snapshot_usuario(usuario), numero_comprobante),
+                    {
+                        "detalles": snapshot_detalles(detalles),
+                        "totales": totales,
+                        "metodo_pago": metodo_nombre,
+                        "gym_name": rb.get("gym_name"),
+                        "gym_address": rb.get("gym_address"),
+                    },
+                )
+            )
+            item_ids.append(pid)
+        except Exception as e:
+            errores[str(pid)] = str(e)
+
+    try:
+        results = await render_svc.render_receipt_batch(get_current_tenant(), items)
+    except RenderQueueFull as e:
+        return _render_queue_full_response(e)
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for pid, res in zip(item_ids, results):
+            if isinstance(res, BaseException):
+                errores[str(pid)] = str(res)
+                continue
+            try:
+                zf.write(res, arcname=f"recibo_{pid}.pdf")
+            except Exception as e:
+                errores[str(pid)] = str(e)
+        if errores:
+            zf.writestr("errores.json", json.dumps(errores, ensure_ascii=False, indent=2))
+    return Response(
+        content=buf.getvalue(),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="recibos.zip"'},
+    )
+
+
 @router.get("/api/recibos/numero-proximo")
 async def api_recibos_numero_proximo(
     _scope=Depends(require_scope_gestion("configuracion:read")),
@@ -1,3 +1,6 @@
+import asyncio
+import hashlib
+import json
 import logging
 import os
 import time
@@ -9,12 +12,15 @@ from pathlib import Path
 from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse, Response, FileResponse
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 
 from src.dependencies import CURRENT_TENANT
 from src.database.tenant_connection import get_tenant_session_factory
 from src.database.tenant_connection import validate_tenant_name
 from src.services.feature_flags_service import FeatureFlagsService
 from src.services.entitlements_payload_service import EntitlementsPayloadService
+from src.services import bootstrap_cache
+from src.services.pdf_artifact_cache import etag_for, etag_matches
 from src.utils import (
     _resolve_theme_vars,
     _resolve_logo_url,
@@ -70,10 +76,10 @@ def _extract_tenant_public(request: Request) -> str:
     return tenant
 
 
-def _get_branding_for_tenant(tenant: str) -> Dict[str, Any]:
+def _get_branding_for_tenant(tenant: str, fresh: bool = False) -> Dict[str, Any]:
     cache_key = tenant or "__no_tenant__"
     now = int(time.time())
-    cached = _GYM_DATA_PUBLIC_CACHE.get(cache_key)
+    cached = None if fresh else _GYM_DATA_PUBLIC_CACHE.get(cache_key)
     if cached and isinstance(cached, dict):
         try:
             if now - int(cached.get("ts") or 0) < _GYM_DATA_PUBLIC_CACHE_TTL_S:
@@ -254,10 +260,10 @@ def _get_sucursales_for_tenant(tenant: str) -> Dict[str, Any]:
         return {"items": [], "error": "query_failed"}
 
 
-def _get_admin_tenant_status(tenant: str) -> Dict[str, Any]:
+def _get_admin_tenant_status(tenant: str, fresh: bool = False) -> Dict[str, Any]:
     key = str(tenant or "").strip().lower() or "__no_tenant__"
     now = int(time.time())
-    cached = _ADMIN_STATUS_CACHE.get(key)
+    cached = None if fresh else _ADMIN_STATUS_CACHE.get(key)
     if cached and isinstance(cached, dict):
         try:
             if now - int(cached.get("ts") or 0) < _ADMIN_STATUS_CACHE_TTL_S:
@@ -317,10 +323,93 @@ async def gym_data_public(request: Request):
     return resp
 
 
+def _get_feature_flags_for_tenant(tenant: str, sucursal_id: Optional[int]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    if not tenant:
+        return out
+    try:
+        factory = get_tenant_session_factory(tenant)
+        if factory:
+            ses = factory()
+            try:
+                ff = FeatureFlagsService(ses).get_flags(sucursal_id=sucursal_id)
+                if isinstance(ff, dict) and isinstance(ff.get("modules"), dict):
+                    out["modules"] = ff.get("modules")
+                if isinstance(ff, dict) and isinstance(ff.get("features"), dict):
+                    out["features"] = ff.get("features")
+            finally:
+                ses.close()
+    except Exception:
+        pass
+    return out
+
+
+def _status_flags(admin_row: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        st = str((admin_row.get("status") or "")).strip().lower()
+        until = admin_row.get("suspended_until")
+        msg = admin_row.get("suspended_reason")
+
+        suspended = st in ("suspended", "suspension")
+        maintenance = st == "maintenance"
+
+        until_s = ""
+        try:
+            until_s = (
+                until.isoformat()
+                if hasattr(until, "isoformat") and until
+                else (str(until or ""))
+            )
+        except Exception:
+            until_s = str(until or "")
+
+        return {
+            "suspended": bool(suspended),
+            "reason": str(msg or "") if suspended else "",
+            "until": until_s if suspended else "",
+            "maintenance": bool(maintenance),
+            "maintenance_message": str(msg or "") if maintenance else "",
+        }
+    except Exception:
+        return {"suspended": False, "maintenance": False}
+
+
+async def _build_tenant_bootstrap(tenant: str, sucursal_id: Optional[int]) -> Dict[str, Any]:
+    """Tenant-scoped part of /api/bootstrap; the four lookups are independent."""
+    if not tenant:
+        branding = await run_in_threadpool(_get_branding_for_tenant, tenant)
+        return {"gym": branding, "status": _status_flags({}), "sucursales": [], "feature_flags": {}}
+    branding, admin_row, sucursales_info, feature_flags = await asyncio.gather(
+        run_in_threadpool(_get_branding_for_tenant, tenant, True),
+        run_in_threadpool(_get_admin_tenant_status, tenant, True),
+        run_in_threadpool(_get_sucursales_for_tenant, tenant),
+        run_in_threadpool(_get_feature_flags_for_tenant, tenant, sucursal_id),
+    )
+    return {
+        "gym": branding,
+        "status": _status_flags(admin_row or {}),
+        "sucursales": (sucursales_info or {}).get("items") or [],
+        "feature_flags": feature_flags or {},
+    }
+
+
+def _get_entitlements(tenant: str, user_id: int, sucursal_id: Optional[int]) -> Optional[Dict[str, Any]]:
+    try:
+        factory = get_tenant_session_factory(tenant)
+        if not factory:
+            return None
+        ses = factory()
+        try:
+            return EntitlementsPayloadService(ses).get_payload(int(user_id), sucursal_id)
+        finally:
+            ses.close()
+    except Exception:
+        return None
+
+
 @router.get("/api/bootstrap")
 async def api_bootstrap(request: Request, context: str = "auto"):
     tenant = _extract_tenant_public(request)
-    branding = _get_branding_for_tenant(tenant)
 
     try:
         ctx = str(context or "auto").strip().lower()
@@ -382,38 +471,6 @@ async def api_bootstrap(request: Request, context: str = "auto"):
     except Exception:
         session_payload = {"authenticated": False, "user": None}
 
-    flags: Dict[str, Any] = {"tenant": tenant or None}
-    try:
-        admin_row = _get_admin_tenant_status(tenant) if tenant else {}
-        st = str((admin_row.get("status") or "")).strip().lower()
-        until = admin_row.get("suspended_until")
-        msg = admin_row.get("suspended_reason")
-
-        suspended = st in ("suspended", "suspension")
-        maintenance = st == "maintenance"
-
-        until_s = ""
-        try:
-            until_s = (
-                until.isoformat()
-                if hasattr(until, "isoformat") and until
-                else (str(until or ""))
-            )
-        except Exception:
-            until_s = str(until or "")
-
-        flags.update(
-            {
-                "suspended": bool(suspended),
-                "reason": str(msg or "") if suspended else "",
-                "until": until_s if suspended else "",
-                "maintenance": bool(maintenance),
-                "maintenance_message": str(msg or "") if maintenance else "",
-            }
-        )
-    except Exception:
-        flags.update({"suspended": False, "maintenance": False})
-
     current_sucursal_id = request.session.get("sucursal_id")
     try:
         current_sucursal_id = (
@@ -422,24 +479,32 @@ async def api_bootstrap(request: Request, context: str = "auto"):
     except Exception:
         current_sucursal_id = None
 
+    entitlements_uid: Optional[int] = None
     try:
-        if tenant:
-            factory = get_tenant_session_factory(tenant)
-            if factory:
-                ses = factory()
-                try:
-                    ff = FeatureFlagsService(ses).get_flags(sucursal_id=current_sucursal_id)
-                    if isinstance(ff, dict) and isinstance(ff.get("modules"), dict):
-                        flags["modules"] = ff.get("modules")
-                    if isinstance(ff, dict) and isinstance(ff.get("features"), dict):
-                        flags["features"] = ff.get("features")
-                finally:
-                    ses.close()
+        if tenant and isinstance(session_payload.get("user"), dict):
+            uid = session_payload["user"].get("id")
+            if uid is not None and int(uid) > 0:
+                entitlements_uid = int(uid)
     except Exception:
-        pass
+        entitlements_uid = None
 
-    sucursales_info = _get_sucursales_for_tenant(tenant) if tenant else {"items": []}
-    sucursales = sucursales_info.get("items") or []
+    # Tenant part (cached) and entitlements (per user) don't depend on each other
+    tenant_part_task = bootstrap_cache.get_or_build(
+        tenant or "", current_sucursal_id,
+        lambda: _build_tenant_bootstrap(tenant, current_sucursal_id),
+    )
+    if tenant and entitlements_uid is not None:
+        tenant_part, entitlements = await asyncio.gather(
+            tenant_part_task,
+            run_in_threadpool(_get_entitlements, tenant, entitlements_uid, current_sucursal_id),
+        )
+    else:
+        tenant_part, entitlements = await tenant_part_task, None
+
+    sucursales = tenant_part.data.get("sucursales") or []
+    flags: Dict[str, Any] = {"tenant": tenant or None}
+    flags.update(tenant_part.data.get("status") or {})
+    flags.update(tenant_part.data.get("feature_flags") or {})
 
     try:
         if current_sucursal_id is not None:
@@ -454,6 +519,10 @@ async def api_bootstrap(request: Request, context: str = "auto"):
             if active_ids and int(current_sucursal_id) not in active_ids:
                 request.session.pop("sucursal_id", None)
                 current_sucursal_id = None
+                if entitlements_uid is not None:
+                    entitlements = await run_in_threadpool(
+                        _get_entitlements, tenant, entitlements_uid, None
+                    )
     except Exception:
         pass
 
@@ -467,32 +536,33 @@ async def api_bootstrap(request: Request, context: str = "auto"):
 
     payload = {
         "tenant": tenant or None,
-        "gym": branding,
+        "gym": tenant_part.data.get("gym") or {},
         "session": session_payload,
         "sucursales": sucursales,
         "sucursal_actual_id": current_sucursal_id,
         "branch_required": branch_required,
         "flags": flags,
     }
-    try:
-        if tenant and isinstance(session_payload.get("user"), dict):
-            uid = session_payload["user"].get("id")
-            if uid is not None and int(uid) > 0:
-                factory = get_tenant_session_factory(tenant)
-                if factory:
-                    ses = factory()
-                    try:
-                        payload["entitlements"] = EntitlementsPayloadService(ses).get_payload(
-                            int(uid), current_sucursal_id
-                        )
-                    finally:
-                        ses.close()
-    except Exception:
-        pass
-    resp = JSONResponse(payload)
-    resp.headers["Cache-Control"] = "private, max-age=5"
-    resp.headers["Vary"] = "Cookie, X-Tenant, Origin"
-    return resp
+    if entitlements is not None:
+        payload["entitlements"] = entitlements
+
+    # ETag = tenant digest + the small per-session part
+    per_session = json.dumps(
+        [session_payload, current_sucursal_id, branch_required, entitlements],
+        sort_keys=True,
+        default=str,
+    )
+    etag = etag_for(
+        hashlib.sha256(f"{tenant_part.digest}|{per_session}".encode("utf-8")).hexdigest()
+    )
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, max-age=5",
+        "Vary": "Cookie, X-Tenant, Origin",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(payload, headers=headers)
 
 
 @router.get("/checkin")
@@ -16,6 +16,7 @@ from src.dependencies import (
     require_sucursal_selected,
     require_scope_gestion,
 )
+from src.services.csv_stream import stream_csv
 from src.services.reports_service import ReportsService
 
 router = APIRouter(
@@ -172,6 +173,20 @@ def _to_csv_response(data: list, filename: str):
     )
 
 
+_PAGOS_COLUMNS = (
+    "id",
+    "usuario_id",
+    "usuario_nombre",
+    "monto",
+    "fecha",
+    "metodo_id",
+    "metodo_nombre",
+    "notas",
+    "created_at",
+)
+_ASISTENCIAS_COLUMNS = ("id", "usuario_id", "usuario_nombre", "created_at")
+
+
 @router.get("/api/export/usuarios/csv")
 async def api_export_usuarios_csv(
     _=Depends(require_gestion_access),
@@ -189,11 +204,12 @@ async def api_export_pagos_csv(
     _=Depends(require_gestion_access),
     svc: ReportsService = Depends(get_reports_service),
 ):
-    """Export payments to CSV."""
-    return _to_csv_response(
-        svc.exportar_pagos(
+    """Export payments to CSV (archived months included)."""
+    return stream_csv(
+        svc.iter_exportar_pagos(
             request.query_params.get("desde"), request.query_params.get("hasta")
         ),
+        _PAGOS_COLUMNS,
         f"pagos_{date.today().isoformat()}.csv",
     )
 
@@ -204,11 +220,12 @@ async def api_export_asistencias_csv(
     _=Depends(require_gestion_access),
     svc: ReportsService = Depends(get_reports_service),
 ):
-    """Export attendance to CSV."""
-    return _to_csv_response(
-        svc.exportar_asistencias(
+    """Export attendance to CSV (archived months included)."""
+    return stream_csv(
+        svc.iter_exportar_asistencias(
             request.query_params.get("desde"), request.query_params.get("hasta")
         ),
+        _ASISTENCIAS_COLUMNS,
         f"asistencias_{date.today().isoformat()}.csv",
     )
 
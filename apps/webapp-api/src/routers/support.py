@@ -143,20 +143,21 @@ async def api_support_upload_attachment(
         "image/webp",
         "text/plain",
     }
-    content = await file.read()
-    if not content:
+    size = b2_storage.fileobj_size(file.file)
+    if not size:
         raise HTTPException(status_code=400, detail="Archivo vacío")
-    if len(content) > 5 * 1024 * 1024:
+    if size > 5 * 1024 * 1024:
         raise HTTPException(status_code=400, detail="Archivo demasiado grande (max 5MB)")
     content_type = str(file.content_type or "application/octet-stream")
     if content_type not in allowed_types:
         raise HTTPException(status_code=400, detail="Tipo de archivo no permitido")
-    ok, url_or_err, key = b2_storage.upload_file(
-        content,
+    ok, url_or_err, key = await b2_storage.upload_fileobj_async(
+        file.file,
         str(file.filename or "file"),
         tenant,
         folder="support",
         content_type=content_type,
+        max_bytes=5 * 1024 * 1024,
     )
     if not ok:
         raise HTTPException(status_code=500, detail=url_or_err or "No se pudo subir")
@@ -167,7 +168,7 @@ async def api_support_upload_attachment(
             "key": key,
             "filename": str(file.filename or ""),
             "content_type": content_type,
-            "size_bytes": int(len(content)),
+            "size_bytes": int(size),
         },
     }
 
@@ -13,8 +13,8 @@ from src.dependencies import (
     require_owner,
     require_sucursal_selected,
 )
-from src.database.clase_profesor_schema import ensure_clase_profesor_schema
 from src.models.orm_models import Profesor, StaffPermission, StaffProfile, Usuario
+from src.services import class_agenda_cache
 from src.services.profesor_service import ProfesorService
 from src.services.staff_service import StaffService
 
@@ -206,8 +206,6 @@ async def api_team_impact(
         ).first()
     )
 
-    ensure_clase_profesor_schema(svc_staff.db)
-
     profesor_impact: Dict[str, Any] = {"exists": False}
     if prof is not None:
         pid = int(getattr(prof, "id", 0) or 0)
@@ -315,8 +313,6 @@ async def api_team_convert(
     if rol_actual in ("dueño", "dueno", "owner"):
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    ensure_clase_profesor_schema(svc_staff.db)
-
     prof = (
         svc_staff.db.scalars(
             select(Profesor).where(Profesor.usuario_id == int(usuario_id)).limit(1)
@@ -481,6 +477,8 @@ async def api_team_convert(
         except Exception:
             svc_staff.db.rollback()
             raise
+        if pid and force and active_assignments > 0:
+            class_agenda_cache.invalidate_static()
         return {"ok": True, "usuario_id": int(usuario_id), "target": "staff"}
 
     if staff_profile_id and not force:
@@ -516,6 +514,8 @@ async def api_team_convert(
     except Exception:
         svc_staff.db.rollback()
         raise
+    if pid and force and active_assignments > 0:
+        class_agenda_cache.invalidate_static()
     return {"ok": True, "usuario_id": int(usuario_id), "target": "usuario"}
 
 
@@ -553,8 +553,6 @@ async def api_team_delete_profile(
     if rol_actual in ("dueño", "dueno", "owner"):
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    ensure_clase_profesor_schema(svc_staff.db)
-
     prof = (
         svc_staff.db.scalars(
             select(Profesor).where(Profesor.usuario_id == int(usuario_id)).limit(1)
@@ -669,6 +667,8 @@ async def api_team_delete_profile(
         except Exception:
             svc_staff.db.rollback()
             raise
+        if force and active_assignments > 0:
+            class_agenda_cache.invalidate_static()
         return {"ok": True, "usuario_id": int(usuario_id), "kind": "profesor", "deleted": True}
 
     if staff_profile_id and active_staff_sessions > 0:
@@ -8,6 +8,8 @@ from datetime import datetime, timezone, timedelta
 
 from fastapi import APIRouter, Request, Depends, HTTPException, Response
 from fastapi.responses import JSONResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import text, select
 
@@ -26,10 +28,12 @@ from src.dependencies import (
 from src.services.whatsapp_service import WhatsAppService
 from src.services.whatsapp_dispatch_service import WhatsAppDispatchService
 from src.services.whatsapp_settings_service import WhatsAppSettingsService
+from src.services import whatsapp_inbound_service
 from src.services.audit_service import AuditService
 from src.services.payment_service import PaymentService
 from src.models.orm_models import Configuracion
 from src.database.orm_models import Usuario
+from src.database import schema_capabilities
 from src.database.tenant_connection import (
     validate_tenant_name,
     set_current_tenant,
@@ -70,49 +74,6 @@ def _redact_whatsapp_state_for_role(
         return state
 
 
-def _is_missing_table_error(e: Exception, table_name: str) -> bool:
-    try:
-        msg = str(e)
-    except Exception:
-        msg = ""
-    t = str(table_name or "").strip().lower()
-    if not t:
-        return False
-    if "undefinedtable" in msg.lower():
-        return True
-    if f'relation "{t}" does not exist' in msg.lower():
-        return True
-    return False
-
-
-def _ensure_whatsapp_triggers_table(db: Session) -> None:
-    db.execute(
-        text(
-            """
-            CREATE TABLE IF NOT EXISTS whatsapp_triggers (
-              trigger_key TEXT PRIMARY KEY,
-              enabled BOOLEAN NOT NULL DEFAULT FALSE,
-              template_name TEXT NULL,
-              cooldown_minutes INTEGER NOT NULL DEFAULT 1440,
-              last_run_at TIMESTAMP NULL
-            )
-            """
-        )
-    )
-    db.execute(
-        text(
-            """
-            INSERT INTO whatsapp_triggers(trigger_key, enabled, template_name, cooldown_minutes)
-            VALUES
-              ('overdue_daily', FALSE, NULL, 1440),
-              ('due_today_daily', FALSE, NULL, 1440),
-              ('due_soon_daily', FALSE, NULL, 1440)
-            ON CONFLICT (trigger_key) DO NOTHING
-            """
-        )
-    )
-
-
 @router.get("/api/whatsapp/state")
 async def api_whatsapp_state(
     request: Request,
@@ -779,6 +740,35 @@ async def internal_cron_whatsapp_reconcile(
     }
 
 
+@router.post("/internal/cron/whatsapp/inbound")
+async def internal_cron_whatsapp_inbound(
+    request: Request,
+):
+    secret = (os.getenv("INTERNAL_CRON_SECRET") or "").strip()
+    incoming = (request.headers.get("X-Internal-Cron-Secret") or "").strip()
+    if not secret:
+        return JSONResponse(
+            {"ok": False, "error": "INTERNAL_CRON_SECRET not configured"},
+            status_code=503,
+        )
+    if incoming != secret:
+        return JSONResponse({"ok": False, "error": "Unauthorized"}, status_code=401)
+
+    try:
+        max_batches = int(request.query_params.get("max_batches") or 10)
+    except Exception:
+        max_batches = 10
+    max_batches = max(1, min(max_batches, 100))
+
+    try:
+        stats = await run_in_threadpool(
+            whatsapp_inbound_service.drain, max_batches=max_batches
+        )
+    except Exception as e:
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
+    return {"ok": True, **stats}
+
+
 @router.get("/api/whatsapp/templates")
 async def api_whatsapp_templates_list(
     _=Depends(require_owner),
@@ -893,7 +883,8 @@ async def api_whatsapp_triggers_list(
     _=Depends(require_owner),
     db: Session = Depends(get_db_session),
 ):
-    try:
+    rows = []
+    if schema_capabilities.has(db, "whatsapp_triggers"):
         rows = db.execute(
             text(
                 """
@@ -903,28 +894,6 @@ async def api_whatsapp_triggers_list(
                 """
             )
         ).fetchall()
-    except Exception as e:
-        if _is_missing_table_error(e, "whatsapp_triggers"):
-            try:
-                _ensure_whatsapp_triggers_table(db)
-                db.commit()
-                rows = db.execute(
-                    text(
-                        """
-                        SELECT trigger_key, enabled, template_name, cooldown_minutes, last_run_at
-                        FROM whatsapp_triggers
-                        ORDER BY trigger_key ASC
-                        """
-                    )
-                ).fetchall()
-            except Exception:
-                try:
-                    db.rollback()
-                except Exception:
-                    pass
-                rows = []
-        else:
-            raise
     return {
         "triggers": [
             {
@@ -954,6 +923,11 @@ async def api_whatsapp_triggers_upsert(
     enabled = bool(payload.get("enabled", False))
     template_name = payload.get("template_name")
     cooldown_minutes = payload.get("cooldown_minutes")
+    if not schema_capabilities.has(db, "whatsapp_triggers"):
+        raise HTTPException(
+            status_code=503,
+            detail="Automatizaciones no disponibles: esquema pendiente de migración",
+        )
     old_row = None
     try:
         old_row = db.execute(
@@ -963,61 +937,33 @@ async def api_whatsapp_triggers_upsert(
     except Exception:
         old_row = None
         try:
-            _ensure_whatsapp_triggers_table(db)
-            db.commit()
+            db.rollback()
         except Exception:
-            try:
-                db.rollback()
-            except Exception:
-                pass
+            pass
     try:
         cooldown_minutes = (
             int(cooldown_minutes) if cooldown_minutes is not None else 1440
         )
     except Exception:
         cooldown_minutes = 1440
-    try:
-        db.execute(
-            text(
-                """
-                INSERT INTO whatsapp_triggers (trigger_key, enabled, template_name, cooldown_minutes)
-                VALUES (:k, :en, :tpl, :cd)
-                ON CONFLICT (trigger_key) DO UPDATE
-                SET enabled = EXCLUDED.enabled,
-                    template_name = EXCLUDED.template_name,
-                    cooldown_minutes = EXCLUDED.cooldown_minutes
-                """
-            ),
-            {
-                "k": trigger_key,
-                "en": enabled,
-                "tpl": template_name,
-                "cd": cooldown_minutes,
-            },
-        )
-    except Exception as e:
-        if _is_missing_table_error(e, "whatsapp_triggers"):
-            _ensure_whatsapp_triggers_table(db)
-            db.execute(
-                text(
-                    """
-                    INSERT INTO whatsapp_triggers (trigger_key, enabled, template_name, cooldown_minutes)
-                    VALUES (:k, :en, :tpl, :cd)
-                    ON CONFLICT (trigger_key) DO UPDATE
-                    SET enabled = EXCLUDED.enabled,
-                        template_name = EXCLUDED.template_name,
-                        cooldown_minutes = EXCLUDED.cooldown_minutes
-                    """
-                ),
-                {
-                    "k": trigger_key,
-                    "en": enabled,
-                    "tpl": template_name,
-                    "cd": cooldown_minutes,
-                },
-            )
-        else:
-            raise
+    db.execute(
+        text(
+            """
+            INSERT INTO whatsapp_triggers (trigger_key, enabled, template_name, cooldown_minutes)
+            VALUES (:k, :en, :tpl, :cd)
+            ON CONFLICT (trigger_key) DO UPDATE
+            SET enabled = EXCLUDED.enabled,
+                template_name = EXCLUDED.template_name,
+                cooldown_minutes = EXCLUDED.cooldown_minutes
+            """
+        ),
+        {
+            "k": trigger_key,
+            "en": enabled,
+            "tpl": template_name,
+            "cd": cooldown_minutes,
+        },
+    )
     db.commit()
     try:
         audit.log_from_request(
@@ -1065,7 +1011,8 @@ async def api_whatsapp_automation_run(
     if trigger_keys and not isinstance(trigger_keys, list):
         trigger_keys = None
 
-    try:
+    triggers = []
+    if schema_capabilities.has(db, "whatsapp_triggers"):
         triggers = db.execute(
             text(
                 """
@@ -1074,27 +1021,6 @@ async def api_whatsapp_automation_run(
                 """
             )
         ).fetchall()
-    except Exception as e:
-        if _is_missing_table_error(e, "whatsapp_triggers"):
-            try:
-                _ensure_whatsapp_triggers_table(db)
-                db.commit()
-                triggers = db.execute(
-                    text(
-                        """
-                        SELECT trigger_key, enabled, cooldown_minutes, last_run_at
-                        FROM whatsapp_triggers
-                        """
-                    )
-                ).fetchall()
-            except Exception:
-                try:
-                    db.rollback()
-                except Exception:
-                    pass
-                triggers = []
-        else:
-            raise
     trig_map = {
         r[0]: {
             "enabled": bool(r[1]),
@@ -2153,137 +2079,101 @@ async def whatsapp_verify_tenant(tenant: str, request: Request):
     raise HTTPException(status_code=403, detail="Invalid verify token")
 
 
-@router.post("/webhooks/whatsapp")
-async def whatsapp_webhook(
-    request: Request,
-):
-    def _admin_db_params() -> Dict[str, Any]:
-        return {
-            "host": os.getenv("ADMIN_DB_HOST", os.getenv("DB_HOST", "localhost")),
-            "port": int(os.getenv("ADMIN_DB_PORT", os.getenv("DB_PORT", 5432))),
-            "database": os.getenv(
-                "ADMIN_DB_NAME", os.getenv("DB_NAME", "ironhub_admin")
-            ),
-            "user": os.getenv("ADMIN_DB_USER", os.getenv("DB_USER", "postgres")),
-            "password": os.getenv("ADMIN_DB_PASSWORD", os.getenv("DB_PASSWORD", "")),
-            "sslmode": os.getenv(
-                "ADMIN_DB_SSLMODE", os.getenv("DB_SSLMODE", "require")
-            ),
-            "connect_timeout": 10,
-            "application_name": "webapp_api_whatsapp_webhook",
-        }
+def _webhook_unsigned_allowed() -> bool:
+    dev_mode = os.getenv("DEVELOPMENT_MODE", "").lower() in (
+        "1",
+        "true",
+        "yes",
+    ) or os.getenv("ENV", "").lower() in ("dev", "development")
+    allow_unsigned = os.getenv("ALLOW_UNSIGNED_WHATSAPP_WEBHOOK", "").lower() in (
+        "1",
+        "true",
+        "yes",
+    )
+    return dev_mode or allow_unsigned
 
-    def _resolve_tenant_by_phone_number_id(phone_number_id: str) -> Optional[str]:
-        from src.database.raw_manager import RawPostgresManager
 
-        pid = str(phone_number_id or "").strip()
-        if not pid:
-            return None
-        try:
-            adm = RawPostgresManager(connection_params=_admin_db_params())
-            with adm.get_connection_context() as conn:
-                cur = conn.cursor()
-                cur.execute(
-                    "SELECT subdominio FROM gyms WHERE whatsapp_phone_id = %s LIMIT 1",
-                    (pid,),
-                )
-                row = cur.fetchone()
-            return str(row[0]).strip().lower() if row and row[0] else None
-        except Exception:
-            return None
+def _verify_webhook_signature(raw: bytes, request: Request, app_secret: str) -> None:
+    if not app_secret and not _webhook_unsigned_allowed():
+        raise HTTPException(status_code=503, detail="Webhook signature not configured")
+    if not app_secret:
+        return
+    import hmac, hashlib
 
-    def _extract_phone_number_id(payload: Dict[str, Any]) -> Optional[str]:
-        try:
-            for entry in (payload or {}).get("entry") or []:
-                for change in (entry or {}).get("changes") or []:
-                    value = (change or {}).get("value") or {}
-                    md = value.get("metadata") or {}
-                    pid = (md or {}).get("phone_number_id")
-                    if pid:
-                        return str(pid)
-                    for st0 in value.get("statuses") or []:
-                        c = (
-                            (st0 or {}).get("recipient_id")
-                            or (st0 or {}).get("conversation")
-                            or None
-                        )
-                        _ = c
-            return None
-        except Exception:
-            return None
-
-    def _verify_signature(
-        raw: bytes,
-        request: Request,
-        app_secret: str,
-        dev_mode: bool,
-        allow_unsigned: bool,
-    ) -> None:
-        if not app_secret and not (dev_mode or allow_unsigned):
-            raise HTTPException(
-                status_code=503, detail="Webhook signature not configured"
+    sig = request.headers.get("X-Hub-Signature-256") or ""
+    expected_hash = hmac.new(app_secret.encode(), raw, hashlib.sha256).hexdigest()
+    incoming_hash = str(sig).strip()
+    if incoming_hash.lower().startswith("sha256="):
+        incoming_hash = incoming_hash.split("=", 1)[1]
+    if not hmac.compare_digest(expected_hash, incoming_hash):
+        raise HTTPException(status_code=403, detail="Invalid signature")
+
+
+def _tenant_app_secret(tenant: str) -> str:
+    try:
+        with tenant_session_scope(tenant) as db:
+            row = db.execute(
+                select(Configuracion.valor)
+                .where(Configuracion.clave == "WHATSAPP_APP_SECRET")
+                .limit(1)
+            ).first()
+            return str((row[0] if row else "") or "")
+    except Exception:
+        return ""
+
+
+async def _ack_webhook(
+    payload: Dict[str, Any], tenant: Optional[str], phone_number_id: Optional[str]
+):
+    """Queue the delivery and answer Meta right away.
+
+    When the queue is unavailable the payload is applied inline, as before.
+    Without a worker thread (serverless) one batch is drained after the
+    response has been sent.
+    """
+    try:
+        await run_in_threadpool(
+            whatsapp_inbound_service.enqueue, payload, tenant, phone_number_id
+        )
+    except Exception as e:
+        logger.warning(f"WhatsApp inbound queue unavailable, processing inline: {e}")
+        if not tenant and phone_number_id:
+            try:
+                resolved = await run_in_threadpool(
+                    whatsapp_inbound_service.resolve_tenants, [phone_number_id]
+                )
+                tenant = resolved.get(str(phone_number_id).strip())
+            except Exception:
+                tenant = None
+        ok, _ = validate_tenant_name(str(tenant or ""))
+        if not tenant or not ok:
+            logger.warning(
+                f"WhatsApp webhook unrouted: phone_number_id={str(phone_number_id or '').strip() or 'none'}"
             )
-        if not app_secret:
-            return
-        import hmac, hashlib
-
-        sig = request.headers.get("X-Hub-Signature-256") or ""
-        expected_hash = hmac.new(app_secret.encode(), raw, hashlib.sha256).hexdigest()
-        incoming_hash = str(sig).strip()
-        if incoming_hash.lower().startswith("sha256="):
-            incoming_hash = incoming_hash.split("=", 1)[1]
-        if not hmac.compare_digest(expected_hash, incoming_hash):
-            raise HTTPException(status_code=403, detail="Invalid signature")
-
-    def _process_payload(
-        svc0: WhatsAppService, payload0: Dict[str, Any], sucursal_id: Optional[int]
-    ) -> None:
-        for entry in payload0.get("entry") or []:
-            for change in entry.get("changes") or []:
-                value = change.get("value") or {}
-                for status in value.get("statuses") or []:
-                    mid, stt = status.get("id"), status.get("status")
-                    if mid and stt:
-                        svc0.actualizar_estado_mensaje(mid, stt)
-                for msg in value.get("messages") or []:
-                    mid = msg.get("id")
-                    mtype = msg.get("type")
-                    wa_from = msg.get("from")
-                    text = None
-                    if mtype == "text":
-                        text = (msg.get("text") or {}).get("body")
-                    elif mtype == "button":
-                        text = (msg.get("button") or {}).get("text")
-                    elif mtype == "interactive":
-                        ir = msg.get("interactive") or {}
-                        text = (ir.get("button_reply") or {}).get("title") or (
-                            ir.get("list_reply") or {}
-                        ).get("title")
-                    elif mtype in ("image", "audio", "video", "document"):
-                        text = f"[{mtype}]"
-                    uid = (
-                        svc0.obtener_usuario_id_por_telefono(wa_from)
-                        if wa_from
-                        else None
-                    )
-                    svc0.registrar_mensaje_entrante(
-                        uid, sucursal_id, wa_from, text or "", mid
-                    )
+            return {"status": "ignored", "reason": "unrouted"}
+        await run_in_threadpool(
+            whatsapp_inbound_service.process_tenant,
+            str(tenant),
+            [(phone_number_id, payload)],
+        )
+        return {"status": "ok"}
+
+    if whatsapp_inbound_service.inbound_worker_running():
+        return {"status": "ok"}
+    return JSONResponse(
+        {"status": "ok"},
+        background=BackgroundTask(whatsapp_inbound_service.drain, max_batches=1),
+    )
+
 
+@router.post("/webhooks/whatsapp")
+async def whatsapp_webhook(
+    request: Request,
+):
     try:
         raw = await request.body()
-        dev_mode = os.getenv("DEVELOPMENT_MODE", "").lower() in (
-            "1",
-            "true",
-            "yes",
-        ) or os.getenv("ENV", "").lower() in ("dev", "development")
-        allow_unsigned = os.getenv("ALLOW_UNSIGNED_WHATSAPP_WEBHOOK", "").lower() in (
-            "1",
-            "true",
-            "yes",
-        )
         app_secret = (os.getenv("WHATSAPP_APP_SECRET", "") or "").strip()
-        _verify_signature(raw, request, app_secret, dev_mode, allow_unsigned)
+        _verify_webhook_signature(raw, request, app_secret)
         payload = json.loads(raw.decode())
         if not isinstance(payload, dict):
             return {"status": "ignored"}
@@ -2292,39 +2182,8 @@ async def whatsapp_webhook(
     except Exception:
         raise HTTPException(status_code=400, detail="Bad Request")
 
-    phone_number_id = _extract_phone_number_id(payload)
-    tenant = _resolve_tenant_by_phone_number_id(phone_number_id or "")
-    if tenant:
-        ok, err = validate_tenant_name(str(tenant))
-        if not ok:
-            return {"status": "ignored", "reason": "invalid_tenant"}
-        set_current_tenant(str(tenant))
-        with tenant_session_scope(str(tenant)) as tdb:
-            tsvc = WhatsAppService(tdb)
-            sid = None
-            try:
-                if phone_number_id:
-                    sid = (
-                        tdb.execute(
-                            text(
-                                "SELECT sucursal_id FROM whatsapp_config WHERE phone_id = :pid ORDER BY created_at DESC LIMIT 1"
-                            ),
-                            {"pid": str(phone_number_id).strip()},
-                        ).scalar()
-                        or None
-                    )
-            except Exception:
-                sid = None
-            _process_payload(tsvc, payload, sid)
-        return {"status": "ok"}
-
-    try:
-        logger.warning(
-            f"WhatsApp webhook unrouted: phone_number_id={str(phone_number_id or '').strip() or 'none'}"
-        )
-    except Exception:
-        pass
-    return {"status": "ignored", "reason": "unrouted"}
+    phone_number_id = whatsapp_inbound_service.extract_phone_number_id(payload)
+    return await _ack_webhook(payload, None, phone_number_id)
 
 
 @router.post("/webhooks/whatsapp/{tenant}")
@@ -2334,113 +2193,19 @@ async def whatsapp_webhook_tenant(tenant: str, request: Request):
         raise HTTPException(status_code=404, detail=str(err or "Not found"))
     t = str(tenant).strip().lower()
     set_current_tenant(t)
-    with tenant_session_scope(t) as db:
-        svc = WhatsAppService(db)
-        try:
-            raw = await request.body()
-            dev_mode = os.getenv("DEVELOPMENT_MODE", "").lower() in (
-                "1",
-                "true",
-                "yes",
-            ) or os.getenv("ENV", "").lower() in ("dev", "development")
-            allow_unsigned = os.getenv(
-                "ALLOW_UNSIGNED_WHATSAPP_WEBHOOK", ""
-            ).lower() in ("1", "true", "yes")
-
-            app_secret = os.getenv("WHATSAPP_APP_SECRET", "")
-            if not app_secret:
-                try:
-                    row = db.execute(
-                        select(Configuracion.valor)
-                        .where(Configuracion.clave == "WHATSAPP_APP_SECRET")
-                        .limit(1)
-                    ).first()
-                    app_secret = (row[0] if row else "") or ""
-                except Exception:
-                    app_secret = ""
-            if not app_secret and not (dev_mode or allow_unsigned):
-                raise HTTPException(
-                    status_code=503, detail="Webhook signature not configured"
-                )
-
-            if app_secret:
-                import hmac, hashlib
-
-                sig = request.headers.get("X-Hub-Signature-256") or ""
-                expected_hash = hmac.new(
-                    app_secret.encode(), raw, hashlib.sha256
-                ).hexdigest()
-                incoming_hash = str(sig).strip()
-                if incoming_hash.lower().startswith("sha256="):
-                    incoming_hash = incoming_hash.split("=", 1)[1]
-                if not hmac.compare_digest(expected_hash, incoming_hash):
-                    raise HTTPException(status_code=403, detail="Invalid signature")
-
-            payload = json.loads(raw.decode())
-        except HTTPException:
-            raise
-        except Exception:
-            raise HTTPException(status_code=400, detail="Bad Request")
-
-        phone_number_id = None
-        try:
-            for entry in payload.get("entry") or []:
-                for change in entry.get("changes") or []:
-                    value = (change or {}).get("value") or {}
-                    md = value.get("metadata") or {}
-                    pid = (md or {}).get("phone_number_id")
-                    if pid:
-                        phone_number_id = str(pid)
-                        break
-        except Exception:
-            phone_number_id = None
-        sid = None
-        try:
-            if phone_number_id:
-                sid = (
-                    db.execute(
-                        text(
-                            "SELECT sucursal_id FROM whatsapp_config WHERE phone_id = :pid ORDER BY created_at DESC LIMIT 1"
-                        ),
-                        {"pid": str(phone_number_id).strip()},
-                    ).scalar()
-                    or None
-                )
-        except Exception:
-            sid = None
-
-        for entry in payload.get("entry") or []:
-            for change in entry.get("changes") or []:
-                value = change.get("value") or {}
-
-                for status in value.get("statuses") or []:
-                    mid, stt = status.get("id"), status.get("status")
-                    if mid and stt:
-                        svc.actualizar_estado_mensaje(mid, stt)
-
-                for msg in value.get("messages") or []:
-                    mid = msg.get("id")
-                    mtype = msg.get("type")
-                    wa_from = msg.get("from")
-
-                    text = None
-                    if mtype == "text":
-                        text = (msg.get("text") or {}).get("body")
-                    elif mtype == "button":
-                        text = (msg.get("button") or {}).get("text")
-                    elif mtype == "interactive":
-                        ir = msg.get("interactive") or {}
-                        text = (ir.get("button_reply") or {}).get("title") or (
-                            ir.get("list_reply") or {}
-                        ).get("title")
-                    elif mtype in ("image", "audio", "video", "document"):
-                        text = f"[{mtype}]"
-
-                    uid = (
-                        svc.obtener_usuario_id_por_telefono(wa_from)
-                        if wa_from
-                        else None
-                    )
-                    svc.registrar_mensaje_entrante(uid, sid, wa_from, text or "", mid)
+    try:
+        raw = await request.body()
+        app_secret = os.getenv("WHATSAPP_APP_SECRET", "")
+        if not app_secret:
+            app_secret = await run_in_threadpool(_tenant_app_secret, t)
+        _verify_webhook_signature(raw, request, app_secret)
+        payload = json.loads(raw.decode())
+        if not isinstance(payload, dict):
+            return {"status": "ignored"}
+    except HTTPException:
+        raise
+    except Exception:
+        raise HTTPException(status_code=400, detail="Bad Request")
 
-        return {"status": "ok"}
+    phone_number_id = whatsapp_inbound_service.extract_phone_number_id(payload)
+    return await _ack_webhook(payload, t, phone_number_id)
@@ -0,0 +1,235 @@
+"""
+Opt-in sampling profiler
+
+A statistical stack sampler that is armed per tenant for a time window
+(POST /internal/profiler/{tenant}) without restarting. While any window is
+open a daemon thread wakes every PROFILER_INTERVAL_MS, snapshots
+sys._current_frames() and counts the non-idle stacks. When every window has
+closed the thread exits, so the cost is zero when the profiler is not in use.
+
+The event loop thread serves every tenant, so samples are attributed by
+what is in flight: a sample counts for tenant X only while X has requests in
+progress. In strict mode (default) samples taken while other tenants also
+have requests in flight are skipped, which keeps the profile clean at the
+cost of fewer samples on busy workers. Windows are per process.
+
+Reports give self/total counts per function and folded stacks
+("a;b;c N") that flamegraph tools read directly.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+PROFILER_INTERVAL_MS = max(_env_int("PROFILER_INTERVAL_MS", 10), 1)
+PROFILER_MAX_WINDOW_SECONDS = max(_env_int("PROFILER_MAX_WINDOW_SECONDS", 300), 1)
+PROFILER_MAX_DEPTH = max(_env_int("PROFILER_MAX_DEPTH", 64), 1)
+
+# Leaf frames that mean "this thread is waiting", not working
+_IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+_Frame = Tuple[str, str, int]
+
+
+class ProfileWindow:
+    """Samples collected for one tenant between `started` and `ends`"""
+
+    def __init__(self, tenant: str, seconds: int, strict: bool = True):
+        self.tenant = tenant
+        self.strict = bool(strict)
+        self.started = time.time()
+        self.ends = self.started + seconds
+        self.samples = 0
+        self.skipped = 0
+        self.stacks: Counter = Counter()
+
+    def active(self, now: Optional[float] = None) -> bool:
+        return (now if now is not None else time.time()) < self.ends
+
+    def report(self, limit: int = 50) -> Dict[str, Any]:
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        for stack, n in self.stacks.items():
+            if stack:
+                self_counts[_label(stack[-1])] += n
+            for label in {_label(f) for f in stack}:
+                total_counts[label] += n
+        return {
+            "tenant": self.tenant,
+            "started": self.started,
+            "ends": self.ends,
+            "active": self.active(),
+            "strict": self.strict,
+            "interval_ms": PROFILER_INTERVAL_MS,
+            "samples": self.samples,
+            "skipped": self.skipped,
+            "self": self_counts.most_common(limit),
+            "total": total_counts.most_common(limit),
+        }
+
+    def folded(self) -> str:
+        lines = [
+            ";".join(_label(f) for f in stack) + f" {n}"
+            for stack, n in self.stacks.most_common()
+        ]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+
+def _label(frame: _Frame) -> str:
+    filename, func, lineno = frame
+    return f"{func} ({os.path.basename(filename)}:{lineno})"
+
+
+def _stack(frame: Any) -> Tuple[_Frame, ...]:
+    out: List[_Frame] = []
+    f = frame
+    while f is not None and len(out) < PROFILER_MAX_DEPTH:
+        code = f.f_code
+        out.append((code.co_filename, code.co_name, f.f_lineno))
+        f = f.f_back
+    out.reverse()
+    return tuple(out)
+
+
+def _is_idle(stack: Tuple[_Frame, ...]) -> bool:
+    if not stack:
+        return True
+    filename, func, _ = stack[-1]
+    return (os.path.basename(filename), func) in _IDLE_LEAVES
+
+
+class SamplingProfiler:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._windows: Dict[str, ProfileWindow] = {}
+        self._inflight: Counter = Counter()
+        self._thread: Optional[threading.Thread] = None
+
+    # --- control ---
+
+    def start(self, tenant: str, seconds: int = 60, strict: bool = True) -> ProfileWindow:
+        seconds = max(1, min(int(seconds), PROFILER_MAX_WINDOW_SECONDS))
+        window = ProfileWindow(str(tenant), seconds, strict)
+        with self._lock:
+            self._windows[window.tenant] = window
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="sampling-profiler", daemon=True
+                )
+                self._thread.start()
+        logger.info(f"Sampling profiler armed for '{window.tenant}' for {seconds}s")
+        return window
+
+    def stop(self, tenant: str) -> Optional[ProfileWindow]:
+        with self._lock:
+            window = self._windows.get(str(tenant))
+            if window is not None:
+                window.ends = min(window.ends, time.time())
+        return window
+
+    def get(self, tenant: str) -> Optional[ProfileWindow]:
+        with self._lock:
+            return self._windows.get(str(tenant))
+
+    def armed(self) -> bool:
+        return self._thread is not None
+
+    # --- request tracking (called by the tenant middleware) ---
+
+    def enter(self, tenant: Optional[str]) -> Optional[str]:
+        """Count an in-flight request while the sampler runs; returns the exit token"""
+        if self._thread is None:
+            return None
+        key = str(tenant or "")
+        with self._lock:
+            self._inflight[key] += 1
+        return key
+
+    def exit(self, token: Optional[str]) -> None:
+        if token is None:
+            return
+        with self._lock:
+            n = self._inflight.get(token, 0) - 1
+            if n > 0:
+                self._inflight[token] = n
+            else:
+                self._inflight.pop(token, None)
+
+    # --- sampler ---
+
+    def _run(self) -> None:
+        interval = PROFILER_INTERVAL_MS / 1000.0
+        me = threading.get_ident()
+        while True:
+            now = time.time()
+            with self._lock:
+                open_windows = [w for w in self._windows.values() if w.active(now)]
+                if not open_windows:
+                    self._thread = None
+                    self._inflight.clear()
+                    return
+                inflight = {t: n for t, n in self._inflight.items() if n > 0}
+            target = self._target(open_windows, inflight)
+            if target is not None:
+                self._sample(target, me)
+            time.sleep(interval)
+
+    @staticmethod
+    def _target(windows: List[ProfileWindow], inflight: Dict[str, int]) -> Optional[ProfileWindow]:
+        busy = [w for w in windows if inflight.get(w.tenant)]
+        if len(busy) != 1:
+            return None
+        window = busy[0]
+        if window.strict and any(t != window.tenant for t in inflight):
+            window.skipped += 1
+            return None
+        return window
+
+    def _sample(self, window: ProfileWindow, own_ident: int) -> None:
+        try:
+            frames = sys._current_frames()
+        except Exception:
+            return
+        for ident, frame in frames.items():
+            if ident == own_ident:
+                continue
+            stack = _stack(frame)
+            if _is_idle(stack):
+                continue
+            window.stacks[stack] += 1
+            window.samples += 1
+
+
+_profiler = SamplingProfiler()
+
+
+def get_sampling_profiler() -> SamplingProfiler:
+    return _profiler
+
+
+__all__ = [
+    "PROFILER_MAX_WINDOW_SECONDS",
+    "ProfileWindow",
+    "SamplingProfiler",
+    "get_sampling_profiler",
+]
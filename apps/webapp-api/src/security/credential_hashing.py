@@ -0,0 +1,339 @@
+"""
+Credential hashing off the event loop.
+
+bcrypt/PBKDF2 verification costs 100-250 ms of CPU per call. Routes await
+`averify`/`ahash`, which run in a small process pool, so PIN check-ins and
+logins no longer stall every other request on the worker.
+
+Results are kept for a short time in a verification cache keyed by an HMAC of
+(user, stored hash, input) with a per-process key, so repeated kiosk check-ins
+and the sync code paths that run right after an async pre-check don't hash
+again. Changing the stored hash changes the key, so a PIN change invalidates
+naturally.
+
+Stored formats: bcrypt (`$2...`), `pbkdf2$sha256$<iters>$<salt>$<dk>` and
+legacy plaintext. `needs_rehash` flags anything that is not bcrypt at the
+configured cost (BCRYPT_ROUNDS) so callers can upgrade after a successful
+verification.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import bcrypt  # type: ignore
+
+    HAS_BCRYPT = True
+except Exception:  # pragma: no cover - depends on the runtime image
+    bcrypt = None  # type: ignore
+    HAS_BCRYPT = False
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+BCRYPT_ROUNDS = max(4, min(_env_int("BCRYPT_ROUNDS", 12), 16))
+PBKDF2_ITERATIONS = 200_000
+CREDENTIAL_VERIFY_CACHE_TTL = _env_int("CREDENTIAL_VERIFY_CACHE_TTL", 300)
+CREDENTIAL_VERIFY_NEGATIVE_TTL = _env_int("CREDENTIAL_VERIFY_NEGATIVE_TTL", 30)
+CREDENTIAL_VERIFY_CACHE_SIZE = _env_int("CREDENTIAL_VERIFY_CACHE_SIZE", 10000)
+
+
+# === Pure functions (run inside pool workers) ===
+
+
+def hash_secret(secret: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    p = str(secret or "").strip()
+    if not p:
+        return ""
+    if HAS_BCRYPT:
+        try:
+            return bcrypt.hashpw(p.encode("utf-8"), bcrypt.gensalt(rounds=int(rounds))).decode("utf-8")
+        except Exception:
+            pass
+    salt = os.urandom(16)
+    dk = hashlib.pbkdf2_hmac("sha256", p.encode("utf-8"), salt, PBKDF2_ITERATIONS)
+    salt_b64 = base64.urlsafe_b64encode(salt).decode("utf-8").rstrip("=")
+    dk_b64 = base64.urlsafe_b64encode(dk).decode("utf-8").rstrip("=")
+    return f"pbkdf2$sha256${PBKDF2_ITERATIONS}${salt_b64}${dk_b64}"
+
+
+def verify_pbkdf2(secret: str, stored: str) -> bool:
+    try:
+        parts = str(stored or "").split("$")
+        if len(parts) != 5:
+            return False
+        _scheme, algo, iters_s, salt_b64, dk_b64 = parts
+        if algo != "sha256":
+            return False
+        iters = int(iters_s)
+        if iters < 50_000 or iters > 2_000_000:
+            return False
+        pad = "=" * ((4 - (len(salt_b64) % 4)) % 4)
+        salt = base64.urlsafe_b64decode((salt_b64 + pad).encode("utf-8"))
+        pad2 = "=" * ((4 - (len(dk_b64) % 4)) % 4)
+        dk = base64.urlsafe_b64decode((dk_b64 + pad2).encode("utf-8"))
+        calc = hashlib.pbkdf2_hmac("sha256", str(secret).encode("utf-8"), salt, iters)
+        return hmac.compare_digest(calc, dk)
+    except Exception:
+        return False
+
+
+def verify_secret(secret: str, stored: str) -> bool:
+    """Check a secret against any supported stored format"""
+    s = str(stored or "").strip()
+    if not s or secret is None:
+        return False
+    try:
+        if s.startswith("$2"):
+            if not HAS_BCRYPT:
+                return False
+            return bool(bcrypt.checkpw(str(secret).encode("utf-8"), s.encode("utf-8")))
+        if s.startswith("pbkdf2$"):
+            return verify_pbkdf2(str(secret), s)
+        return hmac.compare_digest(s.encode("utf-8"), str(secret).strip().encode("utf-8"))
+    except Exception:
+        return False
+
+
+def is_hashed(stored: str) -> bool:
+    s = str(stored or "").strip()
+    return s.startswith("$2") or s.startswith("pbkdf2$")
+
+
+def _bcrypt_cost(stored: str) -> Optional[int]:
+    try:
+        # $2b$12$<salt+hash>
+        return int(str(stored).split("$")[2])
+    except Exception:
+        return None
+
+
+# === Pool + cache (API process) ===
+
+
+class CredentialHasher:
+    """Process-pool backed hashing with a short-lived verification cache"""
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        rounds: int = BCRYPT_ROUNDS,
+        cache_ttl: int = CREDENTIAL_VERIFY_CACHE_TTL,
+        negative_ttl: int = CREDENTIAL_VERIFY_NEGATIVE_TTL,
+        cache_size: int = CREDENTIAL_VERIFY_CACHE_SIZE,
+    ):
+        self.workers = max(
+            workers if workers is not None else _env_int("CREDENTIAL_HASH_WORKERS", min(2, os.cpu_count() or 1)),
+            1,
+        )
+        self.rounds = int(rounds)
+        self.cache_ttl = max(int(cache_ttl), 0)
+        self.negative_ttl = max(int(negative_ttl), 0)
+        self.cache_size = max(int(cache_size), 1)
+        self._key = os.urandom(32)
+        self._cache: "OrderedDict[bytes, Tuple[bool, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor: Optional[Executor] = None
+        self._hits = 0
+        self._misses = 0
+
+    # --- executor ---
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                try:
+                    method = os.getenv("CREDENTIAL_HASH_START_METHOD", "spawn")
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context(method),
+                    )
+                except Exception as e:
+                    logger.warning(f"Credential hash process pool unavailable, using threads: {e}")
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix="cred-hash"
+                    )
+            return self._executor
+
+    def _reset_executor(self) -> None:
+        with self._lock:
+            ex, self._executor = self._executor, None
+        if ex is not None:
+            try:
+                ex.shutdown(wait=False, cancel_futures=True)
+            except Exception:
+                pass
+
+    async def _run(self, fn, *args) -> Any:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        except BrokenProcessPool:
+            logger.warning("Credential hash pool broken, recreating it; running this call in a thread")
+            self._reset_executor()
+            return await asyncio.to_thread(fn, *args)
+
+    def _run_sync(self, fn, *args) -> Any:
+        try:
+            return self._get_executor().submit(fn, *args).result()
+        except BrokenProcessPool:
+            self._reset_executor()
+            return fn(*args)
+
+    # --- cache ---
+
+    def _cache_key(self, user_key: Any, stored: str, secret: str) -> bytes:
+        msg = f"{user_key}\x00{stored}\x00{secret}".encode("utf-8", errors="replace")
+        return hmac.new(self._key, msg, hashlib.sha256).digest()
+
+    def _cache_get(self, key: bytes) -> Optional[bool]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._cache.get(key)
+            if item is None:
+                self._misses += 1
+                return None
+            ok, expires = item
+            if expires < now:
+                self._cache.pop(key, None)
+                self._misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self._hits += 1
+            return ok
+
+    def _cache_put(self, key: bytes, ok: bool) -> None:
+        ttl = self.cache_ttl if ok else self.negative_ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._cache[key] = (bool(ok), time.monotonic() + ttl)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def remember(self, user_key: Any, stored: str, secret: str, ok: bool = True) -> None:
+        """Record a known result (e.g. right after re-hashing a verified secret)"""
+        self._cache_put(self._cache_key(user_key, str(stored or "").strip(), str(secret)), ok)
+
+    # --- API ---
+
+    def verify(self, user_key: Any, stored: str, secret: Optional[str]) -> bool:
+        """Blocking verify; answers from cache when an async pre-check already ran"""
+        s = str(stored or "").strip()
+        if not s or secret is None:
+            return False
+        if not is_hashed(s):
+            return verify_secret(str(secret), s)
+        key = self._cache_key(user_key, s, str(secret))
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        ok = bool(self._run_sync(verify_secret, str(secret), s))
+        self._cache_put(key, ok)
+        return ok
+
+    async def averify(self, user_key: Any, stored: str, secret: Optional[str]) -> bool:
+        s = str(stored or "").strip()
+        if not s or secret is None:
+            return False
+        if not is_hashed(s):
+            return verify_secret(str(secret), s)
+        key = self._cache_key(user_key, s, str(secret))
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        ok = bool(await self._run(verify_secret, str(secret), s))
+        self._cache_put(key, ok)
+        return ok
+
+    async def averify_and_upgrade(
+        self, user_key: Any, stored: str, secret: Optional[str]
+    ) -> Tuple[bool, Optional[str]]:
+        """Verify and, when the stored hash is legacy or at another cost, return a fresh hash to persist"""
+        ok = await self.averify(user_key, stored, secret)
+        if not ok or not self.needs_rehash(stored):
+            return ok, None
+        try:
+            new_hash = await self.ahash(str(secret))
+        except Exception as e:
+            logger.warning(f"Credential re-hash failed: {e}")
+            return ok, None
+        if new_hash:
+            self.remember(user_key, new_hash, str(secret), True)
+        return ok, new_hash or None
+
+    def hash(self, secret: str) -> str:
+        if not str(secret or "").strip():
+            return ""
+        return str(self._run_sync(hash_secret, str(secret), self.rounds))
+
+    async def ahash(self, secret: str) -> str:
+        if not str(secret or "").strip():
+            return ""
+        return str(await self._run(hash_secret, str(secret), self.rounds))
+
+    def needs_rehash(self, stored: str) -> bool:
+        s = str(stored or "").strip()
+        if not s:
+            return False
+        if s.startswith("$2"):
+            cost = _bcrypt_cost(s)
+            return cost is not None and cost != self.rounds
+        if s.startswith("pbkdf2$"):
+            return HAS_BCRYPT
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "rounds": self.rounds,
+                "cache_entries": len(self._cache),
+                "hits": self._hits,
+                "misses": self._misses,
+            }
+
+    def shutdown(self) -> None:
+        self._reset_executor()
+
+
+_hasher: Optional[CredentialHasher] = None
+_hasher_lock = threading.Lock()
+
+
+def get_credential_hasher() -> CredentialHasher:
+    global _hasher
+    if _hasher is None:
+        with _hasher_lock:
+            if _hasher is None:
+                _hasher = CredentialHasher()
+    return _hasher
+
+
+def shutdown_credential_hasher() -> None:
+    global _hasher
+    with _hasher_lock:
+        h, _hasher = _hasher, None
+    if h is not None:
+        h.shutdown()
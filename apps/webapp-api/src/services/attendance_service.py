@@ -7,6 +7,7 @@ Replaces raw SQL usage in attendance.py with proper ORM queries.
 
 from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime, date, timedelta, timezone
+from functools import lru_cache
 import logging
 import secrets
 import os
@@ -21,13 +22,135 @@ from sqlalchemy.orm import Session
 from sqlalchemy import select, delete, text
 
 from src.services.base import BaseService
+from src.security.credential_hashing import get_credential_hasher
 from src.database.repositories.attendance_repository import AttendanceRepository
 from src.database.orm_models import Usuario, Asistencia, Configuracion, Sucursal
+from src.database import schema_capabilities, statement_registry
 
 logger = logging.getLogger(__name__)
 
 ATTENDANCE_ALLOW_MULTIPLE_KEY = "attendance_allow_multiple_per_day"
 
+# Check-in and station-kiosk statements, prepared once per connection
+_COUNT_USUARIO_FECHA = statement_registry.register(
+    "attendance.count_usuario_fecha",
+    "SELECT COUNT(*) FROM asistencias WHERE usuario_id = :uid AND fecha = :f",
+)
+_USUARIO_ESTADO = statement_registry.register(
+    "attendance.usuario_estado",
+    """
+    SELECT activo, LOWER(COALESCE(rol,'socio')) AS rol,
+           COALESCE(cuotas_vencidas,0) AS cuotas_vencidas
+    FROM usuarios WHERE id = :id LIMIT 1
+    """,
+)
+_STATION_TOKEN_ACTIVO = statement_registry.register(
+    "attendance.station_token_activo",
+    """
+    SELECT token, expires_at
+    FROM checkin_station_tokens
+    WHERE sucursal_id = :sid AND used_by IS NULL AND expires_at > :now
+    ORDER BY created_at DESC NULLS LAST, id DESC LIMIT 1
+    """,
+)
+_STATION_TOKEN = statement_registry.register(
+    "attendance.station_token",
+    """
+    SELECT id, sucursal_id, expires_at, used_by
+    FROM checkin_station_tokens
+    WHERE token = :token LIMIT 1
+    """,
+)
+_SUCURSAL_NOMBRE = statement_registry.register(
+    "attendance.sucursal_nombre",
+    "SELECT nombre, codigo FROM sucursales WHERE id = :id LIMIT 1",
+)
+_USUARIO_BASICO = statement_registry.register(
+    "attendance.usuario_basico",
+    "SELECT nombre, dni, activo FROM usuarios WHERE id = :id LIMIT 1",
+)
+_ASISTENCIA_HOY = statement_registry.register(
+    "attendance.asistencia_hoy",
+    """
+    SELECT id FROM asistencias
+    WHERE usuario_id = :id AND fecha = :fecha AND sucursal_id = :sid LIMIT 1
+    """,
+)
+_STATION_TOKEN_CLAIM = statement_registry.register(
+    "attendance.station_token_claim",
+    """
+    UPDATE checkin_station_tokens
+    SET used_by = :user_id, used_at = :used_at
+    WHERE id = :token_id AND used_by IS NULL
+    RETURNING id
+    """,
+)
+_STATION_CHECKINS_RECIENTES = statement_registry.register(
+    "attendance.station_checkins_recientes",
+    """
+    SELECT a.id, u.nombre, u.dni, a.hora_registro, a.tipo
+    FROM asistencias a
+    JOIN usuarios u ON u.id = a.usuario_id
+    WHERE a.fecha = :fecha AND a.sucursal_id = :sid
+    ORDER BY a.hora_registro DESC
+    LIMIT :limit
+    """,
+)
+_STATION_CHECKINS_DESDE = statement_registry.register(
+    "attendance.station_checkins_desde",
+    """
+    SELECT a.id, u.nombre, u.dni, a.hora_registro, a.tipo
+    FROM asistencias a
+    JOIN usuarios u ON u.id = a.usuario_id
+    WHERE a.fecha = :fecha AND a.sucursal_id = :sid AND a.id > :since_id
+    ORDER BY a.id ASC
+    LIMIT :limit
+    """,
+)
+_STATION_TOTAL_HOY = statement_registry.register(
+    "attendance.station_total_hoy",
+    "SELECT COUNT(*) FROM asistencias WHERE fecha = :fecha AND sucursal_id = :sid",
+)
+
+
+@lru_cache(maxsize=None)
+def _detalle_statements(
+    by_sucursal: bool, by_usuario: bool, rango: bool, has_q: bool
+) -> Tuple[statement_registry.Statement, statement_registry.Statement]:
+    """(count, page) for one filter combination of the paged attendance list (16 at most)"""
+    where_parts: List[str] = []
+    if by_sucursal:
+        where_parts.append("a.sucursal_id = :sucursal_id")
+    if by_usuario:
+        where_parts.append("a.usuario_id = :usuario_id")
+    where_parts.append("a.fecha BETWEEN :start AND :end" if rango else "a.fecha >= :start_date")
+    if has_q:
+        where_parts.append("(u.nombre ILIKE :q OR u.dni ILIKE :q)")
+    where_sql = " AND ".join(where_parts)
+    count_stmt = statement_registry.variant(
+        "attendance.detalle_count",
+        f"""
+        SELECT COUNT(*)
+        FROM asistencias a
+        JOIN usuarios u ON u.id = a.usuario_id
+        LEFT JOIN sucursales s ON s.id = a.sucursal_id
+        WHERE {where_sql}
+        """,
+    )
+    page_stmt = statement_registry.variant(
+        "attendance.detalle_page",
+        f"""
+        SELECT a.id, a.usuario_id, a.fecha::date, a.hora_registro, u.nombre, a.sucursal_id, s.nombre
+        FROM asistencias a
+        JOIN usuarios u ON u.id = a.usuario_id
+        LEFT JOIN sucursales s ON s.id = a.sucursal_id
+        WHERE {where_sql}
+        ORDER BY a.fecha DESC, a.hora_registro DESC
+        LIMIT :limit OFFSET :offset
+        """,
+    )
+    return count_stmt, page_stmt
+
 
 class AttendanceService(BaseService):
     """Service for attendance and check-in operations using SQLAlchemy."""
@@ -113,11 +236,18 @@ class AttendanceService(BaseService):
         except Exception:
             return False
 
+    def _idempotency_available(self) -> bool:
+        return schema_capabilities.has(self.db, "checkin_idempotency")
+
+    def _idempotency_failed(self, e: Exception) -> None:
+        if "checkin_idempotency" in str(e).lower() and "does not exist" in str(e).lower():
+            schema_capabilities.mark_missing(self.db, "checkin_idempotency")
+
     def idempotency_get_response(
         self, key: str, request_hash: Optional[str] = None
     ) -> Optional[Dict[str, Any]]:
         k = str(key or "").strip()
-        if not k:
+        if not k or not self._idempotency_available():
             return None
         params: Dict[str, Any] = {"k": k}
         where = "key = :k AND (expires_at IS NULL OR expires_at > NOW())"
@@ -137,27 +267,12 @@ class AttendanceService(BaseService):
                 params,
             ).fetchone()
         except Exception as e:
-            if "checkin_idempotency" in str(e).lower() and "does not exist" in str(e).lower():
-                try:
-                    self._ensure_checkin_idempotency_schema()
-                except Exception:
-                    return None
-                try:
-                    row = self.db.execute(
-                        text(
-                            f"""
-                            SELECT response_status, response_body, expires_at
-                            FROM checkin_idempotency
-                            WHERE {where}
-                            LIMIT 1
-                            """
-                        ),
-                        params,
-                    ).fetchone()
-                except Exception:
-                    return None
-            else:
-                return None
+            self._idempotency_failed(e)
+            try:
+                self.db.rollback()
+            except Exception:
+                pass
+            return None
         if not row:
             return None
         status_code = row[0]
@@ -170,35 +285,6 @@ class AttendanceService(BaseService):
             parsed = {"ok": False, "mensaje": "Respuesta inválida (idempotency)"}
         return {"pending": False, "status_code": int(status_code), "body": parsed}
 
-    def _ensure_checkin_idempotency_schema(self) -> None:
-        self.db.execute(
-            text(
-                """
-                CREATE TABLE IF NOT EXISTS checkin_idempotency (
-                    key TEXT PRIMARY KEY,
-                    expires_at TIMESTAMP WITHOUT TIME ZONE NULL,
-                    usuario_id INTEGER NULL REFERENCES usuarios(id) ON DELETE SET NULL,
-                    route TEXT NOT NULL DEFAULT '',
-                    request_hash TEXT NULL,
-                    response_status INTEGER NULL,
-                    response_body JSONB NULL,
-                    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()
-                )
-                """
-            )
-        )
-        self.db.execute(
-            text(
-                "CREATE INDEX IF NOT EXISTS idx_checkin_idempotency_expires_at ON checkin_idempotency(expires_at)"
-            )
-        )
-        self.db.execute(
-            text(
-                "CREATE INDEX IF NOT EXISTS idx_checkin_idempotency_usuario_created_at_desc ON checkin_idempotency(usuario_id, created_at DESC)"
-            )
-        )
-        self.db.commit()
-
     def idempotency_reserve(
         self,
         key: str,
@@ -209,7 +295,7 @@ class AttendanceService(BaseService):
         ttl_seconds: int = 60,
     ) -> bool:
         k = str(key or "").strip()
-        if not k:
+        if not k or not self._idempotency_available():
             return False
         try:
             self.db.execute(
@@ -235,39 +321,14 @@ class AttendanceService(BaseService):
                 self.db.rollback()
             except Exception:
                 pass
-            if "checkin_idempotency" in str(e).lower() and "does not exist" in str(e).lower():
-                try:
-                    self._ensure_checkin_idempotency_schema()
-                    self.db.execute(
-                        text(
-                            """
-                            INSERT INTO checkin_idempotency(key, expires_at, usuario_id, route, request_hash, response_status, response_body)
-                            VALUES (:k, NOW() + (:ttl * INTERVAL '1 second'), :uid, :route, :rh, NULL, NULL)
-                            ON CONFLICT (key) DO NOTHING
-                            """
-                        ),
-                        {
-                            "k": k,
-                            "ttl": int(ttl_seconds),
-                            "uid": int(usuario_id) if usuario_id is not None else None,
-                            "route": str(route or ""),
-                            "rh": str(request_hash) if request_hash else None,
-                        },
-                    )
-                    self.db.commit()
-                    return True
-                except Exception:
-                    try:
-                        self.db.rollback()
-                    except Exception:
-                        pass
+            self._idempotency_failed(e)
             return False
 
     def idempotency_store_response(
         self, key: str, *, status_code: int, body: Dict[str, Any]
     ) -> None:
         k = str(key or "").strip()
-        if not k:
+        if not k or not self._idempotency_available():
             return
         try:
             payload = json.dumps(body or {}, ensure_ascii=False)
@@ -287,34 +348,13 @@ class AttendanceService(BaseService):
                 self.db.rollback()
             except Exception:
                 pass
-            if "checkin_idempotency" in str(e).lower() and "does not exist" in str(e).lower():
-                try:
-                    self._ensure_checkin_idempotency_schema()
-                    self.db.execute(
-                        text(
-                            """
-                            UPDATE checkin_idempotency
-                            SET response_status = :s, response_body = CAST(:b AS JSONB)
-                            WHERE key = :k
-                            """
-                        ),
-                        {"k": k, "s": int(status_code), "b": payload},
-                    )
-                    self.db.commit()
-                except Exception:
-                    try:
-                        self.db.rollback()
-                    except Exception:
-                        pass
+            self._idempotency_failed(e)
 
     def _count_asistencias_usuario_fecha(self, usuario_id: int, fecha: date) -> int:
         try:
             return int(
-                self.db.execute(
-                    text(
-                        "SELECT COUNT(*) FROM asistencias WHERE usuario_id = :uid AND fecha = :f"
-                    ),
-                    {"uid": int(usuario_id), "f": fecha},
+                statement_registry.execute(
+                    self.db, _COUNT_USUARIO_FECHA, {"uid": int(usuario_id), "f": fecha}
                 ).scalar()
                 or 0
             )
@@ -326,13 +366,8 @@ class AttendanceService(BaseService):
     def verificar_usuario_activo(self, usuario_id: int) -> Tuple[bool, str]:
         """Check if user is active. Returns (is_active, reason_if_inactive)."""
         try:
-            result = self.db.execute(
-                text("""
-                    SELECT activo, LOWER(COALESCE(rol,'socio')) AS rol, 
-                           COALESCE(cuotas_vencidas,0) AS cuotas_vencidas
-                    FROM usuarios WHERE id = :id LIMIT 1
-                """),
-                {"id": usuario_id},
+            result = statement_registry.execute(
+                self.db, _USUARIO_ESTADO, {"id": usuario_id}
             )
             row = result.fetchone()
             if not row:
@@ -673,6 +708,39 @@ class AttendanceService(BaseService):
             logger.error(f"Error registering attendance by DNI: {e}")
             return False, str(e), None, False
 
+    async def aregistrar_asistencia_por_dni_y_pin(
+        self,
+        dni: str,
+        pin: str,
+        sucursal_id: Optional[int] = None,
+        *,
+        commit: bool = True,
+        tipo: str = "dni_pin",
+    ) -> Tuple[bool, str, Optional[int], bool]:
+        """registrar_asistencia_por_dni_y_pin with the PIN hash check off the event loop."""
+        try:
+            user = self.db.scalar(
+                select(Usuario).where(Usuario.dni == str(dni)).limit(1)
+            )
+            stored_pin = str(getattr(user, "pin", "") or "").strip() if user else ""
+            if user and stored_pin and pin is not None:
+                _ok, new_hash = await get_credential_hasher().averify_and_upgrade(
+                    int(user.id), stored_pin, str(pin)
+                )
+                if new_hash:
+                    # With commit=False the upgrade rides the caller's transaction
+                    user.pin = new_hash
+                    if commit:
+                        try:
+                            self.db.commit()
+                        except Exception:
+                            self.db.rollback()
+        except Exception as e:
+            logger.warning(f"PIN pre-check failed, verifying inline: {e}")
+        return self.registrar_asistencia_por_dni_y_pin(
+            dni, pin, sucursal_id, commit=commit, tipo=tipo
+        )
+
     def registrar_asistencia_por_dni_y_pin(
         self,
         dni: str,
@@ -697,20 +765,7 @@ class AttendanceService(BaseService):
             if not stored_pin:
                 return False, "Usuario sin PIN configurado", None, False
 
-            pin_ok = False
-            try:
-                if stored_pin.startswith("$2"):
-                    import bcrypt
-
-                    pin_ok = bool(
-                        bcrypt.checkpw(
-                            str(pin).encode("utf-8"), stored_pin.encode("utf-8")
-                        )
-                    )
-                else:
-                    pin_ok = stored_pin == str(pin).strip()
-            except Exception:
-                pin_ok = False
+            pin_ok = get_credential_hasher().verify(usuario_id, stored_pin, str(pin))
 
             if not pin_ok:
                 return False, "PIN incorrecto", None, False
@@ -1270,60 +1325,40 @@ class AttendanceService(BaseService):
                 off = 0
 
             params: Dict[str, Any] = {"limit": lim, "offset": off}
-            where_parts: list[str] = []
 
             if sucursal_id is not None:
                 try:
                     params["sucursal_id"] = int(sucursal_id)
-                    where_parts.append("a.sucursal_id = :sucursal_id")
                 except Exception:
                     pass
 
             if usuario_id is not None:
                 try:
                     params["usuario_id"] = int(usuario_id)
-                    where_parts.append("a.usuario_id = :usuario_id")
                 except Exception:
                     pass
 
-            if start and end:
+            rango = bool(start and end)
+            if rango:
                 params["start"] = start
                 params["end"] = end
-                where_parts.append("a.fecha BETWEEN :start AND :end")
             else:
-                start_date = self._today_local_date() - timedelta(days=30)
-                params["start_date"] = start_date
-                where_parts.append("a.fecha >= :start_date")
+                params["start_date"] = self._today_local_date() - timedelta(days=30)
 
-            if q and str(q).strip():
+            has_q = bool(q and str(q).strip())
+            if has_q:
                 params["q"] = f"%{q}%"
-                where_parts.append("(u.nombre ILIKE :q OR u.dni ILIKE :q)")
-
-            where_sql = " AND ".join(where_parts) if where_parts else "TRUE"
 
-            count_query = f"""
-                SELECT COUNT(*)
-                FROM asistencias a
-                JOIN usuarios u ON u.id = a.usuario_id
-                LEFT JOIN sucursales s ON s.id = a.sucursal_id
-                WHERE {where_sql}
-            """
+            count_stmt, page_stmt = _detalle_statements(
+                "sucursal_id" in params, "usuario_id" in params, rango, has_q
+            )
             total = 0
             try:
-                total = int(self.db.execute(text(count_query), params).scalar() or 0)
+                total = int(statement_registry.execute(self.db, count_stmt, params).scalar() or 0)
             except Exception:
                 total = 0
 
-            query = f"""
-                SELECT a.id, a.usuario_id, a.fecha::date, a.hora_registro, u.nombre, a.sucursal_id, s.nombre
-                FROM asistencias a
-                JOIN usuarios u ON u.id = a.usuario_id
-                LEFT JOIN sucursales s ON s.id = a.sucursal_id
-                WHERE {where_sql}
-                ORDER BY a.fecha DESC, a.hora_registro DESC
-                LIMIT :limit OFFSET :offset
-            """
-            result = self.db.execute(text(query), params)
+            result = statement_registry.execute(self.db, page_stmt, params)
             tz = self._get_app_timezone()
             items = [
                 {
@@ -1502,14 +1537,8 @@ class AttendanceService(BaseService):
             now = self._now_utc_naive()
 
             # Look for active token
-            result = self.db.execute(
-                text("""
-                    SELECT token, expires_at 
-                    FROM checkin_station_tokens 
-                    WHERE sucursal_id = :sid AND used_by IS NULL AND expires_at > :now
-                    ORDER BY created_at DESC NULLS LAST, id DESC LIMIT 1
-                """),
-                {"sid": int(sucursal_id), "now": now},
+            result = statement_registry.execute(
+                self.db, _STATION_TOKEN_ACTIVO, {"sid": int(sucursal_id), "now": now}
             )
             row = result.fetchone()
 
@@ -1549,13 +1578,8 @@ class AttendanceService(BaseService):
         """
         try:
             # Check token exists and is valid
-            result = self.db.execute(
-                text("""
-                    SELECT id, sucursal_id, expires_at, used_by 
-                    FROM checkin_station_tokens 
-                    WHERE token = :token LIMIT 1
-                """),
-                {"token": token},
+            result = statement_registry.execute(
+                self.db, _STATION_TOKEN, {"token": token}
             )
             row = result.fetchone()
 
@@ -1576,11 +1600,8 @@ class AttendanceService(BaseService):
             sucursal_codigo = None
             try:
                 if sucursal_id is not None:
-                    row_s = self.db.execute(
-                        text(
-                            "SELECT nombre, codigo FROM sucursales WHERE id = :id LIMIT 1"
-                        ),
-                        {"id": int(sucursal_id)},
+                    row_s = statement_registry.execute(
+                        self.db, _SUCURSAL_NOMBRE, {"id": int(sucursal_id)}
                     ).fetchone()
                     if row_s:
                         sucursal_nombre = (
@@ -1609,9 +1630,8 @@ class AttendanceService(BaseService):
                 return False, "Código QR expirado", None
 
             # Get user info
-            user_result = self.db.execute(
-                text("SELECT nombre, dni, activo FROM usuarios WHERE id = :id LIMIT 1"),
-                {"id": usuario_id},
+            user_result = statement_registry.execute(
+                self.db, _USUARIO_BASICO, {"id": usuario_id}
             )
             user_row = user_result.fetchone()
 
@@ -1647,11 +1667,9 @@ class AttendanceService(BaseService):
             hoy = self._today_local_date()
             allow_multiple = self._allow_multiple_attendances_per_day()
             if not allow_multiple:
-                check = self.db.execute(
-                    text("""
-                        SELECT id FROM asistencias 
-                        WHERE usuario_id = :id AND fecha = :fecha AND sucursal_id = :sid LIMIT 1
-                    """),
+                check = statement_registry.execute(
+                    self.db,
+                    _ASISTENCIA_HOY,
                     {
                         "id": usuario_id,
                         "fecha": hoy,
@@ -1674,15 +1692,9 @@ class AttendanceService(BaseService):
                     )
 
             used_at = self._now_utc_naive()
-            claimed = self.db.execute(
-                text(
-                    """
-                    UPDATE checkin_station_tokens
-                    SET used_by = :user_id, used_at = :used_at
-                    WHERE id = :token_id AND used_by IS NULL
-                    RETURNING id
-                    """
-                ),
+            claimed = statement_registry.execute(
+                self.db,
+                _STATION_TOKEN_CLAIM,
                 {"user_id": int(usuario_id), "token_id": int(token_id), "used_at": used_at},
             ).fetchone()
             if not claimed:
@@ -1765,15 +1777,9 @@ class AttendanceService(BaseService):
         try:
             hoy = self._today_local_date()
             tz = self._get_app_timezone()
-            result = self.db.execute(
-                text("""
-                    SELECT a.id, u.nombre, u.dni, a.hora_registro, a.tipo
-                    FROM asistencias a
-                    JOIN usuarios u ON u.id = a.usuario_id
-                    WHERE a.fecha = :fecha AND a.sucursal_id = :sid
-                    ORDER BY a.hora_registro DESC
-                    LIMIT :limit
-                """),
+            result = statement_registry.execute(
+                self.db,
+                _STATION_CHECKINS_RECIENTES,
                 {"limit": limit, "fecha": hoy, "sid": int(gym_id)},
             )
             return [
@@ -1810,17 +1816,9 @@ class AttendanceService(BaseService):
             tz = self._get_app_timezone()
             lim = max(1, min(int(limit or 20), 50))
             sid = int(since_id or 0)
-            result = self.db.execute(
-                text(
-                    """
-                    SELECT a.id, u.nombre, u.dni, a.hora_registro, a.tipo
-                    FROM asistencias a
-                    JOIN usuarios u ON u.id = a.usuario_id
-                    WHERE a.fecha = :fecha AND a.sucursal_id = :sid AND a.id > :since_id
-                    ORDER BY a.id ASC
-                    LIMIT :limit
-                    """
-                ),
+            result = statement_registry.execute(
+                self.db,
+                _STATION_CHECKINS_DESDE,
                 {"limit": lim, "fecha": hoy, "sid": int(gym_id), "since_id": sid},
             )
             rows = result.fetchall()
@@ -1852,11 +1850,8 @@ class AttendanceService(BaseService):
         """Get today's check-in stats for station display."""
         try:
             hoy = self._today_local_date()
-            result = self.db.execute(
-                text("""
-                    SELECT COUNT(*) FROM asistencias WHERE fecha = :fecha AND sucursal_id = :sid
-                """),
-                {"fecha": hoy, "sid": int(gym_id)},
+            result = statement_registry.execute(
+                self.db, _STATION_TOTAL_HOY, {"fecha": hoy, "sid": int(gym_id)}
             )
             total_hoy = result.scalar() or 0
 
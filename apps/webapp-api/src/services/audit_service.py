@@ -5,6 +5,7 @@ Provides a simple interface to log all sensitive operations
 such as deletions, role changes, status toggles, etc.
 """
 
+import ipaddress
 import logging
 import json
 from typing import Optional, Dict, Any
@@ -13,6 +14,8 @@ from datetime import datetime
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 
+from src.database.tenant_connection import get_current_tenant
+from src.services.audit_writer import get_audit_writer, insert_rows
 from src.services.base import BaseService
 from src.models.orm_models import AuditLog
 from src.security.session_claims import get_claims
@@ -20,11 +23,22 @@ from src.security.session_claims import get_claims
 logger = logging.getLogger(__name__)
 
 
+def _valid_ip(value: Optional[str]) -> Optional[str]:
+    """audit_logs.ip_address is INET; a malformed value would fail the batch"""
+    if not value:
+        return None
+    try:
+        return str(ipaddress.ip_address(str(value).strip()))
+    except Exception:
+        return None
+
+
 class AuditService(BaseService):
     """Service for audit logging using SQLAlchemy."""
 
     # Action types
     ACTION_CREATE = "CREATE"
+    ACTION_INSERT = "INSERT"
     ACTION_UPDATE = "UPDATE"
     ACTION_DELETE = "DELETE"
     ACTION_TOGGLE_STATUS = "TOGGLE_STATUS"
@@ -70,8 +84,13 @@ class AuditService(BaseService):
             session_id: Session identifier
             extra_details: Additional context to include in new_values
 
+        Entries for a tenant are queued for the background audit writer
+        (see audit_writer); without a tenant context the row is written on
+        this service's session as before.
+
         Returns:
-            ID of the created audit log entry, or None if failed
+            ID of the created audit log entry when written on this session,
+            otherwise None
         """
         try:
             # Serialize values to JSON strings
@@ -95,19 +114,37 @@ class AuditService(BaseService):
                 except Exception:
                     new_json = str(combined)
 
-            audit_entry = AuditLog(
-                user_id=user_id,
-                action=action,
-                table_name=table_name,
-                record_id=record_id,
-                old_values=old_json,
-                new_values=new_json,
-                ip_address=ip_address,
-                user_agent=user_agent,
-                session_id=session_id,
-                timestamp=datetime.utcnow(),
-            )
+            row = {
+                "user_id": user_id,
+                "action": action,
+                "table_name": table_name,
+                "record_id": record_id,
+                "old_values": old_json,
+                "new_values": new_json,
+                "ip_address": _valid_ip(ip_address),
+                "user_agent": user_agent,
+                "session_id": session_id,
+                "timestamp": datetime.utcnow(),
+            }
+
+            tenant = get_current_tenant()
+            if tenant:
+                writer = get_audit_writer()
+                if writer is not None and writer.submit(tenant, row):
+                    return None
+                # Synchronous, but on its own session: never touch the caller's work
+                try:
+                    insert_rows(tenant, [row])
+                except Exception as e:
+                    logger.error(f"Failed to create audit log: {e}")
+                    return None
+                logger.info(
+                    f"Audit log created: action={action} table={table_name} "
+                    f"record_id={record_id} user_id={user_id}"
+                )
+                return None
 
+            audit_entry = AuditLog(**row)
             self.db.add(audit_entry)
             self.db.commit()
 
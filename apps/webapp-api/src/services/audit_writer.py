@@ -0,0 +1,348 @@
+"""
+Buffered audit log writer
+
+AuditService.log used to add the row to the caller's session and commit it
+mid-request, so every audited mutation paid an extra commit and committed the
+caller's unit of work as a side effect. Entries now go onto a bounded
+in-process queue and a daemon thread writes them per tenant with multi-row
+INSERTs, every AUDIT_FLUSH_INTERVAL_MS or AUDIT_FLUSH_MAX_ENTRIES entries,
+whichever comes first.
+
+When a tenant DB is unavailable the batch is spilled to JSONL files under
+AUDIT_SPILL_DIR and replayed every AUDIT_SPILL_RETRY_SECONDS. A full queue
+spills directly instead of blocking the request. `drain()` flushes what is
+left on graceful shutdown.
+
+Serverless runtimes freeze between invocations, so the writer is off there
+by default (AUDIT_ASYNC) and AuditService writes synchronously, on its own
+session rather than the caller's.
+"""
+
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+from src.models.orm_models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+_IS_SERVERLESS = bool(
+    os.getenv("VERCEL") or os.getenv("AWS_LAMBDA_FUNCTION_NAME") or os.getenv("K_SERVICE")
+)
+AUDIT_ASYNC = str(
+    os.getenv("AUDIT_ASYNC", "false" if _IS_SERVERLESS else "true")
+).strip().lower() in ("1", "true", "yes", "on")
+AUDIT_QUEUE_MAX = max(_env_int("AUDIT_QUEUE_MAX", 10000), 1)
+AUDIT_FLUSH_INTERVAL_MS = max(_env_int("AUDIT_FLUSH_INTERVAL_MS", 500), 10)
+AUDIT_FLUSH_MAX_ENTRIES = max(_env_int("AUDIT_FLUSH_MAX_ENTRIES", 200), 1)
+AUDIT_SPILL_RETRY_SECONDS = max(_env_int("AUDIT_SPILL_RETRY_SECONDS", 60), 1)
+AUDIT_SPILL_DIR = os.getenv(
+    "AUDIT_SPILL_DIR", os.path.join(tempfile.gettempdir(), "ironhub_audit_spill")
+)
+
+# Row columns carried through the queue and the spill files
+_COLUMNS = (
+    "user_id",
+    "action",
+    "table_name",
+    "record_id",
+    "old_values",
+    "new_values",
+    "ip_address",
+    "user_agent",
+    "session_id",
+    "timestamp",
+)
+
+_Entry = Tuple[str, Dict[str, Any]]
+
+
+def _is_unavailable(exc: BaseException) -> bool:
+    """Connection-level failures are spilled; anything else is a bad row"""
+    if isinstance(exc, OperationalError):
+        return True
+    if isinstance(exc, DBAPIError) and getattr(exc, "connection_invalidated", False):
+        return True
+    return isinstance(exc, (RuntimeError, ConnectionError, TimeoutError))
+
+
+def insert_rows(tenant: str, rows: List[Dict[str, Any]]) -> int:
+    """Write rows to one tenant DB in a single multi-row INSERT"""
+    from src.database.tenant_connection import tenant_session_scope
+
+    if not rows:
+        return 0
+    with tenant_session_scope(tenant) as db:
+        db.execute(insert(AuditLog), rows)
+    return len(rows)
+
+
+class AuditWriter:
+    def __init__(self, spill_dir: str = AUDIT_SPILL_DIR) -> None:
+        self.spill_dir = spill_dir
+        self._queue: "queue.Queue[Optional[_Entry]]" = queue.Queue(maxsize=AUDIT_QUEUE_MAX)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._last_replay = 0.0
+        self.stats = {"queued": 0, "written": 0, "spilled": 0, "replayed": 0, "dropped": 0}
+
+    # --- producer side ---
+
+    def submit(self, tenant: str, row: Dict[str, Any]) -> bool:
+        """Queue one row; False when the caller should write it itself"""
+        if self._stopping:
+            return False
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait((str(tenant), row))
+            self.stats["queued"] += 1
+            return True
+        except queue.Full:
+            logger.warning("Audit queue full, spilling entry to disk")
+            return self._spill(str(tenant), [row])
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    # --- writer thread ---
+
+    def _run(self) -> None:
+        interval = AUDIT_FLUSH_INTERVAL_MS / 1000.0
+        while True:
+            batch: List[_Entry] = []
+            deadline = None
+            stop = False
+            while len(batch) < AUDIT_FLUSH_MAX_ENTRIES:
+                timeout = interval if deadline is None else max(deadline - time.monotonic(), 0.0)
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + interval
+            if batch:
+                self.flush(batch)
+            if time.monotonic() - self._last_replay >= AUDIT_SPILL_RETRY_SECONDS:
+                self._last_replay = time.monotonic()
+                self.replay_spilled()
+            if stop:
+                return
+
+    def flush(self, batch: List[_Entry]) -> None:
+        by_tenant: Dict[str, List[Dict[str, Any]]] = {}
+        for tenant, row in batch:
+            by_tenant.setdefault(tenant, []).append(row)
+        with self._flush_lock:
+            for tenant, rows in by_tenant.items():
+                self._write_tenant(tenant, rows)
+
+    def _write_tenant(self, tenant: str, rows: List[Dict[str, Any]]) -> None:
+        remaining = self._insert(tenant, rows)
+        if remaining:
+            self._spill(tenant, remaining)
+
+    def _insert(self, tenant: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insert rows, isolating bad ones; returns the rows left unwritten
+        because the DB is unavailable"""
+        try:
+            self.stats["written"] += insert_rows(tenant, rows)
+            return []
+        except Exception as e:
+            if _is_unavailable(e):
+                logger.warning(f"Audit DB unavailable for '{tenant}' ({len(rows)} entries): {e}")
+                return rows
+            logger.warning(f"Audit batch for '{tenant}' failed, retrying row by row: {e}")
+        for i, row in enumerate(rows):
+            try:
+                self.stats["written"] += insert_rows(tenant, [row])
+            except Exception as e:
+                if _is_unavailable(e):
+                    return rows[i:]
+                self.stats["dropped"] += 1
+                logger.error(
+                    f"Dropping audit entry action={row.get('action')} table={row.get('table_name')} "
+                    f"record_id={row.get('record_id')} for '{tenant}': {e}"
+                )
+        return []
+
+    # --- spill files ---
+
+    def _spill(self, tenant: str, rows: List[Dict[str, Any]]) -> bool:
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            name = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.jsonl"
+            fd, tmp = tempfile.mkstemp(dir=self.spill_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                for row in rows:
+                    fh.write(json.dumps({"tenant": tenant, "row": _encode(row)}, ensure_ascii=False))
+                    fh.write("\n")
+            os.replace(tmp, os.path.join(self.spill_dir, name))
+            self.stats["spilled"] += len(rows)
+            return True
+        except Exception as e:
+            self.stats["dropped"] += len(rows)
+            logger.error(f"Audit spill failed, {len(rows)} entries lost: {e}")
+            return False
+
+    def spilled_files(self) -> List[str]:
+        try:
+            return sorted(
+                os.path.join(self.spill_dir, n)
+                for n in os.listdir(self.spill_dir)
+                if n.endswith(".jsonl")
+            )
+        except FileNotFoundError:
+            return []
+
+    def replay_spilled(self) -> int:
+        """Re-insert spilled entries; a file is removed once fully written"""
+        replayed = 0
+        for path in self.spilled_files():
+            by_tenant: Dict[str, List[Dict[str, Any]]] = {}
+            try:
+                with open(path, "r", encoding="utf-8") as fh:
+                    for line in fh:
+                        if not line.strip():
+                            continue
+                        item = json.loads(line)
+                        by_tenant.setdefault(str(item["tenant"]), []).append(_decode(item["row"]))
+            except Exception as e:
+                logger.error(f"Unreadable audit spill file {path}: {e}")
+                os.replace(path, path + ".bad")
+                continue
+            left: Dict[str, List[Dict[str, Any]]] = {}
+            for tenant, rows in by_tenant.items():
+                if left:
+                    left[tenant] = rows
+                    continue
+                remaining = self._insert(tenant, rows)
+                replayed += len(rows) - len(remaining)
+                if remaining:
+                    left[tenant] = remaining
+            if left:
+                # Still unavailable: keep what was not written and retry later
+                self._rewrite(path, left)
+                break
+            os.remove(path)
+        if replayed:
+            self.stats["replayed"] += replayed
+            logger.info(f"Replayed {replayed} spilled audit entries")
+        return replayed
+
+    def _rewrite(self, path: str, by_tenant: Dict[str, List[Dict[str, Any]]]) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.spill_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            for tenant, rows in by_tenant.items():
+                for row in rows:
+                    fh.write(json.dumps({"tenant": tenant, "row": _encode(row)}, ensure_ascii=False))
+                    fh.write("\n")
+        os.replace(tmp, path)
+
+    # --- shutdown ---
+
+    def drain(self, timeout: float = 10.0) -> None:
+        """Stop accepting entries and flush the queue (graceful shutdown)"""
+        self._stopping = True
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+            thread.join(timeout=timeout)
+        # Whatever the thread did not get to (or if it never started)
+        leftover: List[_Entry] = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                leftover.append(item)
+        if leftover:
+            self.flush(leftover)
+        self._thread = None
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+
+def _encode(row: Dict[str, Any]) -> Dict[str, Any]:
+    out = {k: row.get(k) for k in _COLUMNS}
+    ts = out.get("timestamp")
+    if isinstance(ts, datetime):
+        out["timestamp"] = ts.isoformat()
+    return out
+
+
+def _decode(row: Dict[str, Any]) -> Dict[str, Any]:
+    out = {k: row.get(k) for k in _COLUMNS}
+    ts = out.get("timestamp")
+    if isinstance(ts, str):
+        try:
+            out["timestamp"] = datetime.fromisoformat(ts)
+        except Exception:
+            out["timestamp"] = None
+    return out
+
+
+_writer: Optional[AuditWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer() -> Optional[AuditWriter]:
+    """The process-wide writer, or None when AUDIT_ASYNC is off"""
+    global _writer
+    if not AUDIT_ASYNC:
+        return None
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = AuditWriter()
+    return _writer
+
+
+def shutdown_audit_writer() -> None:
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.drain()
+
+
+__all__ = [
+    "AuditWriter",
+    "get_audit_writer",
+    "insert_rows",
+    "shutdown_audit_writer",
+]
@@ -8,9 +8,6 @@ Replaces raw SQL usage in auth.py with proper ORM queries.
 from typing import Optional, Dict, Any, List
 from datetime import datetime, timezone, timedelta
 import os
-import base64
-import hashlib
-import hmac
 
 try:
     from zoneinfo import ZoneInfo
@@ -22,6 +19,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import select, text
 
 from src.services.base import BaseService
+from src.security.credential_hashing import get_credential_hasher, is_hashed, verify_pbkdf2
 from src.database.orm_models import Usuario
 
 logger = logging.getLogger(__name__)
@@ -77,40 +75,10 @@ class AuthService(BaseService):
     # ========== PIN Operations ==========
 
     def _hash_pin(self, pin: str) -> str:
-        p = str(pin or "").strip()
-        if not p:
-            return ""
-        try:
-            import bcrypt  # type: ignore
-
-            return bcrypt.hashpw(p.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-        except Exception:
-            iters = 200_000
-            salt = os.urandom(16)
-            dk = hashlib.pbkdf2_hmac("sha256", p.encode("utf-8"), salt, iters)
-            salt_b64 = base64.urlsafe_b64encode(salt).decode("utf-8").rstrip("=")
-            dk_b64 = base64.urlsafe_b64encode(dk).decode("utf-8").rstrip("=")
-            return f"pbkdf2$sha256${iters}${salt_b64}${dk_b64}"
+        return get_credential_hasher().hash(str(pin or "").strip())
 
     def _verify_pbkdf2(self, pin: str, stored: str) -> bool:
-        try:
-            parts = str(stored or "").split("$")
-            if len(parts) != 5:
-                return False
-            _scheme, algo, iters_s, salt_b64, dk_b64 = parts
-            if algo != "sha256":
-                return False
-            iters = int(iters_s)
-            if iters < 50_000 or iters > 2_000_000:
-                return False
-            pad = "=" * ((4 - (len(salt_b64) % 4)) % 4)
-            salt = base64.urlsafe_b64decode((salt_b64 + pad).encode("utf-8"))
-            pad2 = "=" * ((4 - (len(dk_b64) % 4)) % 4)
-            dk = base64.urlsafe_b64decode((dk_b64 + pad2).encode("utf-8"))
-            calc = hashlib.pbkdf2_hmac("sha256", str(pin).encode("utf-8"), salt, iters)
-            return hmac.compare_digest(calc, dk)
-        except Exception:
-            return False
+        return verify_pbkdf2(pin, stored)
 
     def verificar_pin(self, usuario_id: int, pin: str) -> Dict[str, Any]:
         """
@@ -124,23 +92,9 @@ class AuthService(BaseService):
         stored_pin = str(user.pin or "").strip()
         is_valid = False
         if stored_pin and pin is not None:
-            try:
-                if stored_pin.startswith("$2"):
-                    import bcrypt
+            is_valid = get_credential_hasher().verify(usuario_id, stored_pin, str(pin))
 
-                    is_valid = bool(
-                        bcrypt.checkpw(
-                            str(pin).encode("utf-8"), stored_pin.encode("utf-8")
-                        )
-                    )
-                elif stored_pin.startswith("pbkdf2$"):
-                    is_valid = self._verify_pbkdf2(str(pin), stored_pin)
-                else:
-                    is_valid = stored_pin == str(pin)
-            except Exception:
-                is_valid = False
-
-        if is_valid and stored_pin and not (stored_pin.startswith("$2") or stored_pin.startswith("pbkdf2$")):
+        if is_valid and stored_pin and not is_hashed(stored_pin):
             try:
                 user.pin = self._hash_pin(str(pin))
                 self.db.commit()
@@ -156,6 +110,31 @@ class AuthService(BaseService):
             "usuario": self._usuario_to_dict(user) if is_valid else None,
         }
 
+    async def averificar_pin(self, usuario_id: int, pin: str) -> Dict[str, Any]:
+        """
+        verificar_pin without blocking the event loop.
+
+        The hash check runs in the credential pool and primes the verification
+        cache, so the sync verificar_pin below answers from cache. Legacy or
+        wrong-cost hashes are upgraded after a successful check.
+        """
+        user = self.db.get(Usuario, usuario_id)
+        stored_pin = str(getattr(user, "pin", "") or "").strip() if user else ""
+        if user and stored_pin and pin is not None:
+            _ok, new_hash = await get_credential_hasher().averify_and_upgrade(
+                usuario_id, stored_pin, str(pin)
+            )
+            if new_hash:
+                try:
+                    user.pin = new_hash
+                    self.db.commit()
+                except Exception:
+                    try:
+                        self.db.rollback()
+                    except Exception:
+                        pass
+        return self.verificar_pin(usuario_id, pin)
+
     def actualizar_pin(self, usuario_id: int, new_pin: str) -> bool:
         """Update user PIN."""
         try:
@@ -276,19 +255,7 @@ class AuthService(BaseService):
             stored_pin = str(row[3] or "").strip()
             is_valid = False
             if stored_pin and pin is not None:
-                try:
-                    if stored_pin.startswith("$2"):
-                        import bcrypt
-
-                        is_valid = bool(
-                            bcrypt.checkpw(
-                                str(pin).encode("utf-8"), stored_pin.encode("utf-8")
-                            )
-                        )
-                    else:
-                        is_valid = stored_pin == str(pin)
-                except Exception:
-                    is_valid = False
+                is_valid = get_credential_hasher().verify(row[1], stored_pin, str(pin))
             is_active = bool(row[4])
 
             if not is_active:
@@ -322,9 +289,21 @@ class AuthService(BaseService):
         Verify owner password with Auto-Healing synchronization.
         Checks Admin DB first (as authority) and syncs to Local DB if different.
         """
-        import os
-        from sqlalchemy import text
+        hasher = get_credential_hasher()
+        for secret in self._owner_password_candidates():
+            if hasher.verify("owner", secret, password):
+                return True
+        return False
+
+    async def averificar_owner_password(self, password: str) -> bool:
+        """verificar_owner_password with the hash checks off the event loop."""
+        hasher = get_credential_hasher()
+        for secret in self._owner_password_candidates():
+            if await hasher.averify("owner", secret, password):
+                return True
+        return False
 
+    def _owner_password_candidates(self) -> List[str]:
         local_hash = None
         admin_hash = None
         local_user_id = None
@@ -400,21 +379,8 @@ class AuthService(BaseService):
         if not candidates:
             candidates.append("admin")  # Fallback
 
-        import bcrypt
-
-        for secret in candidates:
-            try:
-                # Bcrypt
-                if secret.startswith("$2"):
-                    if bcrypt.checkpw(password.encode("utf-8"), secret.encode("utf-8")):
-                        return True
-                # Plaintext
-                elif secret == password:
-                    return True
-            except Exception:
-                continue
-
-        return False
+        # Only bcrypt or plaintext secrets are accepted for the owner.
+        return [c for c in candidates if c.startswith("$2") or not is_hashed(c)]
 
     # ========== Session/Work Session ==========
 
@@ -4,15 +4,19 @@ Handles file uploads to Backblaze B2 with Cloudflare CDN integration
 """
 
 import os
+import asyncio
 import hashlib
 import logging
-from typing import Optional, Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Optional, Tuple
 from pathlib import Path
 import re
 import urllib.parse
 
 try:
     import boto3
+    from boto3.s3.transfer import TransferConfig
     from botocore.config import Config
     from botocore.exceptions import ClientError
 
@@ -40,6 +44,19 @@ B2_PUBLIC_BASE_URL = os.getenv("B2_PUBLIC_BASE_URL", "https://f005.backblazeb2.c
 
 MAX_B2_UPLOAD_BYTES = int(os.getenv("MAX_B2_UPLOAD_BYTES", str(60 * 1024 * 1024)))
 
+B2_MAX_POOL_CONNECTIONS = int(os.getenv("B2_MAX_POOL_CONNECTIONS", "32"))
+B2_MULTIPART_THRESHOLD = int(os.getenv("B2_MULTIPART_THRESHOLD", str(8 * 1024 * 1024)))
+B2_MULTIPART_CHUNKSIZE = int(os.getenv("B2_MULTIPART_CHUNKSIZE", str(8 * 1024 * 1024)))
+B2_UPLOAD_CONCURRENCY = int(os.getenv("B2_UPLOAD_CONCURRENCY", "4"))
+
+_HASH_READ_BYTES = 1024 * 1024
+
+# boto3 clients are thread-safe; one per process keeps the TLS pool warm.
+_client = None
+_client_lock = threading.Lock()
+_transfer_config = None
+_background: Optional[ThreadPoolExecutor] = None
+
 
 def _get_direct_public_base() -> str:
     """Return a direct Backblaze public base URL (never a CDN domain)."""
@@ -103,9 +120,13 @@ def _normalize_key_layout(key: str) -> str:
 
 def get_s3_client():
     """
-    Get a boto3 S3 client configured for Backblaze B2.
+    Get the shared boto3 S3 client configured for Backblaze B2.
     Returns None if boto3 is not installed or credentials are missing.
     """
+    global _client
+    if _client is not None:
+        return _client
+
     if not HAS_BOTO3:
         logger.warning("boto3 not installed, B2 uploads disabled")
         return None
@@ -114,22 +135,46 @@ def get_s3_client():
         logger.warning("B2 credentials not configured")
         return None
 
-    try:
-        endpoint = str(B2_ENDPOINT_URL or "").strip()
-        if endpoint and not (
-            endpoint.startswith("http://") or endpoint.startswith("https://")
-        ):
-            endpoint = f"https://{endpoint}"
-        return boto3.client(
-            "s3",
-            endpoint_url=endpoint,
-            aws_access_key_id=B2_KEY_ID,
-            aws_secret_access_key=B2_APPLICATION_KEY,
-            config=Config(signature_version="s3v4", s3={"addressing_style": "path"}),
+    with _client_lock:
+        if _client is not None:
+            return _client
+        try:
+            endpoint = str(B2_ENDPOINT_URL or "").strip()
+            if endpoint and not (
+                endpoint.startswith("http://") or endpoint.startswith("https://")
+            ):
+                endpoint = f"https://{endpoint}"
+            _client = boto3.client(
+                "s3",
+                endpoint_url=endpoint,
+                aws_access_key_id=B2_KEY_ID,
+                aws_secret_access_key=B2_APPLICATION_KEY,
+                config=Config(
+                    signature_version="s3v4",
+                    s3={"addressing_style": "path"},
+                    max_pool_connections=max(B2_MAX_POOL_CONNECTIONS, 1),
+                    connect_timeout=5,
+                    read_timeout=60,
+                    retries={"max_attempts": 3, "mode": "standard"},
+                    tcp_keepalive=True,
+                ),
+            )
+            return _client
+        except Exception as e:
+            logger.error(f"Failed to create B2 client: {e}")
+            return None
+
+
+def _get_transfer_config():
+    global _transfer_config
+    if _transfer_config is None and HAS_BOTO3:
+        _transfer_config = TransferConfig(
+            multipart_threshold=max(B2_MULTIPART_THRESHOLD, 5 * 1024 * 1024),
+            multipart_chunksize=max(B2_MULTIPART_CHUNKSIZE, 5 * 1024 * 1024),
+            max_concurrency=max(B2_UPLOAD_CONCURRENCY, 1),
+            use_threads=True,
         )
-    except Exception as e:
-        logger.error(f"Failed to create B2 client: {e}")
-        return None
+    return _transfer_config
 
 
 def get_cdn_url(file_path: str) -> str:
@@ -173,6 +218,24 @@ def _sanitize_folder(folder: str) -> str:
         return "uploads"
 
 
+def _build_file_key(file_hash: str, filename: str, tenant: str, folder: str) -> str:
+    tenant_safe = _sanitize_tenant(tenant)
+    folder_safe = _sanitize_folder(folder)
+
+    raw_name = os.path.basename(str(filename or "file"))
+    raw_name = raw_name.replace(" ", "_")
+    raw_name = re.sub(r"[^A-Za-z0-9._-]", "_", raw_name)
+    # Keep extension but avoid extremely long names
+    ext = Path(raw_name).suffix.lower()
+    stem = Path(raw_name).stem
+    stem = stem[:80] if stem else "file"
+    safe_filename = f"{stem}{ext}".lower()
+
+    # Build the full path: assets/{tenant}-assets/{folder}/{hash}_{filename}
+    tenant_folder = f"{tenant_safe}-assets"
+    return f"{B2_MEDIA_PREFIX}/{tenant_folder}/{folder_safe}/{file_hash}_{safe_filename}"
+
+
 def upload_file(
     file_content: bytes,
     filename: str,
@@ -207,23 +270,7 @@ def upload_file(
 
     # Generate unique filename with hash to avoid collisions
     file_hash = hashlib.sha256(file_content).hexdigest()[:10]
-    tenant_safe = _sanitize_tenant(tenant)
-    folder_safe = _sanitize_folder(folder)
-
-    raw_name = os.path.basename(str(filename or "file"))
-    raw_name = raw_name.replace(" ", "_")
-    raw_name = re.sub(r"[^A-Za-z0-9._-]", "_", raw_name)
-    # Keep extension but avoid extremely long names
-    ext = Path(raw_name).suffix.lower()
-    stem = Path(raw_name).stem
-    stem = stem[:80] if stem else "file"
-    safe_filename = f"{stem}{ext}".lower()
-
-    # Build the full path: assets/{tenant}-assets/{folder}/{hash}_{filename}
-    tenant_folder = f"{tenant_safe}-assets"
-    file_key = (
-        f"{B2_MEDIA_PREFIX}/{tenant_folder}/{folder_safe}/{file_hash}_{safe_filename}"
-    )
+    file_key = _build_file_key(file_hash, filename, tenant, folder)
 
     try:
         client.put_object(
@@ -250,6 +297,98 @@ def upload_file(
         return False, error_msg, None
 
 
+def upload_fileobj(
+    fileobj: BinaryIO,
+    filename: str,
+    tenant: str,
+    folder: str = "uploads",
+    content_type: str = "application/octet-stream",
+    max_bytes: Optional[int] = None,
+) -> Tuple[bool, str, Optional[str]]:
+    """
+    Stream a seekable file object (e.g. an UploadFile spool) to B2.
+
+    The SHA-256 used in the key is computed incrementally and the body is sent
+    with a multipart upload, so memory stays at a few chunks regardless of size.
+
+    Returns:
+        Tuple of (success, cdn_url or error_message, file_key)
+    """
+    client = get_s3_client()
+    if not client:
+        return False, "B2 client not available", None
+
+    limit = MAX_B2_UPLOAD_BYTES if max_bytes is None else int(max_bytes)
+    try:
+        fileobj.seek(0)
+        digest = hashlib.sha256()
+        size = 0
+        while True:
+            chunk = fileobj.read(_HASH_READ_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if limit and size > limit:
+                return False, "File too large", None
+            digest.update(chunk)
+        if size <= 0:
+            return False, "Empty file", None
+        fileobj.seek(0)
+    except Exception:
+        return False, "Invalid file", None
+
+    file_key = _build_file_key(digest.hexdigest()[:10], filename, tenant, folder)
+
+    try:
+        client.upload_fileobj(
+            fileobj,
+            B2_BUCKET_NAME,
+            file_key,
+            ExtraArgs={
+                "ContentType": content_type,
+                "ACL": "public-read",
+                "CacheControl": "max-age=31536000",
+            },
+            Config=_get_transfer_config(),
+        )
+        cdn_url = get_cdn_url(file_key)
+        logger.info(f"Uploaded file to B2 (stream, {size} bytes): {file_key}")
+        return True, cdn_url, file_key
+    except ClientError as e:
+        error_msg = str(e)
+        logger.error(f"B2 upload failed: {error_msg}")
+        return False, error_msg, None
+    except Exception as e:
+        error_msg = str(e)
+        logger.error(f"Unexpected error uploading to B2: {error_msg}")
+        return False, error_msg, None
+
+
+async def upload_fileobj_async(
+    fileobj: BinaryIO,
+    filename: str,
+    tenant: str,
+    folder: str = "uploads",
+    content_type: str = "application/octet-stream",
+    max_bytes: Optional[int] = None,
+) -> Tuple[bool, str, Optional[str]]:
+    """upload_fileobj on a worker thread so the event loop keeps serving."""
+    return await asyncio.to_thread(
+        upload_fileobj, fileobj, filename, tenant, folder, content_type, max_bytes
+    )
+
+
+def fileobj_size(fileobj: BinaryIO) -> int:
+    """Size of a seekable file object; leaves the position at the start."""
+    try:
+        fileobj.seek(0, os.SEEK_END)
+        size = int(fileobj.tell())
+        fileobj.seek(0)
+        return size
+    except Exception:
+        return 0
+
+
 def delete_file(file_key: str) -> Tuple[bool, str]:
     """
     Delete a file from B2 storage.
@@ -287,6 +426,103 @@ def delete_file(file_key: str) -> Tuple[bool, str]:
         return False, error_msg
 
 
+def artifact_key(tenant: str, kind: str, scope: str, name: str) -> str:
+    """Deterministic object key for a rendered artifact (not publicly listed)."""
+    tenant_folder = f"{_sanitize_tenant(tenant)}-assets"
+    kind_safe = _sanitize_folder(kind)
+    scope_safe = re.sub(r"[^A-Za-z0-9_-]", "_", str(scope or "_"))[:64] or "_"
+    name_safe = re.sub(r"[^A-Za-z0-9._-]", "_", os.path.basename(str(name or "file")))
+    return f"{B2_MEDIA_PREFIX}/{tenant_folder}/artifacts/{kind_safe}/{scope_safe}/{name_safe}"
+
+
+def put_object(
+    file_key: str,
+    file_content: bytes,
+    content_type: str = "application/octet-stream",
+) -> bool:
+    """Store bytes under an exact key as a private object."""
+    client = get_s3_client()
+    if not client:
+        return False
+    key = str(file_key or "").lstrip("/")
+    if not key or ".." in key or not key.startswith(f"{B2_MEDIA_PREFIX}/"):
+        return False
+    try:
+        if not file_content or (
+            MAX_B2_UPLOAD_BYTES and len(file_content) > MAX_B2_UPLOAD_BYTES
+        ):
+            return False
+        client.put_object(
+            Bucket=B2_BUCKET_NAME,
+            Key=key,
+            Body=file_content,
+            ContentType=content_type,
+        )
+        return True
+    except Exception as e:
+        logger.error(f"B2 put_object failed for {key}: {e}")
+        return False
+
+
+def get_object(file_key: str) -> Optional[bytes]:
+    """Fetch an object's bytes by key; None when missing or unavailable."""
+    client = get_s3_client()
+    if not client:
+        return None
+    key = str(file_key or "").lstrip("/")
+    if not key or ".." in key or not key.startswith(f"{B2_MEDIA_PREFIX}/"):
+        return None
+    try:
+        resp = client.get_object(Bucket=B2_BUCKET_NAME, Key=key)
+        return resp["Body"].read()
+    except ClientError:
+        return None
+    except Exception as e:
+        logger.error(f"B2 get_object failed for {key}: {e}")
+        return None
+
+
+def delete_prefix(prefix: str) -> int:
+    """Delete every object under a prefix; returns how many were removed."""
+    client = get_s3_client()
+    if not client:
+        return 0
+    pfx = str(prefix or "").lstrip("/")
+    if not pfx or ".." in pfx or not pfx.startswith(f"{B2_MEDIA_PREFIX}/"):
+        return 0
+    removed = 0
+    try:
+        token = None
+        while True:
+            kwargs = {"Bucket": B2_BUCKET_NAME, "Prefix": pfx}
+            if token:
+                kwargs["ContinuationToken"] = token
+            response = client.list_objects_v2(**kwargs)
+            keys = [{"Key": o["Key"]} for o in response.get("Contents", [])]
+            if keys:
+                client.delete_objects(Bucket=B2_BUCKET_NAME, Delete={"Objects": keys})
+                removed += len(keys)
+            token = response.get("NextContinuationToken")
+            if not response.get("IsTruncated") or not token:
+                break
+    except Exception as e:
+        logger.error(f"B2 delete_prefix failed for {pfx}: {e}")
+    return removed
+
+
+def delete_file_background(file_key: str) -> None:
+    """Fire-and-forget delete for best-effort cleanups."""
+    global _background
+    with _client_lock:
+        if _background is None:
+            _background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="b2-bg")
+        ex = _background
+    try:
+        ex.submit(delete_file, file_key)
+    except Exception as e:
+        logger.warning(f"Could not schedule B2 delete for {file_key}: {e}")
+
+
 def list_tenant_files(tenant: str, folder: str = "") -> list:
     """
     List all files for a tenant in B2.
@@ -366,13 +602,13 @@ def upload_logo(file_content: bytes, filename: str, tenant: str) -> Tuple[bool,
 
 
 def upload_exercise_video(
-    file_content: bytes, filename: str, tenant: str
+    file_content, filename: str, tenant: str
 ) -> Tuple[bool, str]:
     """
     Upload an exercise video.
 
     Args:
-        file_content: Video bytes
+        file_content: Video bytes or a seekable file object (streamed)
         filename: Original filename
         tenant: Gym subdomain
 
@@ -386,9 +622,14 @@ def upload_exercise_video(
     elif ext == ".mov":
         content_type = "video/quicktime"
 
-    success, url, _ = upload_file(
-        file_content, filename, tenant, "videos", content_type
-    )
+    if hasattr(file_content, "read"):
+        success, url, _ = upload_fileobj(
+            file_content, filename, tenant, "videos", content_type
+        )
+    else:
+        success, url, _ = upload_file(
+            file_content, filename, tenant, "videos", content_type
+        )
     return success, url
 
 
@@ -397,6 +638,15 @@ def upload_exercise_video(
 # ============================================================================
 
 
+def _parse_subfolder(subfolder: str) -> Tuple[str, str]:
+    parts = subfolder.strip("/").split("/", 1)
+    if len(parts) == 2:
+        return parts[1], parts[0]
+    if len(parts) == 1 and parts[0]:
+        return "common", parts[0]
+    return "common", "uploads"
+
+
 def simple_upload(
     file_data: bytes, file_name: str, content_type: str, subfolder: str = ""
 ) -> Optional[str]:
@@ -413,20 +663,27 @@ def simple_upload(
         CDN URL if successful, None if failed
     """
     # Parse tenant and folder from subfolder (e.g., "exercises/mygym" -> tenant="mygym", folder="exercises")
-    parts = subfolder.strip("/").split("/", 1)
-    if len(parts) == 2:
-        folder, tenant = parts[0], parts[1]
-    elif len(parts) == 1:
-        folder = parts[0]
-        tenant = "common"
-    else:
-        folder = "uploads"
-        tenant = "common"
+    tenant, folder = _parse_subfolder(subfolder)
 
     success, url, _ = upload_file(file_data, file_name, tenant, folder, content_type)
     return url if success else None
 
 
+async def simple_upload_stream(
+    fileobj: BinaryIO,
+    file_name: str,
+    content_type: str,
+    subfolder: str = "",
+    max_bytes: Optional[int] = None,
+) -> Optional[str]:
+    """Streaming, off-loop counterpart of simple_upload for UploadFile spools."""
+    tenant, folder = _parse_subfolder(subfolder)
+    success, url, _ = await upload_fileobj_async(
+        fileobj, file_name, tenant, folder, content_type, max_bytes
+    )
+    return url if success else None
+
+
 def get_file_url(file_path: str) -> str:
     """
     Get public URL for a file. Compatible with old StorageService.get_file_url().
@@ -0,0 +1,160 @@
+"""
+Bootstrap payload cache
+
+GET /api/bootstrap runs on every page load of both web apps. Most of its
+payload is the same for everyone in a tenant - branding, admin status,
+sucursales and feature flags - and used to be rebuilt per request from four
+sessions (one of them on the admin DB). That part is memoized here per
+(tenant, sucursal) together with a content digest the router folds into the
+response ETag; only the session/entitlements part is computed per request.
+
+Invalidation is versioned: writers of branding config, sucursales or feature
+flags call `invalidate()` after committing, which bumps the tenant's version
+so the next request rebuilds (entries built while a bump happened are
+discarded, never served). Other processes pick changes up after
+BOOTSTRAP_CACHE_TTL_SECONDS, which also bounds admin status changes made by
+admin-api.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from src.database.tenant_connection import get_current_tenant
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+BOOTSTRAP_CACHE_TTL_SECONDS = max(_env_int("BOOTSTRAP_CACHE_TTL_SECONDS", 30), 0)
+BOOTSTRAP_CACHE_MAX_ENTRIES = max(_env_int("BOOTSTRAP_CACHE_MAX_ENTRIES", 2000), 1)
+
+
+@dataclass
+class TenantBootstrap:
+    """Tenant-scoped part of the bootstrap payload."""
+
+    data: Dict[str, Any]
+    version: int = 0
+    digest: str = ""
+    built_at: float = field(default_factory=time.monotonic)
+
+    def __post_init__(self) -> None:
+        if not self.digest:
+            raw = json.dumps(self.data, sort_keys=True, default=str, separators=(",", ":"))
+            self.digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+_Key = Tuple[str, int]
+
+_lock = threading.Lock()
+_versions: Dict[str, int] = {}
+_entries: Dict[_Key, TenantBootstrap] = {}
+_build_locks: Dict[_Key, asyncio.Lock] = {}
+
+
+def enabled() -> bool:
+    return BOOTSTRAP_CACHE_TTL_SECONDS > 0
+
+
+def version(tenant: str) -> int:
+    with _lock:
+        return _versions.get(str(tenant), 0)
+
+
+def invalidate(tenant: Optional[str] = None) -> None:
+    """Bump the tenant's version; call after committing a change it depends on"""
+    tenant = tenant or get_current_tenant()
+    if not tenant:
+        return
+    t = str(tenant).strip().lower()
+    with _lock:
+        _versions[t] = _versions.get(t, 0) + 1
+        for key in [k for k in _entries if k[0] == t]:
+            _entries.pop(key, None)
+
+
+def get(tenant: str, sucursal_id: int) -> Optional[TenantBootstrap]:
+    key = (str(tenant), int(sucursal_id))
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        if (
+            entry.version != _versions.get(key[0], 0)
+            or time.monotonic() - entry.built_at >= BOOTSTRAP_CACHE_TTL_SECONDS
+        ):
+            _entries.pop(key, None)
+            return None
+        return entry
+
+
+def put(tenant: str, sucursal_id: int, entry: TenantBootstrap) -> None:
+    key = (str(tenant), int(sucursal_id))
+    with _lock:
+        if entry.version != _versions.get(key[0], 0):
+            # Invalidated while it was being built
+            return
+        if len(_entries) >= BOOTSTRAP_CACHE_MAX_ENTRIES:
+            oldest = min(_entries, key=lambda k: _entries[k].built_at)
+            _entries.pop(oldest, None)
+        _entries[key] = entry
+
+
+async def get_or_build(
+    tenant: str,
+    sucursal_id: Optional[int],
+    build: Callable[[], Awaitable[Dict[str, Any]]],
+) -> TenantBootstrap:
+    """Cached tenant part, built once per key when missing (no stampede)"""
+    t = str(tenant).strip().lower()
+    sid = int(sucursal_id or 0)
+    if not enabled():
+        return TenantBootstrap(data=await build())
+    entry = get(t, sid)
+    if entry is not None:
+        return entry
+    with _lock:
+        build_lock = _build_locks.get((t, sid))
+        if build_lock is None:
+            if len(_build_locks) >= BOOTSTRAP_CACHE_MAX_ENTRIES:
+                _build_locks.clear()
+            build_lock = asyncio.Lock()
+            _build_locks[(t, sid)] = build_lock
+    async with build_lock:
+        entry = get(t, sid)
+        if entry is not None:
+            return entry
+        started = version(t)
+        entry = TenantBootstrap(data=await build(), version=started)
+        put(t, sid, entry)
+        return entry
+
+
+def cache_stats() -> Dict[str, Any]:
+    with _lock:
+        return {"entries": len(_entries), "tenants": len({k[0] for k in _entries})}
+
+
+__all__ = [
+    "TenantBootstrap",
+    "cache_stats",
+    "enabled",
+    "get",
+    "get_or_build",
+    "invalidate",
+    "put",
+    "version",
+]
@@ -0,0 +1,443 @@
+"""
+Branding Asset Cache
+
+Per-tenant, disk-backed store of gym logos for PDF generation. Exports and
+receipts read the logo from here and never wait on an outbound HTTP call: a
+miss or a stale entry schedules a background (conditional, ETag-aware) fetch
+and the current render goes ahead with whatever is cached.
+
+Layout: <root>/<tenant>/<sha256(url)>.img plus a .json sidecar holding the
+URL, content type, ETag/Last-Modified and fetch time. Changing the logo
+(GymConfigService logo keys) drops the tenant directory and prefetches the
+new URL.
+
+Decoded ReportLab ImageReader objects are kept in a small per-process LRU
+keyed by content digest, so PDF workers don't re-decode the same logo for
+every document.
+"""
+
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+BRANDING_CACHE_DIR = os.getenv(
+    "BRANDING_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "ironhub_branding"),
+)
+BRANDING_REVALIDATE_SECONDS = int(os.getenv("BRANDING_REVALIDATE_SECONDS", "3600"))
+BRANDING_FETCH_TIMEOUT = float(os.getenv("BRANDING_FETCH_TIMEOUT", "5"))
+PDF_MAX_IMAGE_BYTES = int(os.environ.get("PDF_MAX_IMAGE_BYTES", "600000"))
+
+_ALLOWED_TYPES = {
+    "image/png": "image/png",
+    "image/jpeg": "image/jpeg",
+    "image/jpg": "image/jpeg",
+    "image/gif": "image/gif",
+}
+_LOCAL_EXT_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".gif": "image/gif",
+}
+_ASSETS_ROOT = (Path(__file__).resolve().parents[1] / "assets").resolve()
+
+
+@dataclass
+class BrandingAsset:
+    url: str
+    content_type: str
+    data: bytes
+    path: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: float = 0.0
+
+    def data_uri(self) -> str:
+        return f"data:{self.content_type};base64,{base64.b64encode(self.data).decode()}"
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256(self.data).hexdigest()
+
+
+def _tenant_segment(tenant: Optional[str]) -> str:
+    s = "".join(c if (c.isalnum() or c in "-_") else "_" for c in str(tenant or ""))
+    return s[:64] or "common"
+
+
+def _url_key(url: str) -> str:
+    return hashlib.sha256(str(url).encode("utf-8")).hexdigest()
+
+
+def _read_local_asset(url: str) -> Optional[BrandingAsset]:
+    """Bundled /assets/... logos (no network involved)."""
+    rel = url[len("/assets/") :] if url.startswith("/assets/") else url
+    rel = rel.lstrip("/")
+    candidate = (_ASSETS_ROOT / rel).resolve()
+    if _ASSETS_ROOT not in candidate.parents and candidate != _ASSETS_ROOT:
+        return None
+    if not candidate.is_file():
+        return None
+    ctype = _LOCAL_EXT_TYPES.get(candidate.suffix.lower())
+    if not ctype:
+        return None
+    raw = candidate.read_bytes()
+    if len(raw) > PDF_MAX_IMAGE_BYTES:
+        return None
+    return BrandingAsset(url=url, content_type=ctype, data=raw, path=str(candidate))
+
+
+def _decode_data_uri(url: str) -> Optional[BrandingAsset]:
+    try:
+        header, b64 = url.split(",", 1)
+        ctype = _ALLOWED_TYPES.get(header[len("data:") :].split(";")[0].strip().lower())
+        if not ctype:
+            return None
+        raw = base64.b64decode(b64, validate=True)
+        if len(raw) > PDF_MAX_IMAGE_BYTES:
+            return None
+        return BrandingAsset(url=url, content_type=ctype, data=raw)
+    except Exception:
+        return None
+
+
+class BrandingAssetCache:
+    """Disk + memory cache of tenant logos with background refresh"""
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        revalidate_seconds: Optional[int] = None,
+        fetch_timeout: Optional[float] = None,
+    ):
+        self.root = os.path.abspath(root or BRANDING_CACHE_DIR)
+        self.revalidate_seconds = max(
+            int(BRANDING_REVALIDATE_SECONDS if revalidate_seconds is None else revalidate_seconds), 0
+        )
+        self.fetch_timeout = float(BRANDING_FETCH_TIMEOUT if fetch_timeout is None else fetch_timeout)
+        self._mem: Dict[Tuple[str, str], BrandingAsset] = {}
+        self._inflight: Set[Tuple[str, str]] = set()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stats = {"hits": 0, "misses": 0, "fetches": 0, "not_modified": 0, "errors": 0}
+
+    # --- paths ---
+
+    def _paths(self, tenant: str, url: str) -> Tuple[str, str]:
+        base = os.path.join(self.root, tenant, _url_key(url))
+        return base + ".img", base + ".json"
+
+    # --- public API ---
+
+    def get(self, tenant: Optional[str], url: Optional[str]) -> Optional[BrandingAsset]:
+        """Cached logo for a URL; never performs network I/O on the caller's thread"""
+        u = str(url or "").strip()
+        if not u:
+            return None
+        if u.startswith("data:image/"):
+            return _decode_data_uri(u)
+        if not u.startswith("http"):
+            try:
+                return _read_local_asset(u)
+            except Exception:
+                return None
+
+        t = _tenant_segment(tenant)
+        key = (t, u)
+        with self._lock:
+            asset = self._mem.get(key)
+        if asset is None:
+            asset = self._load_disk(t, u)
+            if asset is not None:
+                with self._lock:
+                    self._mem[key] = asset
+        with self._lock:
+            self._stats["hits" if asset is not None else "misses"] += 1
+        if asset is None or (time.time() - asset.fetched_at) >= self.revalidate_seconds:
+            self._schedule_fetch(t, u, asset)
+        return asset
+
+    def data_uri(self, tenant: Optional[str], url: Optional[str]) -> str:
+        asset = self.get(tenant, url)
+        return asset.data_uri() if asset is not None else ""
+
+    def local_path(self, tenant: Optional[str], url: Optional[str]) -> Optional[str]:
+        asset = self.get(tenant, url)
+        return asset.path if asset is not None else None
+
+    def prefetch(self, tenant: Optional[str], url: Optional[str]) -> None:
+        u = str(url or "").strip()
+        if u.startswith("http"):
+            self._schedule_fetch(_tenant_segment(tenant), u, None)
+
+    def invalidate(self, tenant: Optional[str]) -> None:
+        """Forget every cached logo of a tenant"""
+        t = _tenant_segment(tenant)
+        with self._lock:
+            for key in [k for k in self._mem if k[0] == t]:
+                self._mem.pop(key, None)
+        try:
+            shutil.rmtree(os.path.join(self.root, t), ignore_errors=True)
+        except Exception as e:
+            logger.warning(f"Branding cache invalidation failed for {t}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, entries=len(self._mem), inflight=len(self._inflight))
+
+    # --- disk ---
+
+    def _load_disk(self, tenant: str, url: str) -> Optional[BrandingAsset]:
+        img_path, meta_path = self._paths(tenant, url)
+        try:
+            if not (os.path.isfile(img_path) and os.path.isfile(meta_path)):
+                return None
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(img_path, "rb") as f:
+                data = f.read()
+            if not data:
+                return None
+            return BrandingAsset(
+                url=url,
+                content_type=str(meta.get("content_type") or "image/png"),
+                data=data,
+                path=img_path,
+                etag=meta.get("etag"),
+                last_modified=meta.get("last_modified"),
+                fetched_at=float(meta.get("fetched_at") or 0),
+            )
+        except Exception:
+            return None
+
+    @staticmethod
+    def _atomic_write(path: str, content: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp, path)
+        except Exception:
+            try:
+                os.remove(tmp)
+            except Exception:
+                pass
+            raise
+
+    def _store(self, tenant: str, asset: BrandingAsset) -> BrandingAsset:
+        img_path, meta_path = self._paths(tenant, asset.url)
+        self._atomic_write(img_path, asset.data)
+        meta = {
+            "url": asset.url,
+            "content_type": asset.content_type,
+            "etag": asset.etag,
+            "last_modified": asset.last_modified,
+            "fetched_at": asset.fetched_at,
+        }
+        self._atomic_write(meta_path, json.dumps(meta).encode("utf-8"))
+        asset.path = img_path
+        return asset
+
+    # --- background refresh ---
+
+    def _schedule_fetch(self, tenant: str, url: str, current: Optional[BrandingAsset]) -> None:
+        key = (tenant, url)
+        with self._lock:
+            if key in self._inflight:
+                return
+            self._inflight.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=2, thread_name_prefix="branding-fetch"
+                )
+            ex = self._executor
+        try:
+            ex.submit(self._fetch, tenant, url, current)
+        except Exception as e:
+            with self._lock:
+                self._inflight.discard(key)
+            logger.warning(f"Branding fetch rejected: {e}")
+
+    def _fetch(self, tenant: str, url: str, current: Optional[BrandingAsset]) -> None:
+        key = (tenant, url)
+        try:
+            headers = {"User-Agent": "IronHub"}
+            if current is not None and current.etag:
+                headers["If-None-Match"] = current.etag
+            if current is not None and current.last_modified:
+                headers["If-Modified-Since"] = current.last_modified
+            req = urllib.request.Request(url, headers=headers)
+            try:
+                resp = urllib.request.urlopen(req, timeout=self.fetch_timeout)
+            except urllib.error.HTTPError as e:
+                if e.code == 304 and current is not None:
+                    current.fetched_at = time.time()
+                    self._store(tenant, current)
+                    with self._lock:
+                        self._mem[key] = current
+                        self._stats["not_modified"] += 1
+                    return
+                raise
+            with resp:
+                ctype = _ALLOWED_TYPES.get(
+                    (resp.headers.get("content-type") or "").split(";")[0].strip().lower()
+                )
+                if not ctype:
+                    return
+                raw = resp.read(PDF_MAX_IMAGE_BYTES + 1)
+                if not raw or len(raw) > PDF_MAX_IMAGE_BYTES:
+                    return
+                asset = BrandingAsset(
+                    url=url,
+                    content_type=ctype,
+                    data=raw,
+                    etag=resp.headers.get("ETag"),
+                    last_modified=resp.headers.get("Last-Modified"),
+                    fetched_at=time.time(),
+                )
+            self._store(tenant, asset)
+            with self._lock:
+                self._mem[key] = asset
+                self._stats["fetches"] += 1
+        except Exception as e:
+            with self._lock:
+                self._stats["errors"] += 1
+            logger.warning(f"Branding fetch failed for {url}: {e}")
+        finally:
+            with self._lock:
+                self._inflight.discard(key)
+
+
+_cache: Optional[BrandingAssetCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_branding_cache() -> BrandingAssetCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = BrandingAssetCache()
+    return _cache
+
+
+def _current_tenant() -> Optional[str]:
+    try:
+        from src.database.tenant_connection import get_current_tenant
+
+        return get_current_tenant()
+    except Exception:
+        return None
+
+
+def logo_data_uri(url: Optional[str], tenant: Optional[str] = None) -> str:
+    """data: URI of the cached logo for the current tenant ("" when not cached yet)"""
+    try:
+        return get_branding_cache().data_uri(
+            tenant if tenant is not None else _current_tenant(), url
+        )
+    except Exception:
+        return ""
+
+
+def logo_local_path(url: Optional[str], tenant: Optional[str] = None) -> Optional[str]:
+    try:
+        return get_branding_cache().local_path(
+            tenant if tenant is not None else _current_tenant(), url
+        )
+    except Exception:
+        return None
+
+
+def invalidate_branding(new_logo_url: Optional[str] = None, tenant: Optional[str] = None) -> None:
+    """Drop the tenant's cached logos and warm the new one in the background"""
+    try:
+        t = tenant if tenant is not None else _current_tenant()
+        cache = get_branding_cache()
+        cache.invalidate(t)
+        if new_logo_url:
+            from src.services.b2_storage import get_file_url
+
+            cache.prefetch(t, get_file_url(str(new_logo_url)))
+    except Exception as e:
+        logger.warning(f"Branding invalidation failed: {e}")
+
+
+# === Decoded images (per process, used inside PDF workers) ===
+
+_READER_CACHE_SIZE = 16
+_readers: "OrderedDict[str, Any]" = OrderedDict()
+_readers_lock = threading.Lock()
+
+
+def image_reader(raw: bytes) -> Any:
+    """ReportLab ImageReader for image bytes, reused across documents by content digest"""
+    from reportlab.lib.utils import ImageReader
+
+    key = hashlib.sha256(raw).hexdigest()
+    with _readers_lock:
+        reader = _readers.get(key)
+        if reader is not None:
+            _readers.move_to_end(key)
+            return reader
+    reader = ImageReader(io.BytesIO(raw))
+    with _readers_lock:
+        _readers[key] = reader
+        while len(_readers) > _READER_CACHE_SIZE:
+            _readers.popitem(last=False)
+    return reader
+
+
+def image_reader_from_path(path: str) -> Any:
+    with open(path, "rb") as f:
+        return image_reader(f.read())
+
+
+def reader_flowable(reader: Any, width: float, height: float) -> Any:
+    """Platypus flowable for an ImageReader (platypus Image only takes files)"""
+    from reportlab.platypus.flowables import Flowable
+
+    class _ReaderImage(Flowable):
+        def __init__(self):
+            super().__init__()
+            self.width = float(width)
+            self.height = float(height)
+
+        def wrap(self, availWidth, availHeight):
+            return self.width, self.height
+
+        def draw(self):
+            self.canv.drawImage(reader, 0, 0, width=self.width, height=self.height, mask="auto")
+
+    return _ReaderImage()
+
+
+__all__ = [
+    "BrandingAsset",
+    "BrandingAssetCache",
+    "get_branding_cache",
+    "image_reader",
+    "image_reader_from_path",
+    "invalidate_branding",
+    "logo_data_uri",
+    "logo_local_path",
+    "reader_flowable",
+]
@@ -0,0 +1,338 @@
+"""
+Bulk User Import Service
+
+Set-based apply step for `usuarios_import` bulk jobs. Valid rows are staged
+chunk by chunk into a temp table straight from `bulk_job_rows`, matched
+against existing users (DNI first, then phone) with a single join, written
+with one UPDATE plus one INSERT ... ON CONFLICT per chunk, and their results
+are written back to `bulk_job_rows` in one statement.
+
+If a chunk fails as a whole (e.g. a constraint violation on one row) it is
+rolled back and re-applied row by row through UserService so the offending
+rows get their own error while the rest still go through.
+"""
+
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.services.base import BaseService
+from src.services.user_service import UserService
+
+logger = logging.getLogger(__name__)
+
+BULK_IMPORT_CHUNK_SIZE = int(os.environ.get("BULK_IMPORT_CHUNK_SIZE", "2000"))
+
+_STAGE_DDL = """
+    CREATE TEMP TABLE _bulk_usuarios_stage (
+        row_index INTEGER PRIMARY KEY,
+        nombre TEXT NOT NULL,
+        dni TEXT,
+        telefono TEXT NOT NULL,
+        tipo_cuota_id INTEGER,
+        activo BOOLEAN NOT NULL,
+        notas TEXT,
+        tipo_cuota_nombre TEXT,
+        duracion_dias INTEGER,
+        usuario_id INTEGER,
+        dup_of INTEGER,
+        action TEXT
+    ) ON COMMIT DROP
+"""
+
+_STAGE_LOAD = """
+    INSERT INTO _bulk_usuarios_stage(row_index, nombre, dni, telefono, tipo_cuota_id, activo, notas)
+    SELECT
+        r.row_index,
+        COALESCE(r.data->>'nombre', ''),
+        NULLIF(r.data->>'dni', ''),
+        COALESCE(r.data->>'telefono', ''),
+        CASE WHEN (r.data->>'tipo_cuota_id') ~ '^[0-9]+$' THEN (r.data->>'tipo_cuota_id')::INTEGER END,
+        COALESCE(CASE WHEN (r.data->>'activo') IN ('true', 'false') THEN (r.data->>'activo')::BOOLEAN END, true),
+        NULLIF(r.data->>'notas', '')
+    FROM bulk_job_rows r
+    WHERE r.job_id = :jid AND r.is_valid = true AND r.row_index > :after
+    ORDER BY r.row_index ASC
+    LIMIT :lim
+"""
+
+_STAGE_TIPO_CUOTA = """
+    UPDATE _bulk_usuarios_stage s
+    SET tipo_cuota_nombre = tc.nombre, duracion_dias = COALESCE(tc.duracion_dias, 30)
+    FROM tipos_cuota tc
+    WHERE tc.id = s.tipo_cuota_id
+"""
+
+# DNI match wins; otherwise the oldest user with the same phone.
+_STAGE_MATCH = """
+    UPDATE _bulk_usuarios_stage s
+    SET usuario_id = COALESCE(ud.id, ut.id)
+    FROM _bulk_usuarios_stage s2
+    LEFT JOIN usuarios ud ON s2.dni IS NOT NULL AND ud.dni = s2.dni
+    LEFT JOIN (
+        SELECT DISTINCT ON (u.telefono) u.telefono, u.id
+        FROM usuarios u
+        WHERE u.telefono IN (SELECT telefono FROM _bulk_usuarios_stage WHERE telefono <> '')
+        ORDER BY u.telefono, u.id ASC
+    ) ut ON s2.telefono <> '' AND ut.telefono = s2.telefono
+    WHERE s2.row_index = s.row_index
+"""
+
+# Several rows for the same person in one chunk: the last one wins, like
+# applying them in order would.
+_STAGE_DEDUPE = """
+    UPDATE _bulk_usuarios_stage s
+    SET dup_of = w.keep
+    FROM (
+        SELECT row_index, MAX(row_index) OVER (PARTITION BY k) AS keep
+        FROM (
+            SELECT row_index,
+                   COALESCE('u:' || usuario_id::TEXT, 'd:' || dni, 't:' || telefono, 'r:' || row_index::TEXT) AS k
+            FROM _bulk_usuarios_stage
+        ) keyed
+    ) w
+    WHERE w.row_index = s.row_index AND w.keep <> s.row_index
+"""
+
+_APPLY_UPDATES = """
+    UPDATE usuarios u
+    SET nombre = s.nombre,
+        telefono = s.telefono,
+        activo = s.activo,
+        notas = s.notas,
+        tipo_cuota = COALESCE(s.tipo_cuota_nombre, u.tipo_cuota),
+        fecha_proximo_vencimiento = CASE
+            WHEN s.tipo_cuota_nombre IS NOT NULL AND s.tipo_cuota_nombre IS DISTINCT FROM u.tipo_cuota
+            THEN CAST(:today AS DATE) + s.duracion_dias
+            ELSE u.fecha_proximo_vencimiento
+        END
+    FROM _bulk_usuarios_stage s
+    WHERE s.usuario_id = u.id AND s.dup_of IS NULL
+"""
+
+_APPLY_INSERTS = """
+    WITH ins AS (
+        INSERT INTO usuarios(nombre, dni, telefono, rol, activo, tipo_cuota, notas, fecha_registro, fecha_proximo_vencimiento)
+        SELECT s.nombre, s.dni, s.telefono, 'socio', s.activo,
+               COALESCE(s.tipo_cuota_nombre, 'estandar'), s.notas, :now,
+               CAST(:today AS DATE) + COALESCE(s.duracion_dias, 30)
+        FROM _bulk_usuarios_stage s
+        WHERE s.usuario_id IS NULL AND s.dup_of IS NULL
+        ORDER BY s.row_index ASC
+        ON CONFLICT (dni) DO UPDATE
+        SET nombre = EXCLUDED.nombre,
+            telefono = EXCLUDED.telefono,
+            activo = EXCLUDED.activo,
+            notas = EXCLUDED.notas
+        RETURNING id, dni, telefono, (xmax = 0) AS inserted
+    )
+    UPDATE _bulk_usuarios_stage s
+    SET usuario_id = ins.id, action = CASE WHEN ins.inserted THEN 'created' ELSE 'updated' END
+    FROM ins
+    WHERE s.usuario_id IS NULL AND s.dup_of IS NULL
+      AND (
+        (s.dni IS NOT NULL AND ins.dni = s.dni)
+        OR (s.dni IS NULL AND ins.dni IS NULL AND ins.telefono = s.telefono)
+      )
+"""
+
+_STAGE_FINALIZE = """
+    UPDATE _bulk_usuarios_stage s
+    SET usuario_id = w.usuario_id, action = 'merged'
+    FROM _bulk_usuarios_stage w
+    WHERE s.dup_of = w.row_index
+"""
+
+_WRITE_RESULTS = """
+    UPDATE bulk_job_rows r
+    SET applied = (s.usuario_id IS NOT NULL),
+        applied_at = CASE WHEN s.usuario_id IS NOT NULL THEN NOW() ELSE r.applied_at END,
+        result = CASE
+            WHEN s.usuario_id IS NOT NULL
+            THEN jsonb_build_object('ok', true, 'usuario_id', s.usuario_id, 'action', COALESCE(s.action, 'updated'))
+            ELSE jsonb_build_object('ok', false, 'error', 'No se pudo aplicar la fila')
+        END
+    FROM _bulk_usuarios_stage s
+    WHERE r.job_id = :jid AND r.row_index = s.row_index
+    RETURNING (s.usuario_id IS NOT NULL) AS ok
+"""
+
+
+class BulkUserImportService(BaseService):
+    """Applies a previewed `usuarios_import` job to `usuarios` in set-based chunks"""
+
+    def __init__(self, db: Session = None, chunk_size: int = None):
+        super().__init__(db)
+        self.chunk_size = max(int(chunk_size or BULK_IMPORT_CHUNK_SIZE), 1)
+        self.user_service = UserService(self.db)
+
+    def is_cancelled(self, job_id: int) -> bool:
+        try:
+            st = self.db.execute(
+                text("SELECT status FROM bulk_jobs WHERE id = :id"), {"id": int(job_id)}
+            ).scalar()
+            return str(st or "") == "cancelled"
+        except Exception:
+            return False
+
+    def apply_job(self, job_id: int) -> Dict[str, Any]:
+        """Apply every valid row of the job; stops between chunks if cancelled"""
+        applied = 0
+        failed = 0
+        after = -1
+        while True:
+            if self.is_cancelled(job_id):
+                self._invalidate_users_cache()
+                return {"applied": applied, "failed": failed, "cancelled": True}
+            try:
+                a, f, last = self._apply_chunk(job_id, after)
+            except Exception as e:
+                logger.warning(
+                    f"Bulk import job {job_id}: chunk after row {after} failed set-based ({e}); retrying row by row"
+                )
+                try:
+                    self.db.rollback()
+                except Exception:
+                    pass
+                a, f, last = self._apply_chunk_rowwise(job_id, after)
+            if last is None:
+                break
+            applied += a
+            failed += f
+            after = last
+            self.db.execute(
+                text(
+                    "UPDATE bulk_jobs SET applied_count = :a, error_count = :e, updated_at = NOW() WHERE id = :id"
+                ),
+                {"id": int(job_id), "a": int(applied), "e": int(failed)},
+            )
+            self.db.commit()
+        self._invalidate_users_cache()
+        return {"applied": applied, "failed": failed, "cancelled": False}
+
+    def _apply_chunk(self, job_id: int, after: int) -> Tuple[int, int, Any]:
+        db = self.db
+        db.execute(text(_STAGE_DDL))
+        db.execute(
+            text(_STAGE_LOAD),
+            {"jid": int(job_id), "after": int(after), "lim": int(self.chunk_size)},
+        )
+        last = db.execute(text("SELECT MAX(row_index) FROM _bulk_usuarios_stage")).scalar()
+        if last is None:
+            db.rollback()
+            return (0, 0, None)
+
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        today = self.user_service._today_local_date()
+        db.execute(text(_STAGE_TIPO_CUOTA))
+        db.execute(text(_STAGE_MATCH))
+        db.execute(text(_STAGE_DEDUPE))
+        db.execute(text(_APPLY_UPDATES), {"today": today})
+        db.execute(
+            text(
+                "UPDATE _bulk_usuarios_stage SET action = 'updated' WHERE usuario_id IS NOT NULL AND dup_of IS NULL"
+            )
+        )
+        db.execute(text(_APPLY_INSERTS), {"now": now, "today": today})
+        db.execute(text(_STAGE_FINALIZE))
+        results = db.execute(text(_WRITE_RESULTS), {"jid": int(job_id)}).fetchall()
+        db.commit()
+        ok = sum(1 for r in results if bool(r[0]))
+        return (ok, len(results) - ok, int(last))
+
+    def _apply_chunk_rowwise(self, job_id: int, after: int) -> Tuple[int, int, Any]:
+        """Fallback: same rows as _apply_chunk, one UserService call each"""
+        db = self.db
+        rows = db.execute(
+            text(
+                """
+                SELECT row_index, data
+                FROM bulk_job_rows
+                WHERE job_id = :id AND is_valid = true AND row_index > :after
+                ORDER BY row_index ASC
+                LIMIT :lim
+                """
+            ),
+            {"id": int(job_id), "after": int(after), "lim": int(self.chunk_size)},
+        ).fetchall()
+        if not rows:
+            return (0, 0, None)
+        applied = 0
+        failed = 0
+        results: List[Dict[str, Any]] = []
+        for row_index, data in rows:
+            try:
+                uid, action = self._apply_row(dict(data or {}))
+                applied += 1
+                results.append(
+                    {
+                        "jid": int(job_id),
+                        "idx": int(row_index),
+                        "ok": True,
+                        "res": json.dumps({"ok": True, "usuario_id": uid, "action": action}, ensure_ascii=False),
+                    }
+                )
+            except Exception as e:
+                try:
+                    db.rollback()
+                except Exception:
+                    pass
+                failed += 1
+                results.append(
+                    {
+                        "jid": int(job_id),
+                        "idx": int(row_index),
+                        "ok": False,
+                        "res": json.dumps({"ok": False, "error": str(e)}, ensure_ascii=False),
+                    }
+                )
+        db.execute(
+            text(
+                """
+                UPDATE bulk_job_rows
+                SET applied = :ok,
+                    applied_at = CASE WHEN :ok THEN NOW() ELSE applied_at END,
+                    result = CAST(:res AS JSONB)
+                WHERE job_id = :jid AND row_index = :idx
+                """
+            ),
+            results,
+        )
+        db.commit()
+        return (applied, failed, int(rows[-1][0]))
+
+    def _apply_row(self, data: Dict[str, Any]) -> Tuple[int, str]:
+        svc = self.user_service
+        dni = str(data.get("dni") or "").strip()
+        tel = str(data.get("telefono") or "").strip()
+        existing = svc.get_user_by_dni(dni) if dni else None
+        if existing is None and tel:
+            uid = self.db.execute(
+                text("SELECT id FROM usuarios WHERE telefono = :t ORDER BY id ASC LIMIT 1"),
+                {"t": tel},
+            ).scalar()
+            if uid is not None:
+                existing = svc.get_user(int(uid))
+        if existing is None:
+            payload = dict(data)
+            if not dni:
+                payload["dni"] = None
+            payload["rol"] = "socio"
+            payload["fecha_registro"] = datetime.now(timezone.utc).replace(tzinfo=None)
+            return (int(svc.create_user(payload, is_owner=True)), "created")
+        uid = int(getattr(existing, "id"))
+        payload = dict(data)
+        payload.pop("dni", None)
+        svc.update_user(uid, payload, modifier_id=None, is_owner=True)
+        return (uid, "updated")
+
+    def _invalidate_users_cache(self) -> None:
+        try:
+            self.user_service.user_repo._invalidate_cache("usuarios")
+        except Exception:
+            pass
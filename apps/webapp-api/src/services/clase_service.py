@@ -11,6 +11,7 @@ from typing import List, Dict, Any, Optional
 from sqlalchemy import select, delete
 from sqlalchemy.orm import Session, joinedload
 
+from src.services import class_agenda_cache
 from src.services.base import BaseService
 from src.database.orm_models import Clase, ClaseBloque, ClaseBloqueItem
 
@@ -168,6 +169,7 @@ class ClaseService(BaseService):
                 clase.duracion_minutos = data["duracion_minutos"]
 
             self.db.commit()
+            class_agenda_cache.invalidate_static()
             return True
         except Exception as e:
             logger.error(f"Error updating clase {clase_id}: {e}")
@@ -182,6 +184,8 @@ class ClaseService(BaseService):
                 return False
             self.db.delete(clase)
             self.db.commit()
+            class_agenda_cache.invalidate_static()
+            class_agenda_cache.invalidate_counts()
             return True
         except Exception as e:
             logger.error(f"Error deleting clase {clase_id}: {e}")
@@ -0,0 +1,310 @@
+"""
+Weekly class agenda cache
+
+The agenda (GET /api/clases/agenda) is opened by every member and profesor
+but its structure - schedules, class names, cupo, assigned profesores - only
+changes when staff edit it. Only the enrollment counts move during the day.
+The cache keeps the two apart:
+
+- static entries per (tenant, sucursal), built without touching
+  clase_usuarios and dropped by `invalidate_static` when a schedule, a class
+  or a profesor assignment changes;
+- one counts map per tenant (horario_id -> inscriptos), patched in place by
+  ClassBookingService after each committed booking/cancellation.
+
+Both expire (AGENDA_STATIC_TTL_SECONDS / AGENDA_COUNTS_TTL_SECONDS) so edits
+made by another process are picked up. Responses carry a content-hash ETag,
+memoized per (static build, counts version, filter), so an unchanged agenda
+is answered with 304 and no serialization.
+"""
+
+import hashlib
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.database import schema_capabilities
+from src.database.tenant_connection import get_current_tenant
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+AGENDA_STATIC_TTL_SECONDS = max(_env_int("AGENDA_STATIC_TTL_SECONDS", 300), 0)
+AGENDA_COUNTS_TTL_SECONDS = max(_env_int("AGENDA_COUNTS_TTL_SECONDS", 30), 1)
+AGENDA_CACHE_MAX_ENTRIES = max(_env_int("AGENDA_CACHE_MAX_ENTRIES", 2000), 1)
+
+_DAY_ORDER = {
+    "lunes": 1,
+    "martes": 2,
+    "miércoles": 3,
+    "miercoles": 3,
+    "jueves": 4,
+    "viernes": 5,
+    "sábado": 6,
+    "sabado": 6,
+    "domingo": 7,
+}
+
+
+@dataclass
+class _StaticEntry:
+    rows: List[Dict[str, Any]]
+    token: str = field(default_factory=lambda: uuid.uuid4().hex)
+    built_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class _Counts:
+    values: Dict[int, int]
+    version: int = 0
+    refreshed_at: float = field(default_factory=time.monotonic)
+
+
+_lock = threading.Lock()
+_static: Dict[Tuple[str, int], _StaticEntry] = {}
+_counts: Dict[str, _Counts] = {}
+_etags: Dict[Tuple[str, int, int, int], str] = {}
+# Counts versions are process-wide so a reload never reuses a patched version
+_versions = itertools.count(1)
+
+
+def enabled() -> bool:
+    return AGENDA_STATIC_TTL_SECONDS > 0
+
+
+# ========== Loading ==========
+
+
+def _load_static(db: Session, sucursal_id: int) -> List[Dict[str, Any]]:
+    params: Dict[str, Any] = {}
+    where = ""
+    if sucursal_id > 0:
+        params["sid"] = int(sucursal_id)
+        where = "WHERE (c.sucursal_id IS NULL OR c.sucursal_id = :sid)"
+    result = db.execute(
+        text(
+            f"""
+            SELECT
+                ch.id,
+                ch.clase_id,
+                COALESCE(c.nombre, '') AS clase_nombre,
+                COALESCE(c.descripcion, '') AS clase_descripcion,
+                ch.dia_semana,
+                TO_CHAR(ch.hora_inicio, 'HH24:MI') AS hora_inicio,
+                TO_CHAR(ch.hora_fin, 'HH24:MI') AS hora_fin,
+                COALESCE(ch.cupo_maximo, 20) AS cupo,
+                ARRAY_REMOVE(ARRAY_AGG(DISTINCT a.profesor_id), NULL) AS profesor_ids
+            FROM clases_horarios ch
+            JOIN clases c ON c.id = ch.clase_id
+            LEFT JOIN profesor_clase_asignaciones a
+                   ON a.clase_horario_id = ch.id AND a.activa = TRUE
+            {where}
+            GROUP BY ch.id, ch.clase_id, c.nombre, c.descripcion, ch.dia_semana,
+                     ch.hora_inicio, ch.hora_fin, ch.cupo_maximo
+            """
+        ),
+        params,
+    ).fetchall()
+    rows: List[Dict[str, Any]] = []
+    all_pids = set()
+    for r in result:
+        pids = sorted(int(p) for p in (r[8] or []))
+        all_pids.update(pids)
+        rows.append(
+            {
+                "horario_id": int(r[0]),
+                "clase_id": r[1],
+                "clase_nombre": r[2],
+                "clase_descripcion": r[3] or None,
+                "dia": r[4],
+                "hora_inicio": r[5],
+                "hora_fin": r[6],
+                "cupo": r[7],
+                "profesor_ids": pids,
+            }
+        )
+    names: Dict[int, str] = {}
+    if all_pids:
+        for pid, nombre in db.execute(
+            text(
+                """
+                SELECT p.id, COALESCE(u.nombre, '')
+                FROM profesores p
+                LEFT JOIN usuarios u ON u.id = p.usuario_id
+                WHERE p.id = ANY(:ids)
+                """
+            ),
+            {"ids": sorted(all_pids)},
+        ).fetchall():
+            names[int(pid)] = str(nombre or "")
+    for row in rows:
+        pids = row["profesor_ids"]
+        row["profesor_id"] = pids[0] if pids else None
+        row["profesor_nombre"] = (names.get(pids[0]) or None) if pids else None
+    rows.sort(
+        key=lambda x: (
+            _DAY_ORDER.get(str(x["dia"] or "").strip().lower(), 8),
+            x["hora_inicio"] or "",
+            x["horario_id"],
+        )
+    )
+    return rows
+
+
+def _load_counts(db: Session) -> Dict[int, int]:
+    if schema_capabilities.has(db, "inscriptos_count"):
+        sql = "SELECT id, inscriptos_count FROM clases_horarios"
+    else:
+        sql = "SELECT clase_horario_id, COUNT(*) FROM clase_usuarios GROUP BY clase_horario_id"
+    return {int(h): int(n or 0) for h, n in db.execute(text(sql)).fetchall()}
+
+
+def _get_static(db: Session, tenant: str, sucursal_id: int) -> _StaticEntry:
+    key = (tenant, sucursal_id)
+    now = time.monotonic()
+    with _lock:
+        entry = _static.get(key)
+        if entry is not None and now - entry.built_at < AGENDA_STATIC_TTL_SECONDS:
+            return entry
+    entry = _StaticEntry(rows=_load_static(db, sucursal_id))
+    with _lock:
+        if len(_static) >= AGENDA_CACHE_MAX_ENTRIES:
+            oldest = min(_static, key=lambda k: _static[k].built_at)
+            _static.pop(oldest, None)
+        _static[key] = entry
+    return entry
+
+
+def _get_counts(db: Session, tenant: str) -> _Counts:
+    now = time.monotonic()
+    with _lock:
+        counts = _counts.get(tenant)
+        if counts is not None and now - counts.refreshed_at < AGENDA_COUNTS_TTL_SECONDS:
+            return counts
+    values = _load_counts(db)
+    with _lock:
+        fresh = _Counts(values=values, version=next(_versions))
+        _counts[tenant] = fresh
+    return fresh
+
+
+# ========== Reading ==========
+
+
+def _compose(
+    entry: _StaticEntry, counts: Dict[int, int], profesor_id: Optional[int]
+) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    for row in entry.rows:
+        if profesor_id is not None and int(profesor_id) not in row["profesor_ids"]:
+            continue
+        item = {k: v for k, v in row.items() if k != "profesor_ids"}
+        item["inscriptos_count"] = int(counts.get(row["horario_id"], 0))
+        out.append(item)
+    return out
+
+
+def get_agenda(
+    db: Session,
+    sucursal_id: Optional[int] = None,
+    profesor_id: Optional[int] = None,
+    tenant: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Agenda rows and their ETag; loads directly (no ETag) without a tenant"""
+    tenant = tenant or get_current_tenant()
+    try:
+        sid = int(sucursal_id) if sucursal_id is not None else 0
+    except Exception:
+        sid = 0
+    sid = sid if sid > 0 else 0
+    if not tenant or not enabled():
+        counts = _load_counts(db)
+        return _compose(_StaticEntry(rows=_load_static(db, sid)), counts, profesor_id), None
+    entry = _get_static(db, tenant, sid)
+    counts = _get_counts(db, tenant)
+    # Versions only grow, so reading it before composing never pins stale rows
+    key = (f"{tenant}:{entry.token}", counts.version, sid, int(profesor_id or 0))
+    rows = _compose(entry, counts.values, profesor_id)
+    with _lock:
+        etag = _etags.get(key)
+    if etag is None:
+        payload = json.dumps(rows, sort_keys=True, default=str, separators=(",", ":"))
+        etag = f'"agenda-{hashlib.sha1(payload.encode("utf-8")).hexdigest()[:32]}"'
+        with _lock:
+            if len(_etags) >= AGENDA_CACHE_MAX_ENTRIES:
+                _etags.clear()
+            _etags[key] = etag
+    return rows, etag
+
+
+# ========== Invalidation ==========
+
+
+def invalidate_static(tenant: Optional[str] = None) -> None:
+    """Drop the tenant's static entries (all sucursales: shared classes span them)"""
+    tenant = tenant or get_current_tenant()
+    if not tenant:
+        return
+    with _lock:
+        for key in [k for k in _static if k[0] == tenant]:
+            _static.pop(key, None)
+        prefix = f"{tenant}:"
+        for key in [k for k in _etags if k[0].startswith(prefix)]:
+            _etags.pop(key, None)
+
+
+def invalidate_counts(tenant: Optional[str] = None) -> None:
+    tenant = tenant or get_current_tenant()
+    if not tenant:
+        return
+    with _lock:
+        _counts.pop(tenant, None)
+
+
+def patch_count(horario_id: int, delta: int, tenant: Optional[str] = None) -> None:
+    """Apply a committed booking delta to the tenant's counts (if loaded)"""
+    tenant = tenant or get_current_tenant()
+    if not tenant or not delta:
+        return
+    with _lock:
+        counts = _counts.get(tenant)
+        if counts is None:
+            return
+        hid = int(horario_id)
+        counts.values[hid] = max(int(counts.values.get(hid, 0)) + int(delta), 0)
+        counts.version = next(_versions)
+
+
+def cache_stats() -> Dict[str, Any]:
+    with _lock:
+        return {
+            "static_entries": len(_static),
+            "count_maps": len(_counts),
+            "etags": len(_etags),
+        }
+
+
+__all__ = [
+    "cache_stats",
+    "enabled",
+    "get_agenda",
+    "invalidate_counts",
+    "invalidate_static",
+    "patch_count",
+]
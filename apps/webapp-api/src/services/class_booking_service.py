@@ -0,0 +1,261 @@
+"""
+Class Booking Service - atomic capacity and waitlist promotion
+
+Bookings take a spot with one conditional UPDATE on
+clases_horarios.inscriptos_count (`... WHERE inscriptos_count < cupo`) chained
+to the INSERT in the same statement, so the capacity check and the insert
+cannot interleave and two members can never both get the last spot. When
+bookings open for a popular class, concurrent requests queue on the
+schedule's row lock for the duration of that single statement instead of a
+COUNT(*) + INSERT round trip each.
+
+Cancellations delete the enrollment (the clase_usuarios trigger gives the
+spot back) and promote the head of the waitlist in the same transaction.
+Notifications for promoted members are returned to the caller so they are
+sent after the commit, never inside it.
+
+Tenants without the counter (migration 0023 pending) fall back to the
+COUNT(*) check. Committed changes are patched into class_agenda_cache so the
+cached agenda shows live counts without re-reading clase_usuarios.
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+import logging
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+
+from src.database import schema_capabilities
+from src.services import class_agenda_cache
+from src.services.base import BaseService
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on promotions per cancellation (cupo raised while full, etc.)
+_MAX_PROMOTIONS = 50
+
+
+class ClassBookingService(BaseService):
+    """Capacity-safe enrollments and waitlist promotion for class schedules."""
+
+    def __init__(self, db: Session):
+        super().__init__(db)
+
+    def _now_utc_naive(self) -> datetime:
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+
+    def _has_counter(self) -> bool:
+        return schema_capabilities.has(self.db, "inscriptos_count")
+
+    # ========== Booking ==========
+
+    def reservar(self, horario_id: int, usuario_id: int) -> Dict[str, Any]:
+        """Take a spot; the caller has already validated access.
+
+        Returns the enrollment, {"ok": True, "message": "Ya está inscripto"},
+        {"error": "Cupo lleno", "full": True} or {"error": ...}.
+        """
+        try:
+            row = self._take_spot(int(horario_id), int(usuario_id))
+            if row is None:
+                state = self._booking_state(int(horario_id), int(usuario_id))
+                self.db.rollback()
+                if state is None:
+                    return {"error": "Horario no encontrado"}
+                if state["enrolled"]:
+                    return {"ok": True, "message": "Ya está inscripto"}
+                return {"error": "Cupo lleno", "full": True}
+            self.db.commit()
+            class_agenda_cache.patch_count(int(horario_id), 1)
+            return {
+                "id": row[0],
+                "horario_id": row[1],
+                "usuario_id": row[2],
+                "fecha_inscripcion": row[3].isoformat() if row[3] else None,
+            }
+        except IntegrityError:
+            # Same member booking twice concurrently: the loser's UPDATE is
+            # rolled back with the failed INSERT
+            self.db.rollback()
+            return {"ok": True, "message": "Ya está inscripto"}
+        except Exception as e:
+            logger.error(f"Error booking class: {e}")
+            self.db.rollback()
+            return {"error": str(e)}
+
+    def _take_spot(self, horario_id: int, usuario_id: int):
+        params = {
+            "hid": horario_id,
+            "uid": usuario_id,
+            "fecha": self._now_utc_naive(),
+        }
+        if self._has_counter():
+            return self.db.execute(
+                text(
+                    """
+                    WITH slot AS (
+                        UPDATE clases_horarios
+                        SET inscriptos_count = inscriptos_count + 1
+                        WHERE id = :hid
+                          AND inscriptos_count < COALESCE(cupo_maximo, 20)
+                          AND NOT EXISTS (
+                              SELECT 1 FROM clase_usuarios
+                              WHERE clase_horario_id = :hid AND usuario_id = :uid
+                          )
+                        RETURNING id
+                    )
+                    INSERT INTO clase_usuarios (clase_horario_id, usuario_id, fecha_inscripcion)
+                    SELECT id, :uid, :fecha FROM slot
+                    RETURNING id, clase_horario_id, usuario_id, fecha_inscripcion
+                    """
+                ),
+                params,
+            ).fetchone()
+        return self.db.execute(
+            text(
+                """
+                INSERT INTO clase_usuarios (clase_horario_id, usuario_id, fecha_inscripcion)
+                SELECT ch.id, :uid, :fecha
+                FROM clases_horarios ch
+                WHERE ch.id = :hid
+                  AND (SELECT COUNT(*) FROM clase_usuarios WHERE clase_horario_id = :hid)
+                      < COALESCE(ch.cupo_maximo, 20)
+                ON CONFLICT (clase_horario_id, usuario_id) DO NOTHING
+                RETURNING id, clase_horario_id, usuario_id, fecha_inscripcion
+                """
+            ),
+            params,
+        ).fetchone()
+
+    def _booking_state(self, horario_id: int, usuario_id: int) -> Optional[Dict[str, Any]]:
+        row = self.db.execute(
+            text(
+                """
+                SELECT ch.id,
+                       EXISTS (
+                           SELECT 1 FROM clase_usuarios
+                           WHERE clase_horario_id = ch.id AND usuario_id = :uid
+                       ) AS enrolled
+                FROM clases_horarios ch
+                WHERE ch.id = :hid
+                """
+            ),
+            {"hid": horario_id, "uid": usuario_id},
+        ).fetchone()
+        if not row:
+            return None
+        return {"enrolled": bool(row[1])}
+
+    # ========== Cancellation ==========
+
+    def cancelar(self, horario_id: int, usuario_id: int, promover: bool = True) -> Dict[str, Any]:
+        """Cancel an enrollment and promote from the waitlist in one transaction.
+
+        Returns {"ok", "removed", "promoted": [{usuario_id, ...}]}; the
+        caller notifies the promoted members after this returns.
+        """
+        try:
+            removed = self.db.execute(
+                text(
+                    "DELETE FROM clase_usuarios WHERE clase_horario_id = :hid AND usuario_id = :uid"
+                ),
+                {"hid": int(horario_id), "uid": int(usuario_id)},
+            ).rowcount or 0
+            promoted: List[Dict[str, Any]] = []
+            if removed and promover:
+                promoted = self._promote(int(horario_id))
+            self.db.commit()
+            class_agenda_cache.patch_count(int(horario_id), len(promoted) - int(removed))
+            return {"ok": True, "removed": int(removed), "promoted": promoted}
+        except Exception as e:
+            logger.error(f"Error cancelling class booking: {e}")
+            self.db.rollback()
+            return {"ok": False, "removed": 0, "promoted": [], "error": str(e)}
+
+    def promover_lista_espera(self, horario_id: int) -> List[Dict[str, Any]]:
+        """Fill free spots from the waitlist after cupo_maximo was raised.
+
+        Commits; the caller notifies the returned members afterwards.
+        """
+        try:
+            promoted = self._promote(int(horario_id))
+            self.db.commit()
+            class_agenda_cache.patch_count(int(horario_id), len(promoted))
+            return promoted
+        except Exception as e:
+            logger.error(f"Error promoting waitlist: {e}")
+            self.db.rollback()
+            return []
+
+    def _promote(self, horario_id: int) -> List[Dict[str, Any]]:
+        if not schema_capabilities.has(self.db, "clase_lista_espera"):
+            return []
+        if self._has_counter():
+            take = """
+                slot AS (
+                    UPDATE clases_horarios ch
+                    SET inscriptos_count = ch.inscriptos_count + 1
+                    FROM nxt
+                    WHERE ch.id = :hid
+                      AND ch.inscriptos_count < COALESCE(ch.cupo_maximo, 20)
+                    RETURNING nxt.id AS espera_id, nxt.usuario_id
+                )
+            """
+        else:
+            take = """
+                slot AS (
+                    SELECT nxt.id AS espera_id, nxt.usuario_id
+                    FROM nxt
+                    JOIN clases_horarios ch ON ch.id = :hid
+                    WHERE (SELECT COUNT(*) FROM clase_usuarios WHERE clase_horario_id = :hid)
+                          < COALESCE(ch.cupo_maximo, 20)
+                )
+            """
+        stmt = text(
+            f"""
+            WITH nxt AS (
+                SELECT le.id, le.usuario_id
+                FROM clase_lista_espera le
+                WHERE le.clase_horario_id = :hid
+                  AND le.activo = TRUE
+                  AND NOT EXISTS (
+                      SELECT 1 FROM clase_usuarios cu
+                      WHERE cu.clase_horario_id = le.clase_horario_id
+                        AND cu.usuario_id = le.usuario_id
+                  )
+                ORDER BY le.posicion, le.id
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            ),
+            {take},
+            ins AS (
+                INSERT INTO clase_usuarios (clase_horario_id, usuario_id, fecha_inscripcion)
+                SELECT :hid, usuario_id, :fecha FROM slot
+                RETURNING usuario_id
+            ),
+            gone AS (
+                DELETE FROM clase_lista_espera
+                WHERE id IN (SELECT espera_id FROM slot)
+                RETURNING id
+            )
+            SELECT ins.usuario_id FROM ins
+            """
+        )
+        promoted: List[Dict[str, Any]] = []
+        for _ in range(_MAX_PROMOTIONS):
+            row = self.db.execute(
+                stmt, {"hid": horario_id, "fecha": self._now_utc_naive()}
+            ).fetchone()
+            if not row:
+                break
+            promoted.append({"usuario_id": int(row[0]), "horario_id": horario_id})
+        if promoted:
+            logger.info(
+                f"Promoted {len(promoted)} member(s) from the waitlist of horario {horario_id}"
+            )
+        return promoted
+
+
+__all__ = ["ClassBookingService"]
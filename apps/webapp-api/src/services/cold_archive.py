@@ -0,0 +1,599 @@
+"""
+Cold data archive
+
+Years of pagos, asistencias and whatsapp_messages stay in every tenant DB
+(and in every backup) although after a year they are only read by exports.
+Closed months older than COLD_ARCHIVE_MIN_AGE_MONTHS are exported to
+zstd-compressed Parquet objects - in B2 through b2_storage, or on local disk
+(COLD_ARCHIVE_BACKEND=local) for development and tests - and deleted from
+Postgres once the upload has been read back and verified.
+
+Each object is recorded in archive_segments (alembic 0026_archive_segments),
+one row per (table, month, part); a month archived twice (backdated rows)
+gets a second part. Children removed by ON DELETE CASCADE (pago_detalles,
+comprobantes_pago) are archived with their pagos. Monthly partitions that
+partition retention detached (src/database/partitioning.py) are archived
+whole and dropped.
+
+Readers (`iter_archived_batches`) stream one segment at a time, so exports
+in ReportsService union the archived months with the hot rows without
+loading the history into memory. pyarrow is required for both directions.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from src.database import schema_capabilities
+from src.database.partitioning import add_months, detached_partitions, month_start
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+COLD_ARCHIVE_BACKEND = str(os.getenv("COLD_ARCHIVE_BACKEND", "b2")).strip().lower() or "b2"
+COLD_ARCHIVE_DIR = os.getenv(
+    "COLD_ARCHIVE_DIR",
+    os.path.join(tempfile.gettempdir(), "ironhub_cold_archive"),
+)
+COLD_ARCHIVE_MIN_AGE_MONTHS = max(_env_int("COLD_ARCHIVE_MIN_AGE_MONTHS", 12), 1)
+COLD_ARCHIVE_BATCH_ROWS = max(_env_int("COLD_ARCHIVE_BATCH_ROWS", 5000), 100)
+
+_CONTENT_TYPE = "application/vnd.apache.parquet"
+
+
+@dataclass(frozen=True)
+class ArchiveSpec:
+    table: str
+    column: str
+    # (child table, FK column) removed by ON DELETE CASCADE, archived alongside
+    children: Tuple[Tuple[str, str], ...] = ()
+
+
+ARCHIVE_TABLES: Dict[str, ArchiveSpec] = {
+    "pagos": ArchiveSpec(
+        "pagos",
+        "fecha_pago",
+        (("pago_detalles", "pago_id"), ("comprobantes_pago", "pago_id")),
+    ),
+    "asistencias": ArchiveSpec("asistencias", "fecha"),
+    "whatsapp_messages": ArchiveSpec("whatsapp_messages", "sent_at"),
+}
+
+
+@dataclass
+class Segment:
+    table: str
+    period: date
+    part: int
+    key: str
+    data: bytes
+    rows: int
+    min_id: Optional[int]
+    max_id: Optional[int]
+
+    @property
+    def sha256(self) -> str:
+        return hashlib.sha256(self.data).hexdigest()
+
+
+# ========== Stores ==========
+
+
+class LocalArchiveStore:
+    """Archive objects as files under a local directory (same keys as B2)"""
+
+    backend = "local"
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = os.path.abspath(root or COLD_ARCHIVE_DIR)
+
+    def _path(self, key: str) -> str:
+        k = str(key or "").lstrip("/")
+        if not k or ".." in k:
+            raise ValueError(f"Clave de archivo inválida: {key}")
+        return os.path.join(self.root, *k.split("/"))
+
+    def put(self, key: str, data: bytes) -> bool:
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+            return True
+        except Exception as e:
+            logger.error(f"Local archive put failed for {key}: {e}")
+            return False
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as fh:
+                return fh.read()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class B2ArchiveStore:
+    """Archive objects as private B2 objects"""
+
+    backend = "b2"
+
+    def put(self, key: str, data: bytes) -> bool:
+        from src.services.b2_storage import put_object
+
+        return put_object(key, data, _CONTENT_TYPE)
+
+    def get(self, key: str) -> Optional[bytes]:
+        from src.services.b2_storage import get_object
+
+        return get_object(key)
+
+    def delete(self, key: str) -> None:
+        from src.services.b2_storage import delete_file
+
+        delete_file(key)
+
+
+def get_store(backend: Optional[str] = None, root: Optional[str] = None):
+    name = str(backend or COLD_ARCHIVE_BACKEND).strip().lower()
+    if name == "local":
+        return LocalArchiveStore(root)
+    if name == "b2":
+        return B2ArchiveStore()
+    raise ValueError(f"Backend de archivo desconocido: {name}")
+
+
+def segment_key(tenant: str, table: str, period: date, part: int) -> str:
+    from src.services.b2_storage import artifact_key
+
+    return artifact_key(tenant, "archive", table, f"{period:%Y-%m}-{int(part):03d}.parquet")
+
+
+# ========== Parquet ==========
+
+
+def _arrow_type(data_type: str, precision: Optional[int], scale: Optional[int]):
+    dt = str(data_type or "").lower()
+    if dt == "smallint":
+        return pa.int16()
+    if dt == "integer":
+        return pa.int32()
+    if dt == "bigint":
+        return pa.int64()
+    if dt == "real":
+        return pa.float32()
+    if dt == "double precision":
+        return pa.float64()
+    if dt == "numeric" and precision:
+        return pa.decimal128(int(precision), int(scale or 0))
+    if dt == "boolean":
+        return pa.bool_()
+    if dt == "date":
+        return pa.date32()
+    if dt == "timestamp with time zone":
+        return pa.timestamp("us", tz="UTC")
+    if dt.startswith("timestamp"):
+        return pa.timestamp("us")
+    if dt.startswith("time"):
+        return pa.time64("us")
+    # text, varchar, json(b), inet, unbounded numeric...
+    return pa.string()
+
+
+def _cell(value: Any, as_string: bool) -> Any:
+    if value is None or not as_string:
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return str(value)
+
+
+def _schema(conn: Connection, table: str):
+    rows = conn.execute(
+        text(
+            """
+            SELECT column_name, data_type, numeric_precision, numeric_scale
+            FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = :t
+            ORDER BY ordinal_position
+            """
+        ),
+        {"t": table},
+    ).fetchall()
+    return pa.schema([(str(r[0]), _arrow_type(r[1], r[2], r[3])) for r in rows])
+
+
+def _write_segment(
+    conn: Connection,
+    table: str,
+    sql: str,
+    params: Dict[str, Any],
+    tenant: str,
+    period: date,
+    part: int,
+    schema_table: Optional[str] = None,
+) -> Optional[Segment]:
+    """Stream a query's rows into an in-memory Parquet object; None when empty"""
+    schema = _schema(conn, schema_table or table)
+    names = schema.names
+    strings = [pa.types.is_string(f.type) for f in schema]
+    schema = schema.with_metadata({"ironhub.table": table, "ironhub.period": period.isoformat()})
+    sink = io.BytesIO()
+    writer = None
+    rows = 0
+    min_id: Optional[int] = None
+    max_id: Optional[int] = None
+    id_idx = names.index("id") if "id" in names else None
+    result = conn.execution_options(stream_results=True, yield_per=COLD_ARCHIVE_BATCH_ROWS).execute(
+        text(sql), params
+    )
+    try:
+        while True:
+            batch = result.fetchmany(COLD_ARCHIVE_BATCH_ROWS)
+            if not batch:
+                break
+            if writer is None:
+                writer = pq.ParquetWriter(sink, schema, compression="zstd")
+            arrays = [
+                pa.array([_cell(r[i], strings[i]) for r in batch], type=schema.field(i).type)
+                for i in range(len(names))
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            rows += len(batch)
+            if id_idx is not None:
+                ids = [int(r[id_idx]) for r in batch if r[id_idx] is not None]
+                if ids:
+                    min_id = min(ids) if min_id is None else min(min_id, min(ids))
+                    max_id = max(ids) if max_id is None else max(max_id, max(ids))
+    finally:
+        result.close()
+        if writer is not None:
+            writer.close()
+    if not rows:
+        return None
+    return Segment(
+        table=table,
+        period=period,
+        part=part,
+        key=segment_key(tenant, table, period, part),
+        data=sink.getvalue(),
+        rows=rows,
+        min_id=min_id,
+        max_id=max_id,
+    )
+
+
+def iter_segment(store, key: str, batch_rows: int = COLD_ARCHIVE_BATCH_ROWS) -> Iterator[List[Dict[str, Any]]]:
+    """Row batches of one archived object"""
+    data = store.get(key)
+    if data is None:
+        raise FileNotFoundError(f"Segmento archivado no encontrado: {key}")
+    pf = pq.ParquetFile(io.BytesIO(data))
+    for batch in pf.iter_batches(batch_size=max(int(batch_rows), 1)):
+        yield batch.to_pylist()
+
+
+# ========== Archiving ==========
+
+
+class ColdArchiver:
+    """Moves closed months of one tenant's tables to the archive store"""
+
+    def __init__(self, engine: Engine, tenant: str, store=None):
+        if not HAS_PYARROW:
+            raise RuntimeError("pyarrow no está instalado; el archivo en frío no está disponible")
+        self.engine = engine
+        self.tenant = str(tenant or "").strip().lower()
+        if not self.tenant:
+            raise ValueError("Falta el tenant para nombrar los segmentos")
+        self.store = store or get_store()
+
+    def cutoff(self, older_than_months: int, today: Optional[date] = None) -> date:
+        """Months ending on or before this date closed long enough ago"""
+        return add_months(month_start(today or date.today()), -max(int(older_than_months), 1))
+
+    def closed_periods(
+        self, spec: ArchiveSpec, older_than_months: int, today: Optional[date] = None
+    ) -> List[Tuple[date, int]]:
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                text(
+                    f"""
+                    SELECT CAST(date_trunc('month', {spec.column}) AS date) AS m, COUNT(*)
+                    FROM {spec.table}
+                    WHERE {spec.column} < :cutoff
+                    GROUP BY 1
+                    ORDER BY 1
+                    """
+                ),
+                {"cutoff": self.cutoff(older_than_months, today)},
+            ).fetchall()
+        return [(r[0], int(r[1] or 0)) for r in rows]
+
+    def _next_part(self, conn: Connection, table: str, period: date) -> int:
+        return int(
+            conn.execute(
+                text(
+                    "SELECT COALESCE(MAX(part), 0) + 1 FROM archive_segments WHERE table_name = :t AND period = :p"
+                ),
+                {"t": table, "p": period},
+            ).scalar()
+            or 1
+        )
+
+    def _publish(self, conn: Connection, segments: Sequence[Segment]) -> List[str]:
+        """Upload, read back and record the segments; returns the uploaded keys"""
+        uploaded: List[str] = []
+        try:
+            for seg in segments:
+                if not self.store.put(seg.key, seg.data):
+                    raise RuntimeError(f"No se pudo subir {seg.key}")
+                uploaded.append(seg.key)
+                back = self.store.get(seg.key)
+                if back is None or hashlib.sha256(back).hexdigest() != seg.sha256:
+                    raise RuntimeError(f"Verificación fallida para {seg.key}")
+                conn.execute(
+                    text(
+                        """
+                        INSERT INTO archive_segments
+                            (table_name, period, part, object_key, backend, row_count, byte_size, sha256, min_id, max_id)
+                        VALUES (:t, :p, :part, :k, :b, :n, :size, :sha, :min_id, :max_id)
+                        """
+                    ),
+                    {
+                        "t": seg.table,
+                        "p": seg.period,
+                        "part": seg.part,
+                        "k": seg.key,
+                        "b": self.store.backend,
+                        "n": seg.rows,
+                        "size": len(seg.data),
+                        "sha": seg.sha256,
+                        "min_id": seg.min_id,
+                        "max_id": seg.max_id,
+                    },
+                )
+        except Exception:
+            self._discard(uploaded)
+            raise
+        return uploaded
+
+    def _discard(self, keys: Sequence[str]) -> None:
+        for key in keys:
+            try:
+                self.store.delete(key)
+            except Exception as e:
+                logger.warning(f"Could not remove archive object {key}: {e}")
+
+    def archive_period(self, spec: ArchiveSpec, period: date) -> Optional[Dict[str, Any]]:
+        """Archive one month of a table and delete it; None when the month is empty.
+
+        Runs in a REPEATABLE READ transaction: the rows deleted are exactly the
+        exported snapshot (a concurrent change aborts instead of being lost).
+        """
+        period = month_start(period)
+        lo, hi = period, add_months(period, 1)
+        with self.engine.connect() as raw:
+            conn = raw.execution_options(isolation_level="REPEATABLE READ")
+            with conn.begin():
+                part = self._next_part(conn, spec.table, period)
+                params = {"lo": lo, "hi": hi}
+                parent = _write_segment(
+                    conn,
+                    spec.table,
+                    f"SELECT * FROM {spec.table} WHERE {spec.column} >= :lo AND {spec.column} < :hi ORDER BY id",
+                    params,
+                    self.tenant,
+                    period,
+                    part,
+                )
+                if parent is None:
+                    return None
+                params["max_id"] = parent.max_id
+                segments = [parent]
+                for child, fk in spec.children:
+                    seg = _write_segment(
+                        conn,
+                        child,
+                        f"""
+                        SELECT c.* FROM {child} c
+                        JOIN {spec.table} p ON p.id = c.{fk}
+                        WHERE p.{spec.column} >= :lo AND p.{spec.column} < :hi AND p.id <= :max_id
+                        ORDER BY c.id
+                        """,
+                        params,
+                        self.tenant,
+                        period,
+                        part,
+                    )
+                    if seg is not None:
+                        segments.append(seg)
+                uploaded = self._publish(conn, segments)
+                try:
+                    deleted = conn.execute(
+                        text(
+                            f"DELETE FROM {spec.table} WHERE {spec.column} >= :lo AND {spec.column} < :hi AND id <= :max_id"
+                        ),
+                        params,
+                    ).rowcount
+                    if int(deleted or 0) != parent.rows:
+                        raise RuntimeError(
+                            f"{spec.table} {period:%Y-%m}: se exportaron {parent.rows} filas pero se borrarían {deleted}"
+                        )
+                except Exception:
+                    self._discard(uploaded)
+                    raise
+        logger.info(f"Archived {parent.rows} row(s) of {spec.table} for {period:%Y-%m} (part {part})")
+        return {
+            "table": spec.table,
+            "period": period.isoformat(),
+            "part": part,
+            "rows": parent.rows,
+            "bytes": sum(len(s.data) for s in segments),
+            "children": {s.table: s.rows for s in segments[1:]},
+        }
+
+    def archive_detached(self, spec: ArchiveSpec) -> List[Dict[str, Any]]:
+        """Archive and drop partitions that partition retention detached"""
+        out: List[Dict[str, Any]] = []
+        with self.engine.connect() as conn:
+            names = detached_partitions(conn, spec.table)
+        for name in names:
+            m = re.search(r"_p(\d{4})(\d{2})$", name)
+            if not m:
+                continue
+            period = date(int(m.group(1)), int(m.group(2)), 1)
+            with self.engine.begin() as conn:
+                part = self._next_part(conn, spec.table, period)
+                seg = _write_segment(
+                    conn,
+                    spec.table,
+                    f'SELECT * FROM "{name}" ORDER BY id',
+                    {},
+                    self.tenant,
+                    period,
+                    part,
+                    schema_table=name,
+                )
+                if seg is not None:
+                    self._publish(conn, [seg])
+                conn.execute(text(f'DROP TABLE "{name}"'))
+            logger.info(f"Archived detached partition {name} ({seg.rows if seg else 0} row(s))")
+            out.append(
+                {
+                    "table": spec.table,
+                    "period": period.isoformat(),
+                    "part": part,
+                    "rows": seg.rows if seg else 0,
+                    "bytes": len(seg.data) if seg else 0,
+                    "detached": name,
+                }
+            )
+        return out
+
+
+# ========== Reading ==========
+
+
+def archived_segments(
+    db: Session, table: str, desde: Optional[date] = None, hasta: Optional[date] = None
+) -> List[Dict[str, Any]]:
+    """Segments of `table` whose month overlaps [desde, hasta], newest first"""
+    if not schema_capabilities.has(db, "archive_segments"):
+        return []
+    rows = db.execute(
+        text(
+            """
+            SELECT period, part, object_key, backend, row_count
+            FROM archive_segments
+            WHERE table_name = :t
+              AND (CAST(:desde AS DATE) IS NULL OR period >= :desde)
+              AND (CAST(:hasta AS DATE) IS NULL OR period <= :hasta)
+            ORDER BY period DESC, part DESC
+            """
+        ),
+        {
+            "t": table,
+            "desde": month_start(desde) if desde else None,
+            "hasta": hasta,
+        },
+    ).mappings().all()
+    return [dict(r) for r in rows]
+
+
+def iter_archived_batches(
+    db: Session,
+    table: str,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    where: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    order_by: Optional[str] = None,
+    descending: bool = True,
+) -> Iterator[List[Dict[str, Any]]]:
+    """Archived rows in batches, one segment in memory at a time.
+
+    Segments come newest month first; `order_by` sorts rows within a
+    segment, which keeps the overall order because months do not overlap.
+    """
+    segments = archived_segments(db, table, desde, hasta)
+    if not segments:
+        return
+    if not HAS_PYARROW:
+        # Skipping them would hand out an export that silently lacks months
+        raise RuntimeError(
+            f"pyarrow no está instalado; no se pueden leer {len(segments)} segmento(s) archivado(s) de {table}"
+        )
+    stores: Dict[str, Any] = {}
+    for seg in segments:
+        backend = str(seg.get("backend") or COLD_ARCHIVE_BACKEND)
+        store = stores.get(backend)
+        if store is None:
+            store = stores[backend] = get_store(backend)
+        rows: List[Dict[str, Any]] = []
+        for batch in iter_segment(store, str(seg["object_key"])):
+            rows.extend(r for r in batch if where is None or where(r))
+        if order_by:
+            low = datetime.min if descending else datetime.max
+            rows.sort(
+                key=lambda r: (_sort_value(r.get(order_by), low), r.get("id") or 0),
+                reverse=descending,
+            )
+        for i in range(0, len(rows), COLD_ARCHIVE_BATCH_ROWS):
+            yield rows[i : i + COLD_ARCHIVE_BATCH_ROWS]
+
+
+def _sort_value(value: Any, missing: datetime) -> datetime:
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    return missing
+
+
+__all__ = [
+    "ARCHIVE_TABLES",
+    "ArchiveSpec",
+    "B2ArchiveStore",
+    "COLD_ARCHIVE_MIN_AGE_MONTHS",
+    "ColdArchiver",
+    "HAS_PYARROW",
+    "LocalArchiveStore",
+    "archived_segments",
+    "get_store",
+    "iter_archived_batches",
+    "iter_segment",
+    "segment_key",
+]
@@ -0,0 +1,56 @@
+"""
+Streamed CSV responses
+
+The exports write rows as they are read (server-side cursors, archived
+Parquet segments), so a download never holds the whole table in memory. A
+failure after the headers are sent is re-raised: the server aborts the
+response instead of finishing a body that silently lacks rows.
+"""
+
+import csv
+import io
+import logging
+from typing import Any, Dict, Iterable, Iterator, Sequence
+
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+CSV_STREAM_CHUNK_ROWS = 500
+
+
+def stream_csv(
+    rows: Iterable[Dict[str, Any]],
+    columns: Sequence[str],
+    filename: str,
+    chunk_rows: int = CSV_STREAM_CHUNK_ROWS,
+) -> StreamingResponse:
+    """CSV attachment written chunk_rows rows at a time."""
+    chunk_rows = max(int(chunk_rows or CSV_STREAM_CHUNK_ROWS), 1)
+
+    def _chunks() -> Iterator[str]:
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=list(columns))
+        writer.writeheader()
+        n = 0
+        try:
+            for row in rows:
+                writer.writerow(row)
+                n += 1
+                if n % chunk_rows == 0:
+                    yield output.getvalue()
+                    output.seek(0)
+                    output.truncate(0)
+        except Exception as e:
+            logger.error(f"Export {filename} failed after {n} rows: {e}")
+            raise
+        yield output.getvalue()
+
+    return StreamingResponse(
+        _chunks(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+__all__ = ["CSV_STREAM_CHUNK_ROWS", "stream_csv"]
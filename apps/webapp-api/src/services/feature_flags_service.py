@@ -4,6 +4,7 @@ from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from src.database.orm_models import FeatureFlags, FeatureFlagsOverride
+from src.services import bootstrap_cache
 
 
 DEFAULT_FEATURE_FLAGS: Dict[str, Any] = {
@@ -147,6 +148,7 @@ class FeatureFlagsService:
                 else:
                     row.flags = payload
             self.db.commit()
+            bootstrap_cache.invalidate()
         except Exception:
             try:
                 self.db.rollback()
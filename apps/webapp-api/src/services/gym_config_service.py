@@ -14,7 +14,9 @@ from sqlalchemy import select, text
 from sqlalchemy.orm import Session
 from sqlalchemy.dialects.postgresql import insert
 
+from src.services import bootstrap_cache
 from src.services.base import BaseService
+from src.services.branding_assets import invalidate_branding
 from src.database.orm_models import Configuracion
 
 logger = logging.getLogger(__name__)
@@ -62,6 +64,10 @@ class GymConfigService(BaseService):
                 self.db.execute(stmt)
 
             self.db.commit()
+            bootstrap_cache.invalidate()
+            logo_keys = [k for k in ("logo_url", "gym_logo_url", "main_logo_url") if k in updates]
+            if logo_keys:
+                invalidate_branding(updates.get(logo_keys[0]))
             return True
         except Exception as e:
             logger.error(f"Error updating gym config: {e}")
@@ -5,7 +5,7 @@ Provides class enrollment, schedule, and waitlist operations using SQLAlchemy.
 Replaces raw SQL usage in inscripciones.py with proper ORM queries.
 """
 
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime, timezone, timedelta
 import os
 
@@ -18,8 +18,10 @@ import logging
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
+from src.database import schema_capabilities
+from src.services import class_agenda_cache
 from src.services.base import BaseService
-from src.database.clase_profesor_schema import ensure_clase_profesor_schema
+from src.database.clase_profesor_schema import has_clase_profesor_schema
 
 logger = logging.getLogger(__name__)
 
@@ -31,14 +33,11 @@ class InscripcionesService(BaseService):
         super().__init__(db)
 
     def _table_exists(self, table_name: str) -> bool:
+        """Catalog lookup from schema_capabilities (no round trip)."""
         t = str(table_name or "").strip()
         if not t:
             return False
-        try:
-            v = self.db.execute(text("SELECT to_regclass(:t)"), {"t": t}).scalar()
-            return bool(v)
-        except Exception:
-            return False
+        return schema_capabilities.has_table(self.db, t)
 
     def _get_app_timezone(self):
         tz_name = (
@@ -163,84 +162,22 @@ class InscripcionesService(BaseService):
 
 
     def obtener_agenda(self, profesor_id: Optional[int] = None, sucursal_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        rows, _ = self.obtener_agenda_con_etag(profesor_id=profesor_id, sucursal_id=sucursal_id)
+        return rows
+
+    def obtener_agenda_con_etag(
+        self, profesor_id: Optional[int] = None, sucursal_id: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Weekly agenda from class_agenda_cache, with its ETag."""
         if not self._table_exists("clases_horarios"):
-            return []
+            return [], None
         try:
-            params: Dict[str, Any] = {}
-            clauses: List[str] = []
-            if profesor_id is not None:
-                params["pid"] = int(profesor_id)
-                clauses.append(
-                    """
-                    EXISTS (
-                        SELECT 1
-                        FROM profesor_clase_asignaciones a2
-                        WHERE a2.clase_horario_id = ch.id
-                          AND a2.profesor_id = :pid
-                          AND a2.activa = TRUE
-                    )
-                    """
-                )
-            try:
-                sid = int(sucursal_id) if sucursal_id is not None else None
-            except Exception:
-                sid = None
-            if sid is not None and sid > 0:
-                params["sid"] = int(sid)
-                clauses.append("(c.sucursal_id IS NULL OR c.sucursal_id = :sid)")
-            where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
-            result = self.db.execute(
-                text(f"""
-                SELECT
-                    ch.id,
-                    ch.clase_id,
-                    COALESCE(c.nombre,'') as clase_nombre,
-                    COALESCE(c.descripcion,'') as clase_descripcion,
-                    ch.dia_semana,
-                    TO_CHAR(ch.hora_inicio, 'HH24:MI') as hora_inicio,
-                    TO_CHAR(ch.hora_fin, 'HH24:MI') as hora_fin,
-                    MIN(a.profesor_id) as profesor_id,
-                    COALESCE(ch.cupo_maximo, 20) as cupo,
-                    COALESCE(u.nombre,'') as profesor_nombre,
-                    COUNT(DISTINCT cu.id) as inscriptos_count
-                FROM clases_horarios ch
-                JOIN clases c ON c.id = ch.clase_id
-                LEFT JOIN profesor_clase_asignaciones a ON a.clase_horario_id = ch.id AND a.activa = TRUE
-                LEFT JOIN profesores p ON a.profesor_id = p.id
-                LEFT JOIN usuarios u ON u.id = p.usuario_id
-                LEFT JOIN clase_usuarios cu ON cu.clase_horario_id = ch.id
-                {where}
-                GROUP BY
-                    ch.id, ch.clase_id, c.nombre, c.descripcion, ch.dia_semana, ch.hora_inicio, ch.hora_fin,
-                    ch.cupo_maximo, u.nombre
-                ORDER BY 
-                    CASE ch.dia_semana 
-                        WHEN 'lunes' THEN 1 WHEN 'martes' THEN 2 WHEN 'miércoles' THEN 3 
-                        WHEN 'miercoles' THEN 3 WHEN 'jueves' THEN 4 WHEN 'viernes' THEN 5 
-                        WHEN 'sábado' THEN 6 WHEN 'sabado' THEN 6 WHEN 'domingo' THEN 7 
-                    END, ch.hora_inicio
-            """),
-                params,
+            return class_agenda_cache.get_agenda(
+                self.db, sucursal_id=sucursal_id, profesor_id=profesor_id
             )
-            return [
-                {
-                    "horario_id": r[0],
-                    "clase_id": r[1],
-                    "clase_nombre": r[2],
-                    "clase_descripcion": r[3] or None,
-                    "dia": r[4],
-                    "hora_inicio": r[5],
-                    "hora_fin": r[6],
-                    "profesor_id": r[7],
-                    "cupo": r[8],
-                    "profesor_nombre": r[9] or None,
-                    "inscriptos_count": int(r[10] or 0),
-                }
-                for r in result.fetchall()
-            ]
         except Exception as e:
             logger.error(f"Error getting agenda: {e}")
-            return []
+            return [], None
 
     # ========== Clase Tipos ==========
 
@@ -319,8 +256,9 @@ class InscripcionesService(BaseService):
             sid = None
         if sid is not None and not self._clase_accessible(int(clase_id), sid):
             return []
+        if not has_clase_profesor_schema(self.db):
+            return []
         try:
-            ensure_clase_profesor_schema(self.db)
             rows = self.db.execute(
                 text(
                     """
@@ -453,6 +391,7 @@ class InscripcionesService(BaseService):
                 except Exception:
                     pass
             self.db.commit()
+            class_agenda_cache.invalidate_static()
             return (
                 {
                     "id": row[0],
@@ -474,7 +413,10 @@ class InscripcionesService(BaseService):
     def actualizar_horario(
         self, horario_id: int, clase_id: int, updates: Dict[str, Any], sucursal_id: Optional[int] = None
     ) -> Optional[Dict[str, Any]]:
-        """Update a class schedule."""
+        """Update a class schedule; raising the cupo promotes from the waitlist.
+
+        Promoted members come back in "promoted" for the caller to notify.
+        """
         if not self._table_exists("clases_horarios"):
             return None
         try:
@@ -503,6 +445,13 @@ class InscripcionesService(BaseService):
                 # No updates requested but horario exists
                 return {"ok": True}
 
+            cupo_anterior = None
+            if "cupo" in updates:
+                cupo_anterior = self.db.execute(
+                    text("SELECT COALESCE(cupo_maximo, 20) FROM clases_horarios WHERE id = :id"),
+                    {"id": horario_id},
+                ).scalar()
+
             result = self.db.execute(
                 text(f"""
                     UPDATE clases_horarios SET {", ".join(sets)}
@@ -537,8 +486,14 @@ class InscripcionesService(BaseService):
                 except Exception:
                     pass
             self.db.commit()
+            class_agenda_cache.invalidate_static()
             if not row:
                 return None
+            promoted: List[Dict[str, Any]] = []
+            if cupo_anterior is not None and int(row[5] or 20) > int(cupo_anterior):
+                from src.services.class_booking_service import ClassBookingService
+
+                promoted = ClassBookingService(self.db).promover_lista_espera(int(row[0]))
             return {
                 "id": row[0],
                 "clase_id": row[1],
@@ -547,6 +502,7 @@ class InscripcionesService(BaseService):
                 "hora_fin": row[4],
                 "profesor_id": int(updates.get("profesor_id")) if "profesor_id" in updates and updates.get("profesor_id") is not None else None,
                 "cupo": row[5],
+                "promoted": promoted,
             }
         except Exception as e:
             logger.error(f"Error updating schedule: {e}")
@@ -585,6 +541,8 @@ class InscripcionesService(BaseService):
                 {"id": int(horario_id), "clase_id": int(clase_id)},
             )
             self.db.commit()
+            class_agenda_cache.invalidate_static()
+            class_agenda_cache.invalidate_counts()
             try:
                 return (getattr(res, "rowcount", 0) or 0) > 0
             except Exception:
@@ -631,7 +589,6 @@ class InscripcionesService(BaseService):
         if not self._table_exists("clases_horarios"):
             return {"error": "Horario no encontrado"}
         try:
-            fecha_inscripcion = self._now_utc_naive()
             ctx = (
                 self.db.execute(
                     text(
@@ -676,45 +633,9 @@ class InscripcionesService(BaseService):
                 }
             if ok_opt is False:
                 return {"error": reason2 or "Clase no habilitada", "forbidden": True}
-            # Check capacity
-            cap = self.db.execute(
-                text("""SELECT COALESCE(cupo_maximo, 20) as cupo,
-                               (SELECT COUNT(*) FROM clase_usuarios WHERE clase_horario_id = :id) as inscriptos
-                        FROM clases_horarios WHERE id = :id"""),
-                {"id": horario_id},
-            ).fetchone()
-
-            if not cap:
-                return {"error": "Horario no encontrado"}
-
-            if cap:
-                cupo = cap[0] or 20
-                inscriptos = cap[1] or 0
-                if inscriptos >= cupo:
-                    return {"error": "Cupo lleno", "full": True}
+            from src.services.class_booking_service import ClassBookingService
 
-            result = self.db.execute(
-                text("""INSERT INTO clase_usuarios (clase_horario_id, usuario_id, fecha_inscripcion)
-                        VALUES (:horario_id, :usuario_id, :fecha_inscripcion)
-                        ON CONFLICT (clase_horario_id, usuario_id) DO NOTHING
-                        RETURNING id, clase_horario_id, usuario_id, fecha_inscripcion"""),
-                {
-                    "horario_id": horario_id,
-                    "usuario_id": usuario_id,
-                    "fecha_inscripcion": fecha_inscripcion,
-                },
-            )
-            row = result.fetchone()
-            self.db.commit()
-
-            if row:
-                return {
-                    "id": row[0],
-                    "horario_id": row[1],
-                    "usuario_id": row[2],
-                    "fecha_inscripcion": row[3].isoformat() if row[3] else None,
-                }
-            return {"ok": True, "message": "Ya está inscripto"}
+            return ClassBookingService(self.db).reservar(int(horario_id), int(usuario_id))
         except Exception as e:
             logger.error(f"Error creating enrollment: {e}")
             self.db.rollback()
@@ -722,21 +643,15 @@ class InscripcionesService(BaseService):
 
     def eliminar_inscripcion(self, horario_id: int, usuario_id: int) -> bool:
         """Remove enrollment."""
+        return bool(self.cancelar_inscripcion(horario_id, usuario_id).get("ok"))
+
+    def cancelar_inscripcion(self, horario_id: int, usuario_id: int) -> Dict[str, Any]:
+        """Remove enrollment and promote from the waitlist in the same transaction."""
         if not self._table_exists("clase_usuarios"):
-            return False
-        try:
-            self.db.execute(
-                text(
-                    "DELETE FROM clase_usuarios WHERE clase_horario_id = :hid AND usuario_id = :uid"
-                ),
-                {"hid": horario_id, "uid": usuario_id},
-            )
-            self.db.commit()
-            return True
-        except Exception as e:
-            logger.error(f"Error deleting enrollment: {e}")
-            self.db.rollback()
-            return False
+            return {"ok": False, "removed": 0, "promoted": []}
+        from src.services.class_booking_service import ClassBookingService
+
+        return ClassBookingService(self.db).cancelar(int(horario_id), int(usuario_id))
 
     # ========== Lista de Espera ==========
 
@@ -0,0 +1,730 @@
+"""
+Owner Dashboard Service - list panels, headline numbers and CSV export
+
+List panels page with keyset cursors on the same order the indexes of
+migration 0024 provide ((sucursal_id, fecha DESC, id DESC) and friends), so
+a page costs an index range scan however deep the owner scrolls. The first
+page's total comes from COUNT(*) OVER () in the same statement, computed over
+at most OWNER_DASHBOARD_COUNT_CAP rows instead of a separate unbounded
+COUNT(*); cursor pages skip the count and just read limit + 1 rows.
+The legacy ?page= parameter still works (OFFSET) for old clients.
+
+`resumen` returns every panel's headline numbers in one round trip and
+`iter_export` streams export rows through a server-side cursor, followed by
+the months cold_archive moved out of pagos / asistencias.
+"""
+
+import base64
+import json
+import logging
+import os
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.database import schema_capabilities
+from src.database.clase_profesor_schema import has_clase_profesor_schema
+from src.services import cold_archive
+from src.services.base import BaseService
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+OWNER_DASHBOARD_COUNT_CAP = max(_env_int("OWNER_DASHBOARD_COUNT_CAP", 10000), 1)
+OWNER_DASHBOARD_EXPORT_CHUNK = max(_env_int("OWNER_DASHBOARD_EXPORT_CHUNK", 500), 50)
+
+# Member visible in a sucursal: explicit access override first, then the
+# tipo de cuota's branches. Expects aliases u (usuarios) and tc (tipos_cuota).
+_USUARIO_EN_SUCURSAL = """
+    COALESCE((
+        SELECT uas.allow
+        FROM usuario_accesos_sucursales uas
+        WHERE uas.usuario_id = u.id
+          AND uas.sucursal_id = :sid
+          AND (uas.starts_at IS NULL OR uas.starts_at <= NOW())
+          AND (uas.ends_at IS NULL OR uas.ends_at >= NOW())
+        ORDER BY uas.id DESC
+        LIMIT 1
+    ), (
+        COALESCE(tc.all_sucursales, FALSE)
+        OR EXISTS (
+            SELECT 1
+            FROM tipo_cuota_sucursales tcs
+            WHERE tcs.tipo_cuota_id = tc.id
+              AND tcs.sucursal_id = :sid
+        )
+    )) = TRUE
+"""
+
+
+def profesor_sucursales_sql(db: Session) -> str:
+    """(profesor_id, sid) pairs: the profesor's user branches plus the branches
+    of the classes assigned to them. Used as a subquery by the /profesores
+    panel and the resumen count so both agree."""
+    clase_asignaciones = (
+        """
+        UNION
+        SELECT a.profesor_id AS profesor_id, c.sucursal_id AS sid
+        FROM clase_profesor_asignaciones a
+        JOIN clases c ON c.id = a.clase_id
+        WHERE a.activa = TRUE
+        """
+        if has_clase_profesor_schema(db)
+        else ""
+    )
+    return f"""
+        SELECT p.id AS profesor_id, us.sucursal_id AS sid
+        FROM profesores p
+        LEFT JOIN usuario_sucursales us ON us.usuario_id = p.usuario_id
+        UNION
+        SELECT a.profesor_id AS profesor_id, c.sucursal_id AS sid
+        FROM profesor_clase_asignaciones a
+        JOIN clases_horarios ch ON ch.id = a.clase_horario_id
+        JOIN clases c ON c.id = ch.clase_id
+        WHERE a.activa = TRUE
+        {clase_asignaciones}
+    """
+
+
+EXPORT_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "usuarios": (
+        "id",
+        "nombre",
+        "dni",
+        "telefono",
+        "activo",
+        "rol",
+        "tipo_cuota",
+        "created_at",
+        "sucursal_registro_id",
+        "sucursal_registro_nombre",
+    ),
+    "pagos": (
+        "id",
+        "usuario_id",
+        "usuario_nombre",
+        "monto",
+        "fecha_pago",
+        "metodo_pago",
+        "metodo_pago_id",
+        "estado",
+        "sucursal_id",
+        "sucursal_nombre",
+    ),
+    "asistencias": (
+        "id",
+        "usuario_id",
+        "usuario_nombre",
+        "fecha",
+        "hora",
+        "tipo",
+        "sucursal_id",
+        "sucursal_nombre",
+    ),
+}
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps(
+        [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[List[Any]]:
+    """Cursor values, or None for a missing/garbled cursor (first page)."""
+    raw = str(cursor or "").strip()
+    if not raw:
+        return None
+    try:
+        padded = raw + "=" * (-len(raw) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        if isinstance(values, list) and len(values) == size:
+            return values
+    except Exception:
+        pass
+    return None
+
+
+def _date_range(desde: Optional[date], hasta: Optional[date]) -> Dict[str, Any]:
+    """Half-open [desde, hasta + 1 day) bounds so timestamp columns stay indexable."""
+    return {
+        "desde": desde,
+        "hasta_next": (hasta + timedelta(days=1)) if hasta is not None else None,
+    }
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    return None
+
+
+class OwnerDashboardService(BaseService):
+    """Keyset-paginated panels, headline numbers and exports for the owner dashboard."""
+
+    def __init__(self, db: Session):
+        super().__init__(db)
+
+    # ========== Paging ==========
+
+    def _page(
+        self,
+        select_sql: str,
+        order_inner: str,
+        order_outer: str,
+        params: Dict[str, Any],
+        limit: int,
+        offset: int,
+        key: Tuple[str, ...],
+        with_total: bool = True,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str], Optional[int], Optional[bool]]:
+        """Run one page; returns (rows, next_cursor, total, total_capped).
+
+        Without with_total (cursor pages) the count window and its cap are
+        skipped and total / total_capped come back as None.
+        """
+        limit_i = max(1, min(int(limit or 20), 200))
+        offset_i = max(0, int(offset or 0))
+        if not with_total:
+            rows = (
+                self.db.execute(
+                    text(
+                        f"""
+                        {select_sql}
+                        ORDER BY {order_inner}
+                        LIMIT :_take
+                        """
+                    ),
+                    {**params, "_take": limit_i + 1},
+                )
+                .mappings()
+                .all()
+            )
+            items = [dict(r) for r in rows[:limit_i]]
+            next_cursor = None
+            if len(rows) > limit_i and items:
+                next_cursor = encode_cursor([items[-1][k] for k in key])
+            return items, next_cursor, None, None
+        cap = max(OWNER_DASHBOARD_COUNT_CAP, offset_i + limit_i + 1)
+        rows = (
+            self.db.execute(
+                text(
+                    f"""
+                    SELECT page.*, COUNT(*) OVER () AS _total
+                    FROM (
+                        {select_sql}
+                        ORDER BY {order_inner}
+                        LIMIT :_cap
+                    ) page
+                    ORDER BY {order_outer}
+                    LIMIT :_take OFFSET :_offset
+                    """
+                ),
+                {**params, "_cap": cap, "_take": limit_i + 1, "_offset": offset_i},
+            )
+            .mappings()
+            .all()
+        )
+        total = int(rows[0]["_total"]) if rows else 0
+        items = [dict(r) for r in rows[:limit_i]]
+        for it in items:
+            it.pop("_total", None)
+        next_cursor = None
+        if len(rows) > limit_i and items:
+            next_cursor = encode_cursor([items[-1][k] for k in key])
+        return items, next_cursor, total, total >= cap
+
+    # ========== Panels ==========
+
+    def listar_usuarios(
+        self,
+        sucursal_id: Optional[int] = None,
+        search: str = "",
+        activo: Optional[bool] = None,
+        limit: int = 20,
+        offset: int = 0,
+        cursor: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        params: Dict[str, Any] = {}
+        where: List[str] = []
+        term = str(search or "").strip()
+        if term:
+            where.append("(u.nombre ILIKE :q OR u.dni ILIKE :q OR u.telefono ILIKE :q)")
+            params["q"] = f"%{term}%"
+        if activo is not None:
+            where.append("u.activo = :activo")
+            params["activo"] = bool(activo)
+        if sucursal_id is not None:
+            params["sid"] = int(sucursal_id)
+            where.append(_USUARIO_EN_SUCURSAL)
+        after = decode_cursor(cursor, 2)
+        if after is not None:
+            where.append("(u.nombre, u.id) > (:k_nombre, :k_id)")
+            params.update({"k_nombre": str(after[0]), "k_id": int(after[1])})
+            offset = 0
+        where_sql = ("WHERE " + " AND ".join(w.strip() for w in where)) if where else ""
+        rows, next_cursor, total, capped = self._page(
+            f"""
+            SELECT
+              u.id,
+              u.nombre,
+              u.dni,
+              u.telefono,
+              u.activo,
+              u.rol,
+              u.tipo_cuota,
+              u.fecha_registro,
+              u.fecha_proximo_vencimiento,
+              u.cuotas_vencidas,
+              u.ultimo_pago,
+              u.notas,
+              u.sucursal_registro_id,
+              s.nombre AS sucursal_registro_nombre
+            FROM usuarios u
+            LEFT JOIN tipos_cuota tc ON LOWER(tc.nombre) = LOWER(u.tipo_cuota)
+            LEFT JOIN sucursales s ON s.id = u.sucursal_registro_id
+            {where_sql}
+            """,
+            "u.nombre ASC, u.id ASC",
+            "nombre ASC, id ASC",
+            params,
+            limit,
+            offset,
+            ("nombre", "id"),
+            with_total=after is None,
+        )
+        usuarios = [
+            {
+                "id": int(r.get("id") or 0),
+                "nombre": str(r.get("nombre") or ""),
+                "dni": r.get("dni"),
+                "telefono": r.get("telefono"),
+                "email": "",
+                "activo": bool(r.get("activo")) if r.get("activo") is not None else False,
+                "rol": str(r.get("rol") or "").strip().lower(),
+                "tipo_cuota_id": None,
+                "tipo_cuota_nombre": r.get("tipo_cuota"),
+                "fecha_registro": r.get("fecha_registro"),
+                "fecha_proximo_vencimiento": r.get("fecha_proximo_vencimiento"),
+                "cuotas_vencidas": r.get("cuotas_vencidas"),
+                "ultimo_pago": r.get("ultimo_pago"),
+                "notas": r.get("notas"),
+                "sucursal_registro_id": r.get("sucursal_registro_id"),
+                "sucursal_registro_nombre": r.get("sucursal_registro_nombre"),
+            }
+            for r in rows
+            if r.get("id") is not None
+        ]
+        return {
+            "usuarios": usuarios,
+            "total": total,
+            "total_capped": capped,
+            "next_cursor": next_cursor,
+        }
+
+    def listar_pagos(
+        self,
+        sucursal_id: Optional[int] = None,
+        desde: Optional[date] = None,
+        hasta: Optional[date] = None,
+        metodo_id: Optional[int] = None,
+        limit: int = 20,
+        offset: int = 0,
+        cursor: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        params: Dict[str, Any] = _date_range(desde, hasta)
+        where: List[str] = []
+        if desde is not None:
+            where.append("p.fecha_pago >= :desde")
+        if hasta is not None:
+            where.append("p.fecha_pago < :hasta_next")
+        if metodo_id is not None:
+            where.append("p.metodo_pago_id = :mid")
+            params["mid"] = int(metodo_id)
+        if sucursal_id is not None:
+            where.append("p.sucursal_id = :sid")
+            params["sid"] = int(sucursal_id)
+        after = decode_cursor(cursor, 2)
+        if after is not None:
+            where.append("(p.fecha_pago, p.id) < (CAST(:k_fecha AS TIMESTAMP), :k_id)")
+            params.update({"k_fecha": str(after[0]), "k_id": int(after[1])})
+            offset = 0
+        where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+        rows, next_cursor, total, capped = self._page(
+            f"""
+            SELECT
+              p.id,
+              p.usuario_id,
+              u.nombre AS usuario_nombre,
+              p.monto,
+              p.fecha_pago,
+              p.mes,
+              p."año" AS anio,
+              p.metodo_pago_id,
+              p.metodo_pago,
+              p.estado,
+              p.sucursal_id,
+              s.nombre AS sucursal_nombre
+            FROM pagos p
+            JOIN usuarios u ON u.id = p.usuario_id
+            LEFT JOIN sucursales s ON s.id = p.sucursal_id
+            {where_sql}
+            """,
+            "p.fecha_pago DESC, p.id DESC",
+            "fecha_pago DESC, id DESC",
+            params,
+            limit,
+            offset,
+            ("fecha_pago", "id"),
+            with_total=after is None,
+        )
+        pagos = [
+            {
+                "id": int(r.get("id") or 0),
+                "usuario_id": int(r.get("usuario_id") or 0),
+                "usuario_nombre": r.get("usuario_nombre"),
+                "monto": float(r.get("monto") or 0),
+                "fecha_pago": r.get("fecha_pago"),
+                "mes": r.get("mes"),
+                "anio": r.get("anio"),
+                "metodo_pago_id": r.get("metodo_pago_id"),
+                "metodo_pago": r.get("metodo_pago"),
+                "estado": r.get("estado"),
+                "sucursal_id": r.get("sucursal_id"),
+                "sucursal_nombre": r.get("sucursal_nombre"),
+            }
+            for r in rows
+        ]
+        return {
+            "pagos": pagos,
+            "total": total,
+            "total_capped": capped,
+            "next_cursor": next_cursor,
+        }
+
+    def listar_asistencias(
+        self,
+        sucursal_id: Optional[int] = None,
+        desde: Optional[date] = None,
+        hasta: Optional[date] = None,
+        limit: int = 20,
+        offset: int = 0,
+        cursor: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        params: Dict[str, Any] = {"desde": desde, "hasta": hasta}
+        where: List[str] = []
+        if desde is not None:
+            where.append("a.fecha >= :desde")
+        if hasta is not None:
+            where.append("a.fecha <= :hasta")
+        if sucursal_id is not None:
+            where.append("a.sucursal_id = :sid")
+            params["sid"] = int(sucursal_id)
+        after = decode_cursor(cursor, 2)
+        if after is not None:
+            where.append("(a.fecha, a.id) < (CAST(:k_fecha AS DATE), :k_id)")
+            params.update({"k_fecha": str(after[0]), "k_id": int(after[1])})
+            offset = 0
+        where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+        rows, next_cursor, total, capped = self._page(
+            f"""
+            SELECT
+              a.id,
+              a.usuario_id,
+              u.nombre AS usuario_nombre,
+              a.fecha,
+              a.hora_registro AS hora,
+              a.tipo,
+              a.sucursal_id,
+              s.nombre AS sucursal_nombre
+            FROM asistencias a
+            JOIN usuarios u ON u.id = a.usuario_id
+            LEFT JOIN sucursales s ON s.id = a.sucursal_id
+            {where_sql}
+            """,
+            "a.fecha DESC, a.id DESC",
+            "fecha DESC, id DESC",
+            params,
+            limit,
+            offset,
+            ("fecha", "id"),
+            with_total=after is None,
+        )
+        items = [
+            {
+                "id": int(r.get("id") or 0),
+                "usuario_id": int(r.get("usuario_id") or 0),
+                "usuario_nombre": r.get("usuario_nombre"),
+                "fecha": r.get("fecha"),
+                "hora": r.get("hora"),
+                "tipo": r.get("tipo"),
+                "sucursal_id": r.get("sucursal_id"),
+                "sucursal_nombre": r.get("sucursal_nombre"),
+            }
+            for r in rows
+        ]
+        return {
+            "asistencias": items,
+            "total": total,
+            "total_capped": capped,
+            "next_cursor": next_cursor,
+        }
+
+    # ========== Headline numbers ==========
+
+    def resumen(self, sucursal_id: Optional[int] = None) -> Dict[str, Any]:
+        """Headline numbers of every panel in a single statement."""
+        params: Dict[str, Any] = {}
+        suc_usuarios = ""
+        suc_pagos = ""
+        suc_asistencias = ""
+        suc_persona = ""
+        suc_profesor = ""
+        if sucursal_id is not None:
+            params["sid"] = int(sucursal_id)
+            suc_usuarios = f"WHERE {_USUARIO_EN_SUCURSAL}"
+            suc_pagos = "AND p.sucursal_id = :sid"
+            suc_asistencias = "AND a.sucursal_id = :sid"
+            suc_persona = """
+                AND EXISTS (
+                    SELECT 1 FROM usuario_sucursales us
+                    WHERE us.usuario_id = x.usuario_id AND us.sucursal_id = :sid
+                )
+            """
+            suc_profesor = f"""
+                AND x.id IN (
+                    SELECT ps.profesor_id FROM ({profesor_sucursales_sql(self.db)}) ps
+                    WHERE ps.sid = :sid
+                )
+            """
+        staff_cte = (
+            f"""
+            st AS (
+                SELECT COUNT(*) AS staff_activos
+                FROM staff_profiles x
+                WHERE x.estado = 'activo' {suc_persona}
+            )
+            """
+            if schema_capabilities.has(self.db, "staff")
+            else "st AS (SELECT 0 AS staff_activos)"
+        )
+        row = (
+            self.db.execute(
+                text(
+                    f"""
+                    WITH us AS (
+                        SELECT
+                          COUNT(*) AS usuarios_total,
+                          COUNT(*) FILTER (WHERE u.activo) AS usuarios_activos,
+                          COUNT(*) FILTER (
+                              WHERE u.activo AND u.fecha_proximo_vencimiento < CURRENT_DATE
+                          ) AS usuarios_vencidos
+                        FROM usuarios u
+                        LEFT JOIN tipos_cuota tc ON LOWER(tc.nombre) = LOWER(u.tipo_cuota)
+                        {suc_usuarios}
+                    ),
+                    pg AS (
+                        SELECT COUNT(*) AS pagos_mes, COALESCE(SUM(p.monto), 0) AS ingresos_mes
+                        FROM pagos p
+                        WHERE p.fecha_pago >= DATE_TRUNC('month', CURRENT_DATE) {suc_pagos}
+                    ),
+                    asi AS (
+                        SELECT
+                          COUNT(*) FILTER (WHERE a.fecha = CURRENT_DATE) AS asistencias_hoy,
+                          COUNT(*) AS asistencias_7d
+                        FROM asistencias a
+                        WHERE a.fecha >= CURRENT_DATE - 6 {suc_asistencias}
+                    ),
+                    pr AS (
+                        SELECT COUNT(*) AS profesores_activos
+                        FROM profesores x
+                        WHERE COALESCE(x.estado, 'activo') = 'activo' {suc_profesor}
+                    ),
+                    {staff_cte}
+                    SELECT * FROM us, pg, asi, pr, st
+                    """
+                ),
+                params,
+            )
+            .mappings()
+            .first()
+        )
+        if not row:
+            return {}
+        return {
+            "usuarios": {
+                "total": int(row["usuarios_total"] or 0),
+                "activos": int(row["usuarios_activos"] or 0),
+                "vencidos": int(row["usuarios_vencidos"] or 0),
+            },
+            "pagos": {
+                "mes_cantidad": int(row["pagos_mes"] or 0),
+                "mes_total": float(row["ingresos_mes"] or 0),
+            },
+            "asistencias": {
+                "hoy": int(row["asistencias_hoy"] or 0),
+                "ultimos_7_dias": int(row["asistencias_7d"] or 0),
+            },
+            "profesores": {"activos": int(row["profesores_activos"] or 0)},
+            "staff": {"activos": int(row["staff_activos"] or 0)},
+        }
+
+    # ========== Export ==========
+
+    def iter_export(
+        self,
+        tipo: str,
+        sucursal_id: Optional[int] = None,
+        desde: Optional[date] = None,
+        hasta: Optional[date] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Export rows through a server-side cursor, OWNER_DASHBOARD_EXPORT_CHUNK at a time."""
+        params: Dict[str, Any] = {"sid": int(sucursal_id) if sucursal_id is not None else None}
+        if tipo == "usuarios":
+            suc = f"WHERE {_USUARIO_EN_SUCURSAL}" if sucursal_id is not None else ""
+            sql = f"""
+                SELECT
+                  u.id,
+                  u.nombre,
+                  u.dni,
+                  u.telefono,
+                  u.activo,
+                  u.rol,
+                  u.tipo_cuota,
+                  u.fecha_registro AS created_at,
+                  u.sucursal_registro_id,
+                  s.nombre AS sucursal_registro_nombre
+                FROM usuarios u
+                LEFT JOIN tipos_cuota tc ON LOWER(tc.nombre) = LOWER(u.tipo_cuota)
+                LEFT JOIN sucursales s ON s.id = u.sucursal_registro_id
+                {suc}
+                ORDER BY u.nombre ASC, u.id ASC
+            """
+        elif tipo == "pagos":
+            params.update(_date_range(desde, hasta))
+            sql = """
+                SELECT
+                  p.id,
+                  p.usuario_id,
+                  u.nombre AS usuario_nombre,
+                  p.monto,
+                  p.fecha_pago,
+                  p.metodo_pago,
+                  p.metodo_pago_id,
+                  p.estado,
+                  p.sucursal_id,
+                  s.nombre AS sucursal_nombre
+                FROM pagos p
+                JOIN usuarios u ON u.id = p.usuario_id
+                LEFT JOIN sucursales s ON s.id = p.sucursal_id
+                WHERE (CAST(:sid AS INTEGER) IS NULL OR p.sucursal_id = :sid)
+                  AND (CAST(:desde AS DATE) IS NULL OR p.fecha_pago >= :desde)
+                  AND (CAST(:hasta_next AS DATE) IS NULL OR p.fecha_pago < :hasta_next)
+                ORDER BY p.fecha_pago DESC, p.id DESC
+            """
+        elif tipo == "asistencias":
+            params.update({"desde": desde, "hasta": hasta})
+            sql = """
+                SELECT
+                  a.id,
+                  a.usuario_id,
+                  u.nombre AS usuario_nombre,
+                  a.fecha,
+                  a.hora_registro AS hora,
+                  a.tipo,
+                  a.sucursal_id,
+                  s.nombre AS sucursal_nombre
+                FROM asistencias a
+                JOIN usuarios u ON u.id = a.usuario_id
+                LEFT JOIN sucursales s ON s.id = a.sucursal_id
+                WHERE (CAST(:sid AS INTEGER) IS NULL OR a.sucursal_id = :sid)
+                  AND (CAST(:desde AS DATE) IS NULL OR a.fecha >= :desde)
+                  AND (CAST(:hasta AS DATE) IS NULL OR a.fecha <= :hasta)
+                ORDER BY a.fecha DESC, a.id DESC
+            """
+        else:
+            raise ValueError(f"Tipo de exportación inválido: {tipo}")
+        columns = EXPORT_COLUMNS[tipo]
+        result = self.db.execute(
+            text(sql).execution_options(
+                stream_results=True, yield_per=OWNER_DASHBOARD_EXPORT_CHUNK
+            ),
+            params,
+        ).mappings()
+        for r in result:
+            yield {c: r.get(c) for c in columns}
+        yield from self._iter_archived_export(tipo, sucursal_id, desde, hasta)
+
+    def _iter_archived_export(
+        self,
+        tipo: str,
+        sucursal_id: Optional[int],
+        desde: Optional[date],
+        hasta: Optional[date],
+    ) -> Iterator[Dict[str, Any]]:
+        """Archived months of pagos / asistencias, with the hot query's filters and order."""
+        if tipo not in ("pagos", "asistencias"):
+            return
+        sid = int(sucursal_id) if sucursal_id is not None else None
+        column = "fecha_pago" if tipo == "pagos" else "fecha"
+        # Same half-open [desde, hasta + 1 day) range as the hot query
+        lo = _as_datetime(desde)
+        hi = _as_datetime(hasta + timedelta(days=1)) if hasta is not None else None
+
+        def keep(r: Dict[str, Any]) -> bool:
+            if sid is not None and r.get("sucursal_id") != sid:
+                return False
+            value = _as_datetime(r.get(column))
+            if value is None:
+                return lo is None and hi is None
+            return (lo is None or value >= lo) and (hi is None or value < hi)
+
+        sucursales: Optional[Dict[int, str]] = None
+        columns = EXPORT_COLUMNS[tipo]
+        for batch in cold_archive.iter_archived_batches(
+            self.db, tipo, desde, hasta, where=keep, order_by=column
+        ):
+            if sucursales is None:
+                sucursales = {
+                    int(i): str(n or "")
+                    for i, n in self.db.execute(text("SELECT id, nombre FROM sucursales")).fetchall()
+                }
+            ids = sorted({int(r["usuario_id"]) for r in batch if r.get("usuario_id") is not None})
+            nombres: Dict[int, str] = {}
+            if ids:
+                nombres = {
+                    int(i): n
+                    for i, n in self.db.execute(
+                        text("SELECT id, nombre FROM usuarios WHERE id = ANY(:ids)"),
+                        {"ids": ids},
+                    ).fetchall()
+                }
+            for r in batch:
+                row = dict(r)
+                row["usuario_nombre"] = nombres.get(r.get("usuario_id"))
+                row["sucursal_nombre"] = sucursales.get(r.get("sucursal_id"))
+                if tipo == "asistencias":
+                    row["hora"] = r.get("hora_registro")
+                yield {c: row.get(c) for c in columns}
+
+
+__all__ = [
+    "EXPORT_COLUMNS",
+    "OwnerDashboardService",
+    "decode_cursor",
+    "encode_cursor",
+    "profesor_sucursales_sql",
+]
@@ -33,6 +33,7 @@ from src.database.orm_models import (
     Sucursal,
 )
 from src.services.whatsapp_dispatch_service import WhatsAppDispatchService
+from src.services.pdf_artifact_cache import invalidate_artifacts
 from src.services.entitlements_service import EntitlementsService
 from src.services.membership_service import MembershipService
 
@@ -190,6 +191,7 @@ class PaymentService(BaseService):
                 setattr(pago, key, value)
 
         self.db.commit()
+        invalidate_artifacts("recibo", pago_id)
         return True
 
     def modificar_pago_avanzado(
@@ -256,6 +258,7 @@ class PaymentService(BaseService):
                 self._actualizar_estado_usuario_tras_pago(usuario, now)
 
             self.db.commit()
+            invalidate_artifacts("recibo", pago.id)
             return pago.id
 
         except Exception as e:
@@ -387,6 +390,7 @@ class PaymentService(BaseService):
                 self.db.add(detalle)
 
             self.db.commit()
+            invalidate_artifacts("recibo", pago.id)
 
             return {
                 "ok": True,
@@ -418,6 +422,7 @@ class PaymentService(BaseService):
         self.db.execute(delete(PagoDetalle).where(PagoDetalle.pago_id == pago_id))
 
         self.db.commit()
+        invalidate_artifacts("recibo", pago_id)
 
         # Recalculate user status
         self._recalcular_estado_usuario(usuario_id)
@@ -0,0 +1,386 @@
+"""
+PDF Artifact Cache
+
+Content-addressed store for rendered PDFs (routine exports and payment
+receipts). The key is a SHA-256 over the template identity/version, the
+document data and the branding, so an unchanged document is served from disk
+without rendering and the digest doubles as a strong ETag.
+
+Layout: <root>/<tenant>/<kind>/<scope>/<digest>.pdf where scope is the routine
+or payment id; editing a routine/payment drops its scope directory. Artifacts
+can optionally be mirrored to B2 (PDF_ARTIFACT_CACHE_B2=1) so other instances
+reuse them.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_FORMAT_VERSION = 1
+
+PDF_ARTIFACT_CACHE_DIR = os.getenv(
+    "PDF_ARTIFACT_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "ironhub_pdf_artifacts"),
+)
+PDF_ARTIFACT_CACHE_MAX_MB = int(os.getenv("PDF_ARTIFACT_CACHE_MAX_MB", "512"))
+PDF_ARTIFACT_CACHE_B2 = str(os.getenv("PDF_ARTIFACT_CACHE_B2", "")).strip().lower() in (
+    "1",
+    "true",
+    "yes",
+    "on",
+)
+PDF_ARTIFACT_CACHE_ENABLED = str(
+    os.getenv("PDF_ARTIFACT_CACHE_ENABLED", "true")
+).strip().lower() in ("1", "true", "yes", "on")
+
+_PRUNE_EVERY_PUTS = 50
+_SAFE_SEGMENT = re.compile(r"[^A-Za-z0-9_-]")
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, SimpleNamespace):
+        return vars(obj)
+    if isinstance(obj, (bytes, bytearray)):
+        return hashlib.sha256(bytes(obj)).hexdigest()
+    if isinstance(obj, (set, frozenset)):
+        return sorted(str(x) for x in obj)
+    return str(obj)
+
+
+def compute_digest(kind: str, **parts: Any) -> str:
+    """Stable SHA-256 over the canonical JSON of everything that affects the output"""
+    payload = {"v": ARTIFACT_FORMAT_VERSION, "kind": str(kind), "parts": parts}
+    raw = json.dumps(
+        payload,
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=_json_default,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def etag_for(digest: str) -> str:
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Strong comparison against an If-None-Match header value"""
+    try:
+        raw = str(if_none_match or "").strip()
+        if not raw:
+            return False
+        if raw == "*":
+            return True
+        for candidate in raw.split(","):
+            c = candidate.strip()
+            if c.startswith("W/"):
+                continue
+            if c == etag:
+                return True
+        return False
+    except Exception:
+        return False
+
+
+def _segment(value: Any, fallback: str = "_") -> str:
+    s = _SAFE_SEGMENT.sub("_", str(value if value is not None else ""))[:64]
+    return s or fallback
+
+
+class ArtifactCache:
+    """Local-disk artifact store with optional B2 mirroring"""
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        use_b2: Optional[bool] = None,
+    ):
+        self.root = os.path.abspath(root or PDF_ARTIFACT_CACHE_DIR)
+        self.max_bytes = (
+            int(max_bytes)
+            if max_bytes is not None
+            else max(PDF_ARTIFACT_CACHE_MAX_MB, 1) * 1024 * 1024
+        )
+        self.use_b2 = PDF_ARTIFACT_CACHE_B2 if use_b2 is None else bool(use_b2)
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._hits = 0
+        self._misses = 0
+        self._remote_hits = 0
+        self._uploader: Optional[ThreadPoolExecutor] = None
+
+    # --- paths ---
+
+    def _scope_dir(self, tenant: Optional[str], kind: str, scope: Any) -> str:
+        return os.path.join(
+            self.root, _segment(tenant, "common"), _segment(kind), _segment(scope)
+        )
+
+    def path_for(self, tenant: Optional[str], kind: str, scope: Any, digest: str) -> str:
+        return os.path.join(self._scope_dir(tenant, kind, scope), f"{_segment(digest)}.pdf")
+
+    # --- read/write ---
+
+    def get(self, tenant: Optional[str], kind: str, scope: Any, digest: str) -> Optional[str]:
+        """Path of a cached artifact, pulling it from B2 on a local miss"""
+        path = self.path_for(tenant, kind, scope, digest)
+        try:
+            if os.path.isfile(path):
+                try:
+                    os.utime(path, None)
+                except Exception:
+                    pass
+                with self._lock:
+                    self._hits += 1
+                return path
+        except Exception:
+            pass
+        if self.use_b2:
+            try:
+                from src.services.b2_storage import artifact_key, get_object
+
+                content = get_object(
+                    artifact_key(str(tenant or "common"), kind, str(scope), f"{digest}.pdf")
+                )
+                if content:
+                    self._write_local(path, content)
+                    with self._lock:
+                        self._hits += 1
+                        self._remote_hits += 1
+                    return path
+            except Exception as e:
+                logger.warning(f"Artifact B2 lookup failed: {e}")
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def put(
+        self,
+        tenant: Optional[str],
+        kind: str,
+        scope: Any,
+        digest: str,
+        content: bytes,
+    ) -> Optional[str]:
+        """Store rendered bytes; returns the local path"""
+        if not content:
+            return None
+        path = self.path_for(tenant, kind, scope, digest)
+        try:
+            self._write_local(path, bytes(content))
+        except Exception as e:
+            logger.warning(f"Artifact cache write failed: {e}")
+            return None
+        if self.use_b2:
+            self._mirror_to_b2(tenant, kind, scope, digest, bytes(content))
+        self._after_put()
+        return path
+
+    def put_file(
+        self,
+        tenant: Optional[str],
+        kind: str,
+        scope: Any,
+        digest: str,
+        src_path: str,
+    ) -> Optional[str]:
+        """Store an already rendered file (e.g. PDFGenerator output)"""
+        try:
+            with open(src_path, "rb") as f:
+                content = f.read()
+        except Exception as e:
+            logger.warning(f"Artifact cache could not read {src_path}: {e}")
+            return None
+        return self.put(tenant, kind, scope, digest, content)
+
+    def invalidate(self, tenant: Optional[str], kind: str, scope: Any) -> int:
+        """Drop every artifact of one routine/payment; returns files removed locally"""
+        removed = 0
+        d = self._scope_dir(tenant, kind, scope)
+        try:
+            if os.path.isdir(d):
+                for name in os.listdir(d):
+                    try:
+                        os.remove(os.path.join(d, name))
+                        removed += 1
+                    except Exception:
+                        pass
+                try:
+                    os.rmdir(d)
+                except Exception:
+                    pass
+        except Exception as e:
+            logger.warning(f"Artifact cache invalidation failed for {d}: {e}")
+        if self.use_b2:
+            try:
+                from src.services.b2_storage import artifact_key, delete_prefix
+
+                prefix = artifact_key(str(tenant or "common"), kind, str(scope), "x")
+                prefix = prefix.rsplit("/", 1)[0] + "/"
+                self._submit_background(delete_prefix, prefix)
+            except Exception:
+                pass
+        return removed
+
+    async def aget(self, tenant: Optional[str], kind: str, scope: Any, digest: str) -> Optional[str]:
+        return await asyncio.to_thread(self.get, tenant, kind, scope, digest)
+
+    async def aput(
+        self, tenant: Optional[str], kind: str, scope: Any, digest: str, content: bytes
+    ) -> Optional[str]:
+        return await asyncio.to_thread(self.put, tenant, kind, scope, digest, content)
+
+    async def aput_file(
+        self, tenant: Optional[str], kind: str, scope: Any, digest: str, src_path: str
+    ) -> Optional[str]:
+        return await asyncio.to_thread(self.put_file, tenant, kind, scope, digest, src_path)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "root": self.root,
+                "hits": self._hits,
+                "misses": self._misses,
+                "remote_hits": self._remote_hits,
+                "puts": self._puts,
+                "b2": self.use_b2,
+                "max_bytes": self.max_bytes,
+            }
+
+    # --- internals ---
+
+    @staticmethod
+    def _write_local(path: str, content: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp, path)
+        except Exception:
+            try:
+                os.remove(tmp)
+            except Exception:
+                pass
+            raise
+
+    def _submit_background(self, fn, *args) -> None:
+        with self._lock:
+            if self._uploader is None:
+                self._uploader = ThreadPoolExecutor(
+                    max_workers=2, thread_name_prefix="pdf-artifact-b2"
+                )
+            ex = self._uploader
+        try:
+            ex.submit(fn, *args)
+        except Exception as e:
+            logger.warning(f"Artifact background task rejected: {e}")
+
+    def _mirror_to_b2(
+        self, tenant: Optional[str], kind: str, scope: Any, digest: str, content: bytes
+    ) -> None:
+        try:
+            from src.services.b2_storage import artifact_key, put_object
+
+            key = artifact_key(str(tenant or "common"), kind, str(scope), f"{digest}.pdf")
+            self._submit_background(put_object, key, content, "application/pdf")
+        except Exception as e:
+            logger.warning(f"Artifact B2 mirror failed: {e}")
+
+    def _after_put(self) -> None:
+        with self._lock:
+            self._puts += 1
+            due = self._puts % _PRUNE_EVERY_PUTS == 0
+        if due:
+            try:
+                self.prune()
+            except Exception as e:
+                logger.warning(f"Artifact cache prune failed: {e}")
+
+    def prune(self) -> int:
+        """Evict least recently used artifacts until the cache fits max_bytes"""
+        entries = []
+        total = 0
+        for dirpath, _dirs, files in os.walk(self.root):
+            for name in files:
+                p = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(p)
+                except Exception:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+                total += st.st_size
+        if total <= self.max_bytes:
+            return 0
+        removed = 0
+        entries.sort()
+        for _mtime, size, p in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(p)
+                total -= size
+                removed += 1
+            except Exception:
+                pass
+        return removed
+
+
+_cache: Optional[ArtifactCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_artifact_cache() -> Optional[ArtifactCache]:
+    """Process-wide cache, or None when disabled via PDF_ARTIFACT_CACHE_ENABLED"""
+    global _cache
+    if not PDF_ARTIFACT_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ArtifactCache()
+    return _cache
+
+
+def invalidate_artifacts(kind: str, scope: Any, tenant: Optional[str] = None) -> int:
+    """Invalidate cached artifacts of a routine/payment for the current tenant"""
+    cache = get_artifact_cache()
+    if cache is None:
+        return 0
+    try:
+        if tenant is None:
+            from src.database.tenant_connection import get_current_tenant
+
+            tenant = get_current_tenant()
+        return cache.invalidate(tenant, kind, scope)
+    except Exception as e:
+        logger.warning(f"Artifact invalidation failed ({kind}/{scope}): {e}")
+        return 0
+
+
+__all__ = [
+    "ArtifactCache",
+    "compute_digest",
+    "etag_for",
+    "etag_matches",
+    "get_artifact_cache",
+    "invalidate_artifacts",
+]
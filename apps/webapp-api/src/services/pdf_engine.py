@@ -7,7 +7,12 @@ including variable resolution, exercise table building, QR code management, and
 
 import io
 import os
+import json
 import base64
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple, Union
 from datetime import datetime
@@ -31,32 +36,359 @@ from reportlab.platypus import (
 )
 from reportlab.lib.utils import ImageReader
 
-# Image processing
-import qrcode
-
 # Template processing
 from jinja2 import BaseLoader, StrictUndefined, TemplateError
 from jinja2.sandbox import SandboxedEnvironment
 
+from .branding_assets import image_reader, reader_flowable
+from .qr_code_manager import QR_RENDER_MODE, QRVectorFlowable, draw_qr_vector, qr_png_bytes
+from .variable_resolver import CompiledCache
+
 logger = logging.getLogger(__name__)
 
 _ASSETS_ROOT = (Path(__file__).resolve().parents[2] / "assets").resolve()
 _MAX_IMAGE_BYTES = int(os.environ.get("PDF_MAX_IMAGE_BYTES", "600000"))
 
+# Engines are created per request, so the sandbox and its compiled templates
+# live at module level and are reused by every export in the process.
+_JINJA_ENV = SandboxedEnvironment(
+    loader=BaseLoader(),
+    undefined=StrictUndefined,
+    autoescape=False,
+)
+_COMPILED_TEMPLATES = CompiledCache(int(os.environ.get("PDF_MAX_COMPILED_TEMPLATES", "500")))
+_RENDER_PLANS = CompiledCache(int(os.environ.get("PDF_MAX_RENDER_PLANS", "200")))
+
+_SHARED_STYLES: Optional[Tuple[Any, Dict[str, ParagraphStyle]]] = None
+_SHARED_STYLES_LOCK = threading.Lock()
+
+_SECTION_BUILDERS = {
+    "header": "_build_header_section",
+    "excel_header": "_build_excel_header_section",
+    "text": "_build_text_section",
+    "table": "_build_table_section",
+    "exercise_table": "_build_exercise_table_section",
+    "image": "_build_image_section",
+    "qr_code": "_build_qr_code_section",
+    "spacing": "_build_spacing_section",
+}
+
+_GENERIC_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), lightgrey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), black),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), white),
+    ('GRID', (0, 0), (-1, -1), 1, black)
+])
+
+_EXERCISE_TABLE_HEADERS = ("Ejercicio", "Series", "Repeticiones", "Descanso", "Notas")
+_EXERCISE_TABLE_COL_WIDTHS = (3*inch, 1*inch, 1.5*inch, 1*inch, 2*inch)
+_EXERCISE_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), lightgrey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), black),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+    ('BACKGROUND', (0, 1), (-1, -1), white),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ('GRID', (0, 0), (-1, -1), 1, black),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+])
+
+_EXCEL_WEEKLY_BASE_COMMANDS = (
+    ("GRID", (0, 0), (-1, -1), 0.5, black),
+    ("BACKGROUND", (0, 0), (-1, 0), lightgrey),
+    ("BACKGROUND", (0, 1), (-1, 1), white),
+    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+    ("FONTNAME", (0, 1), (-1, 1), "Helvetica-Bold"),
+    ("FONTSIZE", (0, 0), (-1, 0), 9),
+    ("FONTSIZE", (0, 1), (-1, 1), 8),
+    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+)
+
+
+def _build_custom_styles(base: Any) -> Dict[str, ParagraphStyle]:
+    """Create custom paragraph styles on top of a sample stylesheet"""
+    styles = {}
+    
+    # Title style
+    styles["title"] = ParagraphStyle(
+        "CustomTitle",
+        parent=base["Title"],
+        fontSize=24,
+        spaceAfter=30,
+        alignment=TA_CENTER,
+        textColor=black
+    )
+    
+    # Subtitle style
+    styles["subtitle"] = ParagraphStyle(
+        "CustomSubtitle",
+        parent=base["Heading2"],
+        fontSize=18,
+        spaceAfter=20,
+        alignment=TA_CENTER,
+        textColor=black
+    )
+    
+    # Header style
+    styles["header"] = ParagraphStyle(
+        "CustomHeader",
+        parent=base["Heading3"],
+        fontSize=14,
+        spaceAfter=12,
+        alignment=TA_LEFT,
+        textColor=black
+    )
+    
+    # Body style
+    styles["body"] = ParagraphStyle(
+        "CustomBody",
+        parent=base["Normal"],
+        fontSize=11,
+        spaceAfter=6,
+        alignment=TA_JUSTIFY,
+        textColor=black
+    )
+    
+    # Small style
+    styles["small"] = ParagraphStyle(
+        "CustomSmall",
+        parent=base["Normal"],
+        fontSize=9,
+        spaceAfter=3,
+        alignment=TA_LEFT,
+        textColor=grey
+    )
+    
+    return styles
+
+
+def _shared_stylesheets() -> Tuple[Any, Dict[str, ParagraphStyle]]:
+    """Sample stylesheet and custom styles, built once per process (read-only)"""
+    global _SHARED_STYLES
+    if _SHARED_STYLES is None:
+        with _SHARED_STYLES_LOCK:
+            if _SHARED_STYLES is None:
+                base = getSampleStyleSheet()
+                _SHARED_STYLES = (base, _build_custom_styles(base))
+    return _SHARED_STYLES
+
+
+@lru_cache(maxsize=256)
+def _week_label_key(label: str) -> Optional[str]:
+    raw = str(label or "").strip().lower()
+    raw = unicodedata.normalize("NFKD", raw)
+    raw = "".join([c for c in raw if not unicodedata.combining(c)])
+    raw = raw.replace(".", "").replace(":", "").strip()
+    if raw in ("ser", "series", "sets", "set"):
+        return "series"
+    if raw in ("rep", "reps", "repeticiones", "repeticion"):
+        return "repeticiones"
+    if raw in ("kg", "peso", "carga", "peso_kg"):
+        return "peso_kg"
+    if raw in ("rir", "rpe"):
+        return "rir"
+    if raw in ("descanso", "rest"):
+        return "descanso"
+    if raw in ("notas", "nota", "notes"):
+        return "notas"
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _split_weekly_values(value_string: str) -> Tuple[str, ...]:
+    return tuple(v.strip() for v in value_string.split(","))
+
+
+@lru_cache(maxsize=64)
+def _excel_weekly_skeleton(
+    weeks: int, week_columns: Tuple[str, ...]
+) -> Tuple[Tuple[Any, ...], Tuple[Any, ...], Tuple[float, ...], Tuple[Any, ...]]:
+    """Header rows, column widths and base style commands for an excel_weekly table"""
+    header_row: List[Any] = []
+    subheader_row: List[Any] = [""]
+    for w in range(1, weeks + 1):
+        header_row.append(f"SEMANA {w}")
+        for i in range(len(week_columns) - 1):
+            header_row.append("")
+        for col in week_columns:
+            subheader_row.append(str(col))
+    col_widths = (2.4 * inch,) + (0.6 * inch,) * (weeks * len(week_columns))
+    commands = list(_EXCEL_WEEKLY_BASE_COMMANDS)
+    span_start = 1
+    for _ in range(1, weeks + 1):
+        span_end = span_start + len(week_columns) - 1
+        commands.append(("SPAN", (span_start, 0), (span_end, 0)))
+        span_start = span_end + 1
+    return tuple(header_row), tuple(subheader_row), col_widths, tuple(commands)
+
+
+def _classify_condition(conditional: Any) -> str:
+    """Classify a section conditional once per plan: has_exercises, user_assigned, always or never"""
+    if not conditional:
+        return "always"
+    condition = str(conditional.get("if", "") or "").lower()
+    if "has_exercises" in condition:
+        return "has_exercises"
+    if "user_assigned" in condition:
+        return "user_assigned"
+    return "always" if conditional.get("show", True) else "never"
+
+
+@dataclass(frozen=True)
+class PlannedSection:
+    """A template section with its builder and condition resolved ahead of time"""
+    type: str
+    builder: str
+    content: Dict[str, Any]
+    condition: str = "always"
+    week_columns: Tuple[str, ...] = ()
+    week_keys: Tuple[Optional[str], ...] = ()
+
+
+@dataclass(frozen=True)
+class RenderPlan:
+    """Immutable, data-independent part of a PDF export for one template version"""
+    template_id: Optional[int]
+    version: Optional[str]
+    page_size: Tuple[float, float]
+    margins: Tuple[float, float, float, float]
+    variables: Tuple[Tuple[str, Dict[str, Any]], ...]
+    qr_config: Dict[str, Any]
+    qr_position: str
+    qr_overlay_size: Tuple[float, float]
+    styling: Dict[str, Any]
+    pages: Tuple[Tuple[PlannedSection, ...], ...] = field(default_factory=tuple)
+
 
 class PDFEngine:
     """Core PDF generation engine for dynamic routine templates"""
     
     def __init__(self):
-        self.styles = getSampleStyleSheet()
-        self.custom_styles = self._create_custom_styles()
-        self.jinja_env = SandboxedEnvironment(
-            loader=BaseLoader(),
-            undefined=StrictUndefined,
-            autoescape=False,
+        self.styles, self.custom_styles = _shared_stylesheets()
+        self.jinja_env = _JINJA_ENV
+        self._compiled_templates = _COMPILED_TEMPLATES
+
+    @staticmethod
+    def render_plan_stats() -> Dict[str, Any]:
+        return _RENDER_PLANS.stats()
+
+    @staticmethod
+    def clear_render_plans() -> None:
+        _RENDER_PLANS.clear()
+
+    def get_render_plan(
+        self,
+        template_config: Dict[str, Any],
+        template_id: Optional[int] = None,
+        version: Optional[str] = None,
+    ) -> RenderPlan:
+        """Return the compiled render plan for a template version (cached)"""
+        if version is None:
+            try:
+                version = str((template_config.get("metadata") or {}).get("version") or "") or None
+            except Exception:
+                version = None
+        # Assignments can customize a template and exports override qr_code,
+        # so the config fingerprint is part of the key alongside id/version.
+        fingerprint = hashlib.sha256(
+            json.dumps(template_config, sort_keys=True, default=str, separators=(",", ":")).encode("utf-8")
+        ).hexdigest()
+        key = (template_id, version, fingerprint)
+        return _RENDER_PLANS.get_or_compile(
+            key, lambda: self.compile_render_plan(template_config, template_id=template_id, version=version)
+        )
+
+    def compile_render_plan(
+        self,
+        template_config: Dict[str, Any],
+        template_id: Optional[int] = None,
+        version: Optional[str] = None,
+    ) -> RenderPlan:
+        """Compile the data-independent parts of a template into a RenderPlan"""
+        layout = template_config.get("layout", {}) or {}
+        qr_config = dict(template_config.get("qr_code", {}) or {})
+        styling = dict(template_config.get("styling", {}) or {})
+
+        page_size = self._get_page_size(layout.get("page_size", "A4"))
+        if str(layout.get("orientation", "portrait")).strip().lower() == "landscape":
+            page_size = landscape(page_size)
+
+        margins = layout.get("margins", {}) or {}
+        margin_points = (
+            self._to_points(margins.get("right", 20)),
+            self._to_points(margins.get("left", 20)),
+            self._to_points(margins.get("top", 20)),
+            self._to_points(margins.get("bottom", 20)),
+        )
+
+        qr_position = str(qr_config.get("position") or "inline").strip().lower()
+        if qr_position in ("separate_sheet", "sheet"):
+            qr_position = "separate"
+        qr_overlay_size = (0.0, 0.0)
+        if qr_config.get("enabled", False) and qr_position in ("header", "footer"):
+            size_cfg = qr_config.get("size") or {}
+            if not isinstance(size_cfg, dict):
+                size_cfg = {}
+            qr_overlay_size = (
+                self._to_points(size_cfg.get("width", 40)),
+                self._to_points(size_cfg.get("height", 40)),
+            )
+
+        variables = tuple(
+            (str(name), dict(cfg or {}))
+            for name, cfg in (template_config.get("variables", {}) or {}).items()
+        )
+
+        pages: List[Tuple[PlannedSection, ...]] = []
+        for page in template_config.get("pages", []) or []:
+            planned: List[PlannedSection] = []
+            for section in page.get("sections", []) or []:
+                section_type = section.get("type")
+                builder = _SECTION_BUILDERS.get(section_type)
+                if builder is None:
+                    logger.warning(f"Unknown section type: {section_type}")
+                    continue
+                condition = _classify_condition(section.get("conditional"))
+                if condition == "never":
+                    continue
+                content = dict(section.get("content", {}) or {})
+                week_columns: Tuple[str, ...] = ()
+                if section_type == "exercise_table" and str(content.get("format") or "").strip().lower() == "excel_weekly":
+                    cols = content.get("week_columns")
+                    if not isinstance(cols, list) or not cols:
+                        cols = ["Ser", "Rep", "Kg", "RIR"]
+                    week_columns = tuple(str(c) for c in cols)
+                planned.append(
+                    PlannedSection(
+                        type=str(section_type),
+                        builder=builder,
+                        content=content,
+                        condition=condition,
+                        week_columns=week_columns,
+                        week_keys=tuple(_week_label_key(c) for c in week_columns),
+                    )
+                )
+            pages.append(tuple(planned))
+
+        return RenderPlan(
+            template_id=template_id,
+            version=version,
+            page_size=tuple(page_size),
+            margins=margin_points,
+            variables=variables,
+            qr_config=qr_config,
+            qr_position=qr_position,
+            qr_overlay_size=qr_overlay_size,
+            styling=styling,
+            pages=tuple(pages),
         )
-        self._compiled_templates: Dict[str, Any] = {}
-        self._max_compiled_templates = int(os.environ.get("PDF_MAX_COMPILED_TEMPLATES", "500"))
         
     def generate_pdf(
         self,
@@ -67,117 +399,103 @@ class PDFEngine:
     ) -> Union[str, bytes]:
         """Generate PDF from template and data"""
         try:
-            # Parse template configuration
-            layout = template_config.get("layout", {})
-            pages = template_config.get("pages", [])
-            variables = template_config.get("variables", {})
-            qr_config = template_config.get("qr_code", {})
-            styling = template_config.get("styling", {})
-            
-            # Resolve variables
-            resolved_data = self._resolve_variables(data, variables)
-
-            page_size = self._get_page_size(layout.get("page_size", "A4"))
-            if str(layout.get("orientation", "portrait")).strip().lower() == "landscape":
-                page_size = landscape(page_size)
-
-            margins = layout.get("margins", {}) or {}
-            right_margin = self._to_points(margins.get("right", 20))
-            left_margin = self._to_points(margins.get("left", 20))
-            top_margin = self._to_points(margins.get("top", 20))
-            bottom_margin = self._to_points(margins.get("bottom", 20))
-            
-            qr_position = str((qr_config or {}).get("position") or "inline").strip().lower()
-            if qr_position in ("separate_sheet", "sheet"):
-                qr_position = "separate"
-
-            qr_overlay_reader: Optional[ImageReader] = None
-            qr_overlay_w = 0.0
-            qr_overlay_h = 0.0
-            if (qr_config or {}).get("enabled", False) and qr_position in ("header", "footer"):
-                qr_data = self._get_qr_code_data(resolved_data, qr_config or {})
-                if qr_data:
-                    try:
-                        size_cfg = (qr_config or {}).get("size") or {}
-                        if not isinstance(size_cfg, dict):
-                            size_cfg = {}
-                        qr_overlay_w = self._to_points(size_cfg.get("width", 40))
-                        qr_overlay_h = self._to_points(size_cfg.get("height", 40))
-                        qr_overlay_reader = self._build_qr_image_reader(qr_data)
-                    except Exception:
-                        qr_overlay_reader = None
+            opts = options or {}
+            plan = self.get_render_plan(
+                template_config,
+                template_id=opts.get("template_id"),
+                version=opts.get("template_version"),
+            )
+            return self.render(plan, data, output_path=output_path)
+        except Exception as e:
+            logger.error(f"Error generating PDF: {e}")
+            raise
+
+    def render(
+        self,
+        plan: RenderPlan,
+        data: Dict[str, Any],
+        output_path: Optional[str] = None,
+    ) -> Union[str, bytes]:
+        """Bind data to a compiled render plan and build the PDF"""
+        # Resolve variables
+        resolved_data = self._resolve_variables(data, dict(plan.variables))
 
-            def _draw_qr_overlay(canvas, doc) -> None:
+        qr_config = plan.qr_config
+        qr_position = plan.qr_position
+        qr_overlay_w, qr_overlay_h = plan.qr_overlay_size
+        qr_overlay_reader: Optional[ImageReader] = None
+        qr_overlay_data = ""
+        qr_vector = self._qr_render_mode(qr_config) == "vector"
+        if qr_config.get("enabled", False) and qr_position in ("header", "footer"):
+            qr_data = self._get_qr_code_data(resolved_data, qr_config)
+            if qr_data:
                 try:
-                    if qr_overlay_reader is None:
-                        return
-                    if qr_position not in ("header", "footer"):
-                        return
-                    if qr_overlay_w <= 0 or qr_overlay_h <= 0:
-                        return
-                    x = float(doc.pagesize[0]) - float(doc.rightMargin) - float(qr_overlay_w)
-                    if qr_position == "header":
-                        y = float(doc.height) + float(doc.bottomMargin) + max(
-                            0.0, (float(doc.topMargin) - float(qr_overlay_h)) / 2.0
-                        )
+                    if qr_vector:
+                        qr_overlay_data = str(qr_data)
                     else:
-                        y = max(0.0, (float(doc.bottomMargin) - float(qr_overlay_h)) / 2.0)
-                    canvas.drawImage(
-                        qr_overlay_reader,
-                        x,
-                        y,
-                        width=qr_overlay_w,
-                        height=qr_overlay_h,
-                        preserveAspectRatio=True,
-                        mask="auto",
-                    )
+                        qr_overlay_reader = self._build_qr_image_reader(qr_data)
                 except Exception:
-                    return
+                    qr_overlay_reader = None
 
-            # Create PDF document
-            if output_path:
-                # Save to file
-                doc = SimpleDocTemplate(
-                    output_path,
-                    pagesize=page_size,
-                    rightMargin=right_margin,
-                    leftMargin=left_margin,
-                    topMargin=top_margin,
-                    bottomMargin=bottom_margin,
-                )
-                
-                # Build document
-                story = self._build_story(pages, resolved_data, qr_config, styling)
-                if qr_overlay_reader is not None:
-                    doc.build(story, onFirstPage=_draw_qr_overlay, onLaterPages=_draw_qr_overlay)
+        def _draw_qr_overlay(canvas, doc) -> None:
+            try:
+                if qr_overlay_reader is None and not qr_overlay_data:
+                    return
+                if qr_position not in ("header", "footer"):
+                    return
+                if qr_overlay_w <= 0 or qr_overlay_h <= 0:
+                    return
+                x = float(doc.pagesize[0]) - float(doc.rightMargin) - float(qr_overlay_w)
+                if qr_position == "header":
+                    y = float(doc.height) + float(doc.bottomMargin) + max(
+                        0.0, (float(doc.topMargin) - float(qr_overlay_h)) / 2.0
+                    )
                 else:
-                    doc.build(story)
-                
-                return output_path
-            else:
-                # Return as bytes
-                buffer = io.BytesIO()
-                doc = SimpleDocTemplate(
-                    buffer,
-                    pagesize=page_size,
-                    rightMargin=right_margin,
-                    leftMargin=left_margin,
-                    topMargin=top_margin,
-                    bottomMargin=bottom_margin,
+                    y = max(0.0, (float(doc.bottomMargin) - float(qr_overlay_h)) / 2.0)
+                if qr_overlay_data:
+                    side = min(float(qr_overlay_w), float(qr_overlay_h))
+                    draw_qr_vector(
+                        canvas,
+                        qr_overlay_data,
+                        x + (float(qr_overlay_w) - side) / 2.0,
+                        y + (float(qr_overlay_h) - side) / 2.0,
+                        side,
+                        error_correction="L",
+                    )
+                    return
+                canvas.drawImage(
+                    qr_overlay_reader,
+                    x,
+                    y,
+                    width=qr_overlay_w,
+                    height=qr_overlay_h,
+                    preserveAspectRatio=True,
+                    mask="auto",
                 )
-                
-                story = self._build_story(pages, resolved_data, qr_config, styling)
-                if qr_overlay_reader is not None:
-                    doc.build(story, onFirstPage=_draw_qr_overlay, onLaterPages=_draw_qr_overlay)
-                else:
-                    doc.build(story)
-                
-                buffer.seek(0)
-                return buffer.getvalue()
-                
-        except Exception as e:
-            logger.error(f"Error generating PDF: {e}")
-            raise
+            except Exception:
+                return
+
+        right_margin, left_margin, top_margin, bottom_margin = plan.margins
+        buffer = None if output_path else io.BytesIO()
+        doc = SimpleDocTemplate(
+            output_path or buffer,
+            pagesize=plan.page_size,
+            rightMargin=right_margin,
+            leftMargin=left_margin,
+            topMargin=top_margin,
+            bottomMargin=bottom_margin,
+        )
+
+        story = self._build_story_from_plan(plan, resolved_data)
+        if qr_overlay_reader is not None or qr_overlay_data:
+            doc.build(story, onFirstPage=_draw_qr_overlay, onLaterPages=_draw_qr_overlay)
+        else:
+            doc.build(story)
+
+        if output_path:
+            return output_path
+        buffer.seek(0)
+        return buffer.getvalue()
     
     def generate_preview(
         self,
@@ -236,62 +554,6 @@ class PDFEngine:
     
     # === Private Methods ===
     
-    def _create_custom_styles(self) -> Dict[str, ParagraphStyle]:
-        """Create custom paragraph styles"""
-        styles = {}
-        
-        # Title style
-        styles["title"] = ParagraphStyle(
-            "CustomTitle",
-            parent=self.styles["Title"],
-            fontSize=24,
-            spaceAfter=30,
-            alignment=TA_CENTER,
-            textColor=black
-        )
-        
-        # Subtitle style
-        styles["subtitle"] = ParagraphStyle(
-            "CustomSubtitle",
-            parent=self.styles["Heading2"],
-            fontSize=18,
-            spaceAfter=20,
-            alignment=TA_CENTER,
-            textColor=black
-        )
-        
-        # Header style
-        styles["header"] = ParagraphStyle(
-            "CustomHeader",
-            parent=self.styles["Heading3"],
-            fontSize=14,
-            spaceAfter=12,
-            alignment=TA_LEFT,
-            textColor=black
-        )
-        
-        # Body style
-        styles["body"] = ParagraphStyle(
-            "CustomBody",
-            parent=self.styles["Normal"],
-            fontSize=11,
-            spaceAfter=6,
-            alignment=TA_JUSTIFY,
-            textColor=black
-        )
-        
-        # Small style
-        styles["small"] = ParagraphStyle(
-            "CustomSmall",
-            parent=self.styles["Normal"],
-            fontSize=9,
-            spaceAfter=3,
-            alignment=TA_LEFT,
-            textColor=grey
-        )
-        
-        return styles
-    
     def _get_page_size(self, size_name: str) -> Tuple[float, float]:
         """Get page size by name"""
         sizes = {
@@ -409,79 +671,47 @@ class PDFEngine:
         
         return value
     
-    def _build_story(
-        self,
-        pages: List[Dict[str, Any]],
-        data: Dict[str, Any],
-        qr_config: Dict[str, Any],
-        styling: Dict[str, Any]
-    ) -> List[Any]:
-        """Build story for PDF document"""
-        story = []
-        
-        for i, page in enumerate(pages):
-            # Add page content
-            for section in page.get("sections", []):
-                section_content = self._build_section(section, data, qr_config, styling)
+    def _build_story_from_plan(self, plan: RenderPlan, data: Dict[str, Any]) -> List[Any]:
+        """Build story from pre-classified plan sections"""
+        story: List[Any] = []
+        has_exercises: Optional[bool] = None
+        last = len(plan.pages) - 1
+        for i, sections in enumerate(plan.pages):
+            for section in sections:
+                if section.condition == "has_exercises":
+                    if has_exercises is None:
+                        has_exercises = bool(
+                            data.get("dias") and any(day.get("ejercicios") for day in data["dias"])
+                        )
+                    if not has_exercises:
+                        continue
+                elif section.condition == "user_assigned" and not data.get("usuario"):
+                    continue
+
+                if section.type == "spacing":
+                    section_content = self._build_spacing_section(section.content)
+                elif section.type == "qr_code":
+                    section_content = self._build_qr_code_section(section.content, data, plan.qr_config, plan.styling)
+                elif section.week_columns:
+                    section_content = self._build_excel_weekly_table(
+                        section.content,
+                        data,
+                        plan.styling,
+                        data.get("dias", []),
+                        week_columns=section.week_columns,
+                        week_keys=section.week_keys,
+                    ) if data.get("dias") else []
+                else:
+                    section_content = getattr(self, section.builder)(section.content, data, plan.styling)
                 if section_content:
                     story.extend(section_content)
-            
+
             # Add page break except for last page
-            if i < len(pages) - 1:
+            if i < last:
                 story.append(PageBreak())
-        
+
         return story
-    
-    def _build_section(
-        self,
-        section: Dict[str, Any],
-        data: Dict[str, Any],
-        qr_config: Dict[str, Any],
-        styling: Dict[str, Any]
-    ) -> List[Any]:
-        """Build section content"""
-        section_type = section.get("type")
-        content = section.get("content", {})
-        
-        # Check conditional rendering
-        conditional = section.get("conditional")
-        if conditional and not self._evaluate_condition(conditional, data):
-            return []
-        
-        if section_type == "header":
-            return self._build_header_section(content, data, styling)
-        elif section_type == "excel_header":
-            return self._build_excel_header_section(content, data, styling)
-        elif section_type == "text":
-            return self._build_text_section(content, data, styling)
-        elif section_type == "table":
-            return self._build_table_section(content, data, styling)
-        elif section_type == "exercise_table":
-            return self._build_exercise_table_section(content, data, styling)
-        elif section_type == "image":
-            return self._build_image_section(content, data, styling)
-        elif section_type == "qr_code":
-            return self._build_qr_code_section(content, data, qr_config, styling)
-        elif section_type == "spacing":
-            return self._build_spacing_section(content)
-        else:
-            logger.warning(f"Unknown section type: {section_type}")
-            return []
-    
-    def _evaluate_condition(self, conditional: Dict[str, Any], data: Dict[str, Any]) -> bool:
-        """Evaluate conditional rendering"""
-        condition = conditional.get("if", "")
-        show = conditional.get("show", True)
-        
-        # Simple condition evaluation (can be enhanced)
-        if "has_exercises" in condition.lower():
-            return bool(data.get("dias") and any(day.get("ejercicios") for day in data["dias"]))
-        
-        if "user_assigned" in condition.lower():
-            return bool(data.get("usuario"))
-        
-        return show
-    
+
     def _build_header_section(
         self,
         content: Dict[str, Any],
@@ -540,8 +770,7 @@ class PDFEngine:
                 header, b64 = logo_uri.split(",", 1)
                 raw = base64.b64decode(b64, validate=True)
                 if len(raw) <= _MAX_IMAGE_BYTES:
-                    reader = ImageReader(io.BytesIO(raw))
-                    logo_cell = Image(reader, width=1.2 * inch, height=1.2 * inch)
+                    logo_cell = reader_flowable(image_reader(raw), 1.2 * inch, 1.2 * inch)
             except Exception:
                 logo_cell = Paragraph(gym_name, self.custom_styles["header"])
 
@@ -625,18 +854,7 @@ class PDFEngine:
         if processed_headers and processed_rows:
             table_data = [processed_headers] + processed_rows
             table = Table(table_data)
-            
-            # Add style
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), lightgrey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), black),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), white),
-                ('GRID', (0, 0), (-1, -1), 1, black)
-            ]))
+            table.setStyle(_GENERIC_TABLE_STYLE)
             
             elements.append(table)
             elements.append(Spacer(1, 12))
@@ -673,7 +891,7 @@ class PDFEngine:
             elements.append(Paragraph(f"Día {dia_num}", self.custom_styles["header"]))
             
             # Exercise table headers
-            headers = ["Ejercicio", "Series", "Repeticiones", "Descanso", "Notas"]
+            headers = list(_EXERCISE_TABLE_HEADERS)
             
             # Exercise table rows
             rows = []
@@ -689,22 +907,8 @@ class PDFEngine:
             
             # Create table
             table_data = [headers] + rows
-            table = Table(table_data, colWidths=[3*inch, 1*inch, 1.5*inch, 1*inch, 2*inch])
-            
-            # Style table
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), lightgrey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), black),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-                ('BACKGROUND', (0, 1), (-1, -1), white),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 9),
-                ('GRID', (0, 0), (-1, -1), 1, black),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ]))
+            table = Table(table_data, colWidths=list(_EXERCISE_TABLE_COL_WIDTHS))
+            table.setStyle(_EXERCISE_TABLE_STYLE)
             
             elements.append(table)
             elements.append(Spacer(1, 20))
@@ -717,6 +921,8 @@ class PDFEngine:
         data: Dict[str, Any],
         styling: Dict[str, Any],
         dias: List[Dict[str, Any]],
+        week_columns: Optional[Tuple[str, ...]] = None,
+        week_keys: Optional[Tuple[Optional[str], ...]] = None,
     ) -> List[Any]:
         elements: List[Any] = []
         try:
@@ -724,73 +930,56 @@ class PDFEngine:
         except Exception:
             weeks = 4
         weeks = max(1, min(weeks, 12))
-        week_columns = content.get("week_columns")
-        if not isinstance(week_columns, list) or not week_columns:
-            week_columns = ["Ser", "Rep", "Kg", "RIR"]
+        if not week_columns:
+            cols = content.get("week_columns")
+            if not isinstance(cols, list) or not cols:
+                cols = ["Ser", "Rep", "Kg", "RIR"]
+            week_columns = tuple(str(c) for c in cols)
+            week_keys = None
+        if week_keys is None:
+            week_keys = tuple(_week_label_key(c) for c in week_columns)
         label = str(content.get("label") or "EJERCICIOS").strip() or "EJERCICIOS"
 
-        header_row = [label]
-        subheader_row = [""]
-        for w in range(1, weeks + 1):
-            header_row.append(f"SEMANA {w}")
-            for i in range(len(week_columns) - 1):
-                header_row.append("")
-            for col in week_columns:
-                subheader_row.append(str(col))
-
-        rows: List[List[Any]] = [header_row, subheader_row]
+        header_tail, subheader_row, col_widths, base_commands = _excel_weekly_skeleton(weeks, week_columns)
+        rows: List[List[Any]] = [[label, *header_tail], list(subheader_row)]
+        n_cells = weeks * len(week_columns)
         for dia in dias:
             dia_num = dia.get("numero", 1)
             ejercicios = dia.get("ejercicios", []) or []
-            day_row = [f"DÍA {dia_num}"] + [""] * (weeks * len(week_columns))
+            day_row = [f"DÍA {dia_num}"] + [""] * n_cells
             rows.append(day_row)
             for ejercicio in ejercicios:
                 row = [str(ejercicio.get("nombre") or "")]
                 for w in range(1, weeks + 1):
-                    for idx, col in enumerate(week_columns):
-                        row.append(self._get_excel_week_value(ejercicio, w, col, idx))
+                    for idx, key in enumerate(week_keys):
+                        row.append(self._get_excel_week_value(ejercicio, w, week_columns[idx], idx, key=key))
                 rows.append(row)
 
-        col_widths = [2.4 * inch] + [0.6 * inch] * (weeks * len(week_columns))
-        table = Table(rows, colWidths=col_widths, repeatRows=2)
-        table.setStyle(
-            TableStyle(
-                [
-                    ("GRID", (0, 0), (-1, -1), 0.5, black),
-                    ("BACKGROUND", (0, 0), (-1, 0), lightgrey),
-                    ("BACKGROUND", (0, 1), (-1, 1), white),
-                    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                    ("FONTNAME", (0, 1), (-1, 1), "Helvetica-Bold"),
-                    ("FONTSIZE", (0, 0), (-1, 0), 9),
-                    ("FONTSIZE", (0, 1), (-1, 1), 8),
-                    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-                ]
-            )
-        )
-        span_start = 1
-        for _ in range(1, weeks + 1):
-            span_end = span_start + len(week_columns) - 1
-            table.setStyle([("SPAN", (span_start, 0), (span_end, 0))])
-            span_start = span_end + 1
-
+        commands = list(base_commands)
         row_index = 2
         for dia in dias:
-            table.setStyle(
-                [
-                    ("BACKGROUND", (0, row_index), (-1, row_index), lightgrey),
-                    ("FONTNAME", (0, row_index), (-1, row_index), "Helvetica-Bold"),
-                ]
-            )
+            commands.append(("BACKGROUND", (0, row_index), (-1, row_index), lightgrey))
+            commands.append(("FONTNAME", (0, row_index), (-1, row_index), "Helvetica-Bold"))
             row_index += 1 + len(dia.get("ejercicios", []) or [])
 
+        table = Table(rows, colWidths=list(col_widths), repeatRows=2)
+        table.setStyle(TableStyle(commands))
+
         elements.append(table)
         elements.append(Spacer(1, 12))
         return elements
 
-    def _get_excel_week_value(self, ejercicio: Dict[str, Any], week: int, label: str, col_index: int) -> str:
+    def _get_excel_week_value(
+        self,
+        ejercicio: Dict[str, Any],
+        week: int,
+        label: str,
+        col_index: int,
+        key: Any = ...,
+    ) -> str:
         week_data = None
-        for key in ("semanas", "weeks", "week_data", "semanas_data"):
-            raw = ejercicio.get(key)
+        for k in ("semanas", "weeks", "week_data", "semanas_data"):
+            raw = ejercicio.get(k)
             if isinstance(raw, dict):
                 week_data = raw.get(str(week))
                 if week_data is None:
@@ -802,15 +991,15 @@ class PDFEngine:
                     week_data = raw[week - 1]
                     break
 
-        if isinstance(week_data, dict):
+        if key is ...:
             key = self._map_week_label(label)
+        if isinstance(week_data, dict):
             if key and key in week_data:
                 return str(week_data.get(key) or "")
         if isinstance(week_data, list):
             if 0 <= col_index < len(week_data):
                 return str(week_data[col_index] or "")
 
-        key = self._map_week_label(label)
         if key:
             if key in ("repeticiones", "series", "peso_kg", "rir", "descanso", "notas"):
                 val = ejercicio.get(key)
@@ -821,23 +1010,7 @@ class PDFEngine:
         return ""
 
     def _map_week_label(self, label: str) -> Optional[str]:
-        raw = str(label or "").strip().lower()
-        raw = unicodedata.normalize("NFKD", raw)
-        raw = "".join([c for c in raw if not unicodedata.combining(c)])
-        raw = raw.replace(".", "").replace(":", "").strip()
-        if raw in ("ser", "series", "sets", "set"):
-            return "series"
-        if raw in ("rep", "reps", "repeticiones", "repeticion"):
-            return "repeticiones"
-        if raw in ("kg", "peso", "carga", "peso_kg"):
-            return "peso_kg"
-        if raw in ("rir", "rpe"):
-            return "rir"
-        if raw in ("descanso", "rest"):
-            return "descanso"
-        if raw in ("notas", "nota", "notes"):
-            return "notas"
-        return None
+        return _week_label_key(str(label or ""))
     
     def _build_image_section(
         self,
@@ -922,25 +1095,10 @@ class PDFEngine:
         
         # Add to document
         try:
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=10,
-                border=4,
-            )
-            qr.add_data(qr_data)
-            qr.make(fit=True)
-            
-            # Convert to PIL image
-            qr_img = qr.make_image(fill_color="black", back_color="white")
-            
-            # Convert to ReportLab image
-            buffer = io.BytesIO()
-            qr_img.save(buffer, format="PNG")
-            buffer.seek(0)
-            
-            # Add to document
-            qr_image = Image(buffer, width=size, height=size)
+            if self._qr_render_mode(qr_config) == "vector":
+                qr_image = QRVectorFlowable(str(qr_data), size, error_correction="L")
+            else:
+                qr_image = reader_flowable(self._build_qr_image_reader(qr_data), size, size)
             if pos == "separate":
                 elements.append(PageBreak())
             elements.append(qr_image)
@@ -951,20 +1109,13 @@ class PDFEngine:
         
         return elements
 
+    @staticmethod
+    def _qr_render_mode(qr_config: Optional[Dict[str, Any]]) -> str:
+        return str((qr_config or {}).get("render") or QR_RENDER_MODE).strip().lower()
+
     def _build_qr_image_reader(self, qr_data: str) -> ImageReader:
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(qr_data)
-        qr.make(fit=True)
-        qr_img = qr.make_image(fill_color="black", back_color="white")
-        buffer = io.BytesIO()
-        qr_img.save(buffer, format="PNG")
-        buffer.seek(0)
-        return ImageReader(buffer)
+        # PNG bytes and the decoded reader are both shared across engines/requests
+        return image_reader(qr_png_bytes(str(qr_data), error_correction="L", border=4))
     
     def _build_spacing_section(self, content: Dict[str, Any]) -> List[Any]:
         """Build spacing section"""
@@ -976,21 +1127,18 @@ class PDFEngine:
         if not template_str:
             return ""
         
+        s = str(template_str)
+        # Plain labels render to themselves; skip Jinja entirely (newline
+        # handling is the only thing Jinja would change for them).
+        if "{" not in s and "\r" not in s and not s.endswith("\n"):
+            return s
+
         try:
-            s = str(template_str)
             if "{%" in s or "{#" in s:
                 raise TemplateError("Solo se permiten expresiones {{ ... }}")
             if "__" in s or "import" in s.lower():
                 raise TemplateError("Expresión no permitida")
-            template = self._compiled_templates.get(s)
-            if template is None:
-                if self._max_compiled_templates > 0 and len(self._compiled_templates) >= self._max_compiled_templates:
-                    try:
-                        self._compiled_templates.pop(next(iter(self._compiled_templates)))
-                    except Exception:
-                        self._compiled_templates = {}
-                template = self.jinja_env.from_string(s)
-                self._compiled_templates[s] = template
+            template = self._compiled_templates.get_or_compile(s, lambda: self.jinja_env.from_string(s))
             return str(template.render(**data))
         except TemplateError:
             # Fallback to simple variable replacement
@@ -1006,7 +1154,7 @@ class PDFEngine:
         
         try:
             # Parse comma-separated values
-            values = [v.strip() for v in value_string.split(",")]
+            values = _split_weekly_values(value_string)
             if week <= len(values):
                 return values[week - 1]
             else:
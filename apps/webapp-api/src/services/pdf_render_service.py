@@ -0,0 +1,408 @@
+"""
+PDF Render Service
+
+Runs ReportLab work (routine exports and payment receipts) in a pool of warm
+worker processes so it neither blocks the event loop nor competes for the GIL.
+Jobs wait in a bounded queue served round-robin per tenant; when the queue is
+full callers get RenderQueueFull and should answer 429 with Retry-After.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+class RenderQueueFull(Exception):
+    """Raised when the render queue (global or per tenant) is saturated"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Cola de generación de PDF llena")
+        self.retry_after = max(int(retry_after), 1)
+
+
+# === Worker side (runs inside pool processes) ===
+
+_worker_engine = None
+
+
+def _worker_init() -> None:
+    """Preload ReportLab, fonts, stylesheets and the PDFEngine in each worker"""
+    global _worker_engine
+    try:
+        from reportlab.pdfbase.pdfmetrics import getFont
+
+        for name in ("Helvetica", "Helvetica-Bold"):
+            getFont(name)
+        from src.services.pdf_engine import PDFEngine
+        import src.pdf_generator  # noqa: F401
+
+        _worker_engine = PDFEngine()
+    except Exception as e:
+        logger.warning(f"PDF render worker warm-up failed: {e}")
+
+
+def _render_routine_job(template_config: Dict[str, Any], data: Dict[str, Any], options: Dict[str, Any]) -> bytes:
+    global _worker_engine
+    if _worker_engine is None:
+        from src.services.pdf_engine import PDFEngine
+
+        _worker_engine = PDFEngine()
+    pdf = _worker_engine.generate_pdf(template_config=template_config, data=data, output_path=None, options=options)
+    return bytes(pdf)
+
+
+def _render_receipt_job(branding: Dict[str, Any], args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> str:
+    from src.pdf_generator import PDFGenerator
+
+    return PDFGenerator(branding_config=branding).generar_recibo(*args, **kwargs)
+
+
+# === Snapshots (ORM rows are not safe to ship across processes) ===
+
+def snapshot_pago(pago: Any) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=getattr(pago, "id", 0),
+        usuario_id=getattr(pago, "usuario_id", None),
+        monto=getattr(pago, "monto", 0),
+        fecha_pago=getattr(pago, "fecha_pago", None),
+        mes=getattr(pago, "mes", None),
+        año=getattr(pago, "año", None),
+        metodo_pago_id=getattr(pago, "metodo_pago_id", None),
+        metodo_pago_nombre=getattr(pago, "metodo_pago_nombre", None),
+        sucursal_id=getattr(pago, "sucursal_id", None),
+    )
+
+
+def snapshot_usuario(usuario: Any) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=getattr(usuario, "id", 0),
+        nombre=getattr(usuario, "nombre", None),
+        dni=getattr(usuario, "dni", None),
+        tipo_cuota=getattr(usuario, "tipo_cuota", None),
+        email=getattr(usuario, "email", None),
+        telefono=getattr(usuario, "telefono", None),
+    )
+
+
+def snapshot_detalles(detalles: Optional[Sequence[Any]]) -> Optional[List[SimpleNamespace]]:
+    if detalles is None:
+        return None
+    out: List[SimpleNamespace] = []
+    for d in detalles:
+        concepto = getattr(d, "concepto", None)
+        out.append(
+            SimpleNamespace(
+                cantidad=float(getattr(d, "cantidad", 0) or 0),
+                precio_unitario=float(getattr(d, "precio_unitario", 0) or 0),
+                subtotal=float(getattr(d, "subtotal", 0) or 0),
+                descripcion=getattr(d, "descripcion", None),
+                concepto_nombre=getattr(d, "concepto_nombre", None),
+                concepto=concepto if isinstance(concepto, (str, type(None))) else str(concepto),
+            )
+        )
+    return out
+
+
+def prepare_receipt_branding(branding: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Resolve tenant-dependent branding defaults before the job leaves the request.
+
+    Workers have no tenant context, so PDFGenerator must not fall back to
+    reading gym_name from the database there, nor download the logo.
+    """
+    out = dict(branding or {})
+    if not out.get("gym_name"):
+        try:
+            from src.utils import get_gym_name
+
+            out["gym_name"] = get_gym_name("Gimnasio") or "Gimnasio"
+        except Exception:
+            out["gym_name"] = "Gimnasio"
+    # Hand the worker a cached local file instead of a URL to download
+    logo_url = out.pop("logo_url", None) or out.pop("main_logo_url", None)
+    out.pop("main_logo_url", None)
+    if logo_url and not out.get("main_logo_path"):
+        try:
+            from src.services.branding_assets import logo_local_path
+
+            path = logo_local_path(str(logo_url))
+            if path:
+                out["main_logo_path"] = path
+        except Exception:
+            pass
+    return out
+
+
+# === Scheduler (runs in the API process event loop) ===
+
+@dataclass
+class _Job:
+    tenant: str
+    fn: Callable[..., Any]
+    args: Tuple[Any, ...]
+    future: "asyncio.Future[Any]"
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class PdfRenderService:
+    """Bounded, tenant-fair front end to a pool of warm PDF render workers"""
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        max_per_tenant: Optional[int] = None,
+    ):
+        cpu = os.cpu_count() or 1
+        self.workers = max(workers if workers is not None else _env_int("PDF_RENDER_WORKERS", min(2, cpu)), 0)
+        self.max_queue = max(max_queue if max_queue is not None else _env_int("PDF_RENDER_MAX_QUEUE", 64), 1)
+        self.max_per_tenant = max(
+            max_per_tenant if max_per_tenant is not None else _env_int("PDF_RENDER_MAX_PER_TENANT", 16), 1
+        )
+        self._executor: Optional[Executor] = None
+        self._executor_lock = threading.Lock()
+        self._queues: "OrderedDict[str, Deque[_Job]]" = OrderedDict()
+        self._queued = 0
+        self._in_flight = 0
+        self._avg_render_s = 1.0
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+
+    # --- executor ---
+
+    def _get_executor(self) -> Executor:
+        if self._executor is not None:
+            return self._executor
+        with self._executor_lock:
+            if self._executor is None:
+                if self.workers > 0:
+                    try:
+                        # spawn: forking a process that already runs an event loop and
+                        # DB pool threads is not safe.
+                        ctx = multiprocessing.get_context(os.getenv("PDF_RENDER_START_METHOD", "spawn"))
+                        self._executor = ProcessPoolExecutor(
+                            max_workers=self.workers, mp_context=ctx, initializer=_worker_init
+                        )
+                    except Exception as e:
+                        logger.warning(f"PDF process pool unavailable, falling back to threads: {e}")
+                if self._executor is None:
+                    # Serverless/limited environments: still keep ReportLab off the event loop.
+                    self._executor = ThreadPoolExecutor(max_workers=max(self.workers, 1), thread_name_prefix="pdf-render")
+        return self._executor
+
+    @property
+    def concurrency(self) -> int:
+        return max(self.workers, 1)
+
+    def shutdown(self) -> None:
+        with self._executor_lock:
+            ex = self._executor
+            self._executor = None
+        if ex is not None:
+            try:
+                ex.shutdown(wait=False, cancel_futures=True)
+            except Exception:
+                pass
+
+    # --- admission ---
+
+    def retry_after_seconds(self, extra: int = 0) -> int:
+        backlog = self._queued + self._in_flight + extra
+        return int(max(1.0, (backlog / float(self.concurrency)) * self._avg_render_s) + 0.999)
+
+    def _admit(self, tenant: str, n: int) -> None:
+        tenant_q = self._queues.get(tenant)
+        tenant_pending = len(tenant_q) if tenant_q else 0
+        if self._queued + n > self.max_queue or tenant_pending + n > self.max_per_tenant:
+            self._stats["rejected"] += n
+            raise RenderQueueFull(self.retry_after_seconds(n))
+
+    def _enqueue(self, tenant: str, fn: Callable[..., Any], args: Tuple[Any, ...]) -> "asyncio.Future[Any]":
+        loop = asyncio.get_running_loop()
+        job = _Job(tenant=tenant, fn=fn, args=args, future=loop.create_future())
+        q = self._queues.get(tenant)
+        if q is None:
+            q = deque()
+            self._queues[tenant] = q
+        q.append(job)
+        self._queued += 1
+        self._stats["submitted"] += 1
+        return job.future
+
+    def _next_job(self) -> Optional[_Job]:
+        # Round-robin: take one job from the oldest tenant, then move it to the back.
+        while self._queues:
+            tenant, q = next(iter(self._queues.items()))
+            if not q:
+                self._queues.pop(tenant, None)
+                continue
+            job = q.popleft()
+            self._queued -= 1
+            if q:
+                self._queues.move_to_end(tenant)
+            else:
+                self._queues.pop(tenant, None)
+            if job.future.cancelled():
+                continue
+            return job
+        return None
+
+    def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._in_flight < self.concurrency:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                cf = loop.run_in_executor(self._get_executor(), job.fn, *job.args)
+            except Exception as e:
+                self._handle_executor_error(e)
+                self._stats["failed"] += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+                continue
+            self._in_flight += 1
+            started = time.monotonic()
+            cf.add_done_callback(lambda f, j=job, t0=started: self._on_done(j, f, t0))
+
+    def _handle_executor_error(self, exc: BaseException) -> None:
+        # A crashed worker breaks the whole pool; drop it so the next job spawns a fresh one.
+        if isinstance(exc, BrokenProcessPool):
+            logger.error(f"PDF render pool broken, recreating: {exc}")
+            self.shutdown()
+
+    def _on_done(self, job: _Job, fut: "asyncio.Future[Any]", started: float) -> None:
+        self._in_flight -= 1
+        elapsed = time.monotonic() - started
+        self._avg_render_s = (self._avg_render_s * 0.8) + (elapsed * 0.2)
+        if not job.future.done():
+            exc = fut.exception() if not fut.cancelled() else asyncio.CancelledError()
+            if exc is not None:
+                self._handle_executor_error(exc)
+                self._stats["failed"] += 1
+                job.future.set_exception(exc)
+            else:
+                self._stats["completed"] += 1
+                job.future.set_result(fut.result())
+        self._dispatch()
+
+    # --- public API ---
+
+    async def submit(self, tenant: Optional[str], fn: Callable[..., Any], *args: Any) -> Any:
+        """Queue a picklable job; raises RenderQueueFull when saturated"""
+        key = str(tenant or "_")
+        self._admit(key, 1)
+        fut = self._enqueue(key, fn, args)
+        self._dispatch()
+        return await fut
+
+    async def submit_batch(self, tenant: Optional[str], jobs: Sequence[Tuple[Callable[..., Any], Tuple[Any, ...]]]) -> List[Any]:
+        """Queue several jobs atomically (all admitted or none); results keep input order.
+
+        Failed jobs are returned as the exception instance instead of raising.
+        """
+        key = str(tenant or "_")
+        if not jobs:
+            return []
+        self._admit(key, len(jobs))
+        futures = [self._enqueue(key, fn, args) for fn, args in jobs]
+        self._dispatch()
+        return list(await asyncio.gather(*futures, return_exceptions=True))
+
+    async def render_routine(
+        self,
+        tenant: Optional[str],
+        template_config: Dict[str, Any],
+        data: Dict[str, Any],
+        options: Optional[Dict[str, Any]] = None,
+    ) -> bytes:
+        return await self.submit(tenant, _render_routine_job, template_config, data, dict(options or {}))
+
+    async def render_receipt(
+        self,
+        tenant: Optional[str],
+        branding: Dict[str, Any],
+        *args: Any,
+        **kwargs: Any,
+    ) -> str:
+        return await self.submit(tenant, _render_receipt_job, dict(branding or {}), args, kwargs)
+
+    async def render_routine_batch(
+        self,
+        tenant: Optional[str],
+        items: Sequence[Tuple[Dict[str, Any], Dict[str, Any], Optional[Dict[str, Any]]]],
+    ) -> List[Any]:
+        """Render (template_config, data, options) items; failures come back as exceptions"""
+        return await self.submit_batch(
+            tenant, [(_render_routine_job, (cfg, data, dict(opts or {}))) for cfg, data, opts in items]
+        )
+
+    async def render_receipt_batch(
+        self,
+        tenant: Optional[str],
+        items: Sequence[Tuple[Dict[str, Any], Tuple[Any, ...], Dict[str, Any]]],
+    ) -> List[Any]:
+        """Render (branding, args, kwargs) receipt items; failures come back as exceptions"""
+        return await self.submit_batch(
+            tenant, [(_render_receipt_job, (dict(b or {}), tuple(a), dict(k or {}))) for b, a, k in items]
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "workers": self.workers,
+            "queued": self._queued,
+            "in_flight": self._in_flight,
+            "tenants_waiting": len(self._queues),
+            "avg_render_ms": int(self._avg_render_s * 1000),
+        }
+
+
+_service: Optional[PdfRenderService] = None
+_service_lock = threading.Lock()
+
+
+def get_pdf_render_service() -> PdfRenderService:
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = PdfRenderService()
+    return _service
+
+
+def shutdown_pdf_render_service() -> None:
+    global _service
+    with _service_lock:
+        svc = _service
+        _service = None
+    if svc is not None:
+        svc.shutdown()
+
+
+__all__ = [
+    "PdfRenderService",
+    "RenderQueueFull",
+    "get_pdf_render_service",
+    "shutdown_pdf_render_service",
+    "prepare_receipt_branding",
+    "snapshot_pago",
+    "snapshot_usuario",
+    "snapshot_detalles",
+]
@@ -4,7 +4,6 @@ Integrates with the dynamic template system to produce professional PDFs
 """
 
 import logging
-import io
 import base64
 from typing import Dict, Any, List
 from datetime import datetime
@@ -474,20 +473,9 @@ class PDFService:
     def generate_qr_code(self, data: str, size: int = 100) -> str:
         """Generate QR code as base64 string"""
         try:
-            import qrcode
-            
-            # Create QR code
-            qr = qrcode.QRCode(version=1, box_size=10, border=2)
-            qr.add_data(data)
-            qr.make(fit=True)
-            
-            # Create image
-            qr_img = qr.make_image(fill_color="black", back_color="white")
-            
-            # Convert to base64
-            buffer = io.BytesIO()
-            qr_img.save(buffer, format="PNG")
-            qr_base64 = base64.b64encode(buffer.getvalue()).decode()
+            from .qr_code_manager import qr_png_bytes
+
+            qr_base64 = base64.b64encode(qr_png_bytes(data, border=2)).decode()
             
             return f"data:image/png;base64,{qr_base64}"
         
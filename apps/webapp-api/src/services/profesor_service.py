@@ -16,7 +16,7 @@ from sqlalchemy import text, select, func
 from sqlalchemy.dialects.postgresql import insert
 
 from src.services.base import BaseService
-from src.database.clase_profesor_schema import ensure_clase_profesor_schema
+from src.database.clase_profesor_schema import has_clase_profesor_schema
 from src.database.orm_models import (
     Profesor,
     HorarioProfesor,
@@ -1242,8 +1242,9 @@ class ProfesorService(BaseService):
     def obtener_clases_asignadas(
         self, profesor_id: int, *, sucursal_id: int
     ) -> List[int]:
+        if not has_clase_profesor_schema(self.db):
+            return []
         try:
-            ensure_clase_profesor_schema(self.db)
             rows = (
                 self.db.execute(
                     text(
@@ -1281,7 +1282,8 @@ class ProfesorService(BaseService):
             except Exception:
                 return {"ok": False, "error": "invalid_args"}
 
-            ensure_clase_profesor_schema(self.db)
+            if not has_clase_profesor_schema(self.db):
+                return {"ok": False, "error": "schema_missing"}
             if not self.profesor_trabaja_en_sucursal(pid, sid):
                 return {"ok": False, "error": "profesor_no_trabaja_en_sucursal"}
 
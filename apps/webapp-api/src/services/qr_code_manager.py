@@ -8,6 +8,8 @@ including multiple data sources, positioning options, and custom styling.
 import io
 import os
 import hashlib
+import threading
+from collections import OrderedDict
 from typing import Dict, Any, Optional, Union, Tuple, List
 from dataclasses import dataclass
 from enum import Enum
@@ -16,7 +18,8 @@ from datetime import datetime
 
 from reportlab.lib.units import inch
 from reportlab.platypus import Image, Table, TableStyle
-from reportlab.lib.colors import Color
+from reportlab.platypus.flowables import Flowable
+from reportlab.lib.colors import Color, HexColor
 from reportlab.graphics.shapes import Drawing
 
 import qrcode
@@ -24,6 +27,190 @@ from PIL import Image as PILImage
 
 logger = logging.getLogger(__name__)
 
+QR_CACHE_MAX_ENTRIES = int(os.environ.get("QR_CACHE_MAX_ENTRIES", "512"))
+# "raster" (PNG image) or "vector" (modules drawn as paths); templates can
+# override it with qr_code.render
+QR_RENDER_MODE = str(os.environ.get("QR_RENDER_MODE", "raster")).strip().lower()
+
+_EC_LEVELS = {
+    "L": qrcode.constants.ERROR_CORRECT_L,
+    "M": qrcode.constants.ERROR_CORRECT_M,
+    "Q": qrcode.constants.ERROR_CORRECT_Q,
+    "H": qrcode.constants.ERROR_CORRECT_H,
+}
+
+
+# === Shared QR cache (process-wide, bounded LRU) ===
+
+_qr_cache: "OrderedDict[Tuple[Any, ...], Any]" = OrderedDict()
+_qr_cache_lock = threading.Lock()
+_qr_cache_stats = {"hits": 0, "misses": 0}
+
+
+def _qr_cache_get_or_build(key: Tuple[Any, ...], build) -> Any:
+    with _qr_cache_lock:
+        val = _qr_cache.get(key)
+        if val is not None:
+            _qr_cache.move_to_end(key)
+            _qr_cache_stats["hits"] += 1
+            return val
+        _qr_cache_stats["misses"] += 1
+    val = build()
+    with _qr_cache_lock:
+        _qr_cache[key] = val
+        _qr_cache.move_to_end(key)
+        while len(_qr_cache) > max(QR_CACHE_MAX_ENTRIES, 1):
+            _qr_cache.popitem(last=False)
+    return val
+
+
+def _make_qr(data: str, error_correction: str, border: int, box_size: int = 10) -> "qrcode.QRCode":
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=_EC_LEVELS.get(str(error_correction or "M").upper(), qrcode.constants.ERROR_CORRECT_M),
+        box_size=int(box_size),
+        border=int(border),
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+
+def qr_png_bytes(
+    data: str,
+    error_correction: str = "M",
+    border: int = 4,
+    box_size: int = 10,
+    fill_color: str = "black",
+    back_color: str = "white",
+) -> bytes:
+    """PNG bytes for a QR code, shared across requests and engines"""
+    key = ("png", str(data), str(error_correction).upper(), int(border), int(box_size), str(fill_color), str(back_color))
+
+    def _build() -> bytes:
+        img = _make_qr(data, error_correction, border, box_size).make_image(
+            fill_color=fill_color, back_color=back_color
+        )
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    return _qr_cache_get_or_build(key, _build)
+
+
+def qr_matrix(data: str, error_correction: str = "M", border: int = 4) -> Tuple[Tuple[bool, ...], ...]:
+    """Module matrix (border included) for vector rendering"""
+    key = ("matrix", str(data), str(error_correction).upper(), int(border))
+    return _qr_cache_get_or_build(
+        key,
+        lambda: tuple(tuple(bool(c) for c in row) for row in _make_qr(data, error_correction, border).get_matrix()),
+    )
+
+
+def qr_cache_stats() -> Dict[str, Any]:
+    with _qr_cache_lock:
+        return dict(_qr_cache_stats, entries=len(_qr_cache))
+
+
+def clear_qr_cache() -> None:
+    with _qr_cache_lock:
+        _qr_cache.clear()
+
+
+def _to_color(value: Any, default: Any) -> Any:
+    try:
+        if isinstance(value, str):
+            v = value.strip()
+            if v.startswith("#"):
+                return HexColor(v)
+            from reportlab.lib import colors as _colors
+
+            named = getattr(_colors, v.lower(), None)
+            if named is not None:
+                return named
+        return default
+    except Exception:
+        return default
+
+
+def draw_qr_vector(
+    canvas,
+    data: str,
+    x: float,
+    y: float,
+    size: float,
+    error_correction: str = "M",
+    border: int = 4,
+    fill_color: Any = "black",
+    back_color: Any = "white",
+) -> None:
+    """Draw a QR code as filled paths (no raster image) with its lower-left corner at (x, y)"""
+    matrix = qr_matrix(data, error_correction, border)
+    n = len(matrix)
+    if n <= 0 or size <= 0:
+        return
+    module = float(size) / n
+    canvas.saveState()
+    try:
+        if back_color is not None:
+            canvas.setFillColor(_to_color(back_color, Color(1, 1, 1)))
+            canvas.rect(x, y, size, size, stroke=0, fill=1)
+        canvas.setFillColor(_to_color(fill_color, Color(0, 0, 0)))
+        path = canvas.beginPath()
+        for r, row in enumerate(matrix):
+            row_y = y + size - (r + 1) * module
+            c = 0
+            while c < n:
+                if not row[c]:
+                    c += 1
+                    continue
+                start = c
+                while c < n and row[c]:
+                    c += 1
+                path.rect(x + start * module, row_y, (c - start) * module, module)
+        canvas.drawPath(path, stroke=0, fill=1)
+    finally:
+        canvas.restoreState()
+
+
+class QRVectorFlowable(Flowable):
+    """Platypus flowable drawing a QR code as vector paths"""
+
+    def __init__(
+        self,
+        data: str,
+        size: float,
+        error_correction: str = "M",
+        border: int = 4,
+        fill_color: Any = "black",
+        back_color: Any = "white",
+    ):
+        super().__init__()
+        self.data = data
+        self.size = float(size)
+        self.error_correction = error_correction
+        self.border = border
+        self.fill_color = fill_color
+        self.back_color = back_color
+        self.width = self.size
+        self.height = self.size
+
+    def wrap(self, availWidth, availHeight):
+        return self.size, self.size
+
+    def draw(self):
+        draw_qr_vector(
+            self.canv,
+            self.data,
+            0,
+            0,
+            self.size,
+            error_correction=self.error_correction,
+            border=self.border,
+            fill_color=self.fill_color,
+            back_color=self.back_color,
+        )
+
 
 class QRPosition(Enum):
     """QR code positioning options"""
@@ -74,6 +261,7 @@ class QRConfig:
     url_shorten: bool = False
     cache_enabled: bool = True
     analytics_enabled: bool = False
+    render: Optional[str] = None  # "raster" | "vector"; None uses QR_RENDER_MODE
     
     def __post_init__(self):
         if self.size is None:
@@ -94,11 +282,9 @@ class QRContext:
 class QRCodeManager:
     """Advanced QR code generation and management"""
 
-    _MAX_CACHE_SIZE = 500
     _MAX_ANALYTICS_SIZE = 1000
 
     def __init__(self):
-        self.cache: dict = {}
         self.analytics_tracker: dict = {}
         self.default_config = QRConfig()
     
@@ -118,24 +304,21 @@ class QRCodeManager:
             if not qr_data:
                 return None, "No data available for QR code"
             
-            # Generate QR code image
-            qr_image = self._create_qr_image(qr_data, config)
-            
             # Position QR code based on configuration
             if config.position == QRPosition.INLINE:
-                return self._create_inline_qr(qr_image, config), None
+                return self._create_inline_qr(self._qr_flowable(qr_data, config), config), None
             elif config.position in (QRPosition.SEPARATE, QRPosition.SHEET):
-                return self._create_separate_qr(qr_image, config), None
+                return self._create_separate_qr(self._qr_flowable(qr_data, config), config), None
             elif config.position == QRPosition.HEADER:
-                return self._create_header_qr(qr_image, config, context), None
+                return self._create_header_qr(self._qr_flowable(qr_data, config), config, context), None
             elif config.position == QRPosition.FOOTER:
-                return self._create_footer_qr(qr_image, config, context), None
+                return self._create_footer_qr(self._qr_flowable(qr_data, config), config, context), None
             elif config.position == QRPosition.OVERLAY:
-                return self._create_overlay_qr(qr_image, config, position_info), None
+                return self._create_overlay_qr(self._create_qr_image(qr_data, config), config, position_info), None
             elif config.position == QRPosition.WATERMARK:
-                return self._create_watermark_qr(qr_image, config, position_info), None
+                return self._create_watermark_qr(self._create_qr_image(qr_data, config), config, position_info), None
             else:
-                return qr_image, None
+                return self._create_qr_image(qr_data, config), None
                 
         except Exception as e:
             logger.error(f"Error generating QR code: {e}")
@@ -157,33 +340,8 @@ class QRCodeManager:
             
             # Get QR data
             qr_data = self._get_qr_data(config, context)
-            
-            # Generate QR code
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=self._get_error_correction_level(config.error_correction),
-                box_size=10,
-                border=config.border_size,
-            )
-            qr.add_data(qr_data)
-            qr.make(fit=True)
-            
-            # Create image
-            qr_img = qr.make_image(
-                fill_color=config.foreground_color,
-                back_color=config.background_color
-            )
-            
-            # Add logo if specified
-            if config.logo_path and os.path.exists(config.logo_path):
-                qr_img = self._add_logo_to_qr(qr_img, config.logo_path, config.logo_size)
-            
-            # Convert to bytes
-            buffer = io.BytesIO()
-            qr_img.save(buffer, format="PNG")
-            buffer.seek(0)
-            
-            return buffer.getvalue()
+
+            return self._create_qr_png(qr_data, config)
             
         except Exception as e:
             logger.error(f"Error generating QR for routine: {e}")
@@ -341,43 +499,59 @@ class QRCodeManager:
     
     # === QR Image Creation ===
     
+    def _create_qr_png(self, data: str, config: QRConfig) -> bytes:
+        """PNG bytes for a QR code, from the shared cache when possible"""
+        has_logo = bool(config.logo_path and os.path.exists(config.logo_path))
+        if config.cache_enabled and not has_logo:
+            return qr_png_bytes(
+                data,
+                error_correction=config.error_correction.value,
+                border=config.border_size,
+                fill_color=config.foreground_color,
+                back_color=config.background_color,
+            )
+        qr_img = self._create_qr_image(data, config)
+        buffer = io.BytesIO()
+        qr_img.save(buffer, format="PNG")
+        return buffer.getvalue()
+
     def _create_qr_image(self, data: str, config: QRConfig) -> PILImage.Image:
         """Create QR code image"""
-        # Check cache first
-        if config.cache_enabled:
-            cache_key = self._get_cache_key(data, config)
-            if cache_key in self.cache:
-                return self.cache[cache_key]
-        
+        has_logo = bool(config.logo_path and os.path.exists(config.logo_path))
+        if config.cache_enabled and not has_logo:
+            return PILImage.open(io.BytesIO(self._create_qr_png(data, config)))
+
         # Generate QR code
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=self._get_error_correction_level(config.error_correction),
-            box_size=10,
-            border=config.border_size,
-        )
-        qr.add_data(data)
-        qr.make(fit=True)
-        
+        qr = _make_qr(data, config.error_correction.value, config.border_size)
+
         # Create image with custom colors
         qr_img = qr.make_image(
             fill_color=config.foreground_color,
             back_color=config.background_color
         )
-        
+
         # Add logo if specified
-        if config.logo_path and os.path.exists(config.logo_path):
+        if has_logo:
             qr_img = self._add_logo_to_qr(qr_img, config.logo_path, config.logo_size)
-        
-        # Cache result (bounded)
-        if config.cache_enabled:
-            self.cache[cache_key] = qr_img
-            # Evict oldest entries if over limit
-            while len(self.cache) > self._MAX_CACHE_SIZE:
-                oldest_key = next(iter(self.cache))
-                del self.cache[oldest_key]
-        
+
         return qr_img
+
+    def _qr_flowable(self, data: str, config: QRConfig) -> Union[Image, QRVectorFlowable]:
+        """ReportLab flowable for a QR code: vector paths or the cached PNG"""
+        width = config.size["width"]
+        height = config.size["height"]
+        mode = str(config.render or QR_RENDER_MODE).strip().lower()
+        has_logo = bool(config.logo_path and os.path.exists(config.logo_path))
+        if mode == "vector" and not has_logo:
+            return QRVectorFlowable(
+                data,
+                min(width, height),
+                error_correction=config.error_correction.value,
+                border=config.border_size,
+                fill_color=config.foreground_color,
+                back_color=config.background_color,
+            )
+        return Image(io.BytesIO(self._create_qr_png(data, config)), width=width, height=height)
     
     def _add_logo_to_qr(self, qr_img: PILImage.Image, logo_path: str, logo_size: float) -> PILImage.Image:
         """Add logo to QR code"""
@@ -408,24 +582,12 @@ class QRCodeManager:
     
     # === QR Positioning ===
     
-    def _create_inline_qr(self, qr_img: PILImage.Image, config: QRConfig) -> Image:
+    def _create_inline_qr(self, qr_image: Flowable, config: QRConfig) -> Flowable:
         """Create inline QR code"""
-        # Convert PIL image to ReportLab image
-        buffer = io.BytesIO()
-        qr_img.save(buffer, format="PNG")
-        buffer.seek(0)
-        
-        return Image(buffer, width=config.size["width"], height=config.size["height"])
+        return qr_image
     
-    def _create_separate_qr(self, qr_img: PILImage.Image, config: QRConfig) -> Table:
+    def _create_separate_qr(self, qr_image: Flowable, config: QRConfig) -> Table:
         """Create separate QR code with optional label"""
-        # Convert PIL image to ReportLab image
-        buffer = io.BytesIO()
-        qr_img.save(buffer, format="PNG")
-        buffer.seek(0)
-        
-        qr_image = Image(buffer, width=config.size["width"], height=config.size["height"])
-        
         # Create table with QR and optional label
         if config.text_label:
             from reportlab.platypus import Paragraph
@@ -445,15 +607,8 @@ class QRCodeManager:
         else:
             return qr_image
     
-    def _create_header_qr(self, qr_img: PILImage.Image, config: QRConfig, context: QRContext) -> Table:
+    def _create_header_qr(self, qr_image: Flowable, config: QRConfig, context: QRContext) -> Table:
         """Create header QR code with routine info"""
-        # Convert PIL image to ReportLab image
-        buffer = io.BytesIO()
-        qr_img.save(buffer, format="PNG")
-        buffer.seek(0)
-        
-        qr_image = Image(buffer, width=config.size["width"], height=config.size["height"])
-        
         # Get routine info
         routine_name = context.routine_data.get("nombre_rutina", "Rutina")
         user_name = context.user_data.get("nombre", "") if context.user_data else ""
@@ -484,15 +639,8 @@ class QRCodeManager:
         
         return table
     
-    def _create_footer_qr(self, qr_img: PILImage.Image, config: QRConfig, context: QRContext) -> Table:
+    def _create_footer_qr(self, qr_image: Flowable, config: QRConfig, context: QRContext) -> Table:
         """Create footer QR code with additional info"""
-        # Convert PIL image to ReportLab image
-        buffer = io.BytesIO()
-        qr_img.save(buffer, format="PNG")
-        buffer.seek(0)
-        
-        qr_image = Image(buffer, width=config.size["width"], height=config.size["height"])
-        
         # Get footer info
         gym_name = context.gym_data.get("nombre", "") if context.gym_data else ""
         date_text = datetime.now().strftime("%d/%m/%Y")
@@ -601,14 +749,9 @@ class QRCodeManager:
         data = f"{context.routine_data.get('id', '')}{datetime.now().isoformat()}"
         return hashlib.sha256(data.encode()).hexdigest()[:16]
     
-    def _get_cache_key(self, data: str, config: QRConfig) -> str:
-        """Generate cache key for QR code"""
-        config_str = f"{config.size}{config.error_correction}{config.foreground_color}{config.background_color}"
-        return hashlib.sha256(f"{data}{config_str}".encode()).hexdigest()
-    
     def clear_cache(self):
-        """Clear QR code cache"""
-        self.cache.clear()
+        """Clear QR code cache (shared by every manager and PDF engine)"""
+        clear_qr_cache()
 
 
 # Export main classes
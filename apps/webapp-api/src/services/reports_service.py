@@ -1,17 +1,99 @@
 """Reports Service - SQLAlchemy ORM for KPIs, statistics, and exports."""
 
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterator, List
 from datetime import date, datetime, timedelta
+from functools import lru_cache
 import logging
 
 from sqlalchemy.orm import Session
 from sqlalchemy import text, func, desc, or_, exists
 
+from src.database import statement_registry
+from src.services import cold_archive
 from src.services.base import BaseService
 from src.models.orm_models import Usuario, Pago, Asistencia, MetodoPago
 
 logger = logging.getLogger(__name__)
 
+# Rows fetched per round trip by the streamed exports
+_EXPORT_BATCH = 1000
+
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    try:
+        return date.fromisoformat(str(value)[:10]) if value else None
+    except Exception:
+        return None
+
+
+def _within(value: Any, lo: Any, hi: Any) -> bool:
+    """Inclusive range check for archived rows (None bounds are open)"""
+    if value is None:
+        return lo is None and hi is None
+    if lo is not None and value < lo:
+        return False
+    if hi is not None and value > hi:
+        return False
+    return True
+
+
+@lru_cache(maxsize=16)
+def _user_access_clause(ua: str, tc: str) -> str:
+    """Branch visibility predicate for users (bind :sid); one string per alias pair"""
+    return f"""
+            COALESCE((
+                SELECT uas.allow
+                FROM usuario_accesos_sucursales uas
+                WHERE uas.usuario_id = {ua}.id
+                  AND uas.sucursal_id = :sid
+                  AND (uas.starts_at IS NULL OR uas.starts_at <= NOW())
+                  AND (uas.ends_at IS NULL OR uas.ends_at >= NOW())
+                ORDER BY uas.id DESC
+                LIMIT 1
+            ), (
+                COALESCE({tc}.all_sucursales, FALSE)
+                OR EXISTS (
+                    SELECT 1
+                    FROM tipo_cuota_sucursales tcs
+                    WHERE tcs.tipo_cuota_id = {tc}.id
+                      AND tcs.sucursal_id = :sid
+                )
+            )) = TRUE
+        """
+
+
+# Branch-scoped user counts behind the dashboard KPIs, prepared once per connection
+_USERS_IN_SUCURSAL = (
+    "FROM usuarios u LEFT JOIN tipos_cuota tc ON LOWER(tc.nombre) = LOWER(u.tipo_cuota) "
+    f"WHERE {_user_access_clause('u', 'tc').strip()}"
+)
+_COUNT_BY_ACTIVO = statement_registry.register(
+    "reports.sucursal_users_by_activo",
+    f"SELECT COUNT(*) {_USERS_IN_SUCURSAL} AND u.activo = :activo",
+)
+_COUNT_REGISTERED_SINCE = statement_registry.register(
+    "reports.sucursal_users_registered_since",
+    f"SELECT COUNT(*) {_USERS_IN_SUCURSAL} AND u.fecha_registro >= :limit_date",
+)
+_COUNT_INACTIVE_REGISTERED_SINCE = statement_registry.register(
+    "reports.sucursal_users_inactive_since",
+    f"SELECT COUNT(*) {_USERS_IN_SUCURSAL} AND u.activo = FALSE AND u.fecha_registro >= :limit_date",
+)
+_ACTIVO_TOTALS = statement_registry.register(
+    "reports.sucursal_users_activo_totals",
+    f"SELECT u.activo, COUNT(*) AS total {_USERS_IN_SUCURSAL} GROUP BY u.activo",
+)
+_NUEVOS_12M = statement_registry.register(
+    "reports.sucursal_users_new_12m",
+    f"""
+    SELECT TO_CHAR(u.fecha_registro, 'YYYY-MM') AS mes, COUNT(*) AS total
+    {_USERS_IN_SUCURSAL}
+      AND u.fecha_registro >= DATE_TRUNC('month', CURRENT_DATE - INTERVAL '11 months')
+    GROUP BY mes
+    ORDER BY mes
+    """,
+)
+
 
 class ReportsService(BaseService):
     """Service for reporting, KPIs, and data exports."""
@@ -37,28 +119,9 @@ class ReportsService(BaseService):
     def _user_access_clause_sql(
         self, *, user_alias: str = "u", tipo_cuota_alias: str = "tc"
     ) -> str:
-        ua = str(user_alias or "u").strip()
-        tc = str(tipo_cuota_alias or "tc").strip()
-        return f"""
-            COALESCE((
-                SELECT uas.allow
-                FROM usuario_accesos_sucursales uas
-                WHERE uas.usuario_id = {ua}.id
-                  AND uas.sucursal_id = :sid
-                  AND (uas.starts_at IS NULL OR uas.starts_at <= NOW())
-                  AND (uas.ends_at IS NULL OR uas.ends_at >= NOW())
-                ORDER BY uas.id DESC
-                LIMIT 1
-            ), (
-                COALESCE({tc}.all_sucursales, FALSE)
-                OR EXISTS (
-                    SELECT 1
-                    FROM tipo_cuota_sucursales tcs
-                    WHERE tcs.tipo_cuota_id = {tc}.id
-                      AND tcs.sucursal_id = :sid
-                )
-            )) = TRUE
-        """
+        return _user_access_clause(
+            str(user_alias or "u").strip(), str(tipo_cuota_alias or "tc").strip()
+        )
 
     # ========== KPIs ==========
 
@@ -82,34 +145,15 @@ class ReportsService(BaseService):
                     or 0
                 )
             else:
-                access = self._user_access_clause_sql(user_alias="u", tipo_cuota_alias="tc")
                 activos = (
-                    self.db.execute(
-                        text(
-                            f"""
-                            SELECT COUNT(*)
-                            FROM usuarios u
-                            LEFT JOIN tipos_cuota tc ON LOWER(tc.nombre) = LOWER(u.tipo_cuota)
-                            WHERE u.activo = TRUE
-                              AND {access}
-                            """
-                        ),
-                        {"sid": int(sid)},
+                    statement_registry.execute(
+                        self.db, _COUNT_BY_ACTIVO, {"sid": int(sid), "activo": True}
                     ).scalar()
                     or 0
                 )
                 inactivos = (
-                    self.db.execute(
-                        text(
-                            f"""
-                            SELECT COUNT(*)
-                            FROM usuarios u
-                            LEFT JOIN tipos_cuota tc ON LOWER(tc.nombre) = LOWER(u.tipo_cuota)
-                            WHERE u.activo = FALSE
-                              AND {access}
-                            """
-                        ),
-                        {"sid": int(sid)},
+                    statement_registry.execute(
+                        self.db, _COUNT_BY_ACTIVO, {"sid": int(sid), "activo": False}
                     ).scalar()
                     or 0
                 )
@@ -144,18 +188,10 @@ class ReportsService(BaseService):
                     or 0
                 )
             else:
-                access = self._user_access_clause_sql(user_alias="u", tipo_cuota_alias="tc")
                 nuevos = (
-                    self.db.execute(
-                        text(
-                            f"""
-                            SELECT COUNT(*)
-                            FROM usuarios u
-                            LEFT JOIN tipos_cuota tc ON LOWER(tc.nombre) = LOWER(u.tipo_cuota)
-                            WHERE u.fecha_registro >= :limit_date
-                              AND {access}
-                            """
-                        ),
+                    statement_registry.execute(
+                        self.db,
+                        _COUNT_REGISTERED_SINCE,
                         {"sid": int(sid), "limit_date": limit_date},
                     ).scalar()
                     or 0
@@ -201,35 +237,17 @@ class ReportsService(BaseService):
                     or 1
                 )
             else:
-                access = self._user_access_clause_sql(user_alias="u", tipo_cuota_alias="tc")
                 churned = (
-                    self.db.execute(
-                        text(
-                            f"""
-                            SELECT COUNT(*)
-                            FROM usuarios u
-                            LEFT JOIN tipos_cuota tc ON LOWER(tc.nombre) = LOWER(u.tipo_cuota)
-                            WHERE u.activo = FALSE
-                              AND u.fecha_registro >= :limit_date
-                              AND {access}
-                            """
-                        ),
+                    statement_registry.execute(
+                        self.db,
+                        _COUNT_INACTIVE_REGISTERED_SINCE,
                         {"sid": int(sid), "limit_date": limit_date},
                     ).scalar()
                     or 0
                 )
                 total_active = (
-                    self.db.execute(
-                        text(
-                            f"""
-                            SELECT COUNT(*)
-                            FROM usuarios u
-                            LEFT JOIN tipos_cuota tc ON LOWER(tc.nombre) = LOWER(u.tipo_cuota)
-                            WHERE u.activo = TRUE
-                              AND {access}
-                            """
-                        ),
-                        {"sid": int(sid)},
+                    statement_registry.execute(
+                        self.db, _COUNT_BY_ACTIVO, {"sid": int(sid), "activo": True}
                     ).scalar()
                     or 1
                 )
@@ -264,22 +282,9 @@ class ReportsService(BaseService):
                     .all()
                 )
             else:
-                access = self._user_access_clause_sql(user_alias="u", tipo_cuota_alias="tc")
-                result = (
-                    self.db.execute(
-                        text(
-                            f"""
-                            SELECT u.activo, COUNT(*) AS total
-                            FROM usuarios u
-                            LEFT JOIN tipos_cuota tc ON LOWER(tc.nombre) = LOWER(u.tipo_cuota)
-                            WHERE {access}
-                            GROUP BY u.activo
-                            """
-                        ),
-                        {"sid": int(sid)},
-                    )
-                    .all()
-                )
+                result = statement_registry.execute(
+                    self.db, _ACTIVO_TOTALS, {"sid": int(sid)}
+                ).all()
             counts = {"activos": 0, "inactivos": 0}
             for status, count in result:
                 if status:
@@ -341,22 +346,8 @@ class ReportsService(BaseService):
                 )
                 return [{"mes": r.mes, "total": int(r.total or 0)} for r in result]
 
-            access = self._user_access_clause_sql(user_alias="u", tipo_cuota_alias="tc")
             rows = (
-                self.db.execute(
-                    text(
-                        f"""
-                        SELECT TO_CHAR(u.fecha_registro, 'YYYY-MM') AS mes, COUNT(*) AS total
-                        FROM usuarios u
-                        LEFT JOIN tipos_cuota tc ON LOWER(tc.nombre) = LOWER(u.tipo_cuota)
-                        WHERE u.fecha_registro >= DATE_TRUNC('month', CURRENT_DATE - INTERVAL '11 months')
-                          AND {access}
-                        GROUP BY mes
-                        ORDER BY mes
-                        """
-                    ),
-                    {"sid": int(sid)},
-                )
+                statement_registry.execute(self.db, _NUEVOS_12M, {"sid": int(sid)})
                 .mappings()
                 .all()
             )
@@ -778,44 +769,83 @@ class ReportsService(BaseService):
     ) -> List[Dict[str, Any]]:
         """Export payments for CSV."""
         try:
-            q = (
-                self.db.query(
-                    Pago,
-                    Usuario.nombre.label("usuario_nombre"),
-                    MetodoPago.nombre.label("metodo_nombre"),
-                )
-                .outerjoin(Usuario, Pago.usuario_id == Usuario.id)
-                .outerjoin(MetodoPago, Pago.metodo_pago_id == MetodoPago.id)
-            )
-
-            if desde:
-                q = q.filter(Pago.fecha_pago >= desde)
-            if hasta:
-                q = q.filter(Pago.fecha_pago <= hasta)
-
-            items = q.order_by(desc(Pago.fecha_pago)).all()
-
-            return [
-                {
-                    "id": r.Pago.id,
-                    "usuario_id": r.Pago.usuario_id,
-                    "usuario_nombre": r.usuario_nombre,
-                    "monto": float(r.Pago.monto),
-                    "fecha": r.Pago.fecha_pago.isoformat()
-                    if r.Pago.fecha_pago
-                    else None,
-                    "metodo_id": r.Pago.metodo_pago_id,
-                    "metodo_nombre": r.metodo_nombre
-                    or r.Pago.metodo_pago,  # Fallback to string
-                    "notas": "",  # Notes not in Pago model shown?
-                    "created_at": "",
-                }
-                for r in items
-            ]
+            return list(self.iter_exportar_pagos(desde, hasta))
         except Exception as e:
             logger.error(f"Error exporting payments: {e}")
             return []
 
+    def iter_exportar_pagos(
+        self, desde: Optional[str] = None, hasta: Optional[str] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Payments newest first: hot rows, then archived months (cold_archive)."""
+        q = (
+            self.db.query(
+                Pago,
+                Usuario.nombre.label("usuario_nombre"),
+                MetodoPago.nombre.label("metodo_nombre"),
+            )
+            .outerjoin(Usuario, Pago.usuario_id == Usuario.id)
+            .outerjoin(MetodoPago, Pago.metodo_pago_id == MetodoPago.id)
+        )
+
+        if desde:
+            q = q.filter(Pago.fecha_pago >= desde)
+        if hasta:
+            q = q.filter(Pago.fecha_pago <= hasta)
+
+        for r in q.order_by(desc(Pago.fecha_pago)).yield_per(_EXPORT_BATCH):
+            yield self._pago_export_row(
+                r.Pago.id,
+                r.Pago.usuario_id,
+                r.usuario_nombre,
+                r.Pago.monto,
+                r.Pago.fecha_pago,
+                r.Pago.metodo_pago_id,
+                r.metodo_nombre or r.Pago.metodo_pago,  # Fallback to string
+            )
+
+        d, h = _parse_date(desde), _parse_date(hasta)
+        lo = datetime.combine(d, datetime.min.time()) if d else None
+        hi = datetime.combine(h, datetime.min.time()) if h else None
+        metodos: Optional[Dict[int, str]] = None
+        for batch in cold_archive.iter_archived_batches(
+            self.db,
+            "pagos",
+            d,
+            h,
+            where=lambda r: _within(r.get("fecha_pago"), lo, hi),
+            order_by="fecha_pago",
+        ):
+            if metodos is None:
+                metodos = {m.id: m.nombre for m in self.db.query(MetodoPago.id, MetodoPago.nombre)}
+            nombres = self._nombres_usuarios(r.get("usuario_id") for r in batch)
+            for r in batch:
+                yield self._pago_export_row(
+                    r.get("id"),
+                    r.get("usuario_id"),
+                    nombres.get(r.get("usuario_id")),
+                    r.get("monto"),
+                    r.get("fecha_pago"),
+                    r.get("metodo_pago_id"),
+                    metodos.get(r.get("metodo_pago_id")) or r.get("metodo_pago"),
+                )
+
+    @staticmethod
+    def _pago_export_row(
+        pago_id, usuario_id, usuario_nombre, monto, fecha_pago, metodo_id, metodo_nombre
+    ) -> Dict[str, Any]:
+        return {
+            "id": pago_id,
+            "usuario_id": usuario_id,
+            "usuario_nombre": usuario_nombre,
+            "monto": float(monto) if monto is not None else 0.0,
+            "fecha": fecha_pago.isoformat() if fecha_pago else None,
+            "metodo_id": metodo_id,
+            "metodo_nombre": metodo_nombre,
+            "notas": "",  # Notes not in Pago model shown?
+            "created_at": "",
+        }
+
     def exportar_asistencias(
         self,
         desde: Optional[str] = None,
@@ -824,35 +854,76 @@ class ReportsService(BaseService):
     ) -> List[Dict[str, Any]]:
         """Export attendance for CSV."""
         try:
-            sid = self._effective_sucursal_id(sucursal_id)
-            q = self.db.query(
-                Asistencia, Usuario.nombre.label("usuario_nombre")
-            ).outerjoin(Usuario, Asistencia.usuario_id == Usuario.id)
-            if sid is not None:
-                q = q.filter(Asistencia.sucursal_id == sid)
-
-            if desde:
-                q = q.filter(func.date(Asistencia.hora_registro) >= desde)
-            if hasta:
-                q = q.filter(func.date(Asistencia.hora_registro) <= hasta)
-
-            items = q.order_by(desc(Asistencia.hora_registro)).all()
-
-            return [
-                {
-                    "id": r.Asistencia.id,
-                    "usuario_id": r.Asistencia.usuario_id,
-                    "usuario_nombre": r.usuario_nombre,
-                    "created_at": r.Asistencia.hora_registro.isoformat()
-                    if r.Asistencia.hora_registro
-                    else None,
-                }
-                for r in items
-            ]
+            return list(self.iter_exportar_asistencias(desde, hasta, sucursal_id))
         except Exception as e:
             logger.error(f"Error exporting attendance: {e}")
             return []
 
+    def iter_exportar_asistencias(
+        self,
+        desde: Optional[str] = None,
+        hasta: Optional[str] = None,
+        sucursal_id: Optional[int] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Attendance newest first: hot rows, then archived months (cold_archive)."""
+        sid = self._effective_sucursal_id(sucursal_id)
+        q = self.db.query(
+            Asistencia, Usuario.nombre.label("usuario_nombre")
+        ).outerjoin(Usuario, Asistencia.usuario_id == Usuario.id)
+        if sid is not None:
+            q = q.filter(Asistencia.sucursal_id == sid)
+
+        if desde:
+            q = q.filter(func.date(Asistencia.hora_registro) >= desde)
+        if hasta:
+            q = q.filter(func.date(Asistencia.hora_registro) <= hasta)
+
+        for r in q.order_by(desc(Asistencia.hora_registro)).yield_per(_EXPORT_BATCH):
+            yield self._asistencia_export_row(
+                r.Asistencia.id,
+                r.Asistencia.usuario_id,
+                r.usuario_nombre,
+                r.Asistencia.hora_registro,
+            )
+
+        d, h = _parse_date(desde), _parse_date(hasta)
+
+        def keep(r: Dict[str, Any]) -> bool:
+            if sid is not None and r.get("sucursal_id") != sid:
+                return False
+            hr = r.get("hora_registro")
+            return _within(hr.date() if hr else None, d, h)
+
+        for batch in cold_archive.iter_archived_batches(
+            self.db, "asistencias", d, h, where=keep, order_by="hora_registro"
+        ):
+            nombres = self._nombres_usuarios(r.get("usuario_id") for r in batch)
+            for r in batch:
+                yield self._asistencia_export_row(
+                    r.get("id"),
+                    r.get("usuario_id"),
+                    nombres.get(r.get("usuario_id")),
+                    r.get("hora_registro"),
+                )
+
+    @staticmethod
+    def _asistencia_export_row(asistencia_id, usuario_id, usuario_nombre, hora_registro) -> Dict[str, Any]:
+        return {
+            "id": asistencia_id,
+            "usuario_id": usuario_id,
+            "usuario_nombre": usuario_nombre,
+            "created_at": hora_registro.isoformat() if hora_registro else None,
+        }
+
+    def _nombres_usuarios(self, ids) -> Dict[int, str]:
+        wanted = sorted({int(i) for i in ids if i is not None})
+        if not wanted:
+            return {}
+        return {
+            u.id: u.nombre
+            for u in self.db.query(Usuario.id, Usuario.nombre).filter(Usuario.id.in_(wanted))
+        }
+
     def obtener_auditoria_asistencias(
         self,
         *,
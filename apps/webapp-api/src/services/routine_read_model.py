@@ -0,0 +1,348 @@
+"""
+Routine Read Model
+
+Denormalized JSON document per routine (rutina_read_models table) so member
+views and PDF exports load a routine with one indexed lookup instead of
+re-querying exercises, sucursal/user names and regrouping days on every read.
+
+The document holds what only changes through TrainingService writes
+(routine fields, exercises grouped by day, resolved video URLs). Names that
+can change elsewhere (member, creator, sucursal) and the `activa` flag are
+joined live in the same lookup, so renames never leave stale documents.
+
+Documents are rebuilt on crear_rutina / actualizar_rutina /
+asignar_ejercicios_rutina, dropped when an exercise they reference changes,
+and rebuilt lazily on a miss or when READ_MODEL_VERSION changes.
+"""
+
+import json
+import logging
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.database import schema_capabilities
+from src.services.b2_storage import get_file_url
+
+logger = logging.getLogger(__name__)
+
+READ_MODEL_VERSION = 1
+
+_LOOKUP_SQL = """
+    SELECT r.id, m.version, m.documento, r.activa, r.usuario_id, r.sucursal_id,
+           r.creada_por_usuario_id, u.nombre AS usuario_nombre,
+           c.nombre AS creada_por_nombre, s.nombre AS sucursal_nombre
+    FROM rutinas r
+    LEFT JOIN rutina_read_models m ON m.rutina_id = r.id
+    LEFT JOIN usuarios u ON u.id = r.usuario_id
+    LEFT JOIN usuarios c ON c.id = r.creada_por_usuario_id
+    LEFT JOIN sucursales s ON s.id = r.sucursal_id
+"""
+
+
+def _iso(value: Any) -> Optional[str]:
+    try:
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+    except Exception:
+        pass
+    return None
+
+
+def _is_missing_table(e: Exception) -> bool:
+    msg = str(e).lower()
+    return "rutina_read_models" in msg and (
+        "does not exist" in msg or "undefinedtable" in msg
+    )
+
+
+def _log_missing_table(db: Session) -> None:
+    schema_capabilities.mark_missing(db, "rutina_read_models")
+
+
+def _available(db: Session) -> bool:
+    return schema_capabilities.has(db, "rutina_read_models")
+
+
+def build_days(dias_semana_val: Any, ejercicios_flat: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Group flat exercise rows into day buckets (same shape the API always returned)."""
+    try:
+        dcount = int(dias_semana_val or 1)
+    except Exception:
+        dcount = 1
+    dcount = max(1, min(dcount, 7))
+    dias_list: List[Dict[str, Any]] = [
+        {"numero": d, "nombre": f"Día {d}", "ejercicios": []}
+        for d in range(1, dcount + 1)
+    ]
+    by_num = {int(d["numero"]): d for d in dias_list}
+    for ex in ejercicios_flat or []:
+        try:
+            dnum = int(ex.get("dia_semana") or ex.get("dia") or 1)
+        except Exception:
+            dnum = 1
+        dnum = max(1, min(dnum, dcount))
+        day_obj = by_num.get(dnum)
+        if not day_obj:
+            continue
+        day_obj["ejercicios"].append(
+            {
+                "id": ex.get("id"),
+                "ejercicio_id": ex.get("ejercicio_id"),
+                "ejercicio_nombre": ex.get("ejercicio_nombre")
+                or ex.get("nombre_ejercicio")
+                or ex.get("nombre"),
+                "series": ex.get("series"),
+                "repeticiones": ex.get("repeticiones"),
+                "descanso": ex.get("descanso"),
+                "notas": ex.get("notas"),
+                "orden": ex.get("orden"),
+                "dia": dnum,
+                "video_url": ex.get("video_url"),
+            }
+        )
+    return dias_list
+
+
+def build_document(db: Session, rutina_id: int) -> Optional[Dict[str, Any]]:
+    """Build the stored document for one routine with two queries."""
+    row = (
+        db.execute(
+            text(
+                """
+                SELECT id, nombre_rutina, descripcion, usuario_id, categoria,
+                       dias_semana, semanas, uuid_rutina, plantilla_id,
+                       fecha_creacion
+                FROM rutinas
+                WHERE id = :rid
+                """
+            ),
+            {"rid": int(rutina_id)},
+        )
+        .mappings()
+        .first()
+    )
+    if not row:
+        return None
+
+    ex_rows = (
+        db.execute(
+            text(
+                """
+                SELECT re.id, re.ejercicio_id, re.dia_semana, re.series,
+                       re.repeticiones, re.orden,
+                       e.nombre, e.grupo_muscular, e.video_url
+                FROM rutina_ejercicios re
+                LEFT JOIN ejercicios e ON e.id = re.ejercicio_id
+                WHERE re.rutina_id = :rid
+                ORDER BY re.dia_semana, re.orden
+                """
+            ),
+            {"rid": int(rutina_id)},
+        )
+        .mappings()
+        .all()
+    )
+
+    ejercicios_out: List[Dict[str, Any]] = []
+    for ex in ex_rows:
+        video_url = ex.get("video_url")
+        try:
+            if video_url:
+                video_url = get_file_url(video_url)
+        except Exception:
+            pass
+        nombre = ex.get("nombre")
+        ejercicios_out.append(
+            {
+                "id": ex.get("id"),
+                "ejercicio_id": ex.get("ejercicio_id"),
+                "nombre": nombre,
+                "nombre_ejercicio": nombre,
+                "ejercicio_nombre": nombre,
+                "grupo_muscular": ex.get("grupo_muscular"),
+                "series": ex.get("series"),
+                "repeticiones": ex.get("repeticiones"),
+                "dia_semana": ex.get("dia_semana"),
+                "orden": ex.get("orden"),
+                "video_url": video_url,
+            }
+        )
+
+    return {
+        "id": row["id"],
+        "nombre_rutina": row["nombre_rutina"],
+        "nombre": row["nombre_rutina"],
+        "descripcion": row["descripcion"],
+        "categoria": row["categoria"],
+        "dias_semana": row["dias_semana"],
+        "semanas": row["semanas"],
+        "uuid_rutina": row["uuid_rutina"],
+        "plantilla_id": row["plantilla_id"],
+        "fecha_creacion": _iso(row["fecha_creacion"]),
+        "ejercicios": ejercicios_out,
+        "dias": build_days(row["dias_semana"], ejercicios_out),
+    }
+
+
+def _store(db: Session, rutina_id: int, doc: Dict[str, Any]) -> None:
+    db.execute(
+        text(
+            """
+            INSERT INTO rutina_read_models (rutina_id, version, documento, actualizado_en)
+            VALUES (:rid, :v, CAST(:doc AS JSONB), NOW())
+            ON CONFLICT (rutina_id) DO UPDATE
+            SET version = EXCLUDED.version,
+                documento = EXCLUDED.documento,
+                actualizado_en = EXCLUDED.actualizado_en
+            """
+        ),
+        {
+            "rid": int(rutina_id),
+            "v": READ_MODEL_VERSION,
+            "doc": json.dumps(doc, ensure_ascii=False, default=str),
+        },
+    )
+
+
+def refresh(db: Session, rutina_id: int, commit: bool = True) -> Optional[Dict[str, Any]]:
+    """Rebuild and persist the document; best-effort, never raises."""
+    if not _available(db):
+        return None
+    try:
+        doc = build_document(db, rutina_id)
+        if doc is None:
+            return None
+        if commit:
+            # Keep a failed upsert from poisoning the caller's transaction
+            with db.begin_nested():
+                _store(db, rutina_id, doc)
+            db.commit()
+        else:
+            with db.begin_nested():
+                _store(db, rutina_id, doc)
+        return doc
+    except Exception as e:
+        if _is_missing_table(e):
+            _log_missing_table(db)
+        else:
+            logger.warning(f"Routine read model refresh failed for {rutina_id}: {e}")
+        if commit:
+            try:
+                db.rollback()
+            except Exception:
+                pass
+        return None
+
+
+def discard_for_exercise(db: Session, ejercicio_id: int, commit: bool = True) -> None:
+    """Drop documents of routines that embed an exercise (rebuilt on next read)."""
+    if not _available(db):
+        return
+    try:
+        with db.begin_nested():
+            db.execute(
+                text(
+                    """
+                    DELETE FROM rutina_read_models
+                    WHERE rutina_id IN (
+                        SELECT rutina_id FROM rutina_ejercicios WHERE ejercicio_id = :eid
+                    )
+                    """
+                ),
+                {"eid": int(ejercicio_id)},
+            )
+        if commit:
+            db.commit()
+    except Exception as e:
+        if _is_missing_table(e):
+            _log_missing_table(db)
+        else:
+            logger.warning(f"Routine read model discard failed for ejercicio {ejercicio_id}: {e}")
+        if commit:
+            try:
+                db.rollback()
+            except Exception:
+                pass
+
+
+def _overlay(doc: Dict[str, Any], row: Any) -> Dict[str, Any]:
+    out = dict(doc)
+    usuario_id = row["usuario_id"]
+    sucursal_id = row["sucursal_id"]
+    creada_por = row["creada_por_usuario_id"]
+    out["usuario_id"] = usuario_id
+    out["usuario_nombre"] = row["usuario_nombre"] if usuario_id else None
+    out["es_plantilla"] = usuario_id is None
+    out["activa"] = row["activa"]
+    out["sucursal_id"] = int(sucursal_id) if sucursal_id is not None else None
+    out["sucursal_nombre"] = (
+        str(row["sucursal_nombre"]) if row["sucursal_nombre"] else None
+    )
+    out["creada_por_usuario_id"] = int(creada_por) if creada_por is not None else None
+    out["creada_por_nombre"] = (
+        str(row["creada_por_nombre"]) if row["creada_por_nombre"] else None
+    )
+    return out
+
+
+def _load(db: Session, where: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if not _available(db):
+        return None
+    try:
+        row = (
+            db.execute(text(f"{_LOOKUP_SQL} WHERE {where} LIMIT 1"), params)
+            .mappings()
+            .first()
+        )
+    except Exception as e:
+        if _is_missing_table(e):
+            _log_missing_table(db)
+        else:
+            logger.warning(f"Routine read model lookup failed: {e}")
+        try:
+            # Read path: nothing pending, just clear the aborted transaction
+            db.rollback()
+        except Exception:
+            pass
+        return None
+    if not row:
+        return {}
+    doc = row["documento"]
+    if isinstance(doc, str):
+        try:
+            doc = json.loads(doc)
+        except Exception:
+            doc = None
+    if not isinstance(doc, dict) or int(row["version"] or 0) != READ_MODEL_VERSION:
+        doc = refresh(db, int(row["id"]))
+        if doc is None:
+            return None
+    return _overlay(doc, row)
+
+
+def load_by_id(db: Session, rutina_id: int) -> Optional[Dict[str, Any]]:
+    """Routine detail from the read model.
+
+    Returns {} when the routine does not exist and None when the read model
+    is unavailable (callers fall back to the ORM path).
+    """
+    return _load(db, "r.id = :rid", {"rid": int(rutina_id)})
+
+
+def load_by_uuid(db: Session, uuid_str: str) -> Optional[Dict[str, Any]]:
+    """Same as load_by_id, keyed by rutinas.uuid_rutina."""
+    return _load(db, "r.uuid_rutina = :u", {"u": str(uuid_str)})
+
+
+__all__ = [
+    "READ_MODEL_VERSION",
+    "build_days",
+    "build_document",
+    "discard_for_exercise",
+    "load_by_id",
+    "load_by_uuid",
+    "refresh",
+]
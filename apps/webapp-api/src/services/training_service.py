@@ -12,7 +12,9 @@ from sqlalchemy import select, or_, func
 from sqlalchemy.orm import Session, joinedload
 
 from src.services.base import BaseService
-from src.services.b2_storage import delete_file, extract_file_key, get_file_url
+from src.services.b2_storage import delete_file_background, extract_file_key, get_file_url
+from src.services.pdf_artifact_cache import invalidate_artifacts
+from src.services import routine_read_model
 from src.database.orm_models import Ejercicio, Rutina, RutinaEjercicio, Usuario, Sucursal
 
 logger = logging.getLogger(__name__)
@@ -287,6 +289,7 @@ class TrainingService(BaseService):
                     ejercicio.sucursal_id = data.get("sucursal_id")
 
             self.db.commit()
+            routine_read_model.discard_for_exercise(self.db, ejercicio_id)
 
             # Best-effort cleanup of old video if it was replaced/removed
             try:
@@ -295,7 +298,7 @@ class TrainingService(BaseService):
                     if old_video_url and old_video_url != new_video_url:
                         old_key = extract_file_key(old_video_url)
                         if old_key:
-                            delete_file(old_key)
+                            delete_file_background(old_key)
             except Exception:
                 pass
 
@@ -324,6 +327,8 @@ class TrainingService(BaseService):
                     except Exception:
                         pass
 
+            routine_read_model.discard_for_exercise(self.db, ejercicio_id, commit=False)
+
             # Defensive cleanup of references (in case DB FKs are not configured with ON DELETE CASCADE)
             try:
                 self.db.query(RutinaEjercicio).filter(
@@ -358,7 +363,7 @@ class TrainingService(BaseService):
                 if old_video_url:
                     old_key = extract_file_key(old_video_url)
                     if old_key:
-                        delete_file(old_key)
+                        delete_file_background(old_key)
             except Exception:
                 pass
 
@@ -749,6 +754,7 @@ class TrainingService(BaseService):
 
             self.db.add(rutina)
             self.db.commit()
+            routine_read_model.refresh(self.db, rutina.id)
             return rutina.id
         except Exception as e:
             logger.error(f"Error creating rutina: {e}")
@@ -759,8 +765,30 @@ class TrainingService(BaseService):
         """Get full details of a routine including exercises (Alias for obtener_rutina_detalle)."""
         return self.obtener_rutina_detalle(rutina_id)
 
+    @staticmethod
+    def _rutina_visible_en_sucursal(own_sid: Any, sucursal_id: Optional[int]) -> bool:
+        if sucursal_id is None or own_sid is None:
+            return True
+        try:
+            sid = int(sucursal_id)
+        except Exception:
+            return True
+        if sid <= 0:
+            return True
+        try:
+            return int(own_sid) == sid
+        except Exception:
+            return True
+
     def obtener_rutina_detalle(self, rutina_id: int, sucursal_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
         """Get full details of a routine including exercises."""
+        doc = routine_read_model.load_by_id(self.db, rutina_id)
+        if doc is not None:
+            if not doc or not self._rutina_visible_en_sucursal(
+                doc.get("sucursal_id"), sucursal_id
+            ):
+                return None
+            return doc
         try:
             rutina = self.db.get(Rutina, rutina_id)
             if not rutina:
@@ -784,6 +812,13 @@ class TrainingService(BaseService):
 
     def obtener_rutina_por_uuid(self, uuid_str: str, sucursal_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
         """Get full details of a routine by UUID."""
+        doc = routine_read_model.load_by_uuid(self.db, uuid_str)
+        if doc is not None:
+            if not doc or not self._rutina_visible_en_sucursal(
+                doc.get("sucursal_id"), sucursal_id
+            ):
+                return None
+            return doc
         try:
             stmt = select(Rutina).where(Rutina.uuid_rutina == uuid_str)
             stmt = self._scope_by_sucursal(stmt, Rutina, sucursal_id)
@@ -838,46 +873,6 @@ class TrainingService(BaseService):
                 }
             )
 
-        def _build_days_detail(
-            dias_semana_val: Any, ejercicios_flat: List[Dict[str, Any]]
-        ) -> List[Dict[str, Any]]:
-            try:
-                dcount = int(dias_semana_val or 1)
-            except Exception:
-                dcount = 1
-            dcount = max(1, min(dcount, 7))
-            dias_list: List[Dict[str, Any]] = [
-                {"numero": d, "nombre": f"Día {d}", "ejercicios": []}
-                for d in range(1, dcount + 1)
-            ]
-            by_num = {int(d["numero"]): d for d in dias_list}
-            for ex in ejercicios_flat or []:
-                try:
-                    dnum = int(ex.get("dia_semana") or ex.get("dia") or 1)
-                except Exception:
-                    dnum = 1
-                dnum = max(1, min(dnum, dcount))
-                day_obj = by_num.get(dnum)
-                if not day_obj:
-                    continue
-                day_obj["ejercicios"].append(
-                    {
-                        "id": ex.get("id"),
-                        "ejercicio_id": ex.get("ejercicio_id"),
-                        "ejercicio_nombre": ex.get("ejercicio_nombre")
-                        or ex.get("nombre_ejercicio")
-                        or ex.get("nombre"),
-                        "series": ex.get("series"),
-                        "repeticiones": ex.get("repeticiones"),
-                        "descanso": ex.get("descanso"),
-                        "notas": ex.get("notas"),
-                        "orden": ex.get("orden"),
-                        "dia": dnum,
-                        "video_url": ex.get("video_url"),
-                    }
-                )
-            return dias_list
-
         try:
             fc = getattr(rutina, "fecha_creacion", None)
             fecha_creacion = fc.isoformat() if fc is not None else None
@@ -936,7 +931,7 @@ class TrainingService(BaseService):
             else None,
             "creada_por_nombre": str(creada_por_nombre) if creada_por_nombre else None,
             "ejercicios": ejercicios_out,
-            "dias": _build_days_detail(
+            "dias": routine_read_model.build_days(
                 getattr(rutina, "dias_semana", None), ejercicios_out
             ),
         }
@@ -1000,6 +995,8 @@ class TrainingService(BaseService):
                     return False
 
             self.db.commit()
+            invalidate_artifacts("rutina", rutina_id)
+            routine_read_model.refresh(self.db, rutina_id)
             return True
         except Exception as e:
             logger.error(f"Error updating rutina {rutina_id}: {e}")
@@ -1033,6 +1030,7 @@ class TrainingService(BaseService):
                 pass
             self.db.delete(rutina)
             self.db.commit()
+            invalidate_artifacts("rutina", rutina_id)
             return True
         except Exception as e:
             logger.error(f"Error deleting rutina {rutina_id}: {e}")
@@ -1144,6 +1142,8 @@ class TrainingService(BaseService):
 
             if commit:
                 self.db.commit()
+                invalidate_artifacts("rutina", rutina_id)
+                routine_read_model.refresh(self.db, rutina_id)
             else:
                 self.db.flush()
             return True
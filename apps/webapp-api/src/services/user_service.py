@@ -213,7 +213,7 @@ class UserService(BaseService):
     def create_user(self, data: Dict[str, Any], is_owner: bool = False) -> int:
         # Validation logic moved from router
         dni = data.get("dni")
-        if self.user_repo.obtener_usuario_por_dni(dni):
+        if dni and self.user_repo.obtener_usuario_por_dni(dni):
             raise ValueError("DNI ya existe")
 
         if self._is_privileged_role(data.get("rol")) and not bool(is_owner):
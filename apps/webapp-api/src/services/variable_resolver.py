@@ -5,9 +5,12 @@ This module provides advanced variable resolution for dynamic templates,
 including calculated variables, user data access, gym data, and custom expressions.
 """
 
+import os
 import re
 import ast
-from typing import Dict, Any, List, Optional, Callable
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Callable, Tuple, Union
 from datetime import datetime, date
 from dataclasses import dataclass
 from enum import Enum
@@ -15,6 +18,8 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+_PLACEHOLDER_RE = re.compile(r'\{\{([^}]+)\}\}')
+
 
 class VariableType(Enum):
     """Variable types for template processing"""
@@ -42,12 +47,105 @@ class VariableContext:
     functions: Optional[Dict[str, Callable]] = None
 
 
+class CompiledCache:
+    """Thread-safe bounded LRU for compiled artifacts, shared across instances"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = max(int(maxsize), 0)
+        self._items: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compile(self, key: Any, factory: Callable[[], Any]) -> Any:
+        """Return the cached value for key, compiling it with factory on a miss"""
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+
+        # Compile outside the lock; a concurrent miss on the same key just
+        # compiles twice and the last writer wins.
+        value = factory()
+        if self.maxsize <= 0:
+            return value
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return value
+
+    def __contains__(self, key: Any) -> bool:
+        with self._lock:
+            return key in self._items
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._items),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+
+# Compiled expressions and tokenized template strings depend only on their
+# source text, so every resolver in the process shares the same caches.
+_EXPRESSION_CACHE = CompiledCache(int(os.environ.get("TEMPLATE_EXPRESSION_CACHE_SIZE", "2048")))
+_TEMPLATE_STRING_CACHE = CompiledCache(int(os.environ.get("TEMPLATE_STRING_CACHE_SIZE", "2048")))
+
+# A compiled template string is a tuple of literal chunks (str) and
+# placeholder references (1-tuples holding the stripped variable path).
+CompiledTemplateString = Tuple[Union[str, Tuple[str]], ...]
+
+
+def compile_template_string(template_str: str) -> CompiledTemplateString:
+    """Split a template string into literal chunks and {{...}} placeholders (cached)"""
+
+    def _tokenize() -> CompiledTemplateString:
+        parts: List[Union[str, Tuple[str]]] = []
+        pos = 0
+        for m in _PLACEHOLDER_RE.finditer(template_str):
+            if m.start() > pos:
+                parts.append(template_str[pos:m.start()])
+            parts.append((m.group(1).strip(),))
+            pos = m.end()
+        if pos < len(template_str):
+            parts.append(template_str[pos:])
+        return tuple(parts)
+
+    return _TEMPLATE_STRING_CACHE.get_or_compile(template_str, _tokenize)
+
+
 class VariableResolver:
     """Advanced variable resolution system"""
     
     def __init__(self):
         self.built_in_functions = self._initialize_built_in_functions()
-        self.expression_cache = {}
+        self.expression_cache = _EXPRESSION_CACHE
+
+    @staticmethod
+    def cache_stats() -> Dict[str, Dict[str, Any]]:
+        """Hit/miss counters for the shared compiled caches"""
+        return {
+            "expressions": _EXPRESSION_CACHE.stats(),
+            "template_strings": _TEMPLATE_STRING_CACHE.stats(),
+        }
     
     def resolve_variables(
         self,
@@ -115,13 +213,12 @@ class VariableResolver:
         if not template_str:
             return ""
         
-        # Find all variable references
-        pattern = r'\{\{([^}]+)\}\}'
-        matches = re.findall(pattern, template_str)
-        
-        result = template_str
-        for match in matches:
-            var_name = match.strip()
+        parts: List[str] = []
+        for token in compile_template_string(template_str):
+            if isinstance(token, str):
+                parts.append(token)
+                continue
+            var_name = token[0]
             
             # Handle nested property access (e.g., "usuario.nombre")
             if "." in var_name:
@@ -134,9 +231,9 @@ class VariableResolver:
                     # Try to resolve as simple variable
                     value = self._resolve_simple_value(var_name, context)
             
-            result = result.replace(f"{{{{{var_name}}}}}", str(value))
+            parts.append(str(value))
         
-        return result
+        return "".join(parts)
     
     def evaluate_expression(
         self,
@@ -144,13 +241,10 @@ class VariableResolver:
         context: VariableContext
     ) -> Any:
         """Evaluate mathematical or logical expression"""
-        # Cache expressions for performance
-        if expression in self.expression_cache:
-            func = self.expression_cache[expression]
-        else:
-            func = self._compile_expression(expression)
-            self.expression_cache[expression] = func
-        
+        # Compiled closures are pure functions of the expression text
+        func = self.expression_cache.get_or_compile(
+            expression, lambda: self._compile_expression(expression)
+        )
         return func(context)
     
     # === Variable Type Resolvers ===
@@ -655,5 +749,7 @@ class VariableResolver:
 __all__ = [
     "VariableResolver",
     "VariableContext",
-    "VariableType"
+    "VariableType",
+    "CompiledCache",
+    "compile_template_string",
 ]
@@ -0,0 +1,771 @@
+"""
+WhatsApp inbound queue
+
+Meta retries webhook deliveries that are not acknowledged quickly, so the
+webhook routes only verify the signature, append the raw payload to
+public.whatsapp_inbound_queue (admin DB) and answer 200. A worker drains the
+queue in batches:
+
+- claims rows with FOR UPDATE SKIP LOCKED and a lease, so several processes
+  (or the cron endpoint) can drain concurrently;
+- resolves phone_number_id -> tenant for the whole batch in one query, with
+  a TTL cache (including negative entries);
+- groups rows per tenant and applies them in one tenant transaction:
+  one bulk status UPDATE, one phone -> user lookup and one multi-row INSERT
+  of incoming messages (ON CONFLICT DO NOTHING, so redeliveries are no-ops);
+- if the group fails for anything but a lost connection, retries it row by
+  row so one malformed delivery does not hold back the rest;
+- marks rows done, or leaves them pending with a backoff until
+  WHATSAPP_INBOUND_MAX_ATTEMPTS is reached.
+
+The worker thread runs in long-lived processes. On serverless runtimes the
+webhook drains a batch in a background task after the response is sent, and
+/internal/cron/whatsapp/inbound (or the webapp-api-whatsapp-inbound CLI)
+picks up anything left behind.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.orm import Session
+
+from src.database import schema_capabilities
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    return str(raw).strip().lower() in ("1", "true", "yes", "on")
+
+
+WHATSAPP_INBOUND_BATCH = max(_env_int("WHATSAPP_INBOUND_BATCH", 100), 1)
+WHATSAPP_INBOUND_LEASE_SECONDS = max(_env_int("WHATSAPP_INBOUND_LEASE_SECONDS", 60), 5)
+WHATSAPP_INBOUND_MAX_ATTEMPTS = max(_env_int("WHATSAPP_INBOUND_MAX_ATTEMPTS", 5), 1)
+WHATSAPP_INBOUND_RETRY_SECONDS = max(_env_int("WHATSAPP_INBOUND_RETRY_SECONDS", 30), 1)
+WHATSAPP_INBOUND_POLL_SECONDS = max(_env_int("WHATSAPP_INBOUND_POLL_SECONDS", 5), 1)
+WHATSAPP_INBOUND_RETENTION_HOURS = max(_env_int("WHATSAPP_INBOUND_RETENTION_HOURS", 72), 1)
+WHATSAPP_INBOUND_TENANT_TTL = max(_env_int("WHATSAPP_INBOUND_TENANT_TTL", 300), 0)
+
+_IS_SERVERLESS = bool(
+    os.getenv("VERCEL") or os.getenv("AWS_LAMBDA_FUNCTION_NAME") or os.getenv("K_SERVICE")
+)
+WHATSAPP_INBOUND_WORKER = _env_bool("WHATSAPP_INBOUND_WORKER", not _IS_SERVERLESS)
+
+# Rows per statement for the bulk UPDATE / INSERT
+_CHUNK = 500
+_CLEANUP_INTERVAL_SECONDS = 3600
+
+
+def _now_utc_naive() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _admin_session() -> Session:
+    from src.database.connection import admin_session_factory
+
+    return admin_session_factory()
+
+
+# === Payload parsing ===
+
+
+def extract_phone_number_id(payload: Dict[str, Any]) -> Optional[str]:
+    try:
+        for entry in (payload or {}).get("entry") or []:
+            for change in (entry or {}).get("changes") or []:
+                value = (change or {}).get("value") or {}
+                pid = (value.get("metadata") or {}).get("phone_number_id")
+                if pid:
+                    return str(pid).strip()
+    except Exception:
+        pass
+    return None
+
+
+def _message_text(msg: Dict[str, Any]) -> str:
+    mtype = msg.get("type")
+    body = None
+    if mtype == "text":
+        body = (msg.get("text") or {}).get("body")
+    elif mtype == "button":
+        body = (msg.get("button") or {}).get("text")
+    elif mtype == "interactive":
+        ir = msg.get("interactive") or {}
+        body = (ir.get("button_reply") or {}).get("title") or (
+            ir.get("list_reply") or {}
+        ).get("title")
+    elif mtype in ("image", "audio", "video", "document"):
+        body = f"[{mtype}]"
+    return str(body or "")
+
+
+def parse_payload(
+    payload: Dict[str, Any],
+) -> Tuple[List[Tuple[str, str]], List[Dict[str, Any]]]:
+    """(message_id, status) updates and incoming messages, in delivery order"""
+    statuses: List[Tuple[str, str]] = []
+    messages: List[Dict[str, Any]] = []
+    for entry in (payload or {}).get("entry") or []:
+        for change in (entry or {}).get("changes") or []:
+            value = (change or {}).get("value") or {}
+            for st in value.get("statuses") or []:
+                mid, stt = (st or {}).get("id"), (st or {}).get("status")
+                if mid and stt:
+                    statuses.append((str(mid), str(stt)))
+            for msg in value.get("messages") or []:
+                msg = msg or {}
+                messages.append(
+                    {
+                        "mid": msg.get("id"),
+                        "phone": msg.get("from"),
+                        "content": _message_text(msg),
+                    }
+                )
+    return statuses, messages
+
+
+def _normalize_phone(phone: Any) -> str:
+    tel = str(phone or "").strip().replace("+", "").replace(" ", "").replace("-", "")
+    return tel[-10:] if len(tel) >= 10 else tel
+
+
+def _chunks(items: List[Any], size: int = _CHUNK) -> Iterable[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+# === Tenant routing ===
+
+
+class _TenantCache:
+    """phone_number_id -> tenant (or None) with a TTL"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[Optional[str], float]] = {}
+
+    def get_many(self, pids: Iterable[str]) -> Tuple[Dict[str, Optional[str]], List[str]]:
+        now = time.monotonic()
+        hits: Dict[str, Optional[str]] = {}
+        misses: List[str] = []
+        with self._lock:
+            for pid in pids:
+                entry = self._entries.get(pid)
+                if entry is not None and now - entry[1] < WHATSAPP_INBOUND_TENANT_TTL:
+                    hits[pid] = entry[0]
+                else:
+                    misses.append(pid)
+        return hits, misses
+
+    def put_many(self, values: Dict[str, Optional[str]]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) > 10000:
+                self._entries.clear()
+            for pid, tenant in values.items():
+                self._entries[pid] = (tenant, now)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_tenant_cache = _TenantCache()
+
+
+def resolve_tenants(phone_number_ids: Iterable[str]) -> Dict[str, Optional[str]]:
+    """Map phone_number_ids to tenant subdomains with one admin DB query"""
+    pids = sorted({str(p).strip() for p in phone_number_ids if str(p or "").strip()})
+    if not pids:
+        return {}
+    found, misses = _tenant_cache.get_many(pids)
+    if not misses:
+        return found
+    fresh: Dict[str, Optional[str]] = {pid: None for pid in misses}
+    ses = _admin_session()
+    try:
+        rows = ses.execute(
+            text(
+                "SELECT whatsapp_phone_id, subdominio FROM gyms WHERE whatsapp_phone_id = ANY(:pids)"
+            ),
+            {"pids": misses},
+        ).fetchall()
+        for pid, sub in rows:
+            if pid and sub:
+                fresh[str(pid).strip()] = str(sub).strip().lower()
+    finally:
+        ses.close()
+    _tenant_cache.put_many(fresh)
+    found.update(fresh)
+    return found
+
+
+# === Queue ===
+
+
+def enqueue(
+    payload: Dict[str, Any],
+    tenant: Optional[str] = None,
+    phone_number_id: Optional[str] = None,
+) -> int:
+    """Persist one webhook delivery; raises if the admin DB is unavailable"""
+    pid = phone_number_id or extract_phone_number_id(payload)
+    ses = _admin_session()
+    try:
+        qid = ses.execute(
+            text(
+                """
+                INSERT INTO public.whatsapp_inbound_queue (tenant, phone_number_id, payload)
+                VALUES (:tenant, :pid, CAST(:payload AS JSONB))
+                RETURNING id
+                """
+            ),
+            {
+                "tenant": (str(tenant).strip().lower() or None) if tenant else None,
+                "pid": pid,
+                "payload": json.dumps(payload, ensure_ascii=False),
+            },
+        ).scalar()
+        ses.commit()
+    except Exception:
+        ses.rollback()
+        raise
+    finally:
+        ses.close()
+    worker = _worker
+    if worker is not None:
+        worker.wake()
+    return int(qid or 0)
+
+
+def claim_batch(limit: int = WHATSAPP_INBOUND_BATCH) -> List[Dict[str, Any]]:
+    ses = _admin_session()
+    try:
+        rows = (
+            ses.execute(
+                text(
+                    """
+                    UPDATE public.whatsapp_inbound_queue q
+                    SET locked_until = NOW() + make_interval(secs => :lease),
+                        attempts = q.attempts + 1
+                    WHERE q.id IN (
+                        SELECT id FROM public.whatsapp_inbound_queue
+                        WHERE status = 'pending'
+                          AND (locked_until IS NULL OR locked_until < NOW())
+                        ORDER BY id
+                        LIMIT :n
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING q.id, q.tenant, q.phone_number_id, q.payload, q.attempts
+                    """
+                ),
+                {"lease": WHATSAPP_INBOUND_LEASE_SECONDS, "n": int(limit)},
+            )
+            .mappings()
+            .all()
+        )
+        ses.commit()
+    except Exception:
+        ses.rollback()
+        raise
+    finally:
+        ses.close()
+    out = []
+    for r in rows:
+        payload = r.get("payload")
+        if isinstance(payload, (str, bytes)):
+            try:
+                payload = json.loads(payload)
+            except Exception:
+                payload = {}
+        out.append(
+            {
+                "id": int(r.get("id")),
+                "tenant": r.get("tenant"),
+                "phone_number_id": r.get("phone_number_id"),
+                "payload": payload if isinstance(payload, dict) else {},
+                "attempts": int(r.get("attempts") or 0),
+            }
+        )
+    out.sort(key=lambda row: row["id"])
+    return out
+
+
+def _finish(done: List[int], ignored: List[int], failed: Dict[str, List[int]]) -> None:
+    if not (done or ignored or failed):
+        return
+    ses = _admin_session()
+    try:
+        if done:
+            ses.execute(
+                text(
+                    """
+                    UPDATE public.whatsapp_inbound_queue
+                    SET status = 'done', processed_at = NOW(), locked_until = NULL, last_error = NULL
+                    WHERE id = ANY(:ids)
+                    """
+                ),
+                {"ids": done},
+            )
+        if ignored:
+            ses.execute(
+                text(
+                    """
+                    UPDATE public.whatsapp_inbound_queue
+                    SET status = 'ignored', processed_at = NOW(), locked_until = NULL, last_error = 'unrouted'
+                    WHERE id = ANY(:ids)
+                    """
+                ),
+                {"ids": ignored},
+            )
+        for err, ids in failed.items():
+            ses.execute(
+                text(
+                    """
+                    UPDATE public.whatsapp_inbound_queue
+                    SET status = CASE WHEN attempts >= :max THEN 'failed' ELSE 'pending' END,
+                        processed_at = CASE WHEN attempts >= :max THEN NOW() ELSE NULL END,
+                        locked_until = NOW() + make_interval(secs => :retry),
+                        last_error = :err
+                    WHERE id = ANY(:ids)
+                    """
+                ),
+                {
+                    "ids": ids,
+                    "max": WHATSAPP_INBOUND_MAX_ATTEMPTS,
+                    "retry": WHATSAPP_INBOUND_RETRY_SECONDS,
+                    "err": err[:1000],
+                },
+            )
+        ses.commit()
+    except Exception:
+        ses.rollback()
+        raise
+    finally:
+        ses.close()
+
+
+def cleanup(retention_hours: int = WHATSAPP_INBOUND_RETENTION_HOURS) -> int:
+    """Delete settled rows older than the retention window"""
+    ses = _admin_session()
+    try:
+        res = ses.execute(
+            text(
+                """
+                DELETE FROM public.whatsapp_inbound_queue
+                WHERE status <> 'pending'
+                  AND processed_at < NOW() - make_interval(hours => :h)
+                """
+            ),
+            {"h": int(retention_hours)},
+        )
+        ses.commit()
+        return int(res.rowcount or 0)
+    except Exception as e:
+        ses.rollback()
+        logger.warning(f"WhatsApp inbound cleanup failed: {e}")
+        return 0
+    finally:
+        ses.close()
+
+
+# === Tenant apply ===
+
+
+def _sucursales_by_phone_id(db: Session, pids: List[str]) -> Dict[str, Optional[int]]:
+    if not pids:
+        return {}
+    try:
+        rows = db.execute(
+            text(
+                """
+                SELECT DISTINCT ON (phone_id) phone_id, sucursal_id
+                FROM whatsapp_config
+                WHERE phone_id = ANY(:pids)
+                ORDER BY phone_id, created_at DESC
+                """
+            ),
+            {"pids": pids},
+        ).fetchall()
+        return {str(pid).strip(): (int(sid) if sid is not None else None) for pid, sid in rows}
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"WhatsApp inbound sucursal lookup failed: {e}")
+        return {}
+
+
+def _apply_statuses(db: Session, statuses: List[Tuple[str, str]]) -> int:
+    # Later deliveries win, as when the webhook applied them one by one
+    latest: Dict[str, str] = {}
+    for mid, stt in statuses:
+        latest.pop(mid, None)
+        latest[mid] = stt
+    items = list(latest.items())
+    updated = 0
+    for chunk in _chunks(items):
+        params: Dict[str, Any] = {}
+        values = []
+        for i, (mid, stt) in enumerate(chunk):
+            params[f"m{i}"] = mid
+            params[f"s{i}"] = stt
+            values.append(f"(:m{i}, :s{i})")
+        res = db.execute(
+            text(
+                f"""
+                UPDATE whatsapp_messages m
+                SET status = v.status
+                FROM (VALUES {", ".join(values)}) AS v(mid, status)
+                WHERE m.message_id = v.mid
+                """
+            ),
+            params,
+        )
+        updated += int(res.rowcount or 0)
+    return updated
+
+
+def _users_by_phone(db: Session, phones: List[str]) -> Dict[str, int]:
+    out: Dict[str, int] = {}
+    for chunk in _chunks(sorted(set(p for p in phones if p))):
+        params = {f"t{i}": tel for i, tel in enumerate(chunk)}
+        values = ", ".join(f"(:t{i})" for i in range(len(chunk)))
+        rows = db.execute(
+            text(
+                f"""
+                SELECT DISTINCT ON (v.tel) v.tel, u.id
+                FROM (VALUES {values}) AS v(tel)
+                JOIN usuarios u
+                  ON REPLACE(REPLACE(REPLACE(u.telefono, '+', ''), ' ', ''), '-', '') LIKE '%' || v.tel
+                ORDER BY v.tel, u.id
+                """
+            ),
+            params,
+        ).fetchall()
+        for tel, uid in rows:
+            out[str(tel)] = int(uid)
+    return out
+
+
+def _insert_messages(db: Session, messages: List[Dict[str, Any]], with_sucursal: bool) -> int:
+    sent_at = _now_utc_naive()
+    cols = "user_id, sucursal_id, " if with_sucursal else "user_id, "
+    inserted = 0
+    for chunk in _chunks(messages):
+        params: Dict[str, Any] = {"sent_at": sent_at}
+        values = []
+        for i, m in enumerate(chunk):
+            params[f"u{i}"] = m.get("user_id")
+            params[f"p{i}"] = m.get("phone")
+            params[f"c{i}"] = m.get("content") or ""
+            params[f"m{i}"] = m.get("mid")
+            sid = ""
+            if with_sucursal:
+                params[f"s{i}"] = m.get("sucursal_id")
+                sid = f"CAST(:s{i} AS INTEGER), "
+            values.append(
+                f"(CAST(:u{i} AS INTEGER), {sid}'welcome', 'incoming', :p{i}, :c{i}, 'received', :m{i}, :sent_at)"
+            )
+        res = db.execute(
+            text(
+                f"""
+                INSERT INTO whatsapp_messages ({cols}message_type, template_name, phone_number, message_content, status, message_id, sent_at)
+                VALUES {", ".join(values)}
+                ON CONFLICT DO NOTHING
+                """
+            ),
+            params,
+        )
+        inserted += int(res.rowcount or 0)
+    return inserted
+
+
+def apply_payloads(db: Session, items: List[Tuple[Optional[str], Dict[str, Any]]]) -> Dict[str, int]:
+    """Apply (phone_number_id, payload) pairs of one tenant; the caller commits"""
+    statuses: List[Tuple[str, str]] = []
+    messages: List[Dict[str, Any]] = []
+    per_item: List[Tuple[Optional[str], List[Dict[str, Any]]]] = []
+    for pid, payload in items:
+        st, msgs = parse_payload(payload)
+        statuses.extend(st)
+        per_item.append((pid, msgs))
+
+    sucursales = _sucursales_by_phone_id(
+        db, sorted({str(pid).strip() for pid, msgs in per_item if pid and msgs})
+    )
+    for pid, msgs in per_item:
+        sid = sucursales.get(str(pid or "").strip())
+        for m in msgs:
+            m["sucursal_id"] = sid
+            m["tel"] = _normalize_phone(m.get("phone"))
+            messages.append(m)
+
+    updated = _apply_statuses(db, statuses) if statuses else 0
+    inserted = 0
+    if messages:
+        users = _users_by_phone(db, [m["tel"] for m in messages])
+        for m in messages:
+            m["user_id"] = users.get(m["tel"]) if m["tel"] else None
+        inserted = _insert_messages(
+            db,
+            messages,
+            schema_capabilities.has(db, "whatsapp_messages_sucursal"),
+        )
+    return {"statuses": updated, "messages": inserted}
+
+
+def process_tenant(tenant: str, items: List[Tuple[Optional[str], Dict[str, Any]]]) -> Dict[str, int]:
+    from src.database.tenant_connection import set_current_tenant, tenant_session_scope
+
+    set_current_tenant(tenant)
+    with tenant_session_scope(tenant) as db:
+        return apply_payloads(db, items)
+
+
+# === Draining ===
+
+
+def _is_unavailable(exc: BaseException) -> bool:
+    """Connection-level failures fail the whole group; anything else is a bad row"""
+    if isinstance(exc, OperationalError):
+        return True
+    if isinstance(exc, DBAPIError) and getattr(exc, "connection_invalidated", False):
+        return True
+    return isinstance(exc, (RuntimeError, ConnectionError, TimeoutError))
+
+
+def _error_key(exc: BaseException) -> str:
+    return str(exc) or exc.__class__.__name__
+
+
+def _process_group(
+    tenant: str,
+    group: List[Dict[str, Any]],
+    done: List[int],
+    failed: Dict[str, List[int]],
+) -> None:
+    """Apply one tenant's rows, isolating bad deliveries row by row"""
+    try:
+        process_tenant(tenant, [(r.get("phone_number_id"), r["payload"]) for r in group])
+        done.extend(r["id"] for r in group)
+        return
+    except Exception as e:
+        if _is_unavailable(e) or len(group) == 1:
+            logger.error(f"WhatsApp inbound processing failed for tenant {tenant}: {e}")
+            failed.setdefault(_error_key(e), []).extend(r["id"] for r in group)
+            return
+        logger.warning(f"WhatsApp inbound batch for tenant {tenant} failed, retrying row by row: {e}")
+    for i, r in enumerate(group):
+        try:
+            process_tenant(tenant, [(r.get("phone_number_id"), r["payload"])])
+            done.append(r["id"])
+        except Exception as e:
+            if _is_unavailable(e):
+                logger.error(f"WhatsApp inbound processing failed for tenant {tenant}: {e}")
+                failed.setdefault(_error_key(e), []).extend(x["id"] for x in group[i:])
+                return
+            logger.error(f"WhatsApp inbound delivery {r['id']} failed for tenant {tenant}: {e}")
+            failed.setdefault(_error_key(e), []).append(r["id"])
+
+
+def process_rows(rows: List[Dict[str, Any]]) -> Dict[str, int]:
+    from src.database.tenant_connection import validate_tenant_name
+
+    stats = {"rows": len(rows), "done": 0, "ignored": 0, "failed": 0, "tenants": 0}
+    if not rows:
+        return stats
+    unresolved = [r["phone_number_id"] for r in rows if not r.get("tenant") and r.get("phone_number_id")]
+    tenants_by_pid: Dict[str, Optional[str]] = {}
+    if unresolved:
+        try:
+            tenants_by_pid = resolve_tenants(unresolved)
+        except Exception as e:
+            logger.warning(f"WhatsApp inbound tenant resolution failed: {e}")
+            _finish([], [], {f"tenant resolution: {e}": [r["id"] for r in rows]})
+            stats["failed"] = len(rows)
+            return stats
+
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    ignored: List[int] = []
+    for r in rows:
+        tenant = r.get("tenant") or tenants_by_pid.get(str(r.get("phone_number_id") or "").strip())
+        ok, _ = validate_tenant_name(str(tenant or ""))
+        if not tenant or not ok:
+            ignored.append(r["id"])
+            continue
+        groups.setdefault(str(tenant), []).append(r)
+    if ignored:
+        logger.warning(f"WhatsApp inbound: {len(ignored)} unrouted deliveries ignored")
+
+    done: List[int] = []
+    failed: Dict[str, List[int]] = {}
+    for tenant, group in groups.items():
+        _process_group(tenant, group, done, failed)
+    _finish(done, ignored, failed)
+    stats.update(
+        done=len(done),
+        ignored=len(ignored),
+        failed=sum(len(v) for v in failed.values()),
+        tenants=len(groups),
+    )
+    return stats
+
+
+_last_cleanup = 0.0
+_cleanup_lock = threading.Lock()
+
+
+def drain(batch: int = WHATSAPP_INBOUND_BATCH, max_batches: int = 0) -> Dict[str, int]:
+    """Process queued deliveries until the queue is empty (or max_batches)"""
+    global _last_cleanup
+    totals = {"batches": 0, "rows": 0, "done": 0, "ignored": 0, "failed": 0, "cleaned": 0}
+    while not max_batches or totals["batches"] < max_batches:
+        rows = claim_batch(batch)
+        if not rows:
+            break
+        stats = process_rows(rows)
+        totals["batches"] += 1
+        for key in ("rows", "done", "ignored", "failed"):
+            totals[key] += stats[key]
+        if len(rows) < batch:
+            break
+    with _cleanup_lock:
+        due = time.monotonic() - _last_cleanup >= _CLEANUP_INTERVAL_SECONDS
+        if due:
+            _last_cleanup = time.monotonic()
+    if due:
+        totals["cleaned"] = cleanup()
+    return totals
+
+
+def queue_stats() -> Dict[str, Any]:
+    ses = _admin_session()
+    try:
+        rows = ses.execute(
+            text(
+                """
+                SELECT status, COUNT(*), MIN(received_at)
+                FROM public.whatsapp_inbound_queue
+                GROUP BY status
+                """
+            )
+        ).fetchall()
+        return {
+            str(st): {"count": int(n or 0), "oldest": (oldest.isoformat() if oldest else None)}
+            for st, n, oldest in rows
+        }
+    finally:
+        ses.close()
+
+
+# === Worker ===
+
+
+class InboundWorker:
+    """Daemon thread that drains the queue; enqueue() wakes it up"""
+
+    def __init__(self, poll_seconds: int = WHATSAPP_INBOUND_POLL_SECONDS) -> None:
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="whatsapp-inbound-worker", daemon=True
+        )
+        self._thread.start()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=timeout)
+        self._thread = None
+
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self) -> None:
+        failures = 0
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                drain()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                if failures == 1 or failures % 60 == 0:
+                    logger.warning(f"WhatsApp inbound worker error: {e}")
+            wait = self.poll_seconds if not failures else min(self.poll_seconds * failures, 60)
+            self._wake.wait(wait)
+
+
+_worker: Optional[InboundWorker] = None
+_worker_lock = threading.Lock()
+
+
+def start_inbound_worker() -> Optional[InboundWorker]:
+    global _worker
+    if not WHATSAPP_INBOUND_WORKER:
+        return None
+    with _worker_lock:
+        if _worker is None:
+            _worker = InboundWorker()
+        _worker.start()
+        return _worker
+
+
+def stop_inbound_worker() -> None:
+    global _worker
+    with _worker_lock:
+        worker, _worker = _worker, None
+    if worker is not None:
+        worker.stop()
+
+
+def inbound_worker_running() -> bool:
+    worker = _worker
+    return worker is not None and worker.running()
+
+
+__all__ = [
+    "InboundWorker",
+    "apply_payloads",
+    "claim_batch",
+    "cleanup",
+    "drain",
+    "enqueue",
+    "extract_phone_number_id",
+    "inbound_worker_running",
+    "parse_payload",
+    "process_rows",
+    "process_tenant",
+    "queue_stats",
+    "resolve_tenants",
+    "start_inbound_worker",
+    "stop_inbound_worker",
+]
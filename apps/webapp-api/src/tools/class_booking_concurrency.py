@@ -0,0 +1,279 @@
+"""
+Concurrency check for ClassBookingService.
+
+Creates a scratch schema on a PostgreSQL database, books the same schedule
+from N parallel clients released at once by a barrier, then cancels part of
+the enrollments concurrently with a waitlist in place. Fails (exit 1) when
+the schedule is overbooked, when inscriptos_count drifts from clase_usuarios
+or when freed spots are not promoted from the waitlist.
+
+    python -m src.tools.class_booking_concurrency --db-url postgresql://... --clients 200 --cupo 20
+
+--legacy runs the same load against the COUNT(*) fallback (no counter
+column) to show the race the counter removes; overbooking is reported but
+not treated as a failure there.
+
+Clients share at most --connections pooled connections (default 50, plus a
+small overflow), so the default load fits a stock max_connections=100 server;
+the rest queue on the pool.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+
+# Extra connections allowed above --connections while the barrier releases
+_MAX_OVERFLOW = 10
+
+
+def _schema_ddl(legacy: bool) -> List[str]:
+    counter = "" if legacy else ", inscriptos_count INTEGER NOT NULL DEFAULT 0"
+    ddl = [
+        "CREATE TABLE usuarios (id SERIAL PRIMARY KEY, nombre TEXT, telefono TEXT)",
+        f"CREATE TABLE clases_horarios (id SERIAL PRIMARY KEY, cupo_maximo INTEGER DEFAULT 20{counter})",
+        """
+        CREATE TABLE clase_usuarios (
+            id SERIAL PRIMARY KEY,
+            clase_horario_id INTEGER NOT NULL REFERENCES clases_horarios(id) ON DELETE CASCADE,
+            usuario_id INTEGER NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+            fecha_inscripcion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (clase_horario_id, usuario_id)
+        )
+        """,
+        """
+        CREATE TABLE clase_lista_espera (
+            id SERIAL PRIMARY KEY,
+            clase_horario_id INTEGER NOT NULL REFERENCES clases_horarios(id) ON DELETE CASCADE,
+            usuario_id INTEGER NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+            posicion INTEGER NOT NULL,
+            activo BOOLEAN DEFAULT TRUE,
+            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (clase_horario_id, usuario_id)
+        )
+        """,
+    ]
+    if not legacy:
+        # Same trigger as alembic 0023_inscriptos_count
+        ddl += [
+            """
+            CREATE FUNCTION clase_usuarios_release_spot() RETURNS trigger AS $$
+            BEGIN
+                UPDATE clases_horarios
+                SET inscriptos_count = GREATEST(inscriptos_count - 1, 0)
+                WHERE id = OLD.clase_horario_id;
+                RETURN OLD;
+            END;
+            $$ LANGUAGE plpgsql
+            """,
+            """
+            CREATE TRIGGER trg_clase_usuarios_release_spot
+            AFTER DELETE ON clase_usuarios
+            FOR EACH ROW EXECUTE FUNCTION clase_usuarios_release_spot()
+            """,
+        ]
+    return ddl
+
+
+def _parallel(clients: int, fn) -> List[Dict[str, Any]]:
+    barrier = threading.Barrier(clients)
+
+    def worker(i: int) -> Dict[str, Any]:
+        barrier.wait()
+        t0 = time.perf_counter()
+        out = fn(i)
+        out["ms"] = (time.perf_counter() - t0) * 1000.0
+        return out
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        return list(pool.map(worker, range(clients)))
+
+
+def _pct(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * p))], 2)
+
+
+def run(
+    db_url: str,
+    clients: int,
+    cupo: int,
+    cancel: int,
+    legacy: bool,
+    keep: bool,
+    connections: int = 50,
+) -> int:
+    from src.services.class_booking_service import ClassBookingService
+
+    schema = f"booking_check_{uuid.uuid4().hex[:8]}"
+    admin = create_engine(db_url)
+    with admin.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+        conn.execute(text(f"SET search_path TO {schema}"))
+        for stmt in _schema_ddl(legacy):
+            conn.execute(text(stmt))
+        conn.execute(
+            text("INSERT INTO usuarios (nombre) SELECT 'u' || g FROM generate_series(1, :n) g"),
+            {"n": clients},
+        )
+        hid = conn.execute(
+            text("INSERT INTO clases_horarios (cupo_maximo) VALUES (:c) RETURNING id"),
+            {"c": cupo},
+        ).scalar()
+
+    pool_size = min(clients, connections)
+    engine = create_engine(
+        db_url,
+        pool_size=pool_size,
+        max_overflow=min(clients - pool_size, _MAX_OVERFLOW),
+        pool_timeout=60,
+    )
+
+    @event.listens_for(engine, "connect")
+    def _search_path(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        cur.execute(f"SET search_path TO {schema}")
+        cur.close()
+        dbapi_conn.commit()
+
+    failures: List[str] = []
+    try:
+        # Phase 1: everyone books the same schedule at once
+        def book(i: int) -> Dict[str, Any]:
+            with Session(engine) as s:
+                r = ClassBookingService(s).reservar(int(hid), i + 1)
+            return {
+                "uid": i + 1,
+                "booked": bool(r.get("id")),
+                "error": None if r.get("full") else r.get("error"),
+            }
+
+        booking = _parallel(clients, book)
+        booked = [b["uid"] for b in booking if b["booked"]]
+        errors = [b["error"] for b in booking if b["error"]]
+
+        with engine.connect() as conn:
+            rows = conn.execute(
+                text("SELECT COUNT(*) FROM clase_usuarios WHERE clase_horario_id = :h"), {"h": hid}
+            ).scalar()
+            counter = None if legacy else conn.execute(
+                text("SELECT inscriptos_count FROM clases_horarios WHERE id = :h"), {"h": hid}
+            ).scalar()
+
+        expected = min(cupo, clients)
+        if rows > cupo:
+            msg = f"overbooked: {rows} enrollments for cupo {cupo}"
+            if legacy:
+                print(f"legacy: {msg}")
+            else:
+                failures.append(msg)
+        if not legacy and rows != expected:
+            failures.append(f"expected {expected} enrollments, got {rows}")
+        if counter is not None and counter != rows:
+            failures.append(f"inscriptos_count={counter} but clase_usuarios has {rows}")
+        if errors:
+            failures.append(f"{len(errors)} booking errors, e.g. {errors[0]}")
+
+        # Phase 2: waitlist the rest, cancel part of the enrollments at once
+        waitlisted = [b["uid"] for b in booking if not b["booked"]]
+        with engine.begin() as conn:
+            for pos, uid in enumerate(waitlisted, start=1):
+                conn.execute(
+                    text("INSERT INTO clase_lista_espera (clase_horario_id, usuario_id, posicion) VALUES (:h, :u, :p)"),
+                    {"h": hid, "u": uid, "p": pos},
+                )
+        cancelling = booked[: max(0, min(cancel, len(booked)))]
+        promoted_total = 0
+        if cancelling:
+            def cancel_one(i: int) -> Dict[str, Any]:
+                with Session(engine) as s:
+                    r = ClassBookingService(s).cancelar(int(hid), cancelling[i])
+                return {"ok": bool(r.get("ok")), "promoted": len(r.get("promoted") or [])}
+
+            cancels = _parallel(len(cancelling), cancel_one)
+            promoted_total = sum(c["promoted"] for c in cancels)
+            if not all(c["ok"] for c in cancels):
+                failures.append("some cancellations failed")
+
+        with engine.connect() as conn:
+            rows_after = conn.execute(
+                text("SELECT COUNT(*) FROM clase_usuarios WHERE clase_horario_id = :h"), {"h": hid}
+            ).scalar()
+            counter_after = None if legacy else conn.execute(
+                text("SELECT inscriptos_count FROM clases_horarios WHERE id = :h"), {"h": hid}
+            ).scalar()
+        expected_promoted = min(len(cancelling), len(waitlisted))
+        if not legacy:
+            if promoted_total != expected_promoted:
+                failures.append(f"promoted {promoted_total}, expected {expected_promoted}")
+            if counter_after != rows_after:
+                failures.append(f"after cancel: inscriptos_count={counter_after}, rows={rows_after}")
+            if rows_after > cupo:
+                failures.append(f"after cancel: overbooked ({rows_after} > {cupo})")
+
+        latencies = [b["ms"] for b in booking]
+        print(
+            json.dumps(
+                {
+                    "mode": "legacy" if legacy else "counter",
+                    "clients": clients,
+                    "cupo": cupo,
+                    "booked": len(booked),
+                    "enrollments": rows,
+                    "inscriptos_count": counter,
+                    "booking_ms_p50": _pct(latencies, 0.5),
+                    "booking_ms_p99": _pct(latencies, 0.99),
+                    "cancelled": len(cancelling),
+                    "promoted": promoted_total,
+                    "enrollments_after": rows_after,
+                    "inscriptos_count_after": counter_after,
+                    "failures": failures,
+                },
+                indent=2,
+            )
+        )
+    finally:
+        engine.dispose()
+        if not keep:
+            with admin.begin() as conn:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        admin.dispose()
+    return 1 if failures else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="webapp-api-class-booking-concurrency")
+    parser.add_argument("--db-url", type=str, default=os.getenv("DATABASE_URL") or "")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--cupo", type=int, default=20)
+    parser.add_argument("--cancel", type=int, default=5)
+    parser.add_argument("--legacy", action="store_true")
+    parser.add_argument("--connections", type=int, default=50)
+    parser.add_argument("--keep", action="store_true", help="No borrar el schema temporal")
+    args = parser.parse_args()
+    if not str(args.db_url or "").strip():
+        raise SystemExit("Falta --db-url (o DATABASE_URL).")
+    return run(
+        str(args.db_url).strip(),
+        max(int(args.clients), 2),
+        max(int(args.cupo), 1),
+        max(int(args.cancel), 0),
+        bool(args.legacy),
+        bool(args.keep),
+        max(int(args.connections), 1),
+    )
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
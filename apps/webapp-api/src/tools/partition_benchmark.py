@@ -0,0 +1,214 @@
+"""
+Latency of the hot asistencias queries as history grows, plain vs monthly
+partitions (src/database/partitioning.py).
+
+For each history size it creates two scratch schemas on a PostgreSQL
+database with the same synthetic check-ins and the production indexes,
+converts one of them with `convert_table` and times the query shapes the app
+runs on every request: today's station feed, the 35-day attendance audit and
+a member's latest check-in. Prints one JSON row per (history, layout).
+
+    python -m src.tools.partition_benchmark --db-url postgresql://... --months 6,24,60 --rows-per-day 800
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+import uuid
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+from sqlalchemy import create_engine, text
+
+from src.database.partitioning import MANAGED_TABLES, add_months, convert_table, month_start
+
+_DDL = [
+    """
+    CREATE TABLE asistencias (
+        id SERIAL PRIMARY KEY,
+        usuario_id INTEGER NOT NULL,
+        sucursal_id INTEGER,
+        fecha DATE DEFAULT CURRENT_DATE NOT NULL,
+        hora_registro TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        tipo TEXT
+    )
+    """,
+    "CREATE INDEX idx_asistencias_usuario_fecha_desc ON asistencias (usuario_id, fecha DESC)",
+    "CREATE INDEX idx_asistencias_sucursal_fecha_id ON asistencias (sucursal_id, fecha DESC, id DESC)",
+    "CREATE INDEX idx_asistencias_fecha_id ON asistencias (fecha DESC, id DESC)",
+]
+
+_QUERIES = {
+    "station_today": (
+        """
+        SELECT a.id, a.hora_registro, a.tipo
+        FROM asistencias a
+        WHERE a.fecha = :today AND a.sucursal_id = :sid AND a.id > 0
+        ORDER BY a.id ASC
+        LIMIT 20
+        """
+    ),
+    "audit_35d": (
+        """
+        SELECT fecha, COUNT(*), COUNT(DISTINCT usuario_id)
+        FROM asistencias
+        WHERE fecha >= :since AND fecha <= :today AND sucursal_id = :sid
+        GROUP BY fecha
+        """
+    ),
+    "member_latest": (
+        """
+        SELECT fecha FROM asistencias
+        WHERE usuario_id = :uid AND fecha >= :recent
+        ORDER BY fecha DESC
+        LIMIT 1
+        """
+    ),
+}
+
+
+def _pct(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * p))], 3)
+
+
+def _load(conn, months: int, rows_per_day: int, users: int, sucursales: int, today: date) -> int:
+    first = add_months(month_start(today), -max(months - 1, 0))
+    conn.execute(
+        text(
+            """
+            INSERT INTO asistencias (usuario_id, sucursal_id, fecha, hora_registro, tipo)
+            SELECT 1 + (random() * (:users - 1))::int,
+                   1 + (g % :sucursales),
+                   d::date,
+                   d + (random() * INTERVAL '14 hours') + INTERVAL '7 hours',
+                   'qr'
+            FROM generate_series(CAST(:first AS date), CAST(:today AS date), INTERVAL '1 day') d,
+                 generate_series(1, :per_day) g
+            """
+        ),
+        {
+            "users": users,
+            "sucursales": sucursales,
+            "first": first,
+            "today": today,
+            "per_day": rows_per_day,
+        },
+    )
+    return int(conn.execute(text("SELECT COUNT(*) FROM asistencias")).scalar() or 0)
+
+
+def _time_queries(conn, repeat: int, users: int, sucursales: int, today: date) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for name, sql in _QUERIES.items():
+        stmt = text(sql)
+        samples: List[float] = []
+        for i in range(repeat):
+            params = {
+                "today": today,
+                "since": today - timedelta(days=34),
+                "recent": today - timedelta(days=1),
+                "sid": 1 + (i % sucursales),
+                "uid": 1 + (i * 7919) % users,
+            }
+            t0 = time.perf_counter()
+            conn.execute(stmt, params).fetchall()
+            samples.append((time.perf_counter() - t0) * 1000.0)
+        out[f"{name}_ms_p50"] = _pct(samples, 0.5)
+        out[f"{name}_ms_p95"] = _pct(samples, 0.95)
+    return out
+
+
+def run(
+    db_url: str,
+    months_list: List[int],
+    rows_per_day: int,
+    users: int,
+    sucursales: int,
+    repeat: int,
+    keep: bool,
+) -> int:
+    engine = create_engine(db_url)
+    today = date.today()
+    spec = MANAGED_TABLES["asistencias"]
+    schemas: List[str] = []
+    results: List[Dict[str, Any]] = []
+    try:
+        for months in months_list:
+            for layout in ("plain", "partitioned"):
+                schema = f"partition_bench_{uuid.uuid4().hex[:8]}"
+                schemas.append(schema)
+                with engine.begin() as conn:
+                    conn.execute(text(f"CREATE SCHEMA {schema}"))
+                    conn.execute(text(f"SET LOCAL search_path TO {schema}"))
+                    for stmt in _DDL:
+                        conn.execute(text(stmt))
+                    rows = _load(conn, months, rows_per_day, users, sucursales, today)
+                    t0 = time.perf_counter()
+                    if layout == "partitioned":
+                        convert_table(conn, spec, premake_months=1, today=today)
+                    convert_s = time.perf_counter() - t0
+                with engine.begin() as conn:
+                    conn.execute(text(f"SET LOCAL search_path TO {schema}"))
+                    conn.execute(text("ANALYZE asistencias"))
+                with engine.connect() as conn:
+                    conn.execute(text(f"SET search_path TO {schema}"))
+                    # Warm the cache once so both layouts are measured hot
+                    _time_queries(conn, 1, users, sucursales, today)
+                    row: Dict[str, Any] = {
+                        "months": months,
+                        "layout": layout,
+                        "rows": rows,
+                        "convert_s": round(convert_s, 3) if layout == "partitioned" else None,
+                    }
+                    row.update(_time_queries(conn, repeat, users, sucursales, today))
+                    conn.rollback()
+                results.append(row)
+                print(json.dumps(row))
+                if not keep:
+                    with engine.begin() as conn:
+                        conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+                    schemas.remove(schema)
+    finally:
+        if not keep:
+            with engine.begin() as conn:
+                for schema in schemas:
+                    conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        engine.dispose()
+    return 0 if results else 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="webapp-api-partition-benchmark")
+    parser.add_argument("--db-url", type=str, default=os.getenv("DATABASE_URL") or "")
+    parser.add_argument("--months", type=str, default="6,24,60", help="Historias a medir, en meses")
+    parser.add_argument("--rows-per-day", type=int, default=500)
+    parser.add_argument("--users", type=int, default=3000)
+    parser.add_argument("--sucursales", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--keep", action="store_true", help="No borrar los schemas temporales")
+    args = parser.parse_args()
+    if not str(args.db_url or "").strip():
+        raise SystemExit("Falta --db-url (o DATABASE_URL).")
+    try:
+        months_list = sorted({max(int(m), 1) for m in str(args.months).split(",") if m.strip()})
+    except ValueError:
+        raise SystemExit("--months debe ser una lista de enteros, p.ej. 6,24,60")
+    return run(
+        str(args.db_url).strip(),
+        months_list,
+        max(int(args.rows_per_day), 1),
+        max(int(args.users), 2),
+        max(int(args.sucursales), 1),
+        max(int(args.repeat), 1),
+        bool(args.keep),
+    )
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())